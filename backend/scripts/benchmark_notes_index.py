@@ -0,0 +1,230 @@
+"""
+注記インデックスの検索レイテンシとコーパス規模の関係を計測
+合成した注記コーパス (有価証券報告書の注記に近い定型文の組み合わせ) をサイズごとに作り、
+インデックス作成・1四半期分の差分更新・検索 (シャード未読込 / 読込済み) と線形走査を比較する
+"""
+
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from notes_index import NotesIndex, group_notes, normalize_text, note_text, query_terms
+
+DEFAULT_SIZES = "1000,10000,50000"
+SENTENCES_PER_NOTE = 6
+
+# Building blocks of synthetic note sentences
+SUBJECTS = [
+    "当社グループ",
+    "連結子会社",
+    "原子力発電所",
+    "送配電事業",
+    "燃料調達",
+    "再生可能エネルギー事業",
+    "退職給付債務",
+    "固定資産",
+    "繰延税金資産",
+    "託送料金",
+]
+EVENTS = [
+    "に関する訴訟が継続中であり",
+    "の減損損失を計上しており",
+    "に係る会計方針を変更しており",
+    "の見積りの変更を行っており",
+    "について規制当局の審査を受けており",
+    "の燃料費調整制度の影響を受けており",
+    "に関する損害賠償請求を受けており",
+    "の廃炉費用の見積額を見直しており",
+]
+OUTCOMES = [
+    "、将来的に追加の損失が発生する可能性があります。",
+    "、当連結会計年度の業績に重要な影響を与えています。",
+    "、その影響額は合理的に見積もることが困難です。",
+    "、財政状態に与える影響は軽微です。",
+    "、今後の動向によっては追加の引当が必要となります。",
+]
+KEYWORDS = ["訴訟", "減損", "会計方針", "規制", "廃炉", "賠償", "燃料費"]
+
+# Specific terms (facility names, counterparties, ...) drawn with a Zipf-like frequency
+VOCABULARY_SIZE = 5000
+KANJI = [chr(c) for c in range(0x4E00, 0x4E00 + 2000)]
+
+# Fixed queries: (query, description); rare vocabulary queries are added per run
+QUERIES = [
+    ("訴訟", "common keyword"),
+    ("損害賠償請求", "common phrase"),
+    ("廃炉費用 見積額", "two terms"),
+    ("託送料金 減損損失", "two terms"),
+    ("存在しない語句", "no match"),
+]
+
+
+def vocabulary(seed: int = 0) -> List[str]:
+    """2〜4文字の合成語彙 (先頭ほど出現頻度が高い)"""
+    rng = random.Random(seed)
+    words = dict.fromkeys(
+        "".join(rng.choice(KANJI) for _ in range(rng.randint(2, 4))) for _ in range(VOCABULARY_SIZE)
+    )
+    return list(words)
+
+
+def benchmark_queries(words: List[str]) -> List[Tuple[str, str]]:
+    """固定クエリと、頻度の異なる語彙クエリ"""
+    return QUERIES + [
+        (words[0], "frequent term"),
+        (words[100], "mid-frequency term"),
+        (words[3000], "rare term"),
+        (f"{words[10]} 訴訟", "term + keyword"),
+    ]
+
+
+def synthetic_notes(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """合成注記を作成 (企業20社 × 四半期、1グループあたり約10件)"""
+    rng = random.Random(seed)
+    words = vocabulary(seed)
+    weights = [1.0 / (rank + 1) for rank in range(len(words))]
+    companies = [f"CO{i:02d}" for i in range(20)]
+    notes = []
+    for i in range(count):
+        group = i // 10
+        company = companies[group % len(companies)]
+        ordinal = 2000 * 4 + group // len(companies)
+        terms = rng.choices(words, weights=weights, k=SENTENCES_PER_NOTE)
+        text = "".join(
+            rng.choice(SUBJECTS) + "の" + term + rng.choice(EVENTS) + rng.choice(OUTCOMES)
+            for term in terms
+        )
+        notes.append(
+            {
+                "company": company,
+                "period": f"{ordinal // 4}Q{ordinal % 4 + 1}",
+                "docID": f"S100{i:05d}",
+                "category": rng.choice(["risk", "policy_change", "info"]),
+                "text": text,
+                "severity": round(rng.random(), 2),
+                "keywords": rng.sample(KEYWORDS, 2),
+                "detected_at": "2026-01-01T00:00:00Z",
+            }
+        )
+    return notes
+
+
+def _linear_scan(query: str, notes: List[Dict[str, Any]]) -> int:
+    terms = query_terms(query)
+    return sum(1 for n in notes if all(t in normalize_text(note_text(n)) for t in terms))
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return round(float(np.percentile(values, q)), 3)
+
+
+def run_benchmark(sizes: List[int], repeats: int = 20) -> List[Dict[str, Any]]:
+    """サイズごとの計測結果"""
+    results = []
+    for size in sizes:
+        notes = synthetic_notes(size)
+        # Hold back the last quarter to measure an incremental update
+        last_period = notes[-1]["period"]
+        initial = [n for n in notes if n["period"] != last_period]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp)
+            began = time.perf_counter()
+            index = NotesIndex.build(initial)
+            manifest = index.save(directory)
+            build_s = time.perf_counter() - began
+
+            began = time.perf_counter()
+            reopened = NotesIndex.open(directory)
+            assert reopened is not None
+            stats = reopened.update(notes)
+            manifest = reopened.save(directory)
+            update_s = time.perf_counter() - began
+
+            grouped = group_notes(notes)
+            for query, description in benchmark_queries(vocabulary()):
+                cold, warm, shards = [], [], []
+                matches = 0
+                for _ in range(repeats):
+                    began = time.perf_counter()
+                    fresh = NotesIndex.open(directory)
+                    assert fresh is not None
+                    matches = len(fresh.search(query, grouped))
+                    cold.append((time.perf_counter() - began) * 1000.0)
+                    shards.append(fresh.shards_loaded)
+
+                    began = time.perf_counter()
+                    fresh.search(query, grouped)
+                    warm.append((time.perf_counter() - began) * 1000.0)
+
+                began = time.perf_counter()
+                expected = _linear_scan(query, notes)
+                scan_ms = (time.perf_counter() - began) * 1000.0
+                if expected != matches:
+                    raise AssertionError(f"{query}: index {matches} != scan {expected}")
+
+                results.append(
+                    {
+                        "size": size,
+                        "query": query,
+                        "kind": description,
+                        "matches": matches,
+                        "shards_loaded": max(shards),
+                        "cold_p50_ms": _percentile(cold, 50),
+                        "warm_p50_ms": _percentile(warm, 50),
+                        "warm_p95_ms": _percentile(warm, 95),
+                        "scan_ms": round(scan_ms, 3),
+                        "index_bytes": sum(s["bytes"] for s in manifest["shards"].values()),
+                        "build_s": round(build_s, 3),
+                        "update_s": round(update_s, 3),
+                        "update_groups": stats["added"],
+                    }
+                )
+    return results
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """コマンドライン引数を解析"""
+    parser = argparse.ArgumentParser(description="Notes bigram index query benchmark")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="注記数 (カンマ区切りで複数指定)")
+    parser.add_argument("--repeats", type=int, default=20, help="クエリごとの繰り返し回数")
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """メイン処理"""
+    args = parse_args(argv)
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    results = run_benchmark(sizes, args.repeats)
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return 0
+
+    for size in sizes:
+        rows = [r for r in results if r["size"] == size]
+        first = rows[0]
+        print(
+            f"notes={size} index={first['index_bytes'] / 1024:.0f}KiB "
+            f"build={first['build_s']}s "
+            f"update(+{first['update_groups']} groups)={first['update_s']}s"
+        )
+        print(f"  {'query':<20} {'hits':>6} {'shards':>6} {'cold':>8} {'warm':>8} {'scan':>9}")
+        for r in rows:
+            print(
+                f"  {r['query']:<20} {r['matches']:>6} {r['shards_loaded']:>6} "
+                f"{r['cold_p50_ms']:>6.2f}ms {r['warm_p50_ms']:>6.2f}ms {r['scan_ms']:>7.2f}ms"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
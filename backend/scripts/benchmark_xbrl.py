@@ -0,0 +1,215 @@
+"""
+XBRL ストリーミング解析と CSV 経路のスループット比較
+合成した大きな有価証券報告書 (多数の未対応要素・セグメント別コンテキストを含む) を
+両方の形式で ZIP にし、それぞれを別プロセスで解析して時間とピークメモリ (RSS) を計測する
+"""
+
+import argparse
+import json
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Facts per synthetic report (comma separated sizes are run in turn)
+DEFAULT_SIZES = "50000,200000"
+SEGMENTS = 40
+
+# Mapped concepts written into every report (local name, yen value)
+MAPPED_CONCEPTS: List[Tuple[str, int]] = [
+    ("OperatingRevenue1", 6_810_000_000_000),
+    ("OperatingIncome", 412_300_000_000),
+    ("OrdinaryIncome", 398_700_000_000),
+    ("ProfitLossAttributableToOwnersOfParent", 267_800_000_000),
+    ("Assets", 13_540_000_000_000),
+    ("CurrentAssets", 2_310_000_000_000),
+    ("NoncurrentAssets", 11_230_000_000_000),
+    ("Liabilities", 10_120_000_000_000),
+    ("NetAssets", 3_420_000_000_000),
+    ("NetCashProvidedByUsedInOperatingActivities", 721_000_000_000),
+    ("NetCashProvidedByUsedInInvestingActivities", -655_000_000_000),
+    ("NetCashProvidedByUsedInFinancingActivities", -48_000_000_000),
+]
+INSTANT_CONCEPTS = {"Assets", "CurrentAssets", "NoncurrentAssets", "Liabilities", "NetAssets"}
+
+PERIOD_START, PERIOD_END = "2024-04-01", "2025-03-31"
+PRIOR_START, PRIOR_END = "2023-04-01", "2024-03-31"
+
+
+def _contexts() -> List[Tuple[str, str, Optional[str], Optional[str]]]:
+    """(id, end/instant, start, segment member)"""
+    contexts: List[Tuple[str, str, Optional[str], Optional[str]]] = [
+        ("CurrentYearDuration", PERIOD_END, PERIOD_START, None),
+        ("CurrentYearInstant", PERIOD_END, None, None),
+        ("Prior1YearDuration", PRIOR_END, PRIOR_START, None),
+        ("Prior1YearInstant", PRIOR_END, None, None),
+    ]
+    for i in range(SEGMENTS):
+        contexts.append((f"CurrentYearDuration_Segment{i}", PERIOD_END, PERIOD_START, f"Seg{i}"))
+        contexts.append((f"CurrentYearInstant_Segment{i}", PERIOD_END, None, f"Seg{i}"))
+    return contexts
+
+
+def write_synthetic_report(directory: Path, facts: int) -> Tuple[Path, Path]:
+    """
+    同じ事実を持つ XBRL (type=1) と CSV (type=5) の ZIP を作成
+
+    Returns:
+        (xbrl_zip, csv_zip)
+    """
+    contexts = _contexts()
+    xbrl_lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<xbrli:xbrl xmlns:xbrli="http://www.xbrl.org/2003/instance" '
+        'xmlns:xbrldi="http://xbrl.org/2006/xbrldi" '
+        'xmlns:iso4217="http://www.xbrl.org/2003/iso4217" '
+        'xmlns:jppfs_cor="http://disclosure.edinet-fsa.go.jp/taxonomy/jppfs/2024-11-01/jppfs_cor" '
+        'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">',
+        '<xbrli:unit id="JPY"><xbrli:measure>iso4217:JPY</xbrli:measure></xbrli:unit>',
+    ]
+    for context_id, end, start, member in contexts:
+        segment = (
+            f'<xbrli:segment><xbrldi:explicitMember dimension="jpcrp_cor:OperatingSegmentsAxis">'
+            f"{member}</xbrldi:explicitMember></xbrli:segment>"
+            if member
+            else ""
+        )
+        period = (
+            f"<xbrli:startDate>{start}</xbrli:startDate><xbrli:endDate>{end}</xbrli:endDate>"
+            if start
+            else f"<xbrli:instant>{end}</xbrli:instant>"
+        )
+        xbrl_lines.append(
+            f'<xbrli:context id="{context_id}"><xbrli:entity><xbrli:identifier '
+            f'scheme="http://disclosure.edinet-fsa.go.jp">E04498</xbrli:identifier>{segment}'
+            f"</xbrli:entity><xbrli:period>{period}</xbrli:period></xbrli:context>"
+        )
+
+    csv_lines = ["要素名,コンテキストID,金額,単位"]
+
+    def add_fact(name: str, context_id: str, value: int) -> None:
+        xbrl_lines.append(
+            f'<jppfs_cor:{name} contextRef="{context_id}" unitRef="JPY" decimals="-6">'
+            f"{value}</jppfs_cor:{name}>"
+        )
+        csv_lines.append(f"jppfs_cor:{name},{context_id},{value // 1000},千円")
+
+    for name, value in MAPPED_CONCEPTS:
+        suffix = "Instant" if name in INSTANT_CONCEPTS else "Duration"
+        add_fact(name, f"Prior1Year{suffix}", value * 9 // 10)
+        add_fact(name, f"CurrentYear{suffix}", value)
+
+    filler = max(facts - len(MAPPED_CONCEPTS) * 2, 0)
+    for i in range(filler):
+        context_id = contexts[i % len(contexts)][0]
+        add_fact(f"DetailItem{i % 5000}", context_id, 1_000_000 + i)
+
+    xbrl_lines.append("</xbrli:xbrl>")
+
+    xbrl_zip = directory / f"BENCH_S100XBRL_{PERIOD_END}.xbrl.zip"
+    csv_zip = directory / f"BENCH_S100XCSV_{PERIOD_END}.zip"
+    with zipfile.ZipFile(xbrl_zip, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("XBRL/PublicDoc/jpcrp030000-asr-001.xbrl", "\n".join(xbrl_lines))
+    with zipfile.ZipFile(csv_zip, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("XBRL_TO_CSV/jpcrp030000-asr-001.csv", "\n".join(csv_lines).encode("cp932"))
+    return xbrl_zip, csv_zip
+
+
+def _run_parser(mode: str, zip_path: str, work_dir: str) -> Dict[str, Any]:
+    """子プロセスで1回解析し、時間とピークRSSを返す"""
+    import extract_financials
+    from xbrl_parser import ParseStats, build_concept_index, parse_xbrl_zip
+
+    taxonomy_map = extract_financials.load_taxonomy_mapping()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    began = time.perf_counter()
+
+    if mode == "xbrl":
+        stats = ParseStats()
+        rows = parse_xbrl_zip(
+            Path(zip_path), "BENCH", "2024Q4", PERIOD_END, build_concept_index(taxonomy_map), stats
+        )
+        facts = stats.facts
+    else:
+        # extract_csv_from_zip writes next to the cache; keep benchmark output in the temp dir
+        extract_financials.CACHE_DIR = Path(work_dir)
+        rows = []
+        facts = 0
+        for csv_path in extract_financials.extract_csv_from_zip(Path(zip_path)):
+            with open(csv_path, encoding="cp932") as f:
+                facts += sum(1 for _ in f) - 1
+            row = extract_financials.parse_financial_csv(
+                csv_path, "BENCH", "2024Q4", PERIOD_END, taxonomy_map
+            )
+            if row:
+                rows.append(row)
+
+    elapsed = time.perf_counter() - began
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "mode": mode,
+        "seconds": round(elapsed, 3),
+        "facts": facts,
+        "facts_per_s": round(facts / elapsed) if elapsed else None,
+        "peak_rss_mib": round(rss_after / 1024, 1),
+        "rss_growth_mib": round((rss_after - rss_before) / 1024, 1),
+        "fields": len(rows[0]) - 3 if rows else 0,
+        "row": rows[0] if rows else None,
+    }
+
+
+def run_benchmark(sizes: List[int]) -> List[Dict[str, Any]]:
+    """サイズごとに両経路を別プロセスで計測"""
+    results = []
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            size_dir = Path(tmp) / str(size)
+            size_dir.mkdir()
+            xbrl_zip, csv_zip = write_synthetic_report(size_dir, size)
+            for mode, path in (("csv", csv_zip), ("xbrl", xbrl_zip)):
+                with context.Pool(1) as pool:
+                    result = pool.apply(_run_parser, (mode, str(path), str(size_dir)))
+                result["size"] = size
+                result["archive_kib"] = round(path.stat().st_size / 1024, 1)
+                results.append(result)
+    return results
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """コマンドライン引数を解析"""
+    parser = argparse.ArgumentParser(description="XBRL streaming vs CSV extraction benchmark")
+    parser.add_argument(
+        "--sizes",
+        default=DEFAULT_SIZES,
+        help="1報告書あたりの事実数 (カンマ区切りで複数指定)",
+    )
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """メイン処理"""
+    args = parse_args(argv)
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    results = run_benchmark(sizes)
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return 0
+
+    print(f"{'facts':>9} {'mode':>5} {'sec':>8} {'facts/s':>10} {'RSS growth':>11} {'fields':>7}")
+    for r in results:
+        print(
+            f"{r['size']:>9} {r['mode']:>5} {r['seconds']:>8.3f} {r['facts_per_s']:>10} "
+            f"{r['rss_growth_mib']:>9.1f}Mi {r['fields']:>7}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
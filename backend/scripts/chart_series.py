@@ -0,0 +1,390 @@
+"""
+グラフ描画用の系列を企業・指標ごとに事前計算
+四半期の全解像度系列に加えて、年度・TTM の集計系列と、LTTB (Largest-Triangle-Three-Buckets)
+で間引いた系列を作り、型付き配列 (Float32 / Uint16) の連結バイナリとして出力する。
+フロントエンドは描画幅に合った解像度を選ぶだけで済み、行データを集計し直す必要がない
+"""
+
+import argparse
+import json
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from compute_metrics import compute_metric_arrays
+from logger import get_data_logger
+from panel import FLOW_FIELDS, NUMERIC_FIELDS, ordinal_to_period, to_grid
+from standalone_quarters import (
+    FLOW_BASIS_ATTR,
+    fiscal_positions,
+    fiscal_shift,
+    fiscal_year_end_month,
+    fiscal_year_label,
+    standalone_panel,
+)
+
+# Logger
+logger = get_data_logger()
+
+# Series per issuer: statement items plus free cash flow
+CHART_METRICS = NUMERIC_FIELDS + ["free_cf"]
+TTM_METRICS = [m for m in CHART_METRICS if m in FLOW_FIELDS or m == "free_cf"]
+
+# LTTB target point counts; a variant is written only when the series is longer
+LTTB_TARGETS = (50, 100, 200)
+
+# Resolutions: quarterly (every quarter), ttm (trailing four quarters), annual (fiscal year)
+BASE_RESOLUTIONS = ("quarterly", "ttm")
+ANNUAL = "annual"
+
+# Binary layout: all Float32 values, then all Uint16 quarter indices (little endian)
+VALUE_DTYPE = np.dtype("<f4")
+INDEX_DTYPE = np.dtype("<u2")
+CHART_FORMAT_VERSION = 1
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, counts: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets で残す点の位置を求める (複数系列を一括処理)
+
+    先頭と末尾の点は必ず残し、間を threshold - 2 個のバケットに分ける。各バケットでは、
+    直前に選んだ点と次のバケットの平均点とで作る三角形の面積が最大になる点を選ぶ。
+    バケット境界は系列ごとの点数から配列演算で求め、次バケットの平均は累積和から取るため、
+    点数の異なる系列もバケット数 (threshold - 2) 回の反復でまとめて処理できる。
+
+    Args:
+        x: (系列数 × 最大点数) の x 座標 (昇順・左詰め)
+        y: (系列数 × 最大点数) の y 座標 (左詰め、counts 以降は無視)
+        counts: 系列ごとの点数 (すべて threshold より大きいこと)
+        threshold: 残す点の数 (3 以上)
+
+    Returns:
+        (系列数 × threshold) の位置
+    """
+    rows = np.arange(len(counts))
+    last = counts - 1
+    every = (counts - 2) / (threshold - 2)
+    width = int(np.ceil(every.max())) + 1
+    window = np.arange(width)
+
+    # Prefix sums give each bucket's average point without per-series slicing
+    x_sum = np.concatenate([np.zeros((len(counts), 1)), np.cumsum(x, axis=1)], axis=1)
+    y_sum = np.concatenate([np.zeros((len(counts), 1)), np.cumsum(y, axis=1)], axis=1)
+
+    selected = np.empty((len(counts), threshold), dtype=np.int64)
+    selected[:, 0] = 0
+    selected[:, -1] = last
+    a = np.zeros(len(counts), dtype=np.int64)
+
+    for i in range(threshold - 2):
+        # Average point of the next bucket (the last point for the final bucket)
+        next_start = np.floor((i + 1) * every).astype(np.int64) + 1
+        next_end = np.minimum(np.floor((i + 2) * every).astype(np.int64) + 1, counts)
+        size = next_end - next_start
+        avg_x = (x_sum[rows, next_end] - x_sum[rows, next_start]) / size
+        avg_y = (y_sum[rows, next_end] - y_sum[rows, next_start]) / size
+
+        start = np.floor(i * every).astype(np.int64) + 1
+        end = np.floor((i + 1) * every).astype(np.int64) + 1
+        candidates = np.minimum(start[:, None] + window, last[:, None])
+        cx = np.take_along_axis(x, candidates, axis=1)
+        cy = np.take_along_axis(y, candidates, axis=1)
+        ax, ay = x[rows, a], y[rows, a]
+        area = np.abs(
+            (ax - avg_x)[:, None] * (cy - ay[:, None]) - (ax[:, None] - cx) * (avg_y - ay)[:, None]
+        )
+        area[candidates >= end[:, None]] = -1.0
+        a = start + np.argmax(area, axis=1)
+        selected[:, i + 1] = a
+    return selected
+
+
+def downsample(values: np.ndarray, threshold: int) -> List[Optional[np.ndarray]]:
+    """
+    (系列数 × 四半期) の系列を LTTB で間引く (欠損は除いてから処理)
+
+    Returns:
+        系列ごとの残す四半期位置 (欠損を除いた点数が threshold 以下なら None)
+    """
+    present = ~np.isnan(values)
+    counts = present.sum(axis=1)
+    members = np.flatnonzero(counts > threshold)
+    result: List[Optional[np.ndarray]] = [None] * len(values)
+    if len(members) == 0 or threshold < 3:
+        return result
+
+    # Left-align the present quarters; padding repeats the last position
+    order = np.argsort(~present[members], axis=1, kind="stable")
+    width = np.arange(values.shape[1])
+    positions = np.where(
+        width < counts[members, None],
+        order,
+        order[np.arange(len(members)), counts[members] - 1, None],
+    )
+    y = np.take_along_axis(values[members], positions, axis=1)
+    chosen = lttb_indices(positions.astype(float), y, counts[members], threshold)
+    for member, kept in zip(members, np.take_along_axis(positions, chosen, axis=1)):
+        result[member] = kept
+    return result
+
+
+def annual_rollup(
+    values: np.ndarray, ordinals: np.ndarray, shifts: np.ndarray, flow: bool
+) -> Tuple[int, np.ndarray]:
+    """
+    四半期系列を会計年度系列に集計
+
+    企業ごとの決算月 (fiscal_shift) で四半期を会計年度に割り当て、フロー項目は4四半期の合計
+    (1つでも欠ければ欠損)、ストック項目は期末 (年度内の第4四半期) の値とする。
+
+    Args:
+        values: (系列数 × 連続四半期) の配列 (フロー項目は単独四半期)
+        ordinals: 四半期番号 (連続)
+        shifts: 系列ごとの fiscal_shift
+        flow: フロー項目かどうか
+
+    Returns:
+        (最初の会計年度番号, (系列数 × 年度) の配列) - 列 j は会計年度番号 (最初 + j)
+    """
+    fiscal_index, _ = fiscal_positions(ordinals, shifts)
+    first_index = int(fiscal_index[:, 0].min())
+    years = int(fiscal_index[:, -1].max()) - first_index + 1
+
+    # Each row is placed by its own fiscal calendar, so columns line up by fiscal year
+    padded = np.full((values.shape[0], years * 4), np.nan)
+    columns = ordinals[None, :] - shifts[:, None] - first_index * 4
+    padded[np.arange(values.shape[0])[:, None], columns] = values
+    quarters = padded.reshape(values.shape[0], years, 4)
+
+    if flow:
+        annual = np.where(np.isnan(quarters).any(axis=2), np.nan, quarters.sum(axis=2))
+    else:
+        annual = quarters[:, :, 3]
+    return first_index, annual
+
+
+class SeriesEncoder:
+    """型付き配列の連結バッファと、その位置を記した索引を作る"""
+
+    def __init__(self) -> None:
+        self.values: List[np.ndarray] = []
+        self.indices: List[np.ndarray] = []
+        self.value_count = 0
+        self.index_count = 0
+
+    def add(self, values: np.ndarray, index: Optional[np.ndarray] = None) -> Dict[str, List[int]]:
+        """
+        系列を追加
+
+        Returns:
+            {"values": [offset, length], "index": [offset, length]} (offset は要素数)
+        """
+        entry = {"values": [self.value_count, len(values)]}
+        self.values.append(values.astype(VALUE_DTYPE))
+        self.value_count += len(values)
+        if index is not None:
+            entry["index"] = [self.index_count, len(index)]
+            self.indices.append(index.astype(INDEX_DTYPE))
+            self.index_count += len(index)
+        return entry
+
+    def payload(self) -> bytes:
+        """Float32 の値すべて → Uint16 の位置すべて、の順に連結したバイト列"""
+        parts = self.values + self.indices
+        return b"".join(part.tobytes() for part in parts)
+
+
+def build_chart_series(panel: pd.DataFrame) -> Dict[str, Tuple[Dict[str, Any], bytes]]:
+    """
+    全企業のグラフ系列を作成
+
+    Args:
+        panel: load_standalone_panel の結果。未変換のパネルはフロー項目を単独四半期に
+            変換してから集計する
+
+    Returns:
+        企業 -> (索引, バイナリ)
+        索引: {"start": 最初の四半期番号, "quarters": 四半期数, "first_fiscal_year", "years",
+               "value_count", "series": {指標: {解像度: {"values": [...], "index": [...]}}}}
+        first_fiscal_year は期末の暦年 (standalone.json の fiscal_year と同じ、2025年3月期なら
+        2025)。解像度は quarterly / ttm / annual と、LTTB で間引いた quarterly@N / ttm@N
+    """
+    panel = standalone_panel(panel)
+    companies, ordinals, grid = to_grid(panel, NUMERIC_FIELDS)
+    if grid.size == 0:
+        return {}
+    shifts = np.array([fiscal_shift(fiscal_year_end_month(str(c))) for c in companies], dtype=int)
+
+    base = {field: grid[:, :, i] for i, field in enumerate(NUMERIC_FIELDS)}
+    derived = compute_metric_arrays(grid, NUMERIC_FIELDS)
+    metrics = {**base, "free_cf": derived["free_cf"]}
+    ttm = {metric: derived[f"{metric}_ttm"] for metric in TTM_METRICS}
+
+    # Each issuer's own range (the shared grid spans every issuer)
+    present = ~np.isnan(grid).all(axis=2)
+    first = present.argmax(axis=1)
+    last = present.shape[1] - 1 - present[:, ::-1].argmax(axis=1)
+
+    # Vectorized across issuers: LTTB variants and annual rollups per metric
+    variants: Dict[Tuple[str, str, int], List[Optional[np.ndarray]]] = {}
+    for metric in CHART_METRICS:
+        for resolution in BASE_RESOLUTIONS:
+            source = metrics if resolution == "quarterly" else ttm
+            if metric not in source:
+                continue
+            for target in LTTB_TARGETS:
+                variants[(metric, resolution, target)] = downsample(source[metric], target)
+    annual = {
+        metric: annual_rollup(metrics[metric], ordinals, shifts, metric in TTM_METRICS)
+        for metric in CHART_METRICS
+    }
+
+    result: Dict[str, Tuple[Dict[str, Any], bytes]] = {}
+    for row, company in enumerate(companies):
+        lo, hi = int(first[row]), int(last[row]) + 1
+        start = int(ordinals[lo])
+        # Fiscal year numbers (fiscal_positions) of the issuer's first and last quarter
+        first_year = (start - int(shifts[row])) // 4
+        last_year = (int(ordinals[hi - 1]) - int(shifts[row])) // 4
+        encoder = SeriesEncoder()
+        series: Dict[str, Dict[str, Any]] = {}
+
+        for metric in CHART_METRICS:
+            values = metrics[metric][row, lo:hi]
+            if np.isnan(values).all():
+                continue
+            entry: Dict[str, Any] = {"quarterly": encoder.add(values)}
+            if metric in ttm and not np.isnan(ttm[metric][row, lo:hi]).all():
+                entry["ttm"] = encoder.add(ttm[metric][row, lo:hi])
+
+            year0, yearly = annual[metric]
+            yearly_values = yearly[row, first_year - year0 : last_year - year0 + 1]
+            if not np.isnan(yearly_values).all():
+                entry[ANNUAL] = encoder.add(yearly_values)
+
+            for resolution in BASE_RESOLUTIONS:
+                if resolution not in entry:
+                    continue
+                source = metrics if resolution == "quarterly" else ttm
+                for target in LTTB_TARGETS:
+                    kept = variants[(metric, resolution, target)][row]
+                    if kept is None:
+                        continue
+                    entry[f"{resolution}@{target}"] = encoder.add(
+                        source[metric][row, kept], kept - lo
+                    )
+            series[metric] = entry
+
+        index = {
+            "format_version": CHART_FORMAT_VERSION,
+            "start": start,
+            "quarters": hi - lo,
+            "first_fiscal_year": int(
+                fiscal_year_label(np.array([[first_year]]), shifts[row : row + 1])[0, 0]
+            ),
+            "years": last_year - first_year + 1,
+            "value_count": encoder.value_count,
+            "series": series,
+        }
+        result[str(company)] = (index, encoder.payload())
+    return result
+
+
+def decode_series(
+    index: Dict[str, Any], payload: bytes, metric: str, resolution: str
+) -> Tuple[List[str], np.ndarray]:
+    """
+    バイナリから1系列を取り出す (フロントエンドの chartSeriesLoader と同じ解釈)
+
+    Returns:
+        (期間ラベル (年度系列は "FY2024" 形式), 値)
+    """
+    entry = index["series"][metric][resolution]
+    offset, length = entry["values"]
+    values = np.frombuffer(payload, dtype=VALUE_DTYPE, count=length, offset=offset * 4)
+
+    if resolution == ANNUAL:
+        labels = [f"FY{index['first_fiscal_year'] + i}" for i in range(length)]
+    elif "index" in entry:
+        index_offset, index_length = entry["index"]
+        positions = np.frombuffer(
+            payload,
+            dtype=INDEX_DTYPE,
+            count=index_length,
+            offset=index["value_count"] * 4 + index_offset * 2,
+        )
+        labels = ordinal_to_period(index["start"] + positions.astype(int))
+    else:
+        labels = ordinal_to_period(index["start"] + np.arange(length))
+    return labels, values
+
+
+def run_benchmark(companies: int, quarters: int, seed: int = 0) -> Dict[str, float]:
+    """
+    合成パネル (companies 社 × quarters 四半期) で系列作成の時間と出力サイズを計測
+
+    Returns:
+        計測値 (作成秒数・系列数・出力バイト数・LTTB 系列数、比較用に行JSONのバイト数)
+    """
+    rng = np.random.default_rng(seed)
+    ordinals = np.arange(1990 * 4, 1990 * 4 + quarters)
+    panel = pd.DataFrame(
+        {
+            "company": np.repeat([f"C{i:04d}" for i in range(companies)], quarters),
+            "period": np.tile(ordinal_to_period(ordinals), companies),
+            "ordinal": np.tile(ordinals, companies),
+        }
+    )
+    walk = np.cumsum(rng.normal(0.0, 1.0, (len(panel), len(NUMERIC_FIELDS))), axis=0)
+    values = 1000.0 + 50.0 * walk
+    values[rng.random(values.shape) < 0.02] = np.nan
+    panel[NUMERIC_FIELDS] = values
+    panel["date"] = None
+    panel.attrs[FLOW_BASIS_ATTR] = "standalone"
+
+    began = time.perf_counter()
+    series = build_chart_series(panel)
+    elapsed = time.perf_counter() - began
+
+    binary_bytes = sum(len(payload) for _, payload in series.values())
+    index_bytes = sum(len(json.dumps(index)) for index, _ in series.values())
+    rows_json = panel[["company", "period"] + NUMERIC_FIELDS].to_json(orient="records")
+    return {
+        "build_s": elapsed,
+        "series": float(sum(len(index["series"]) for index, _ in series.values())),
+        "binary_bytes": float(binary_bytes),
+        "index_bytes": float(index_bytes),
+        "rows_json_bytes": float(len(rows_json)),
+        "lttb_variants": float(
+            sum(
+                "@" in resolution
+                for index, _ in series.values()
+                for entry in index["series"].values()
+                for resolution in entry
+            )
+        ),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="Chart series (LTTB) benchmark")
+    parser.add_argument("--companies", type=int, default=500, help="合成データの企業数")
+    parser.add_argument("--quarters", type=int, default=160, help="合成データの四半期数")
+    args = parser.parse_args(argv)
+
+    try:
+        results = run_benchmark(args.companies, args.quarters)
+        print(json.dumps({k: round(v, 4) for k, v in results.items()}, indent=2))
+        return 0
+
+    except Exception as e:
+        logger.error(f"Fatal error: {str(e)}", exc_info=True)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
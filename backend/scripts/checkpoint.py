@@ -0,0 +1,111 @@
+"""
+EDINET 書類検索のチェックポイント
+走査カーソルと発見済み書類を定期的に永続化し、中断したバックフィルを再開できるようにする
+"""
+
+import json
+import os
+import tempfile
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Checkpoint directory
+CHECKPOINT_DIR = Path(__file__).parent.parent.parent / "data" / ".cache" / "checkpoints"
+
+# Persist at least every N scanned dates
+CHECKPOINT_INTERVAL = 10
+
+
+def atomic_write_json(path: Path, data: Any) -> None:
+    """一時ファイルに書いてから置換する (途中で落ちても壊れたファイルを残さない)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+@dataclass
+class ScanCheckpoint:
+    """1企業分の検索・ダウンロード進捗"""
+
+    edinet_code: str
+    start_date: str
+    end_date: str
+    scan_mode: str
+    limit: int
+    cursor: Optional[str] = None  # last fully scanned date (scan runs newest -> oldest)
+    found_docs: List[Dict[str, Any]] = field(default_factory=list)
+    downloaded: List[str] = field(default_factory=list)
+    failed_dates: List[str] = field(default_factory=list)  # retried on resume
+    scan_complete: bool = False
+    updated_at: Optional[str] = None
+
+    @property
+    def found_ids(self) -> List[str]:
+        return [doc.get("docID", "") for doc in self.found_docs]
+
+    def add_document(self, doc: Dict[str, Any]) -> bool:
+        """書類を追加 (docID が既出なら追加しない)"""
+        if doc.get("docID") in self.found_ids:
+            return False
+        self.found_docs.append(doc)
+        return True
+
+    def is_scanned(self, date_str: str) -> bool:
+        """カーソルより新しい (走査済みの) 日付かどうか (取得に失敗した日付は含めない)"""
+        return (
+            self.cursor is not None
+            and date_str >= self.cursor
+            and date_str not in self.failed_dates
+        )
+
+    def mark_scanned(self, date_str: str, success: bool) -> None:
+        """
+        日付の走査結果を記録
+
+        カーソルは走査済みの最も古い日付に進め、取得に失敗した日付は failed_dates に
+        残して再開時に再照会する (失敗した日付を再照会して成功したら取り除く)。
+        """
+        if self.cursor is None or date_str < self.cursor:
+            self.cursor = date_str
+        if success:
+            if date_str in self.failed_dates:
+                self.failed_dates.remove(date_str)
+        elif date_str not in self.failed_dates:
+            self.failed_dates.append(date_str)
+
+
+def checkpoint_path(edinet_code: str, directory: Path = CHECKPOINT_DIR) -> Path:
+    return directory / f"{edinet_code}.json"
+
+
+def load_checkpoint(edinet_code: str, directory: Path = CHECKPOINT_DIR) -> Optional[ScanCheckpoint]:
+    """
+    チェックポイントを読み込む
+
+    Returns:
+        チェックポイント (存在しない・壊れている場合は None)
+    """
+    path = checkpoint_path(edinet_code, directory)
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return ScanCheckpoint(**json.load(f))
+    except (json.JSONDecodeError, TypeError):
+        return None
+
+
+def save_checkpoint(checkpoint: ScanCheckpoint, directory: Path = CHECKPOINT_DIR) -> None:
+    """チェックポイントをアトミックに保存"""
+    checkpoint.updated_at = datetime.now().isoformat(timespec="seconds")
+    atomic_write_json(checkpoint_path(checkpoint.edinet_code, directory), asdict(checkpoint))
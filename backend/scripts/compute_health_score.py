@@ -0,0 +1,314 @@
+"""
+財務健全性スコア (100点満点) を全企業・全期間について計算
+流動性・収益性・安定性・キャッシュフローの4サブスコアを配列演算で一括算出する
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from compute_metrics import (
+    LOOKBACK_QUARTERS,
+    RATIO_DEFINITIONS,
+    compute_metric_arrays,
+    metric_names,
+)
+from logger import get_data_logger
+from panel import (
+    CACHE_DIR,
+    DATA_DIR,
+    FINANCIALS_DIR,
+    NUMERIC_FIELDS,
+    dirty_ordinals,
+    dirty_window,
+    from_grid,
+    load_incremental_state,
+    merge_period_records,
+    ordinal_to_period,
+    row_hashes,
+    save_incremental_state,
+    to_grid,
+)
+from standalone_quarters import FLOW_BASIS_ATTR, load_standalone_panel, standalone_panel
+
+# Logger
+logger = get_data_logger()
+
+# Paths
+HEALTH_SCORE_CONFIG_PATH = DATA_DIR / "health_score_config.json"
+HEALTH_SCORES_PATH = DATA_DIR / "health_scores.json"
+HEALTH_SCORE_STATE_PATH = CACHE_DIR / "health_score_state.json"
+HEALTH_SCORE_SCHEMA_VERSION = "1.0.0"
+
+# Bump when the scoring formula changes (config changes are detected by hash)
+HEALTH_SCORE_ENGINE_VERSION = "1"
+
+CATEGORIES = ("liquidity", "profitability", "stability", "cash_flow")
+
+
+class HealthScoreConfigError(ValueError):
+    """Invalid health score configuration"""
+
+    pass
+
+
+def load_score_config(path: Path = HEALTH_SCORE_CONFIG_PATH) -> Dict[str, Any]:
+    """
+    スコア設定 (配点・評価基準) を読み込んで検証
+
+    Raises:
+        HealthScoreConfigError: 設定が不正な場合 (未知のカテゴリ・指標名を含む)
+    """
+    if not path.exists():
+        raise HealthScoreConfigError(f"Health score config not found: {path}")
+
+    with open(path, "r", encoding="utf-8") as f:
+        config: Dict[str, Any] = json.load(f)
+
+    weights = config.get("weights", {})
+    indicators = config.get("indicators", {})
+    unknown_categories = sorted(set(indicators) - set(CATEGORIES))
+    if unknown_categories:
+        raise HealthScoreConfigError(f"Unknown categories: {', '.join(unknown_categories)}")
+
+    # A misspelt metric would otherwise be skipped and silently drop its category
+    known = set(NUMERIC_FIELDS) | set(RATIO_DEFINITIONS) | set(metric_names())
+    for category in CATEGORIES:
+        if category not in weights:
+            raise HealthScoreConfigError(f"Missing weight for category '{category}'")
+        for indicator in indicators.get(category, []):
+            if not {"metric", "low", "high"} <= set(indicator):
+                raise HealthScoreConfigError(
+                    f"Indicator in '{category}' needs metric, low and high: {indicator}"
+                )
+            if indicator["metric"] not in known:
+                raise HealthScoreConfigError(
+                    f"Unknown metric '{indicator['metric']}' in '{category}'"
+                )
+            if indicator["low"] == indicator["high"]:
+                raise HealthScoreConfigError(f"Indicator '{indicator['metric']}' has low == high")
+
+    if sum(weights[c] for c in CATEGORIES) <= 0:
+        raise HealthScoreConfigError("Sum of category weights must be positive")
+
+    return config
+
+
+def _config_version(config: Dict[str, Any]) -> str:
+    """設定内容のハッシュを含むエンジンバージョン"""
+    scoring = {"weights": config["weights"], "indicators": config["indicators"]}
+    digest = hashlib.sha256(json.dumps(scoring, sort_keys=True).encode("utf-8")).hexdigest()
+    return f"{HEALTH_SCORE_ENGINE_VERSION}:{digest[:16]}"
+
+
+def score_arrays(metrics: Dict[str, np.ndarray], config: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """
+    指標配列からサブスコアと総合スコアを計算
+
+    各指標は low で0、high で1の線形補間 (範囲外はクリップ) で評価し、
+    カテゴリ内の平均に配点を掛けたものをサブスコアとする。
+    欠損カテゴリは除外し、残りの配点で100点満点に換算する。
+
+    Args:
+        metrics: 指標名 -> (企業 × 四半期) の配列
+        config: load_score_config の結果
+
+    Returns:
+        "total" と各カテゴリ名 -> (企業 × 四半期) の配列
+    """
+    weights = config["weights"]
+    shape = next(iter(metrics.values())).shape
+    scores: Dict[str, np.ndarray] = {}
+
+    for category in CATEGORIES:
+        indicator_scores = []
+        for indicator in config["indicators"].get(category, []):
+            values = metrics.get(indicator["metric"])
+            if values is None:
+                continue
+            low, high = float(indicator["low"]), float(indicator["high"])
+            indicator_scores.append(np.clip((values - low) / (high - low), 0.0, 1.0))
+
+        if indicator_scores:
+            stacked = np.stack(indicator_scores)
+            available = (~np.isnan(stacked)).sum(axis=0)
+            mean = np.where(
+                available > 0, np.nansum(stacked, axis=0) / np.maximum(available, 1), np.nan
+            )
+        else:
+            mean = np.full(shape, np.nan)
+        scores[category] = mean * weights[category]
+
+    sub = np.stack([scores[c] for c in CATEGORIES])
+    weight = np.array([weights[c] for c in CATEGORIES], dtype=float)[:, None, None]
+    available_weight = np.where(np.isnan(sub), 0.0, weight).sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores["total"] = np.where(
+            available_weight > 0, np.nansum(sub, axis=0) / available_weight * 100.0, np.nan
+        )
+    return scores
+
+
+def compute_scores_frame(panel: pd.DataFrame, config: Dict[str, Any]) -> pd.DataFrame:
+    """
+    パネル全体の健全性スコアを計算 (未変換のパネルはフロー項目を単独四半期に変換してから)
+
+    Returns:
+        company, period, ordinal, total と各サブスコア列を持つ DataFrame
+    """
+    panel = standalone_panel(panel)
+    companies, ordinals, grid = to_grid(panel, NUMERIC_FIELDS)
+    if grid.size == 0:
+        return pd.DataFrame(columns=["company", "period", "ordinal"])
+
+    base = {field: grid[:, :, i] for i, field in enumerate(NUMERIC_FIELDS)}
+    metrics = {**base, **compute_metric_arrays(grid, NUMERIC_FIELDS)}
+    scores = score_arrays(metrics, config)
+
+    frame = from_grid(
+        companies, ordinals, {"total": scores["total"], **{c: scores[c] for c in CATEGORIES}}
+    )
+    return frame.merge(panel[["company", "ordinal"]], on=["company", "ordinal"], how="inner")
+
+
+def _load_existing_scores() -> Dict[str, Dict[str, Dict[str, Any]]]:
+    if not HEALTH_SCORES_PATH.exists():
+        return {}
+    with open(HEALTH_SCORES_PATH, "r", encoding="utf-8") as f:
+        companies: Dict[str, Dict[str, Dict[str, Any]]] = json.load(f).get("companies", {})
+        return companies
+
+
+def update_health_scores(
+    full: bool = False,
+    config_path: Path = HEALTH_SCORE_CONFIG_PATH,
+    directory: Path = FINANCIALS_DIR,
+) -> Dict[str, int]:
+    """
+    健全性スコアファイルを更新
+
+    入力行ハッシュと設定ハッシュを前回と比較し、変更された期間以降のみ再計算する。
+
+    Args:
+        full: True なら全企業・全期間を再計算
+        config_path: スコア設定ファイル
+        directory: 財務諸表CSVディレクトリ
+
+    Returns:
+        企業 -> 再計算した期間数
+    """
+    config = load_score_config(config_path)
+    engine_version = _config_version(config)
+
+    # Flow items as standalone quarters (filed values are fiscal year-to-date)
+    panel = load_standalone_panel(directory=directory)
+    current_state = row_hashes(panel)
+    previous_state = {} if full else load_incremental_state(HEALTH_SCORE_STATE_PATH, engine_version)
+    existing = _load_existing_scores() if previous_state else {}
+
+    if previous_state:
+        dirty = dirty_ordinals(panel, previous_state, current_state)
+    else:
+        dirty = {company: -1 for company in current_state}
+
+    if not dirty:
+        logger.info("Health scores are up to date (no changed periods)")
+        return {}
+
+    frame = compute_scores_frame(dirty_window(panel, dirty, LOOKBACK_QUARTERS), config)
+    companies, updated = merge_period_records(existing, frame, dirty, current_state, digits=1)
+
+    output = {
+        "schema_version": HEALTH_SCORE_SCHEMA_VERSION,
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "config_version": engine_version,
+        "weights": config["weights"],
+        "companies": companies,
+    }
+    with open(HEALTH_SCORES_PATH, "w", encoding="utf-8") as f:
+        json.dump(output, f, ensure_ascii=False, separators=(",", ":"))
+
+    save_incremental_state(HEALTH_SCORE_STATE_PATH, engine_version, current_state)
+
+    for company, count in updated.items():
+        logger.info(f"Health scores updated: {company} ({count} periods)")
+    return updated
+
+
+def run_benchmark(
+    companies: int, quarters: int, config: Dict[str, Any], seed: int = 0
+) -> Dict[str, float]:
+    """
+    合成パネル (companies 社 × quarters 四半期) で全期間・最新四半期のスコア計算時間を計測
+
+    Returns:
+        段階ごとの秒数
+    """
+    rng = np.random.default_rng(seed)
+    ordinals = np.arange(2000 * 4, 2000 * 4 + quarters)
+    panel = pd.DataFrame(
+        {
+            "company": np.repeat([f"C{i:04d}" for i in range(companies)], quarters),
+            "period": np.tile(ordinal_to_period(ordinals), companies),
+            "ordinal": np.tile(ordinals, companies),
+        }
+    )
+    values = rng.lognormal(mean=7.0, sigma=1.0, size=(len(panel), len(NUMERIC_FIELDS)))
+    values[rng.random(values.shape) < 0.05] = np.nan
+    panel[NUMERIC_FIELDS] = values
+    # Synthetic flow values are already standalone quarters
+    panel.attrs[FLOW_BASIS_ATTR] = "standalone"
+
+    timings: Dict[str, float] = {}
+    began = time.perf_counter()
+    compute_scores_frame(panel, config)
+    timings["full_s"] = time.perf_counter() - began
+
+    latest = {str(c): int(ordinals[-1]) for c in panel["company"].unique()}
+    began = time.perf_counter()
+    compute_scores_frame(dirty_window(panel, latest, LOOKBACK_QUARTERS), config)
+    timings["incremental_quarter_s"] = time.perf_counter() - began
+    timings["rows"] = float(len(panel))
+    return timings
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="Financial health score computation")
+    parser.add_argument("--full", action="store_true", help="全期間を再計算")
+    parser.add_argument(
+        "--config", type=Path, default=HEALTH_SCORE_CONFIG_PATH, help="スコア設定ファイル"
+    )
+    parser.add_argument(
+        "--benchmark",
+        type=int,
+        metavar="COMPANIES",
+        help="合成データ (COMPANIES 社) で計算時間を計測して終了",
+    )
+    parser.add_argument("--quarters", type=int, default=40, help="ベンチマークの四半期数")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.benchmark:
+            timings = run_benchmark(args.benchmark, args.quarters, load_score_config(args.config))
+            print(json.dumps({k: round(v, 4) for k, v in timings.items()}, indent=2))
+            return 0
+
+        update_health_scores(full=args.full, config_path=args.config)
+        return 0
+
+    except Exception as e:
+        logger.error(f"Fatal error: {str(e)}", exc_info=True)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
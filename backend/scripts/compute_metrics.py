@@ -0,0 +1,246 @@
+"""
+派生指標 (YoY / QoQ / TTM / 利益率 / 成長率) を全企業・全期間について事前計算
+結果は (company, period) で直接引ける JSON として出力し、フロントエンドでの探索を不要にする
+"""
+
+import argparse
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from logger import get_data_logger
+from panel import (
+    CACHE_DIR,
+    DATA_DIR,
+    FINANCIALS_DIR,
+    FLOW_FIELDS,
+    NUMERIC_FIELDS,
+    dirty_ordinals,
+    dirty_window,
+    from_grid,
+    load_incremental_state,
+    merge_period_records,
+    row_hashes,
+    save_incremental_state,
+    to_grid,
+)
+from standalone_quarters import load_standalone_panel, standalone_panel
+
+# Logger
+logger = get_data_logger()
+
+# Output
+METRICS_PATH = DATA_DIR / "metrics.json"
+METRICS_STATE_PATH = CACHE_DIR / "metrics_state.json"
+METRICS_SCHEMA_VERSION = "1.0.0"
+
+# Bump when metric definitions change (invalidates incremental state)
+METRICS_ENGINE_VERSION = "3"
+
+# Quarters of history a metric can depend on: TTM (4) + YoY of TTM (4) - 1
+LOOKBACK_QUARTERS = 7
+
+# Ratio metrics: name -> (numerator, denominator, scale)
+RATIO_DEFINITIONS: Dict[str, Tuple[str, str, float]] = {
+    "operating_margin": ("operating_income", "revenue", 100.0),
+    "ordinary_margin": ("ordinary_income", "revenue", 100.0),
+    "net_margin": ("net_income", "revenue", 100.0),
+    "operating_margin_ttm": ("operating_income_ttm", "revenue_ttm", 100.0),
+    "ordinary_margin_ttm": ("ordinary_income_ttm", "revenue_ttm", 100.0),
+    "net_margin_ttm": ("net_income_ttm", "revenue_ttm", 100.0),
+    "equity_ratio": ("net_assets", "total_assets", 100.0),
+    "current_assets_ratio": ("current_assets", "total_assets", 100.0),
+    "current_assets_to_liabilities": ("current_assets", "total_liabilities", 100.0),
+    "operating_cf_to_liabilities_ttm": ("operating_cf_ttm", "total_liabilities", 100.0),
+    "debt_to_equity": ("total_liabilities", "net_assets", 1.0),
+    "roe_ttm": ("net_income_ttm", "net_assets", 100.0),
+    "roa_ttm": ("net_income_ttm", "total_assets", 100.0),
+    "operating_cf_margin_ttm": ("operating_cf_ttm", "revenue_ttm", 100.0),
+    "free_cf_margin_ttm": ("free_cf_ttm", "revenue_ttm", 100.0),
+}
+
+
+def _lag(values: np.ndarray, periods: int) -> np.ndarray:
+    """四半期軸 (axis=1) を periods だけ遅らせる"""
+    lagged = np.full_like(values, np.nan)
+    if periods < values.shape[1]:
+        lagged[:, periods:] = values[:, :-periods]
+    return lagged
+
+
+def _change_percent(current: np.ndarray, previous: np.ndarray) -> np.ndarray:
+    """増減率 (%) - フロントエンドの calculateYoY と同じ定義、前期0は NaN"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(previous != 0, (current - previous) / previous * 100.0, np.nan)
+
+
+def _rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    """連続 window 四半期の合計 (1つでも欠損があれば NaN)"""
+    filled = np.nan_to_num(values, nan=0.0)
+    missing = np.isnan(values).astype(np.int64)
+
+    sums = np.cumsum(filled, axis=1)
+    counts = np.cumsum(missing, axis=1)
+    sums[:, window:] = sums[:, window:] - sums[:, :-window]
+    counts[:, window:] = counts[:, window:] - counts[:, :-window]
+
+    result = np.where(counts == 0, sums, np.nan)
+    result[:, : window - 1] = np.nan
+    return result
+
+
+def compute_metric_arrays(grid: np.ndarray, fields: List[str]) -> Dict[str, np.ndarray]:
+    """
+    (企業 × 連続四半期 × 項目) の配列から派生指標を一括計算
+
+    Args:
+        grid: to_grid で作成した配列
+        fields: grid の項目名
+
+    Returns:
+        指標名 -> (企業 × 四半期) の配列
+    """
+    base = {field: grid[:, :, i] for i, field in enumerate(fields)}
+    metrics: Dict[str, np.ndarray] = {}
+
+    for field, values in base.items():
+        metrics[f"{field}_qoq"] = _change_percent(values, _lag(values, 1))
+        metrics[f"{field}_yoy"] = _change_percent(values, _lag(values, 4))
+
+    # Trailing twelve months for flow items
+    for field in FLOW_FIELDS:
+        if field not in base:
+            continue
+        ttm = _rolling_sum(base[field], 4)
+        metrics[f"{field}_ttm"] = ttm
+        metrics[f"{field}_ttm_yoy"] = _change_percent(ttm, _lag(ttm, 4))
+
+    # Free cash flow
+    if "operating_cf" in base and "investing_cf" in base:
+        metrics["free_cf"] = base["operating_cf"] + base["investing_cf"]
+        metrics["free_cf_ttm"] = _rolling_sum(metrics["free_cf"], 4)
+
+    lookup = {**base, **metrics}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for name, (numerator, denominator, scale) in RATIO_DEFINITIONS.items():
+            if numerator not in lookup or denominator not in lookup:
+                continue
+            den = lookup[denominator]
+            metrics[name] = np.where(den != 0, lookup[numerator] / den * scale, np.nan)
+
+    return metrics
+
+
+def metric_names(fields: List[str] = NUMERIC_FIELDS) -> List[str]:
+    """
+    compute_metric_arrays が返す指標名 (設定ファイルの指標名の検証用)
+
+    Returns:
+        指標名のリスト (項目名そのものは含まない)
+    """
+    return sorted(compute_metric_arrays(np.full((1, 1, len(fields)), np.nan), fields))
+
+
+def compute_metrics_frame(panel: pd.DataFrame) -> pd.DataFrame:
+    """
+    パネル全体の派生指標を計算
+
+    Args:
+        panel: load_standalone_panel の結果 (部分集合でも可)。未変換のパネルは
+            フロー項目を単独四半期に変換してから計算する
+
+    Returns:
+        company, period, ordinal と各指標列を持つ DataFrame (元データが存在する行のみ)
+    """
+    panel = standalone_panel(panel)
+    companies, ordinals, grid = to_grid(panel, NUMERIC_FIELDS)
+    if grid.size == 0:
+        return pd.DataFrame(columns=["company", "period", "ordinal"])
+
+    metrics = compute_metric_arrays(grid, NUMERIC_FIELDS)
+    frame = from_grid(companies, ordinals, metrics)
+
+    # Drop gap-filling rows that have no source data
+    present = panel[["company", "ordinal"]]
+    return frame.merge(present, on=["company", "ordinal"], how="inner")
+
+
+def _load_existing_metrics() -> Dict[str, Dict[str, Dict[str, Any]]]:
+    if not METRICS_PATH.exists():
+        return {}
+    with open(METRICS_PATH, "r", encoding="utf-8") as f:
+        companies: Dict[str, Dict[str, Dict[str, Any]]] = json.load(f).get("companies", {})
+        return companies
+
+
+def update_metrics(full: bool = False, directory: Path = FINANCIALS_DIR) -> Dict[str, int]:
+    """
+    派生指標ファイルを更新
+
+    前回実行時の入力ハッシュと比較し、変更のあった企業の変更期間以降のみ再計算する。
+
+    Args:
+        full: True なら全企業・全期間を再計算
+        directory: 財務諸表CSVディレクトリ
+
+    Returns:
+        企業 -> 再計算した期間数
+    """
+    # Flow items as standalone quarters (filed values are fiscal year-to-date)
+    panel = load_standalone_panel(directory=directory)
+    current_state = row_hashes(panel)
+    previous_state = (
+        {} if full else load_incremental_state(METRICS_STATE_PATH, METRICS_ENGINE_VERSION)
+    )
+    existing = _load_existing_metrics() if previous_state else {}
+
+    if previous_state:
+        dirty = dirty_ordinals(panel, previous_state, current_state)
+    else:
+        dirty = {company: -1 for company in current_state}
+
+    if not dirty:
+        logger.info("Metrics are up to date (no changed periods)")
+        return {}
+
+    # Only the dirty issuers, plus the lookback window their metrics depend on
+    frame = compute_metrics_frame(dirty_window(panel, dirty, LOOKBACK_QUARTERS))
+    companies, updated = merge_period_records(existing, frame, dirty, current_state)
+
+    output = {
+        "schema_version": METRICS_SCHEMA_VERSION,
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "companies": companies,
+    }
+    with open(METRICS_PATH, "w", encoding="utf-8") as f:
+        json.dump(output, f, ensure_ascii=False, separators=(",", ":"))
+
+    save_incremental_state(METRICS_STATE_PATH, METRICS_ENGINE_VERSION, current_state)
+
+    for company, count in updated.items():
+        logger.info(f"Metrics updated: {company} ({count} periods)")
+    return updated
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="Derived metrics computation")
+    parser.add_argument("--full", action="store_true", help="全期間を再計算")
+    args = parser.parse_args(argv)
+
+    try:
+        update_metrics(full=args.full)
+        return 0
+
+    except Exception as e:
+        logger.error(f"Fatal error: {str(e)}", exc_info=True)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
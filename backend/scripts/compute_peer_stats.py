@@ -0,0 +1,393 @@
+"""
+同業他社比較 (クロスセクション統計) を全期間・全指標について計算
+期間ごとに全登録企業の分布 (中央値・四分位・平均・標準偏差) と、
+各企業のパーセンタイル順位・zスコアを (企業 × 期間 × 指標) の配列演算で一括算出する
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from compute_metrics import LOOKBACK_QUARTERS, compute_metric_arrays
+from logger import get_data_logger
+from panel import (
+    CACHE_DIR,
+    DATA_DIR,
+    FINANCIALS_DIR,
+    NUMERIC_FIELDS,
+    dirty_ordinals,
+    load_incremental_state,
+    ordinal_to_period,
+    period_to_ordinal,
+    row_hashes,
+    save_incremental_state,
+    to_grid,
+)
+from standalone_quarters import FLOW_BASIS_ATTR, load_standalone_panel, standalone_panel
+
+# Logger
+logger = get_data_logger()
+
+# Output
+PEER_STATS_PATH = DATA_DIR / "peer_stats.json"
+PEER_STATS_STATE_PATH = CACHE_DIR / "peer_stats_state.json"
+PEER_STATS_SCHEMA_VERSION = "1.0.0"
+
+# Bump when the statistics change (invalidates incremental state)
+PEER_STATS_ENGINE_VERSION = "2"
+
+# Per (period, metric) distribution summary, in output order
+STAT_FIELDS = ["n", "q1", "median", "q3", "mean", "std"]
+QUANTILES = (0.25, 0.5, 0.75)
+
+# A distribution needs at least this many issuers to be published
+MIN_PEERS = 2
+
+
+def metric_cube(panel: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, List[str], np.ndarray]:
+    """
+    パネルを (企業 × 連続四半期 × 指標) の配列に展開
+
+    指標は財務項目そのものと compute_metric_arrays の派生指標 (metrics.json と同じ定義)。
+    未変換のパネルはフロー項目を単独四半期に変換してから計算する。
+
+    Returns:
+        (companies, ordinals, 指標名, cube)
+    """
+    panel = standalone_panel(panel)
+    companies, ordinals, grid = to_grid(panel, NUMERIC_FIELDS)
+    if grid.size == 0:
+        return companies, ordinals, [], np.empty((0, 0, 0))
+
+    base = {field: grid[:, :, i] for i, field in enumerate(NUMERIC_FIELDS)}
+    metrics = {**base, **compute_metric_arrays(grid, NUMERIC_FIELDS)}
+    names = list(metrics)
+    return companies, ordinals, names, np.stack([metrics[n] for n in names], axis=2)
+
+
+def peer_metric_names() -> List[str]:
+    """比較対象の指標名 (metric_cube の指標軸の順序)"""
+    grid = np.full((1, 1, len(NUMERIC_FIELDS)), np.nan)
+    return NUMERIC_FIELDS + list(compute_metric_arrays(grid, NUMERIC_FIELDS))
+
+
+def _quantile(ordered: np.ndarray, counts: np.ndarray, q: float) -> np.ndarray:
+    """昇順 (NaN は末尾) に並べた axis=0 の線形補間分位点 (np.nanquantile と同じ定義)"""
+    position = np.maximum(counts - 1, 0) * q
+    lower = np.floor(position).astype(np.int64)
+    upper = np.ceil(position).astype(np.int64)
+    low = np.take_along_axis(ordered, lower[None], axis=0)[0]
+    high = np.take_along_axis(ordered, upper[None], axis=0)[0]
+    return np.where(counts > 0, low + (high - low) * (position - lower), np.nan)
+
+
+def peer_arrays(cube: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    企業軸 (axis=0) のクロスセクション統計を一括計算
+
+    パーセンタイル順位は (自分より小さい企業数 + 同値の企業数 / 2) / 企業数 × 100、
+    zスコアは母標準偏差で標準化した値。欠損は集計から除外する。
+
+    Args:
+        cube: (企業 × 期間 × 指標) の配列
+
+    Returns:
+        STAT_FIELDS の各名前 -> (期間 × 指標) の配列、
+        "percentile" / "z" -> (企業 × 期間 × 指標) の配列
+    """
+    n_companies, n_periods, n_metrics = cube.shape
+    valid = ~np.isnan(cube)
+    counts = valid.sum(axis=0)
+    ordered = np.sort(cube, axis=0)
+
+    stats: Dict[str, np.ndarray] = {"n": counts.astype(float)}
+    for name, q in zip(("q1", "median", "q3"), QUANTILES):
+        stats[name] = _quantile(ordered, counts, q)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(valid, cube, 0.0).sum(axis=0) / counts
+        deviation = np.where(valid, cube - mean, 0.0)
+        std = np.sqrt((deviation**2).sum(axis=0) / counts)
+        stats["mean"], stats["std"] = mean, std
+
+        published = counts >= MIN_PEERS
+        stats["z"] = np.where(published & (std > 0), (cube - mean) / std, np.nan)
+
+    # Average rank along the issuer axis (ties share the mean rank, NaN stays NaN)
+    ranks = pd.DataFrame(cube.reshape(n_companies, -1)).rank(axis=0, method="average")
+    rank = ranks.to_numpy().reshape(cube.shape)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        stats["percentile"] = np.where(published, (rank - 0.5) / counts * 100.0, np.nan)
+    return stats
+
+
+def _rounded(values: np.ndarray, digits: int) -> List[Optional[float]]:
+    rounded = values.round(digits).astype(object)
+    rounded[np.isnan(values)] = None
+    return rounded.tolist()  # type: ignore[no-any-return]
+
+
+def build_period_entries(
+    companies: np.ndarray,
+    ordinals: np.ndarray,
+    names: List[str],
+    cube: np.ndarray,
+    stats: Dict[str, np.ndarray],
+    digits: int = 2,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    期間ごとのダッシュボード向け出力を作成
+
+    各期間はその期間にデータがある企業のみを companies に並べ、
+    percentile / z は companies と同じ順序の配列として持つ。
+    企業数が MIN_PEERS 未満の指標は省略する。
+
+    Returns:
+        期間 -> {"companies", "stats", "percentile", "z"}
+    """
+    entries: Dict[str, Dict[str, Any]] = {}
+    has_data = ~np.isnan(cube).all(axis=2)
+    counts = stats["n"]
+    summary = np.stack([stats[name] for name in STAT_FIELDS], axis=2).round(digits)
+
+    for t, period in enumerate(ordinal_to_period(ordinals)):
+        rows = np.flatnonzero(has_data[:, t])
+        metrics = [m for m in range(len(names)) if counts[t, m] >= MIN_PEERS]
+        if len(rows) < MIN_PEERS or not metrics:
+            continue
+        entries[period] = {
+            "companies": companies[rows].tolist(),
+            "stats": {names[m]: _rounded(summary[t, m], digits) for m in metrics},
+            "percentile": {names[m]: _rounded(stats["percentile"][rows, t, m], 1) for m in metrics},
+            "z": {names[m]: _rounded(stats["z"][rows, t, m], digits) for m in metrics},
+        }
+    return entries
+
+
+def compute_peer_entries(
+    panel: pd.DataFrame, periods: Optional[Set[int]] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    指定期間 (四半期番号、None で全期間) のクロスセクション統計を計算
+
+    派生指標は全期間で計算し (TTM の累積和の起点を全件計算と揃えるため)、
+    分布の集計と出力は指定期間の列だけに絞る。
+    """
+    if periods is not None and not periods:
+        return {}
+
+    companies, ordinals, names, cube = metric_cube(panel)
+    if cube.size == 0:
+        return {}
+    if periods is not None:
+        columns = np.isin(ordinals, sorted(periods))
+        ordinals, cube = ordinals[columns], cube[:, columns, :]
+
+    return build_period_entries(companies, ordinals, names, cube, peer_arrays(cube))
+
+
+def affected_ordinals(
+    dirty: Dict[str, int],
+    previous_state: Dict[str, Dict[str, str]],
+    current_state: Dict[str, Dict[str, str]],
+) -> Set[int]:
+    """
+    分布が変わりうる四半期番号
+
+    企業の変更期間それぞれから LOOKBACK_QUARTERS 先までは派生指標が変わるため、その期間の
+    分布を全企業分再計算する (最初の変更期間だけでなく、新規企業のすべての期間や離れた複数の
+    変更期間も含める)。全期間が対象 (-1) の企業は前回・今回のすべての期間を含める。
+    """
+    affected: Set[int] = set()
+    for company, first_dirty in dirty.items():
+        before = previous_state.get(company, {})
+        after = current_state.get(company, {})
+        if first_dirty < 0:
+            labels = set(before) | set(after)
+            affected.update(int(o) for o in period_to_ordinal(pd.Series(sorted(labels))))
+            continue
+        changed = sorted(p for p in after if before.get(p) != after[p])
+        for ordinal in period_to_ordinal(pd.Series(changed, dtype=str)):
+            affected.update(range(int(ordinal), int(ordinal) + LOOKBACK_QUARTERS + 1))
+    return affected
+
+
+def _load_existing_periods() -> Dict[str, Dict[str, Any]]:
+    if not PEER_STATS_PATH.exists():
+        return {}
+    with open(PEER_STATS_PATH, "r", encoding="utf-8") as f:
+        periods: Dict[str, Dict[str, Any]] = json.load(f).get("periods", {})
+        return periods
+
+
+def update_peer_stats(full: bool = False, directory: Path = FINANCIALS_DIR) -> int:
+    """
+    同業他社比較ファイルを更新
+
+    入力行ハッシュを前回と比較し、分布が変わりうる期間のみ全企業分を再計算する。
+
+    Args:
+        full: True なら全期間を再計算
+        directory: 財務諸表CSVディレクトリ
+
+    Returns:
+        再計算した期間数
+    """
+    # Flow items as standalone quarters (filed values are fiscal year-to-date)
+    panel = load_standalone_panel(directory=directory)
+    current_state = row_hashes(panel)
+    previous_state = (
+        {} if full else load_incremental_state(PEER_STATS_STATE_PATH, PEER_STATS_ENGINE_VERSION)
+    )
+    existing = _load_existing_periods() if previous_state else {}
+
+    if previous_state:
+        dirty = dirty_ordinals(panel, previous_state, current_state)
+        if not dirty:
+            logger.info("Peer statistics are up to date (no changed periods)")
+            return 0
+        affected: Optional[Set[int]] = affected_ordinals(dirty, previous_state, current_state)
+    else:
+        affected = None
+
+    entries = compute_peer_entries(panel, affected)
+    if affected is None:
+        periods = entries
+    else:
+        stale = set(ordinal_to_period(np.array(sorted(affected))))
+        periods = {p: e for p, e in existing.items() if p not in stale}
+        periods.update(entries)
+
+    output = {
+        "schema_version": PEER_STATS_SCHEMA_VERSION,
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "universe": sorted(current_state),
+        "metrics": peer_metric_names(),
+        "stat_fields": STAT_FIELDS,
+        "periods": dict(sorted(periods.items())),
+    }
+    with open(PEER_STATS_PATH, "w", encoding="utf-8") as f:
+        json.dump(output, f, ensure_ascii=False, separators=(",", ":"))
+
+    save_incremental_state(PEER_STATS_STATE_PATH, PEER_STATS_ENGINE_VERSION, current_state)
+
+    logger.info(
+        f"Peer statistics updated: {len(entries)} periods across {len(current_state)} issuers"
+    )
+    return len(entries)
+
+
+def load_peer_stats(path: Path = PEER_STATS_PATH) -> Dict[str, Any]:
+    """peer_stats.json を読み込む (無ければ空)"""
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        data: Dict[str, Any] = json.load(f)
+        return data
+
+
+def company_peer_records(peer_stats: Dict[str, Any], company: str) -> Dict[str, Dict[str, Any]]:
+    """
+    1企業分の同業比較を companies[企業][期間] と同じ形式で取り出す (バンドル用)
+
+    Args:
+        peer_stats: load_peer_stats の結果
+        company: 企業コード
+
+    Returns:
+        期間 -> {"<指標>_pct": パーセンタイル, "<指標>_z": zスコア, "<指標>_median": 中央値}
+    """
+    median_index = peer_stats.get("stat_fields", STAT_FIELDS).index("median")
+    records: Dict[str, Dict[str, Any]] = {}
+    for period, entry in peer_stats.get("periods", {}).items():
+        if company not in entry["companies"]:
+            continue
+        row = entry["companies"].index(company)
+        values: Dict[str, Any] = {}
+        for metric, summary in entry["stats"].items():
+            values[f"{metric}_median"] = summary[median_index]
+            values[f"{metric}_pct"] = entry["percentile"][metric][row]
+            values[f"{metric}_z"] = entry["z"][metric][row]
+        records[period] = {k: v for k, v in values.items() if v is not None}
+    return records
+
+
+def run_benchmark(companies: int, quarters: int, seed: int = 0) -> Dict[str, float]:
+    """
+    合成パネル (companies 社 × quarters 四半期) で全期間の計算時間を計測
+
+    Returns:
+        段階ごとの秒数
+    """
+    rng = np.random.default_rng(seed)
+    ordinals = np.arange(2000 * 4, 2000 * 4 + quarters)
+    panel = pd.DataFrame(
+        {
+            "company": np.repeat([f"C{i:04d}" for i in range(companies)], quarters),
+            "period": np.tile(ordinal_to_period(ordinals), companies),
+            "ordinal": np.tile(ordinals, companies),
+        }
+    )
+    values = rng.lognormal(mean=7.0, sigma=1.0, size=(len(panel), len(NUMERIC_FIELDS)))
+    values[rng.random(values.shape) < 0.05] = np.nan
+    panel[NUMERIC_FIELDS] = values
+    # Synthetic flow values are already standalone quarters
+    panel.attrs[FLOW_BASIS_ATTR] = "standalone"
+
+    timings: Dict[str, float] = {}
+    began = time.perf_counter()
+    _, cube_ordinals, names, cube = metric_cube(panel)
+    timings["metrics_s"] = time.perf_counter() - began
+
+    began = time.perf_counter()
+    stats = peer_arrays(cube)
+    timings["peer_stats_s"] = time.perf_counter() - began
+
+    began = time.perf_counter()
+    build_period_entries(np.array(sorted(set(panel["company"]))), cube_ordinals, names, cube, stats)
+    timings["encode_s"] = time.perf_counter() - began
+
+    latest = {int(ordinals[-1])}
+    began = time.perf_counter()
+    compute_peer_entries(panel, latest)
+    timings["incremental_quarter_s"] = time.perf_counter() - began
+    timings["cells"] = float(cube.size)
+    return timings
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="Cross-sectional peer statistics")
+    parser.add_argument("--full", action="store_true", help="全期間を再計算")
+    parser.add_argument(
+        "--benchmark",
+        type=int,
+        metavar="COMPANIES",
+        help="合成データ (COMPANIES 社) で計算時間を計測して終了",
+    )
+    parser.add_argument("--quarters", type=int, default=40, help="ベンチマークの四半期数")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.benchmark:
+            timings = run_benchmark(args.benchmark, args.quarters)
+            print(json.dumps({k: round(v, 4) for k, v in timings.items()}, indent=2))
+            return 0
+
+        update_peer_stats(full=args.full)
+        return 0
+
+    except Exception as e:
+        logger.error(f"Fatal error: {str(e)}", exc_info=True)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
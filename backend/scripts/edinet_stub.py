@@ -0,0 +1,603 @@
+"""
+EDINET API v2 のローカルスタブサーバ
+書類一覧API (documents.json) と書類取得API (documents/{docID}) を、フィクスチャまたは
+実行中に追加した書類で応答する。EDINET_API_BASE をこのサーバに向けて取得・監視処理を試験する
+
+記録モードでは実APIへの中継時に応答 (ステータス・ヘッダ・本文) をカセットに保存し、
+再生モードではカセットから同じ応答を返す。遅延・帯域・429/5xx の注入とレート制限を
+組み合わせて、取得処理の並列度やリトライを再現性のある条件で計測できる
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import requests
+
+from checkpoint import atomic_write_json
+from logger import get_edinet_logger
+
+# Logger
+logger = get_edinet_logger()
+
+# Server defaults
+STUB_HOST = "127.0.0.1"
+STUB_PORT = 8780
+
+# Fixture layout: documents.json ({"YYYY-MM-DD": [metadata, ...]}) and <docID>.zip archives
+FIXTURE_DOCUMENTS_FILE = "documents.json"
+
+# Cassette layout: cassette.json (request key -> response) and bodies/<sha256>.bin
+CASSETTE_INDEX_FILE = "cassette.json"
+CASSETTE_BODIES_DIR = "bodies"
+CASSETTE_VERSION = 1
+UPSTREAM_API_BASE = "https://api.edinet-fsa.go.jp/api/v2"
+API_PATH_PREFIX = "/api/v2"
+
+# Response headers kept in cassettes (the subscription key is never recorded)
+RECORDED_HEADERS = ("Content-Type", "Content-Disposition", "ETag", "Last-Modified")
+
+# Injected server errors are drawn from these statuses
+INJECTED_ERROR_STATUSES = (500, 502, 503)
+
+# Bandwidth throttling writes the body in slices of this many seconds
+BANDWIDTH_SLICE_SECONDS = 0.05
+
+
+def cassette_key(path: str, params: Dict[str, str]) -> str:
+    """
+    カセットの検索キー (API基点からのパスと、認証キーを除いたクエリ)
+
+    Args:
+        path: リクエストパス (/api/v2/documents.json など)
+        params: クエリパラメータ
+
+    Returns:
+        "GET /documents.json?date=2024-06-27&type=2" 形式のキー
+    """
+    if path.startswith(API_PATH_PREFIX):
+        path = path[len(API_PATH_PREFIX) :]
+    query = urlencode(sorted((k, v) for k, v in params.items() if k != "Subscription-Key"))
+    return f"GET {path}?{query}" if query else f"GET {path}"
+
+
+@dataclass
+class RecordedResponse:
+    """カセットに記録した応答"""
+
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+
+
+class CassetteStore:
+    """
+    記録した応答の保存先
+
+    本文は内容のハッシュで bodies/ に保存し (同じZIPは1つだけ)、cassette.json に
+    リクエストキーごとのステータス・ヘッダ・本文ハッシュを記録する
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+        index_path = directory / CASSETTE_INDEX_FILE
+        if index_path.exists():
+            with open(index_path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("interactions", {})
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: str) -> Optional[RecordedResponse]:
+        """記録した応答 (未記録なら None)"""
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None:
+            return None
+        body = b""
+        if entry.get("body"):
+            body = (self.directory / CASSETTE_BODIES_DIR / f"{entry['body']}.bin").read_bytes()
+        return RecordedResponse(entry["status"], dict(entry["headers"]), body)
+
+    def put(self, key: str, response: RecordedResponse) -> None:
+        """応答を記録 (同じキーは上書き)"""
+        digest = hashlib.sha256(response.body).hexdigest() if response.body else None
+        if digest is not None:
+            body_path = self.directory / CASSETTE_BODIES_DIR / f"{digest}.bin"
+            if not body_path.exists():
+                body_path.parent.mkdir(parents=True, exist_ok=True)
+                part_path = body_path.with_name(body_path.name + ".part")
+                part_path.write_bytes(response.body)
+                part_path.replace(body_path)
+
+        with self.lock:
+            self.entries[key] = {
+                "status": response.status,
+                "headers": response.headers,
+                "body": digest,
+                "bytes": len(response.body),
+                "recorded_at": datetime.now().isoformat(timespec="seconds"),
+            }
+            atomic_write_json(
+                self.directory / CASSETTE_INDEX_FILE,
+                {"version": CASSETTE_VERSION, "interactions": self.entries},
+            )
+
+
+class TokenBucket:
+    """毎秒 rate 件・最大 burst 件のトークンバケット (EDINET 側のレート制限を模擬)"""
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        1件分のトークンを取得
+
+        Returns:
+            0.0 (許可) または次のトークンまでの秒数 (拒否)
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return 0.0
+            return (1.0 - self.tokens) / self.rate
+
+
+@dataclass
+class StubFaults:
+    """
+    応答に加える遅延・帯域制限・エラー注入・レート制限の設定
+
+    乱数は seed で初期化するため、同じリクエスト順なら同じ応答列になる
+    """
+
+    latency: float = 0.0  # seconds before the response starts
+    jitter: float = 0.0  # extra uniform [0, jitter) seconds
+    bandwidth: int = 0  # bytes per second for response bodies (0 = unlimited)
+    error_rate: float = 0.0  # probability of an injected 500/502/503
+    throttle_rate: float = 0.0  # probability of an injected 429
+    rate_limit: float = 0.0  # requests per second enforced with 429 (0 = off)
+    burst: int = 1
+    retry_after: int = 1  # Retry-After seconds on injected 429
+    seed: int = 0
+
+    def __post_init__(self) -> None:
+        self.random = random.Random(self.seed)
+        self.lock = threading.Lock()
+        self.bucket = TokenBucket(self.rate_limit, self.burst) if self.rate_limit > 0 else None
+
+    def draw(self) -> Tuple[float, Optional[int]]:
+        """
+        1リクエスト分の遅延と注入するステータスを決める
+
+        Returns:
+            (遅延秒数, 注入するステータス または None)
+        """
+        with self.lock:
+            delay = self.latency + (self.random.random() * self.jitter if self.jitter else 0.0)
+            roll = self.random.random()
+            status: Optional[int] = None
+            if roll < self.throttle_rate:
+                status = 429
+            elif roll < self.throttle_rate + self.error_rate:
+                status = self.random.choice(INJECTED_ERROR_STATUSES)
+        return delay, status
+
+
+@dataclass
+class StubState:
+    """スタブが応答する書類と、受け付けたリクエストの記録"""
+
+    filings: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+    archives: Dict[str, bytes] = field(default_factory=dict)
+    requests: Dict[str, int] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def add_filing(self, date: str, doc: Dict[str, Any], archive: Optional[bytes] = None) -> None:
+        """
+        書類を追加 (次の書類一覧APIの応答から見える)
+
+        Args:
+            date: 提出日 (YYYY-MM-DD)
+            doc: 書類一覧APIの書類メタデータ (docID 必須)
+            archive: 書類取得APIで返すZIPの内容
+        """
+        with self.lock:
+            self.filings.setdefault(date, []).append(doc)
+            if archive is not None:
+                self.archives[doc["docID"]] = archive
+
+    def documents(self, date: str) -> List[Dict[str, Any]]:
+        with self.lock:
+            return list(self.filings.get(date, []))
+
+    def archive(self, doc_id: str) -> Optional[bytes]:
+        with self.lock:
+            return self.archives.get(doc_id)
+
+    def count_request(self, kind: str) -> None:
+        with self.lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+
+
+def load_fixtures(directory: Path) -> StubState:
+    """
+    フィクスチャディレクトリからスタブの状態を作成
+
+    Args:
+        directory: documents.json と <docID>.zip を置いたディレクトリ
+
+    Returns:
+        スタブの状態
+    """
+    state = StubState()
+    documents_path = directory / FIXTURE_DOCUMENTS_FILE
+    if documents_path.exists():
+        with open(documents_path, "r", encoding="utf-8") as f:
+            filings: Dict[str, List[Dict[str, Any]]] = json.load(f)
+        for date, docs in filings.items():
+            for doc in docs:
+                archive_path = directory / f"{doc['docID']}.zip"
+                archive = archive_path.read_bytes() if archive_path.exists() else None
+                state.add_filing(date, doc, archive)
+    return state
+
+
+def documents_response(date: str, doc_type: int, docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """書類一覧APIの応答 (type=1 はメタデータのみ、type=2 は書類一覧を含む)"""
+    payload: Dict[str, Any] = {
+        "metadata": {
+            "title": "提出された書類を把握するためのAPI",
+            "parameter": {"date": date, "type": str(doc_type)},
+            "resultset": {"count": len(docs)},
+            "processDateTime": datetime.now().strftime("%Y-%m-%d %H:%M"),
+            "status": "200",
+            "message": "OK",
+        }
+    }
+    if doc_type == 2:
+        payload["results"] = docs
+    return payload
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    """EDINET API v2 の GET ハンドラ"""
+
+    server: "StubServer"
+    protocol_version = "HTTP/1.1"
+    server_version = "EDINETStub/1.0"
+
+    def do_GET(self) -> None:  # noqa: N802 (BaseHTTPRequestHandler API)
+        url = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        path = url.path.rstrip("/")
+
+        api_key = self.headers.get("Subscription-Key") or params.get("Subscription-Key")
+        if not api_key:
+            self._send_json(401, {"StatusCode": 401, "message": "Access denied"})
+            return
+
+        if self._inject_faults():
+            return
+
+        key = cassette_key(path, params)
+        if self.server.upstream is not None:
+            self.server.state.count_request("recorded")
+            self._record(key, url.path, params, api_key)
+            return
+        if self.server.cassette is not None:
+            recorded = self.server.cassette.get(key)
+            if recorded is not None:
+                self.server.state.count_request("replayed")
+                self._replay(recorded)
+                return
+
+        if path.endswith("/documents.json"):
+            self.server.state.count_request("documents_list")
+            self._documents_list(params)
+        elif "/documents/" in path:
+            self.server.state.count_request("document")
+            self._document(path.rsplit("/", 1)[-1])
+        else:
+            self._send_json(404, {"StatusCode": 404, "message": "Not Found"})
+
+    def _inject_faults(self) -> bool:
+        """遅延を加え、レート超過または注入対象なら 429/5xx を返す (返したら True)"""
+        faults = self.server.faults
+        delay, status = faults.draw()
+        if delay > 0:
+            time.sleep(delay)
+
+        wait = faults.bucket.acquire() if faults.bucket is not None else 0.0
+        if wait > 0:
+            self.server.state.count_request("rate_limited")
+            self._send_json(
+                429,
+                {"StatusCode": 429, "message": "Too Many Requests"},
+                headers={"Retry-After": str(max(1, int(wait + 0.999)))},
+            )
+            return True
+        if status == 429:
+            self.server.state.count_request("injected_429")
+            self._send_json(
+                429,
+                {"StatusCode": 429, "message": "Too Many Requests"},
+                headers={"Retry-After": str(faults.retry_after)},
+            )
+            return True
+        if status is not None:
+            self.server.state.count_request("injected_5xx")
+            self._send_json(status, {"StatusCode": status, "message": "Injected error"})
+            return True
+        return False
+
+    def _record(self, key: str, path: str, params: Dict[str, str], api_key: str) -> None:
+        """実APIへ中継し、応答をカセットに記録してから返す"""
+        upstream_path = path[len(API_PATH_PREFIX) :] if path.startswith(API_PATH_PREFIX) else path
+        forwarded = {k: v for k, v in params.items() if k != "Subscription-Key"}
+        try:
+            response = requests.get(
+                f"{self.server.upstream}{upstream_path}",
+                params=forwarded,
+                headers={"Subscription-Key": api_key},
+                timeout=60,
+            )
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Upstream request failed for {key}: {str(e)}")
+            self._send_json(502, {"StatusCode": 502, "message": "Upstream error"})
+            return
+
+        recorded = RecordedResponse(
+            response.status_code,
+            {k: response.headers[k] for k in RECORDED_HEADERS if k in response.headers},
+            response.content,
+        )
+        # Transient failures are passed through but not recorded
+        transient = response.status_code == 429 or response.status_code >= 500
+        if self.server.cassette is not None and not transient:
+            self.server.cassette.put(key, recorded)
+        self._replay(recorded)
+
+    def _replay(self, recorded: RecordedResponse) -> None:
+        etag = recorded.headers.get("ETag")
+        if etag and recorded.status == 200 and self.headers.get("If-None-Match") == etag:
+            self._send(304, b"", etag=etag)
+            return
+        headers = {k: v for k, v in recorded.headers.items() if k not in ("Content-Type", "ETag")}
+        self._send(
+            recorded.status,
+            recorded.body,
+            etag=etag,
+            content_type=recorded.headers.get("Content-Type", "application/json; charset=utf-8"),
+            headers=headers,
+        )
+
+    def _documents_list(self, params: Dict[str, str]) -> None:
+        date = params.get("date", "")
+        try:
+            datetime.strptime(date, "%Y-%m-%d")
+            doc_type = int(params.get("type", "1"))
+        except ValueError:
+            self._send_json(400, {"StatusCode": 400, "message": "Invalid parameter"})
+            return
+
+        docs = self.server.state.documents(date)
+        # processDateTime changes every minute; tag the list itself
+        listing = json.dumps([doc_type, docs], sort_keys=True).encode("utf-8")
+        etag = '"' + hashlib.sha256(listing).hexdigest()[:16] + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self._send(304, b"", etag=etag)
+            return
+        body = json.dumps(documents_response(date, doc_type, docs), ensure_ascii=False)
+        self._send(200, body.encode("utf-8"), etag=etag)
+
+    def _document(self, doc_id: str) -> None:
+        archive = self.server.state.archive(doc_id)
+        if archive is None:
+            self._send_json(404, {"StatusCode": 404, "message": "Not Found"})
+            return
+        self._send(200, archive, content_type="application/octet-stream")
+
+    def _send_json(
+        self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None
+    ) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self._send(status, body, headers=headers)
+
+    def _send(
+        self,
+        status: int,
+        body: bytes,
+        etag: Optional[str] = None,
+        content_type: str = "application/json; charset=utf-8",
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.send_response(status)
+        if status != 304:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if body:
+            self._write_body(body)
+
+    def _write_body(self, body: bytes) -> None:
+        """本文を書き出す (帯域制限があれば一定量ごとに待つ)"""
+        bandwidth = self.server.faults.bandwidth
+        if bandwidth <= 0:
+            self.wfile.write(body)
+            return
+        size = max(1, int(bandwidth * BANDWIDTH_SLICE_SECONDS))
+        for offset in range(0, len(body), size):
+            began = time.monotonic()
+            chunk = body[offset : offset + size]
+            self.wfile.write(chunk)
+            remaining = len(chunk) / bandwidth - (time.monotonic() - began)
+            if remaining > 0:
+                time.sleep(remaining)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug("stub %s - %s", self.address_string(), format % args)
+
+
+class StubServer(ThreadingHTTPServer):
+    """スタブの状態を持つスレッド型HTTPサーバ"""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        state: StubState,
+        cassette: Optional[CassetteStore] = None,
+        faults: Optional[StubFaults] = None,
+        upstream: Optional[str] = None,
+    ) -> None:
+        super().__init__(address, StubRequestHandler)
+        self.state = state
+        self.cassette = cassette
+        self.faults = faults or StubFaults()
+        self.upstream = upstream.rstrip("/") if upstream else None
+
+    @property
+    def api_base(self) -> str:
+        """EDINET_API_BASE に設定するURL"""
+        host, port = self.server_address[:2]
+        if isinstance(host, bytes):
+            host = host.decode()
+        return f"http://{host}:{port}/api/v2"
+
+
+def create_stub_server(
+    state: Optional[StubState] = None,
+    host: str = STUB_HOST,
+    port: int = STUB_PORT,
+    cassette: Optional[CassetteStore] = None,
+    faults: Optional[StubFaults] = None,
+    upstream: Optional[str] = None,
+) -> StubServer:
+    """
+    スタブサーバを作成 (port=0 で空きポートを使用)
+
+    Args:
+        state: フィクスチャ・追加書類 (カセットに無いリクエストへの応答)
+        host: 待ち受けアドレス
+        port: 待ち受けポート
+        cassette: 再生 (upstream 指定時は記録) に使うカセット
+        faults: 遅延・エラー注入・レート制限の設定
+        upstream: 記録モードの中継先 (実APIの基点URL)
+
+    Returns:
+        スタブサーバ
+    """
+    return StubServer((host, port), state or StubState(), cassette, faults, upstream)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """コマンドライン引数を解析"""
+    parser = argparse.ArgumentParser(description="Local EDINET API v2 stub server")
+    parser.add_argument("--host", default=STUB_HOST, help="待ち受けアドレス")
+    parser.add_argument("--port", type=int, default=STUB_PORT, help="待ち受けポート")
+    parser.add_argument(
+        "--fixtures", type=Path, help="documents.json と <docID>.zip を置いたディレクトリ"
+    )
+    parser.add_argument("--cassette", type=Path, help="記録・再生に使うカセットのディレクトリ")
+    parser.add_argument(
+        "--record",
+        action="store_true",
+        help="実APIへ中継して応答をカセットに記録する (--cassette 必須)",
+    )
+    parser.add_argument(
+        "--upstream", default=UPSTREAM_API_BASE, help="記録モードの中継先 (実APIの基点URL)"
+    )
+    parser.add_argument("--latency", type=float, default=0.0, help="応答前の遅延 (ミリ秒)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="遅延に加える揺らぎ (ミリ秒)")
+    parser.add_argument(
+        "--bandwidth", type=float, default=0.0, help="応答本文の帯域 (KB/秒、0 で無制限)"
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0, help="5xx を返す確率")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="429 を返す確率")
+    parser.add_argument(
+        "--rate-limit", type=float, default=0.0, help="許可するリクエスト数 (件/秒、0 で無制限)"
+    )
+    parser.add_argument("--burst", type=int, default=1, help="レート制限のバースト件数")
+    parser.add_argument("--seed", type=int, default=0, help="遅延・エラー注入の乱数シード")
+    args = parser.parse_args(argv)
+    if args.record and args.cassette is None:
+        parser.error("--record requires --cassette")
+    return args
+
+
+def faults_from_args(args: argparse.Namespace) -> StubFaults:
+    """コマンドライン引数から障害注入の設定を作成"""
+    return StubFaults(
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        bandwidth=int(args.bandwidth * 1024),
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        rate_limit=args.rate_limit,
+        burst=args.burst,
+        seed=args.seed,
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """メイン処理"""
+    args = parse_args(argv)
+    state = load_fixtures(args.fixtures) if args.fixtures else StubState()
+    cassette = CassetteStore(args.cassette) if args.cassette else None
+    try:
+        server = create_stub_server(
+            state,
+            args.host,
+            args.port,
+            cassette=cassette,
+            faults=faults_from_args(args),
+            upstream=args.upstream if args.record else None,
+        )
+    except OSError as e:
+        logger.error(f"Failed to start stub server: {str(e)}")
+        return 1
+
+    documents = sum(len(docs) for docs in state.filings.values())
+    if args.record:
+        logger.info(f"EDINET stub recording {args.upstream} into {args.cassette}")
+    elif cassette is not None:
+        logger.info(f"EDINET stub replaying {len(cassette)} recorded responses")
+    logger.info(f"EDINET stub serving {documents} documents at {server.api_base}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down")
+    finally:
+        server.server_close()
+        logger.info(f"Requests: {json.dumps(state.requests, sort_keys=True)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
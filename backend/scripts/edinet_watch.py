@@ -0,0 +1,608 @@
+"""
+EDINET 新着書類の監視デーモン
+当日の書類一覧を一定間隔でポーリングし、登録企業の新しい報告書が提出されたら
+その企業分だけをダウンロード・抽出・検証して、派生データを差分更新で再発行する
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field, fields
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import requests
+
+from checkpoint import atomic_write_json
+from extract_financials import process_company_cache, update_derived_outputs
+from fetch_edinet import (
+    CACHE_DIR,
+    COMPANIES,
+    DOCUMENT_FORMAT,
+    EDINET_API_BASE,
+    EDINET_API_KEY,
+    TARGET_DOC_DESCRIPTIONS,
+    EDINETAPIError,
+    cached_document_path,
+    download_cached_document,
+    log_resolution,
+)
+from logger import get_edinet_logger
+from panel import STATEMENTS, statement_csv_path
+from publisher import PublishManifest
+from supersession import SupersessionIndex
+from validate_schema import validate_csv_schema
+
+# Logger
+logger = get_edinet_logger()
+
+# Polling
+WATCH_INTERVAL = float(os.getenv("EDINET_WATCH_INTERVAL", "300"))
+WATCH_STATUS_HOST = os.getenv("EDINET_WATCH_STATUS_HOST", "127.0.0.1")
+WATCH_STATUS_PORT = int(os.getenv("EDINET_WATCH_STATUS_PORT", "8766"))
+REQUEST_TIMEOUT = 30
+
+# Consecutive failures back off exponentially up to this multiple of the interval
+MAX_BACKOFF_FACTOR = 8
+
+# Health turns "stale" when no poll succeeded for this many intervals
+STALE_INTERVALS = 3
+
+# Seen documents of the current day (restarts do not reprocess them)
+WATCH_STATE_PATH = CACHE_DIR / "watch_state.json"
+
+# Recent ingest events kept for the status endpoint
+RECENT_EVENTS = 50
+
+
+class WatchValidationError(Exception):
+    """抽出結果が検証に失敗した (派生データは再発行しない)"""
+
+    pass
+
+
+@dataclass
+class WatchState:
+    """当日の処理済み書類 (日付が変わったら空にする)"""
+
+    date: str
+    seen: List[str] = field(default_factory=list)
+
+
+def load_watch_state(path: Path = WATCH_STATE_PATH) -> Optional[WatchState]:
+    """監視状態を読み込む (無い・壊れている場合は None)"""
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return WatchState(date=data["date"], seen=list(data.get("seen", [])))
+    except (json.JSONDecodeError, KeyError, TypeError):
+        logger.warning(f"Ignoring corrupt watch state: {path}")
+        return None
+
+
+@dataclass
+class WatchMetrics:
+    """監視デーモンのカウンタ (状態エンドポイントで公開)"""
+
+    started_at: float = field(default_factory=time.time)
+    polls: int = 0
+    not_modified: int = 0
+    unchanged: int = 0
+    api_requests: int = 0
+    filings_detected: int = 0
+    filings_ingested: int = 0
+    validation_failures: int = 0
+    errors: int = 0
+    consecutive_failures: int = 0
+    last_poll_at: Optional[float] = None
+    last_success_at: Optional[float] = None
+    last_ingest_at: Optional[float] = None
+    last_error: Optional[str] = None
+    recent: Deque[Dict[str, Any]] = field(default_factory=lambda: deque(maxlen=RECENT_EVENTS))
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON で返せる値のコピー"""
+        with self.lock:
+            values = {
+                f.name: getattr(self, f.name)
+                for f in fields(self)
+                if f.name not in ("recent", "lock")
+            }
+            values["recent"] = list(self.recent)
+        values["uptime_s"] = round(time.time() - self.started_at, 1)
+        values["rss_kib"] = resident_memory_kib()
+        return values
+
+
+def resident_memory_kib() -> int:
+    """現在の常駐メモリ (KiB、/proc が無い環境ではピーク値)"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError):
+        return int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+class DocumentsPoller:
+    """
+    当日の書類一覧の条件付きポーリング
+
+    まず type=1 (件数のみのメタデータ) を If-None-Match 付きで取得し、件数が変わったときだけ
+    type=2 (書類一覧) を取得する。接続はセッションで使い回す。
+    """
+
+    def __init__(
+        self,
+        metrics: WatchMetrics,
+        api_base: str = EDINET_API_BASE,
+        api_key: Optional[str] = EDINET_API_KEY,
+        session: Optional[requests.Session] = None,
+    ) -> None:
+        self.metrics = metrics
+        self.api_base = api_base
+        self.api_key = api_key
+        self.session = session or requests.Session()
+        self.date: Optional[str] = None
+        self.etag: Optional[str] = None
+        self.count: Optional[int] = None
+
+    def reset(self) -> None:
+        """次回は必ず書類一覧を取得する"""
+        self.etag = None
+        self.count = None
+
+    def _get(self, date: str, doc_type: int, etag: Optional[str] = None) -> requests.Response:
+        if not self.api_key:
+            raise EDINETAPIError("EDINET_API_KEY is not set. Please set it in .env.local")
+        headers = {"Subscription-Key": self.api_key}
+        if etag:
+            headers["If-None-Match"] = etag
+        with self.metrics.lock:
+            self.metrics.api_requests += 1
+        try:
+            response = self.session.get(
+                f"{self.api_base}/documents.json",
+                params={"date": date, "type": str(doc_type)},
+                headers=headers,
+                timeout=REQUEST_TIMEOUT,
+            )
+        except requests.exceptions.RequestException as e:
+            raise EDINETAPIError(f"Request failed: {str(e)}")
+        if response.status_code == 401:
+            raise EDINETAPIError("Invalid API key (401 Unauthorized)")
+        if response.status_code not in (200, 304):
+            raise EDINETAPIError(f"Failed to fetch documents list: HTTP {response.status_code}")
+        return response
+
+    def _json(self, response: requests.Response) -> Dict[str, Any]:
+        try:
+            body: Dict[str, Any] = response.json()
+        except ValueError as e:
+            raise EDINETAPIError(f"Invalid documents list response: {str(e)}")
+        return body
+
+    def poll(self, date: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        書類一覧を条件付きで取得
+
+        Args:
+            date: 日付 (YYYY-MM-DD)
+
+        Returns:
+            書類一覧 (前回から変化が無ければ None)
+
+        Raises:
+            EDINETAPIError: API呼び出しエラー
+        """
+        if date != self.date:
+            self.date = date
+            self.reset()
+
+        response = self._get(date, 1, self.etag)
+        if response.status_code == 304:
+            with self.metrics.lock:
+                self.metrics.not_modified += 1
+            return None
+
+        metadata = self._json(response).get("metadata", {})
+        if str(metadata.get("status", "200")) != "200":
+            raise EDINETAPIError(
+                f"Documents list error: {metadata.get('status')} {metadata.get('message')}"
+            )
+        count = int(metadata.get("resultset", {}).get("count", 0))
+        etag = response.headers.get("ETag")
+        if count == self.count:
+            self.etag = etag
+            with self.metrics.lock:
+                self.metrics.unchanged += 1
+            return None
+
+        results: List[Dict[str, Any]] = self._json(self._get(date, 2)).get("results", [])
+        # Commit the cursor only after the list was fetched
+        self.etag = etag
+        self.count = count
+        return results
+
+
+def is_target_filing(doc: Dict[str, Any], companies: Dict[str, str]) -> bool:
+    """登録企業の四半期報告書・有価証券報告書かどうか"""
+    return doc.get("edinetCode") in companies and any(
+        keyword in (doc.get("docDescription") or "") for keyword in TARGET_DOC_DESCRIPTIONS
+    )
+
+
+def snapshot_outputs(paths: List[Path], directory: Path) -> Dict[Path, Optional[Path]]:
+    """
+    出力ファイルを directory へ退避
+
+    Returns:
+        出力パス -> 退避先 (存在しなかったファイルは None)
+    """
+    snapshot: Dict[Path, Optional[Path]] = {}
+    for i, path in enumerate(paths):
+        if path.exists():
+            backup = directory / f"{i}_{path.name}"
+            shutil.copy2(path, backup)
+            snapshot[path] = backup
+        else:
+            snapshot[path] = None
+    return snapshot
+
+
+def restore_outputs(snapshot: Dict[Path, Optional[Path]]) -> None:
+    """snapshot_outputs で退避した状態に戻す (新たに作られたファイルは削除)"""
+    for path, backup in snapshot.items():
+        if backup is None:
+            path.unlink(missing_ok=True)
+        else:
+            os.replace(backup, path)
+
+
+def ingest_company(
+    company_name: str,
+    docs: List[Dict[str, Any]],
+    document_format: str = DOCUMENT_FORMAT,
+    frontend: bool = False,
+) -> List[str]:
+    """
+    1企業の新着書類を取り込み、派生データを差分更新する
+
+    置き換え判定 → ダウンロード → 抽出 (この企業のみ) → 検証 → 派生データの再発行。
+    派生データの各ステージは入力ハッシュで変更期間を判定するため、この企業の変更期間だけが
+    再計算される。取得・抽出・検証のいずれかに失敗した場合は諸表CSVと置き換え索引を
+    取り込み前の内容に戻し、発行マニフェストも保存しない。
+
+    Args:
+        company_name: 企業名 (キャッシュファイル名の接頭辞)
+        docs: 書類一覧APIの書類メタデータ
+        document_format: 取得形式 (csv / xbrl)
+        frontend: True なら派生データのバンドル等を frontend/public/data にもコピー
+
+    Returns:
+        内容が変わった諸表のリスト
+
+    Raises:
+        EDINETAPIError: 選ばれた書類がキャッシュに無い (取得失敗・他ワーカーが取得中) 場合
+        WatchValidationError: 抽出した諸表が検証に失敗した場合
+    """
+    index = SupersessionIndex()
+    outputs = [statement_csv_path(company_name, statement) for statement in STATEMENTS]
+    with tempfile.TemporaryDirectory(prefix="edinet_watch_") as backup_dir:
+        snapshot = snapshot_outputs([index.path, *outputs], Path(backup_dir))
+        try:
+            resolution = index.select(docs)
+            # Extraction reads the saved index to leave out superseded documents
+            index.save()
+            log_resolution(resolution)
+            if not resolution.selected:
+                logger.info(f"No new documents to extract for {company_name}")
+                return []
+
+            # Every selected document must be in the cache before extraction; earlier polls
+            # may have cached a document without extracting it, so extraction does not depend
+            # on this download
+            downloaded: List[str] = []
+            missing: List[str] = []
+            for doc in resolution.selected:
+                download_cached_document(doc, company_name, downloaded, document_format)
+                cache_path = cached_document_path(doc, company_name, document_format)
+                if cache_path is None or not cache_path.exists():
+                    missing.append(str(doc.get("docID")))
+            if missing:
+                raise EDINETAPIError(
+                    f"Documents not cached for {company_name}: {', '.join(missing)}"
+                )
+
+            manifest = PublishManifest()
+            changed = process_company_cache(company_name, manifest)
+            errors: List[str] = []
+            for statement in changed:
+                path = statement_csv_path(company_name, statement)
+                valid, statement_errors = validate_csv_schema(path)
+                if not valid:
+                    errors.extend(f"{statement}: {error}" for error in statement_errors)
+            if errors:
+                raise WatchValidationError(f"{company_name}: {'; '.join(errors[:5])}")
+        except BaseException:
+            # Never leave unvalidated statements (or the index that selected them) in place
+            restore_outputs(snapshot)
+            raise
+    manifest.save()
+    if not changed:
+        logger.info(f"Statements unchanged for {company_name}")
+        return []
+
+    update_derived_outputs(frontend=frontend)
+    return changed
+
+
+class FilingWatcher:
+    """当日の書類一覧を監視し、登録企業の新着書類を取り込む"""
+
+    def __init__(
+        self,
+        companies: Optional[Dict[str, str]] = None,
+        interval: float = WATCH_INTERVAL,
+        poller: Optional[DocumentsPoller] = None,
+        state_path: Path = WATCH_STATE_PATH,
+        document_format: str = DOCUMENT_FORMAT,
+        frontend: bool = False,
+    ) -> None:
+        self.companies = companies or COMPANIES
+        self.interval = interval
+        self.metrics = WatchMetrics()
+        self.poller = poller or DocumentsPoller(self.metrics)
+        self.poller.metrics = self.metrics
+        self.state_path = state_path
+        self.document_format = document_format
+        self.frontend = frontend
+        self.state = load_watch_state(state_path)
+
+    def run_once(self, date: Optional[str] = None) -> int:
+        """
+        1回ポーリングして新着書類を取り込む
+
+        Args:
+            date: 対象日 (省略時は当日)
+
+        Returns:
+            取り込んだ書類数
+
+        Raises:
+            EDINETAPIError: 書類一覧の取得に失敗した場合
+        """
+        date = date or datetime.now().strftime("%Y-%m-%d")
+        if self.state is None or self.state.date != date:
+            self.state = WatchState(date=date)
+
+        with self.metrics.lock:
+            self.metrics.polls += 1
+            self.metrics.last_poll_at = time.time()
+        results = self.poller.poll(date)
+        with self.metrics.lock:
+            self.metrics.last_success_at = time.time()
+        if results is None:
+            return 0
+
+        seen = set(self.state.seen)
+        new_docs: Dict[str, List[Dict[str, Any]]] = {}
+        for doc in results:
+            if doc.get("docID") not in seen and is_target_filing(doc, self.companies):
+                new_docs.setdefault(self.companies[doc["edinetCode"]], []).append(doc)
+        if not new_docs:
+            return 0
+
+        ingested = 0
+        for company_name, docs in sorted(new_docs.items()):
+            with self.metrics.lock:
+                self.metrics.filings_detected += len(docs)
+            logger.info(f"New filings for {company_name}: {', '.join(d['docID'] for d in docs)}")
+            event: Dict[str, Any] = {
+                "at": datetime.now().isoformat(timespec="seconds"),
+                "company": company_name,
+                "docs": [d["docID"] for d in docs],
+            }
+            began = time.perf_counter()
+            try:
+                event["changed"] = ingest_company(
+                    company_name, docs, self.document_format, self.frontend
+                )
+            except (WatchValidationError, EDINETAPIError) as e:
+                # Leave the documents unseen and force a list refetch so they are retried
+                self.poller.reset()
+                validation = isinstance(e, WatchValidationError)
+                event["error"] = str(e)
+                logger.error(f"Ingest failed for {company_name}: {str(e)}")
+                with self.metrics.lock:
+                    self.metrics.errors += 1
+                    self.metrics.validation_failures += int(validation)
+                    self.metrics.last_error = str(e)
+                    self.metrics.recent.append(event)
+                continue
+
+            event["seconds"] = round(time.perf_counter() - began, 2)
+            self.state.seen.extend(d["docID"] for d in docs)
+            atomic_write_json(self.state_path, asdict(self.state))
+            ingested += len(docs)
+            with self.metrics.lock:
+                self.metrics.filings_ingested += len(docs)
+                self.metrics.last_ingest_at = time.time()
+                self.metrics.recent.append(event)
+            logger.info(f"Ingested {company_name} in {event['seconds']}s: {event['changed']}")
+        return ingested
+
+    def run(self, stop: threading.Event) -> None:
+        """
+        stop が設定されるまでポーリングを続ける
+
+        例外は種類を問わず記録して続行し、失敗が続いた場合は間隔を倍々に延ばす
+        (最大 MAX_BACKOFF_FACTOR 倍)。
+        """
+        logger.info(f"Watching {', '.join(self.companies.values())} every {self.interval:.0f}s")
+        while not stop.is_set():
+            try:
+                self.run_once()
+                failures = 0
+            except Exception as e:
+                # Any failure (API, extraction, disk) backs off instead of stopping the daemon
+                if isinstance(e, EDINETAPIError):
+                    logger.warning(f"Poll failed: {str(e)}")
+                else:
+                    logger.error(f"Poll failed: {str(e)}", exc_info=True)
+                self.poller.reset()
+                with self.metrics.lock:
+                    self.metrics.errors += 1
+                    self.metrics.last_error = str(e)
+                    failures = self.metrics.consecutive_failures + 1
+            with self.metrics.lock:
+                self.metrics.consecutive_failures = failures
+            stop.wait(self.interval * min(2**failures, MAX_BACKOFF_FACTOR))
+
+    def health(self) -> Tuple[int, Dict[str, Any]]:
+        """
+        状態エンドポイントの応答
+
+        Returns:
+            (HTTPステータス, 本文) - 最後の成功から STALE_INTERVALS 間隔を超えたら 503
+        """
+        metrics = self.metrics.snapshot()
+        last_success = metrics["last_success_at"]
+        if last_success is None:
+            status = "starting" if metrics["polls"] == 0 else "failing"
+        elif time.time() - last_success > self.interval * STALE_INTERVALS:
+            status = "stale"
+        else:
+            status = "ok"
+        body = {
+            "status": status,
+            "date": self.state.date if self.state else None,
+            "seen": len(self.state.seen) if self.state else 0,
+            "interval_s": self.interval,
+            "last_success_at": last_success,
+            "last_ingest_at": metrics["last_ingest_at"],
+            "last_error": metrics["last_error"],
+        }
+        return (200 if status in ("ok", "starting") else 503), body
+
+
+class StatusRequestHandler(BaseHTTPRequestHandler):
+    """/health と /metrics を返す GET ハンドラ"""
+
+    server: "StatusServer"
+    protocol_version = "HTTP/1.1"
+    server_version = "FinSightWatch/1.0"
+
+    def do_GET(self) -> None:  # noqa: N802 (BaseHTTPRequestHandler API)
+        if self.path == "/health":
+            status, body = self.server.watcher.health()
+        elif self.path == "/metrics":
+            status, body = 200, self.server.watcher.metrics.snapshot()
+        else:
+            status, body = 404, {"error": f"Not found: {self.path}"}
+
+        payload = json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class StatusServer(ThreadingHTTPServer):
+    """監視デーモンの状態エンドポイント"""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], watcher: FilingWatcher) -> None:
+        super().__init__(address, StatusRequestHandler)
+        self.watcher = watcher
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """コマンドライン引数を解析"""
+    parser = argparse.ArgumentParser(description="EDINET new filing watcher")
+    parser.add_argument(
+        "--interval", type=float, default=WATCH_INTERVAL, help="ポーリング間隔 (秒)"
+    )
+    parser.add_argument(
+        "--status-host", default=WATCH_STATUS_HOST, help="状態APIの待ち受けアドレス"
+    )
+    parser.add_argument(
+        "--status-port",
+        type=int,
+        default=WATCH_STATUS_PORT,
+        help="状態APIの待ち受けポート (0 で無効)",
+    )
+    parser.add_argument("--date", help="監視する日付 (YYYY-MM-DD、--once と併用)")
+    parser.add_argument("--once", action="store_true", help="1回ポーリングして終了")
+    parser.add_argument(
+        "--frontend",
+        action="store_true",
+        help="派生データのバンドル等を frontend/public/data にもコピーする",
+    )
+    args = parser.parse_args(argv)
+
+    if args.interval <= 0:
+        parser.error("--interval must be > 0")
+    if args.date and not args.once:
+        parser.error("--date requires --once")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """メイン処理"""
+    args = parse_args(argv)
+    watcher = FilingWatcher(interval=args.interval, frontend=args.frontend)
+
+    if args.once:
+        try:
+            ingested = watcher.run_once(args.date)
+        except EDINETAPIError as e:
+            logger.error(f"Poll failed: {str(e)}")
+            return 1
+        logger.info(f"Ingested {ingested} filings")
+        return 0 if watcher.metrics.errors == 0 else 1
+
+    status_server: Optional[StatusServer] = None
+    if args.status_port:
+        try:
+            status_server = StatusServer((args.status_host, args.status_port), watcher)
+        except OSError as e:
+            logger.error(f"Failed to start status server: {str(e)}")
+            return 1
+        threading.Thread(target=status_server.serve_forever, daemon=True).start()
+        logger.info(f"Status on http://{args.status_host}:{status_server.server_address[1]}/health")
+
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+    try:
+        watcher.run(stop)
+    finally:
+        if status_server is not None:
+            status_server.shutdown()
+            status_server.server_close()
+    logger.info("Watcher stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
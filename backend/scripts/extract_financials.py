@@ -2,18 +2,38 @@
 EDINET ZIPファイルからCSVを抽出して財務データを変換
 """
 
-import csv
+import argparse
 import json
 import re
 import sys
 import zipfile
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Sequence, Union
 
 import pandas as pd
 
+from compute_anomalies import ANOMALIES_PATH, update_anomalies
+from compute_health_score import HEALTH_SCORES_PATH, update_health_scores
+from compute_metrics import METRICS_PATH, update_metrics
+from compute_peer_stats import PEER_STATS_PATH, update_peer_stats
+from financial_store import FinancialStore
 from logger import get_data_logger
+from note_changes import update_note_changes
+from notes_index import FRONTEND_NOTES_INDEX_DIR, NOTES_INDEX_DIR, NOTES_PATH, update_notes_index
+from profiler import (
+    add_profile_arguments,
+    configure_profiling,
+    profile_stage,
+    write_profile_reports,
+)
+from publish_bundle import BUNDLE_DIR, FRONTEND_DATA_DIR, publish_bundle
+from publisher import PublishManifest, render_csv, stage_paths
+from standalone_quarters import STANDALONE_PATH, update_standalone
+from statement_writer import SortedRunWriter, stream_statement_csvs
+from supersession import SupersessionIndex
+from units import DEFAULT_CSV_UNIT, to_oku
+from xbrl_parser import XBRL_ARCHIVE_SUFFIX, build_concept_index, parse_xbrl_zip
 
 # Logger
 logger = get_data_logger()
@@ -37,7 +57,8 @@ def load_taxonomy_mapping() -> Dict[str, List[str]]:
 
     with open(TAXONOMY_MAP_PATH, "r", encoding="utf-8") as f:
         data = json.load(f)
-        return data.get("mappings", {})
+        mappings: Dict[str, List[str]] = data.get("mappings", {})
+        return mappings
 
 
 def parse_period_from_filename(filename: str) -> Optional[str]:
@@ -72,6 +93,20 @@ def parse_period_from_filename(filename: str) -> Optional[str]:
     return f"{year}Q{quarter}"
 
 
+def parse_doc_id_from_filename(filename: str) -> Optional[str]:
+    """
+    ファイル名から書類IDを抽出
+
+    Args:
+        filename: ファイル名 (例: TEPCO_S100ABCD_2025-09-30.zip)
+
+    Returns:
+        書類ID または None
+    """
+    match = re.match(r"[^_]+_([^_]+)_", filename)
+    return match.group(1) if match else None
+
+
 def extract_csv_from_zip(zip_path: Path) -> List[Path]:
     """
     ZIPファイルからCSVファイルを抽出
@@ -93,7 +128,7 @@ def extract_csv_from_zip(zip_path: Path) -> List[Path]:
                     zf.extract(name, extract_dir)
                     extracted_path = extract_dir / name
                     extracted_files.append(extracted_path)
-                    logger.debug(f"Extracted: {name}")
+                    logger.debug("Extracted: %s", name)
 
     except zipfile.BadZipFile:
         logger.error(f"Bad ZIP file: {zip_path}")
@@ -156,6 +191,7 @@ def parse_financial_csv(
         for _, row in df.iterrows():
             label = str(row.get("要素名", ""))
             value = row.get("金額", None)
+            unit = row.get("単位", None)
 
             if pd.isna(value) or label == "":
                 continue
@@ -163,12 +199,16 @@ def parse_financial_csv(
             # Map to field name
             field_name = map_field_name(label, taxonomy_map)
             if field_name:
-                # Convert to 億円 (assume original is 千円)
+                # Convert to 億円 by the row's unit (千円 when the CSV has no unit column)
+                unit = DEFAULT_CSV_UNIT if pd.isna(unit) else str(unit)
                 try:
-                    value_float = float(value) / 100000  # 千円 → 億円
-                    data_row[field_name] = round(value_float, 2)
+                    value_oku = to_oku(float(value), unit)
                 except (ValueError, TypeError):
                     logger.warning(f"Invalid value for {label}: {value}")
+                    continue
+                # Shares, ratios and other non-monetary rows are not statement amounts
+                if value_oku is not None:
+                    data_row[field_name] = value_oku
 
         # Check if we got any data
         if len(data_row) > 3:  # More than just company, period, date
@@ -181,30 +221,65 @@ def parse_financial_csv(
         return None
 
 
-def process_company_cache(company: str) -> None:
+def process_company_cache(
+    company: str, manifest: Optional[PublishManifest] = None
+) -> List[str]:
     """
     企業のキャッシュファイルを処理して財務データCSVを生成
 
     Args:
         company: 企業コード (TEPCO/CHUBU)
+        manifest: 発行マニフェスト
+
+    Returns:
+        内容が変わった諸表のリスト
     """
     logger.info(f"=== Processing {company} cache files ===")
 
-    # Find cache files for this company
-    cache_files = list(CACHE_DIR.glob(f"{company}_*.zip"))
+    # Find cache files for this company (sorted so parsing order is deterministic)
+    cache_files = sorted(CACHE_DIR.glob(f"{company}_*.zip"))
     logger.info(f"Found {len(cache_files)} cache files")
 
     if not cache_files:
         logger.warning(f"No cache files found for {company}")
-        return
+        return []
 
     # Load taxonomy mapping
     taxonomy_map = load_taxonomy_mapping()
+    concept_index = build_concept_index(taxonomy_map)
 
-    # Collect all financial data
-    all_data: List[Dict[str, Any]] = []
+    # Amended / duplicate filings recorded by the fetcher
+    supersession = SupersessionIndex()
 
+    # Parsed rows are spilled as sorted runs so memory does not grow with history length
+    writer = SortedRunWriter()
+    try:
+        _parse_cache_files(company, cache_files, writer, taxonomy_map, concept_index, supersession)
+        with profile_stage("extract.write_csv"):
+            changed = stream_statement_csvs(writer.records(), manifest)
+    finally:
+        writer.close()
+
+    logger.info(f"=== Completed processing for {company} ===")
+    return changed.get(company, [])
+
+
+def _parse_cache_files(
+    company: str,
+    cache_files: List[Path],
+    writer: SortedRunWriter,
+    taxonomy_map: Dict[str, List[str]],
+    concept_index: Dict[str, str],
+    supersession: SupersessionIndex,
+) -> None:
+    """キャッシュZIPを順にパースして抽出行を writer に追加 (訂正前の書類は除外)"""
     for zip_path in cache_files:
+        doc_id = parse_doc_id_from_filename(zip_path.name)
+        skipped = supersession.skip_reason(doc_id) if doc_id else None
+        if skipped:
+            logger.info(f"Skipping superseded document: {zip_path.name} ({skipped['reason']})")
+            continue
+
         logger.info(f"Processing: {zip_path.name}")
 
         # Extract period and date from filename
@@ -217,33 +292,50 @@ def process_company_cache(company: str) -> None:
         date_match = re.search(r"(\d{4}-\d{2}-\d{2})", zip_path.name)
         date = date_match.group(1) if date_match else "unknown"
 
+        # XBRL instance archives (type=1) are streamed without extraction
+        if zip_path.name.endswith(XBRL_ARCHIVE_SUFFIX):
+            with profile_stage("extract.parse_xbrl"):
+                rows = parse_xbrl_zip(zip_path, company, period, date, concept_index)
+            writer.extend(rows)
+            continue
+
         # Extract CSVs
-        csv_files = extract_csv_from_zip(zip_path)
+        with profile_stage("extract.unzip"):
+            csv_files = extract_csv_from_zip(zip_path)
 
         # Parse each CSV
         for csv_path in csv_files:
-            data_row = parse_financial_csv(csv_path, company, period, date, taxonomy_map)
+            with profile_stage("extract.parse_csv"):
+                data_row = parse_financial_csv(csv_path, company, period, date, taxonomy_map)
             if data_row:
-                all_data.append(data_row)
-                logger.debug(f"Parsed data: {period} with {len(data_row)} fields")
-
-    # Sort by period
-    all_data.sort(key=lambda x: x["period"])
-
-    # Create separate CSVs for PL, BS, CF
-    create_statement_csvs(company, all_data)
-
-    logger.info(f"=== Completed processing for {company} ===")
+                writer.add(data_row)
+                logger.debug("Parsed data: %s with %d fields", period, len(data_row))
 
 
-def create_statement_csvs(company: str, data: List[Dict[str, Any]]) -> None:
+def create_statement_csvs(
+    company: str,
+    data: Union[FinancialStore, List[Dict[str, Any]]],
+    manifest: Optional[PublishManifest] = None,
+) -> List[str]:
     """
     PL/BS/CFの個別CSVファイルを作成
 
+    正規化した内容のハッシュが変わったファイルのみ書き込む。
+    財務データリストの行はそのまま書き出す (同じ期間の行も統合しない)。
+    ストアは1期間1行 (統合済み) のため、その行を書き出す。
+
     Args:
         company: 企業コード
-        data: 財務データリスト
+        data: 財務データ (ストアまたは財務データリスト)
+        manifest: 発行マニフェスト (省略時は新規作成して保存)
+
+    Returns:
+        内容が変わった諸表のリスト (例: ["pl", "bs"])
     """
+    own_manifest = manifest is None
+    if manifest is None:
+        manifest = PublishManifest()
+
     # Define fields for each statement
     pl_fields = ["company", "period", "date", "revenue", "operating_income", "ordinary_income", "net_income"]
     bs_fields = ["company", "period", "date", "total_assets", "current_assets", "fixed_assets", "total_liabilities", "net_assets"]
@@ -254,43 +346,189 @@ def create_statement_csvs(company: str, data: List[Dict[str, Any]]) -> None:
         "bs": bs_fields,
         "cf": cf_fields,
     }
+    changed: List[str] = []
 
     for statement_type, fields in statements.items():
         output_path = FINANCIALS_DIR / f"{company}_{statement_type}_quarterly.csv"
 
-        # Filter rows that have at least one field from this statement
-        statement_data = []
-        for row in data:
-            # Check if row has any statement-specific fields
-            has_data = any(field in row and row[field] is not None for field in fields[3:])
-            if has_data:
-                statement_data.append(row)
+        # Rows that have at least one field from this statement
+        if isinstance(data, FinancialStore):
+            statement_data = data.statement(statement_type).to_records()
+        else:
+            statement_data = [
+                row for row in data if any(row.get(field) is not None for field in fields[3:])
+            ]
 
         if not statement_data:
             logger.warning(f"No data for {company} {statement_type.upper()}")
             continue
 
-        # Write CSV
-        with open(output_path, "w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
-            writer.writeheader()
-            writer.writerows(statement_data)
+        # Write CSV only when the canonical content changed
+        content = render_csv(statement_data, fields).encode("utf-8")
+        key = f"{company}/{statement_type}"
+        if manifest.publish(key, output_path, content, len(statement_data)):
+            changed.append(statement_type)
+            logger.info(f"Updated: {output_path.name} ({len(statement_data)} rows)")
+        else:
+            logger.info(f"Unchanged: {output_path.name} ({len(statement_data)} rows)")
+
+    if own_manifest:
+        manifest.save()
+
+    return changed
+
+
+# Stages derived from the statement CSVs, in dependency order -> outputs they rewrite
+# (the last path of notes_index / bundle is the copy under frontend/public/data)
+DERIVED_STAGES: Dict[str, List[Path]] = {
+    "standalone": [STANDALONE_PATH],
+    "metrics": [METRICS_PATH],
+    "health_score": [HEALTH_SCORES_PATH],
+    "anomalies": [ANOMALIES_PATH],
+    "peer_stats": [PEER_STATS_PATH],
+    "note_changes": [NOTES_PATH],
+    "notes_index": [NOTES_INDEX_DIR, FRONTEND_NOTES_INDEX_DIR],
+    "bundle": [BUNDLE_DIR, FRONTEND_DATA_DIR / BUNDLE_DIR.name],
+}
+FRONTEND_OUTPUT_PATHS = [FRONTEND_NOTES_INDEX_DIR, FRONTEND_DATA_DIR / BUNDLE_DIR.name]
+
+
+def update_derived_outputs(
+    stages: Sequence[str] = tuple(DERIVED_STAGES), frontend: bool = False
+) -> List[Path]:
+    """
+    財務諸表CSVから派生する出力 (単独四半期・指標・スコア・異常値・同業比較・注記・バンドル) を更新
 
-        logger.info(f"Created: {output_path.name} ({len(statement_data)} rows)")
+    各ステージは入力ハッシュで変更期間を判定するため、変更のあった企業・期間のみ再計算される。
 
+    Args:
+        stages: 実行するステージ (DERIVED_STAGES のキー、実行順は依存順に固定)
+        frontend: True なら注記インデックスとバンドルを frontend/public/data にもコピー
+
+    Returns:
+        実行したステージの派生出力のパス (存在するもの。ディレクトリは配下の追加・削除をまとめて
+        git add できる)
 
-def main() -> int:
+    Raises:
+        ValueError: 未知のステージ名
+    """
+    unknown = sorted(set(stages) - set(DERIVED_STAGES))
+    if unknown:
+        raise ValueError(f"Unknown derived stage(s): {', '.join(unknown)}")
+    selected = set(stages)
+
+    # Standalone quarters / TTM from fiscal year-to-date flow items (before metrics)
+    if "standalone" in selected:
+        with profile_stage("extract.standalone"):
+            update_standalone()
+
+    # Derived metrics (YoY/QoQ/TTM/margins) for changed periods
+    if "metrics" in selected:
+        with profile_stage("extract.metrics"):
+            update_metrics()
+
+    # Financial health score (100 points) for changed periods
+    if "health_score" in selected:
+        with profile_stage("extract.health_score"):
+            update_health_scores()
+
+    # Anomaly flags (robust z-scores, same quarter last year, accounting identities)
+    if "anomalies" in selected:
+        with profile_stage("extract.anomalies"):
+            update_anomalies()
+
+    # Cross-sectional peer statistics for periods touched by the changes
+    if "peer_stats" in selected:
+        with profile_stage("extract.peer_stats"):
+            update_peer_stats()
+
+    # Paragraph-level note changes vs. the previous period (before indexing)
+    if "note_changes" in selected:
+        with profile_stage("extract.note_changes"):
+            update_note_changes()
+
+    # Notes search index (skipped when data/xbrl_notes.json is absent)
+    if "notes_index" in selected:
+        with profile_stage("extract.notes_index"):
+            update_notes_index(frontend_dir=FRONTEND_NOTES_INDEX_DIR if frontend else None)
+
+    # Dashboard bundle
+    if "bundle" in selected:
+        with profile_stage("extract.publish"):
+            publish_bundle(frontend_dir=FRONTEND_DATA_DIR if frontend else None)
+
+    return [
+        path
+        for stage in DERIVED_STAGES
+        if stage in selected
+        for path in DERIVED_STAGES[stage]
+        if path.exists() and (frontend or path not in FRONTEND_OUTPUT_PATHS)
+    ]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """コマンドライン引数を解析"""
+    parser = argparse.ArgumentParser(description="Financial Data Extraction")
+    parser.add_argument(
+        "--stage",
+        action="store_true",
+        help="内容が変わった出力ファイルのみ git add する",
+    )
+    derived = parser.add_mutually_exclusive_group()
+    derived.add_argument(
+        "--stages",
+        nargs="+",
+        choices=tuple(DERIVED_STAGES),
+        default=list(DERIVED_STAGES),
+        metavar="STAGE",
+        help=f"実行する派生ステージ (既定: 全て。{', '.join(DERIVED_STAGES)})",
+    )
+    derived.add_argument(
+        "--no-derived",
+        dest="stages",
+        action="store_const",
+        const=[],
+        help="財務諸表CSVの抽出のみ行い、派生ステージを実行しない",
+    )
+    parser.add_argument(
+        "--frontend",
+        action="store_true",
+        help="注記インデックスとバンドルを frontend/public/data にもコピーする",
+    )
+    add_profile_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
     """メイン処理"""
+    args = parse_args(argv)
+    configure_profiling(args.profile, "extract", args.profile_interval)
+
     logger.info("=" * 80)
     logger.info("Financial Data Extraction")
     logger.info("=" * 80)
 
     try:
+        manifest = PublishManifest()
+
         # Process TEPCO
-        process_company_cache("TEPCO")
+        process_company_cache("TEPCO", manifest)
 
         # Process CHUBU
-        process_company_cache("CHUBU")
+        process_company_cache("CHUBU", manifest)
+
+        manifest.save()
+        logger.info(f"Publish: {manifest.report.summary()}")
+
+        derived_paths = update_derived_outputs(args.stages, frontend=args.frontend)
+
+        # Stage the statements together with every output regenerated from them
+        staged = manifest.report.paths + derived_paths
+        if args.stage and stage_paths(staged):
+            logger.info(
+                f"Staged {len(manifest.report.paths)} changed statement file(s) "
+                f"and {len(derived_paths)} derived output(s)"
+            )
 
         logger.info("=" * 80)
         logger.info("✓ Data extraction completed successfully")
@@ -301,6 +539,11 @@ def main() -> int:
         logger.error(f"Fatal error: {str(e)}", exc_info=True)
         return 1
 
+    finally:
+        report_dir = write_profile_reports()
+        if report_dir:
+            logger.info(f"Profile reports written to: {report_dir}")
+
 
 if __name__ == "__main__":
     sys.exit(main())
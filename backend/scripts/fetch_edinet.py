@@ -3,6 +3,7 @@ EDINET API v2 からデータを取得するスクリプト
 東京電力HD (E04498) と中部電力 (E04503) の財務データを取得
 """
 
+import argparse
 import os
 import sys
 import time
@@ -14,7 +15,25 @@ from typing import Dict, List, Optional
 import requests
 from dotenv import load_dotenv
 
+from checkpoint import CHECKPOINT_INTERVAL, ScanCheckpoint, load_checkpoint, save_checkpoint
 from logger import get_edinet_logger
+from profiler import (
+    add_profile_arguments,
+    configure_profiling,
+    profile_stage,
+    write_profile_reports,
+)
+from scan_planner import SCAN_MODES, plan_scan_dates
+from sharding import (
+    DocumentLease,
+    ShardState,
+    load_shard_state,
+    merge_shard_states,
+    save_shard_state,
+    select_shard_dates,
+)
+from supersession import Resolution, SupersessionIndex
+from xbrl_parser import XBRL_ARCHIVE_SUFFIX
 
 # Load environment variables
 load_dotenv()
@@ -29,6 +48,29 @@ EDINET_API_BASE = os.getenv("EDINET_API_BASE", "https://api.edinet-fsa.go.jp/api
 TEPCO_CODE = os.getenv("TEPCO_CODE", "E04498")
 CHUBU_CODE = os.getenv("CHUBU_CODE", "E04503")
 
+# Fiscal year end month per issuer (used by the scan planner)
+FISCAL_YEAR_END_MONTHS: Dict[str, int] = {
+    TEPCO_CODE: int(os.getenv("TEPCO_FISCAL_YEAR_END_MONTH", "3")),
+    CHUBU_CODE: int(os.getenv("CHUBU_FISCAL_YEAR_END_MONTH", "3")),
+}
+# Amendments can be filed on any day, so narrower planner modes are opt-in
+SCAN_MODE = os.getenv("EDINET_SCAN_MODE", "full")
+
+# Issuers fetched by default (EDINET code -> cache name)
+COMPANIES: Dict[str, str] = {TEPCO_CODE: "TEPCO", CHUBU_CODE: "CHUBU"}
+
+# Global API budget shared by all workers (requests per second)
+GLOBAL_RATE_LIMIT = float(os.getenv("EDINET_GLOBAL_RATE_LIMIT", "1.0"))
+
+# Document archive formats: name -> documents API type
+#   csv:  type=5 (XBRL converted to CSV)
+#   xbrl: type=1 (original submission incl. XBRL instance; keeps contexts and units)
+DOCUMENT_FORMATS: Dict[str, int] = {"csv": 5, "xbrl": 1}
+DOCUMENT_FORMAT = os.getenv("EDINET_DOCUMENT_FORMAT", "csv")
+
+# Report types collected from the documents list
+TARGET_DOC_DESCRIPTIONS = ("四半期報告書", "有価証券報告書")
+
 # Data directories
 PROJECT_ROOT = Path(__file__).parent.parent.parent
 DATA_DIR = PROJECT_ROOT / "data"
@@ -71,7 +113,7 @@ def get_documents_list(
         raise EDINETAPIError("EDINET_API_KEY is not set. Please set it in .env.local")
 
     url = f"{EDINET_API_BASE}/documents.json"
-    params = {"date": date, "type": doc_type}
+    params = {"date": date, "type": str(doc_type)}
     headers = {"Subscription-Key": EDINET_API_KEY}
 
     for attempt in range(max_retries):
@@ -81,7 +123,7 @@ def get_documents_list(
 
             if response.status_code == 200:
                 data = response.json()
-                results = data.get("results", [])
+                results: List[Dict] = data.get("results", [])
                 logger.info(f"Found {len(results)} documents")
                 return results
 
@@ -161,9 +203,12 @@ def download_document(
             )
 
             if response.status_code == 200:
-                with open(output_path, "wb") as f:
+                # Write to a partial file first so an interrupted download never looks cached
+                part_path = output_path.with_name(output_path.name + ".part")
+                with open(part_path, "wb") as f:
                     for chunk in response.iter_content(chunk_size=8192):
                         f.write(chunk)
+                part_path.replace(output_path)
 
                 logger.info(f"Downloaded to: {output_path}")
                 return True
@@ -209,15 +254,23 @@ def find_company_documents(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     limit: int = 40,
+    scan_mode: Optional[str] = None,
+    checkpoint: Optional[ScanCheckpoint] = None,
 ) -> List[Dict]:
     """
     特定企業の書類を検索
 
+    決算月と法定提出期限から報告書が提出され得る営業日のみを走査する
+    (scan_mode="full" で全日走査)。checkpoint を渡すと走査カーソルと発見済み書類を
+    定期的に保存し、カーソルより新しい (走査済みの) 日付は再照会しない。
+
     Args:
         edinet_code: EDINETコード
         start_date: 開始日 (YYYY-MM-DD)
         end_date: 終了日 (YYYY-MM-DD)
         limit: 取得件数上限
+        scan_mode: 走査モード (full / deadline / likely、省略時は EDINET_SCAN_MODE)
+        checkpoint: 進捗チェックポイント
 
     Returns:
         書類リスト
@@ -234,22 +287,48 @@ def find_company_documents(
         f"Searching documents for {edinet_code} from {start_date} to {end_date}"
     )
 
-    found_docs = []
-    current_date = datetime.strptime(end_date, "%Y-%m-%d")
-    start = datetime.strptime(start_date, "%Y-%m-%d")
+    if checkpoint is not None and checkpoint.scan_complete:
+        logger.info(f"Scan already completed (checkpoint): {len(checkpoint.found_docs)} documents")
+        return list(checkpoint.found_docs)
+
+    found_docs = list(checkpoint.found_docs) if checkpoint is not None else []
+    plan = plan_scan_dates(
+        datetime.strptime(start_date, "%Y-%m-%d").date(),
+        datetime.strptime(end_date, "%Y-%m-%d").date(),
+        fiscal_year_end_months=[FISCAL_YEAR_END_MONTHS.get(edinet_code, 3)],
+        mode=scan_mode or SCAN_MODE,
+    )
+    logger.info(
+        f"Scan plan ({plan.mode}): {len(plan.dates)} of {plan.total_days} days "
+        f"({plan.skipped_days} skipped)"
+    )
+
+    if checkpoint is not None and checkpoint.cursor:
+        logger.info(f"Resuming scan before {checkpoint.cursor}")
 
     # Search backwards from end_date
-    while current_date >= start and len(found_docs) < limit:
+    scanned_since_save = 0
+    for current_date in plan.dates:
+        if len(found_docs) >= limit:
+            break
         date_str = current_date.strftime("%Y-%m-%d")
+        if checkpoint is not None and checkpoint.is_scanned(date_str):
+            continue
+        found_before = len(found_docs)
+        success = False
 
         try:
-            results = get_documents_list(date_str)
+            with profile_stage("fetch.documents_list"):
+                results = get_documents_list(date_str)
+            success = True
 
             # Filter by company
             for doc in results:
                 if doc.get("edinetCode") == edinet_code:
                     doc_desc = doc.get("docDescription", "")
-                    if "四半期報告書" in doc_desc or "有価証券報告書" in doc_desc:
+                    if any(keyword in doc_desc for keyword in TARGET_DOC_DESCRIPTIONS):
+                        if checkpoint is not None and not checkpoint.add_document(doc):
+                            continue
                         found_docs.append(doc)
                         logger.info(
                             f"Found: {doc.get('docID')} - {doc_desc} "
@@ -262,17 +341,133 @@ def find_company_documents(
         except EDINETAPIError as e:
             logger.warning(f"Error fetching documents for {date_str}: {str(e)}")
 
-        # Move to previous day
-        current_date -= timedelta(days=1)
+        if checkpoint is not None:
+            checkpoint.mark_scanned(date_str, success)
+            scanned_since_save += 1
+            # Save periodically, and immediately whenever new documents were found
+            if scanned_since_save >= CHECKPOINT_INTERVAL or len(found_docs) > found_before:
+                save_checkpoint(checkpoint)
+                scanned_since_save = 0
 
         # Rate limiting: 1 request per second
         time.sleep(1)
 
+    if checkpoint is not None:
+        # Dates that failed stay pending so --resume queries them again
+        checkpoint.scan_complete = len(found_docs) >= limit or not checkpoint.failed_dates
+        if not checkpoint.scan_complete:
+            logger.warning(
+                f"{len(checkpoint.failed_dates)} dates failed; rerun with --resume to retry them"
+            )
+        save_checkpoint(checkpoint)
+
     logger.info(f"Found {len(found_docs)} documents for {edinet_code}")
     return found_docs
 
 
-def fetch_company_data(edinet_code: str, company_name: str, years: int = 10) -> None:
+def log_resolution(resolution: Resolution) -> None:
+    """置き換え判定でスキップした書類と理由をログ出力"""
+    for doc_id, entry in resolution.skipped.items():
+        superseded_by = entry.get("superseded_by")
+        logger.info(
+            f"Skipping {doc_id} ({entry['reason']}"
+            + (f" by {superseded_by})" if superseded_by else ")")
+        )
+    logger.info(f"Supersession: {resolution.summary()}")
+
+
+def cached_document_path(
+    doc: Dict, company_name: str, document_format: str = DOCUMENT_FORMAT
+) -> Optional[Path]:
+    """
+    書類のキャッシュファイルのパス
+
+    Args:
+        doc: 置き換え判定で選ばれた書類 (Resolution.selected)
+        company_name: 企業名 (キャッシュファイル名の接頭辞)
+        document_format: 取得形式 (csv / xbrl)
+
+    Returns:
+        キャッシュファイルのパス (periodEnd が無くキャッシュできない書類は None)
+    """
+    period_end = doc.get("periodEnd")
+    if not period_end:
+        return None
+    suffix = XBRL_ARCHIVE_SUFFIX if document_format == "xbrl" else ".zip"
+    return CACHE_DIR / f"{company_name}_{doc.get('docID')}_{period_end}{suffix}"
+
+
+def download_cached_document(
+    doc: Dict,
+    company_name: str,
+    downloaded: List[str],
+    document_format: str = DOCUMENT_FORMAT,
+) -> bool:
+    """
+    書類をキャッシュへダウンロード (docID のリースを取得できた場合のみ)
+
+    複数ワーカーが同じ data/.cache を共有していても、同じ docID を二重に取得しない。
+
+    Args:
+        doc: 置き換え判定で選ばれた書類 (Resolution.selected、periodEnd が無ければ取得しない)
+        company_name: 企業名 (キャッシュファイル名の接頭辞)
+        downloaded: ダウンロード済みキー (成功時に追加、xbrl 形式は "{docID}.xbrl")
+        document_format: 取得形式 (csv / xbrl)
+
+    Returns:
+        ダウンロードに成功したかどうか (キャッシュ済み・他ワーカーが取得中・失敗なら False)
+    """
+    doc_id: str = doc["docID"]
+    key = f"{doc_id}.xbrl" if document_format == "xbrl" else doc_id
+
+    # The period in the cache filename is what extraction keys on; never cache without one
+    cache_path = cached_document_path(doc, company_name, document_format)
+    if cache_path is None:
+        logger.warning(f"Skipping {doc_id} (no period end; resolve it with SupersessionIndex)")
+        return False
+    cache_filename = cache_path.name
+
+    # Skip if already downloaded
+    if key in downloaded or cache_path.exists():
+        logger.info(f"Skipping {doc_id} (already cached)")
+        return False
+
+    with DocumentLease(key) as lease:
+        if not lease.acquired:
+            logger.info(f"Skipping {doc_id} (leased by another worker)")
+            return False
+
+        # Another worker may have finished it between the check above and the lease
+        if cache_path.exists():
+            logger.info(f"Skipping {doc_id} (already cached)")
+            downloaded.append(key)
+            return False
+
+        try:
+            with profile_stage("fetch.download"):
+                success = download_document(
+                    doc_id, cache_path, doc_type=DOCUMENT_FORMATS[document_format]
+                )
+        except EDINETAPIError as e:
+            logger.error(f"Error downloading {doc_id}: {str(e)}")
+            return False
+
+        if not success:
+            logger.warning(f"Failed to download {doc_id}")
+            return False
+        logger.info(f"Cached: {cache_filename}")
+        downloaded.append(key)
+        return True
+
+
+def fetch_company_data(
+    edinet_code: str,
+    company_name: str,
+    years: int = 10,
+    scan_mode: Optional[str] = None,
+    resume: bool = False,
+    document_format: str = DOCUMENT_FORMAT,
+) -> None:
     """
     企業データを取得してキャッシュに保存
 
@@ -280,60 +475,293 @@ def fetch_company_data(edinet_code: str, company_name: str, years: int = 10) ->
         edinet_code: EDINETコード
         company_name: 企業名 (TEPCO/CHUBU)
         years: 取得年数
+        scan_mode: 走査モード (full / deadline / likely)
+        resume: 前回のチェックポイントから再開
+        document_format: 取得形式 (csv / xbrl)
     """
     logger.info(f"=== Fetching data for {company_name} ({edinet_code}) ===")
 
+    checkpoint = load_checkpoint(edinet_code) if resume else None
+    if checkpoint is not None:
+        logger.info(
+            f"Resuming checkpoint: {checkpoint.start_date} - {checkpoint.end_date} "
+            f"(cursor: {checkpoint.cursor}, {len(checkpoint.found_docs)} found, "
+            f"{len(checkpoint.downloaded)} downloaded)"
+        )
+    else:
+        end = datetime.now()
+        checkpoint = ScanCheckpoint(
+            edinet_code=edinet_code,
+            start_date=(end - timedelta(days=365 * years)).strftime("%Y-%m-%d"),
+            end_date=end.strftime("%Y-%m-%d"),
+            scan_mode=scan_mode or SCAN_MODE,
+            limit=years * 4,  # Quarterly reports
+        )
+        save_checkpoint(checkpoint)
+
     # Search documents
-    docs = find_company_documents(edinet_code, limit=years * 4)  # Quarterly reports
+    docs = find_company_documents(
+        edinet_code,
+        start_date=checkpoint.start_date,
+        end_date=checkpoint.end_date,
+        limit=checkpoint.limit,
+        scan_mode=checkpoint.scan_mode,
+        checkpoint=checkpoint,
+    )
 
     if not docs:
         logger.warning(f"No documents found for {company_name}")
         return
 
+    # Download only the authoritative version per (period, report scope)
+    index = SupersessionIndex()
+    resolution = index.select(docs)
+    index.save()
+    log_resolution(resolution)
+
     # Download each document
-    for doc in docs:
-        doc_id = doc.get("docID")
-        period_end = doc.get("periodEnd", "unknown")
-        doc_desc = doc.get("docDescription", "unknown")
+    for doc in resolution.selected:
+        if download_cached_document(doc, company_name, checkpoint.downloaded, document_format):
+            save_checkpoint(checkpoint)
+            # Rate limiting
+            time.sleep(2)
 
-        # Create cache filename
-        cache_filename = f"{company_name}_{doc_id}_{period_end}.zip"
-        cache_path = CACHE_DIR / cache_filename
+    logger.info(f"=== Completed data fetch for {company_name} ===")
 
-        # Skip if already downloaded
-        if cache_path.exists():
-            logger.info(f"Skipping {doc_id} (already cached)")
-            continue
 
-        # Download
-        try:
-            success = download_document(doc_id, cache_path)
-            if success:
-                logger.info(f"Cached: {cache_filename}")
-            else:
-                logger.warning(f"Failed to download {doc_id}")
+def fetch_shard(
+    shard_index: int,
+    shard_count: int,
+    companies: Optional[Dict[str, str]] = None,
+    years: int = 10,
+    scan_mode: Optional[str] = None,
+    resume: bool = False,
+    global_rate: float = GLOBAL_RATE_LIMIT,
+    document_format: str = DOCUMENT_FORMAT,
+) -> ShardState:
+    """
+    シャード単位で全企業の書類を検索・ダウンロード
 
-        except EDINETAPIError as e:
-            logger.error(f"Error downloading {doc_id}: {str(e)}")
+    走査日はシャード間で重ならないように分配し、各日の書類一覧は全対象企業で共有する。
+    API呼び出し間隔は shard_count / global_rate 秒とし、全ワーカー合計で global_rate を超えない。
 
-        # Rate limiting
-        time.sleep(2)
+    Args:
+        shard_index: 自シャード番号 (0始まり)
+        shard_count: シャード数
+        companies: EDINETコード -> 企業名 (省略時は COMPANIES)
+        years: 取得年数
+        scan_mode: 走査モード (full / deadline / likely)
+        resume: 前回のシャード状態から再開
+        global_rate: 全ワーカー合計のリクエスト数上限 (件/秒)
+        document_format: 取得形式 (csv / xbrl)
 
-    logger.info(f"=== Completed data fetch for {company_name} ===")
+    Returns:
+        シャード状態
+    """
+    companies = companies or COMPANIES
+    interval = shard_count / global_rate
+    logger.info(
+        f"=== Fetching shard {shard_index + 1}/{shard_count} "
+        f"({', '.join(companies.values())}, 1 request per {interval:.1f}s) ==="
+    )
+
+    state = load_shard_state(shard_index, shard_count) if resume else None
+    if state is not None:
+        logger.info(
+            f"Resuming shard state: cursor {state.cursor}, {len(state.found_docs)} found, "
+            f"{len(state.downloaded)} downloaded"
+        )
+    else:
+        end = datetime.now()
+        state = ShardState(
+            shard_index=shard_index,
+            shard_count=shard_count,
+            start_date=(end - timedelta(days=365 * years)).strftime("%Y-%m-%d"),
+            end_date=end.strftime("%Y-%m-%d"),
+            scan_mode=scan_mode or SCAN_MODE,
+        )
+        save_shard_state(state)
+
+    if not state.scan_complete:
+        plan = plan_scan_dates(
+            datetime.strptime(state.start_date, "%Y-%m-%d").date(),
+            datetime.strptime(state.end_date, "%Y-%m-%d").date(),
+            fiscal_year_end_months=[FISCAL_YEAR_END_MONTHS.get(code, 3) for code in companies],
+            mode=state.scan_mode,
+        )
+        dates = select_shard_dates(plan.dates, shard_index, shard_count)
+        logger.info(f"Shard scan plan ({plan.mode}): {len(dates)} of {len(plan.dates)} days")
+
+        scanned_since_save = 0
+        for current_date in dates:
+            date_str = current_date.strftime("%Y-%m-%d")
+            if state.is_scanned(date_str):
+                continue
+            found_before = len(state.found_docs)
+            success = False
+
+            try:
+                with profile_stage("fetch.documents_list"):
+                    results = get_documents_list(date_str)
+                success = True
+
+                for doc in results:
+                    if doc.get("edinetCode") not in companies:
+                        continue
+                    doc_desc = doc.get("docDescription", "")
+                    if any(keyword in doc_desc for keyword in TARGET_DOC_DESCRIPTIONS):
+                        if state.add_document(doc):
+                            logger.info(
+                                f"Found: {doc.get('docID')} - {doc_desc} "
+                                f"(期間: {doc.get('periodEnd')})"
+                            )
+
+            except EDINETAPIError as e:
+                logger.warning(f"Error fetching documents for {date_str}: {str(e)}")
+
+            state.mark_scanned(date_str, success)
+            scanned_since_save += 1
+            if scanned_since_save >= CHECKPOINT_INTERVAL or len(state.found_docs) > found_before:
+                save_shard_state(state)
+                scanned_since_save = 0
+
+            time.sleep(interval)
+
+        # Dates that failed stay pending so --resume queries them again
+        state.scan_complete = not state.failed_dates
+        if not state.scan_complete:
+            logger.warning(
+                f"{len(state.failed_dates)} dates failed; rerun with --resume to retry them"
+            )
+        save_shard_state(state)
+
+    logger.info(f"Shard {shard_index + 1}/{shard_count}: {len(state.found_docs)} documents found")
+
+    # Judge against documents known from earlier runs too; the global index is written on merge
+    resolution = SupersessionIndex().select(state.found_docs)
+    log_resolution(resolution)
+
+    for doc in resolution.selected:
+        company_name = companies.get(doc.get("edinetCode", ""), doc.get("edinetCode", "unknown"))
+        if download_cached_document(doc, company_name, state.downloaded, document_format):
+            save_shard_state(state)
+            time.sleep(interval)
+
+    logger.info(f"=== Completed shard {shard_index + 1}/{shard_count} ===")
+    return state
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """コマンドライン引数を解析"""
+    parser = argparse.ArgumentParser(description="EDINET Data Fetcher")
+    parser.add_argument(
+        "--scan-mode",
+        choices=SCAN_MODES,
+        default=SCAN_MODE,
+        help="書類一覧の走査モード (full: 全日 (既定), deadline: 提出期間の営業日, "
+        "likely: 提出期限前の営業日。期間外に提出された訂正報告書は走査されない)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=tuple(DOCUMENT_FORMATS),
+        default=DOCUMENT_FORMAT,
+        help="取得形式 (csv: type=5 CSV, xbrl: type=1 XBRLインスタンス)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="data/.cache/checkpoints のチェックポイントから再開",
+    )
+    parser.add_argument(
+        "--shard-index",
+        type=int,
+        default=None,
+        help="シャード番号 (0始まり、--shard-count と併用)",
+    )
+    parser.add_argument(
+        "--shard-count",
+        type=int,
+        default=1,
+        help="シャード数 (ワーカー数)",
+    )
+    parser.add_argument(
+        "--global-rate",
+        type=float,
+        default=GLOBAL_RATE_LIMIT,
+        help="全ワーカー合計のAPIリクエスト数上限 (件/秒)",
+    )
+    parser.add_argument(
+        "--merge-shards",
+        action="store_true",
+        help="全シャードの状態を data/.cache/document_index.json に統合して終了",
+    )
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
 
+    if args.shard_count < 1:
+        parser.error("--shard-count must be >= 1")
+    if args.shard_index is not None and not 0 <= args.shard_index < args.shard_count:
+        parser.error("--shard-index must be in [0, --shard-count)")
+    if args.global_rate <= 0:
+        parser.error("--global-rate must be > 0")
+    return args
 
-def main() -> int:
+
+def main(argv: Optional[List[str]] = None) -> int:
     """メイン処理"""
+    args = parse_args(argv)
+    configure_profiling(args.profile, "fetch", args.profile_interval)
+
     logger.info("=" * 80)
     logger.info("EDINET Data Fetcher")
     logger.info("=" * 80)
 
     try:
+        if args.merge_shards:
+            index = merge_shard_states(args.shard_count)
+            logger.info(f"Merged {len(index['documents'])} documents into the document index")
+            supersession = SupersessionIndex()
+            supersession.update(list(index["documents"].values()))
+            supersession.save()
+            logger.info(f"Supersession: {supersession.resolution.summary()}")
+            if index["incomplete_shards"]:
+                logger.warning(f"Incomplete shards: {index['incomplete_shards']}")
+                return 1
+            return 0
+
+        if args.shard_index is not None:
+            fetch_shard(
+                args.shard_index,
+                args.shard_count,
+                scan_mode=args.scan_mode,
+                resume=args.resume,
+                global_rate=args.global_rate,
+                document_format=args.format,
+            )
+            logger.info("=" * 80)
+            logger.info("✓ Shard fetch completed successfully")
+            logger.info("=" * 80)
+            return 0
+
         # Fetch TEPCO data
-        fetch_company_data(TEPCO_CODE, "TEPCO", years=10)
+        fetch_company_data(
+            TEPCO_CODE,
+            "TEPCO",
+            years=10,
+            scan_mode=args.scan_mode,
+            resume=args.resume,
+            document_format=args.format,
+        )
 
         # Fetch CHUBU data
-        fetch_company_data(CHUBU_CODE, "CHUBU", years=10)
+        fetch_company_data(
+            CHUBU_CODE,
+            "CHUBU",
+            years=10,
+            scan_mode=args.scan_mode,
+            resume=args.resume,
+            document_format=args.format,
+        )
 
         logger.info("=" * 80)
         logger.info("✓ Data fetch completed successfully")
@@ -344,6 +772,11 @@ def main() -> int:
         logger.error(f"Fatal error: {str(e)}", exc_info=True)
         return 1
 
+    finally:
+        report_dir = write_profile_reports()
+        if report_dir:
+            logger.info(f"Profile reports written to: {report_dir}")
+
 
 if __name__ == "__main__":
     sys.exit(main())
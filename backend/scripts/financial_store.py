@@ -0,0 +1,428 @@
+"""
+型付き列指向の財務データストア
+(company, period) を行キーとし、項目ごとの NumPy 配列と欠損マスクで保持する。
+参照API (query_api) が財務諸表CSVから読み込み、企業・期間・項目での絞り込みに使う
+"""
+
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from panel import (
+    FINANCIALS_DIR,
+    KEY_FIELDS,
+    NUMERIC_FIELDS,
+    STATEMENT_FIELDS,
+    load_panel,
+    ordinal_to_period,
+    period_to_ordinal,
+)
+
+# Row key: company index in the high 32 bits, quarter ordinal in the low 32 bits
+_KEY_SHIFT = np.int64(32)
+
+
+def _row_keys(company_idx: np.ndarray, ordinal: np.ndarray) -> np.ndarray:
+    return (company_idx.astype(np.int64) << _KEY_SHIFT) | ordinal.astype(np.int64)
+
+
+def _period_ordinal(period: Union[str, int]) -> int:
+    if isinstance(period, (int, np.integer)):
+        return int(period)
+    return int(period_to_ordinal(pd.Series([period]))[0])
+
+
+def _period_ordinals(periods: Sequence[Union[str, int]]) -> np.ndarray:
+    periods = list(periods)
+    if all(isinstance(p, (int, np.integer)) for p in periods):
+        return np.asarray(periods, dtype=np.int64)
+    return period_to_ordinal(pd.Series([str(p) for p in periods])).astype(np.int64)
+
+
+class FinancialStore:
+    """
+    財務データストア
+
+    行は (company, ordinal) でソート済み・一意。値は float64、欠損は mask=False (値は NaN)。
+
+    Attributes:
+        companies: 企業コード (ソート済み、行の company_idx が参照)
+        company_idx: 行ごとの企業インデックス (int32)
+        ordinal: 行ごとの四半期番号 year * 4 + (quarter - 1) (int32)
+        date: 行ごとの期末日 (文字列、不明は "")
+        values: 項目 -> 値配列 (float64)
+        mask: 項目 -> 値の有無 (bool)
+    """
+
+    def __init__(
+        self,
+        companies: np.ndarray,
+        company_idx: np.ndarray,
+        ordinal: np.ndarray,
+        date: np.ndarray,
+        values: Dict[str, np.ndarray],
+        mask: Optional[Dict[str, np.ndarray]] = None,
+    ) -> None:
+        self.companies = np.asarray(companies, dtype=str)
+        self.company_idx = np.asarray(company_idx, dtype=np.int32)
+        self.ordinal = np.asarray(ordinal, dtype=np.int32)
+        self.date = np.asarray(date, dtype=str)
+        self.values = {f: np.asarray(v, dtype=np.float64) for f, v in values.items()}
+        if mask is None:
+            mask = {f: ~np.isnan(v) for f, v in self.values.items()}
+        self.mask = {f: np.asarray(m, dtype=bool) for f, m in mask.items()}
+        self._keys = _row_keys(self.company_idx, self.ordinal)
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def empty(cls, fields: Sequence[str] = NUMERIC_FIELDS) -> "FinancialStore":
+        return cls(
+            np.array([], dtype=str),
+            np.array([], dtype=np.int32),
+            np.array([], dtype=np.int32),
+            np.array([], dtype=str),
+            {f: np.array([], dtype=np.float64) for f in fields},
+        )
+
+    @classmethod
+    def _from_columns(
+        cls,
+        company: np.ndarray,
+        ordinal: np.ndarray,
+        date: np.ndarray,
+        values: Dict[str, np.ndarray],
+    ) -> "FinancialStore":
+        """
+        未ソート・重複ありの列から作成
+
+        同じ (company, period) の行は項目ごとに後の行の値を優先し、欠損は前の行で補う。
+        """
+        if len(company) == 0:
+            return cls.empty(list(values))
+
+        companies, company_idx = np.unique(company.astype(str), return_inverse=True)
+        keys = _row_keys(company_idx, ordinal)
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        rows = np.arange(len(keys))
+
+        def last_present(present: np.ndarray) -> np.ndarray:
+            # Index (in sorted order) of the last present value in each key group, -1 if none
+            return np.maximum.reduceat(np.where(present, rows, -1), starts)
+
+        merged: Dict[str, np.ndarray] = {}
+        for name, column in values.items():
+            column = column.astype(np.float64)[order]
+            last = last_present(~np.isnan(column))
+            merged[name] = np.where(last >= 0, column[np.maximum(last, 0)], np.nan)
+
+        date = date.astype(str)[order]
+        last_date = last_present(date != "")
+        dates = np.where(last_date >= 0, date[np.maximum(last_date, 0)], "")
+
+        first = order[starts]
+        return cls(companies, company_idx[first], ordinal[first], dates, merged)
+
+    @classmethod
+    def from_records(
+        cls,
+        records: Iterable[Dict[str, Any]],
+        fields: Sequence[str] = NUMERIC_FIELDS,
+    ) -> "FinancialStore":
+        """
+        抽出結果 (1 CSV = 1 辞書) から作成
+
+        Args:
+            records: company, period, date と項目値を持つ辞書
+            fields: 保持する項目
+
+        Returns:
+            ストア (同じ期間の複数行は統合済み)
+        """
+        records = list(records)
+        company = np.array([r["company"] for r in records], dtype=str)
+        periods = pd.Series([r["period"] for r in records], dtype=str)
+        ordinal = period_to_ordinal(periods) if len(records) else np.array([], dtype=int)
+        date = np.array([r.get("date") or "" for r in records], dtype=str)
+        values = {
+            f: np.array([np.nan if r.get(f) is None else r[f] for r in records], dtype=np.float64)
+            for f in fields
+        }
+        return cls._from_columns(company, ordinal, date, values)
+
+    @classmethod
+    def from_frame(
+        cls, frame: pd.DataFrame, fields: Optional[Sequence[str]] = None
+    ) -> "FinancialStore":
+        """load_panel 形式の DataFrame から作成"""
+        if fields is None:
+            fields = [f for f in NUMERIC_FIELDS if f in frame.columns]
+        if frame.empty:
+            return cls.empty(fields)
+        ordinal = (
+            frame["ordinal"].to_numpy()
+            if "ordinal" in frame.columns
+            else period_to_ordinal(frame["period"])
+        )
+        date = frame["date"].fillna("").astype(str).to_numpy() if "date" in frame else None
+        return cls._from_columns(
+            frame["company"].to_numpy(dtype=str),
+            ordinal,
+            date if date is not None else np.full(len(frame), "", dtype=str),
+            {f: frame[f].to_numpy(dtype=np.float64) for f in fields},
+        )
+
+    @classmethod
+    def load_csv(
+        cls,
+        companies: Optional[Sequence[str]] = None,
+        directory: Path = FINANCIALS_DIR,
+    ) -> "FinancialStore":
+        """公開済みの財務諸表CSVから作成"""
+        return cls.from_frame(load_panel(companies, directory))
+
+    # ------------------------------------------------------------------
+    # Shape and lookup
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.ordinal)
+
+    def __repr__(self) -> str:
+        return (
+            f"FinancialStore({len(self.companies)} companies, {len(self)} rows, "
+            f"{len(self.fields)} fields)"
+        )
+
+    @property
+    def fields(self) -> List[str]:
+        return list(self.values)
+
+    @property
+    def company(self) -> np.ndarray:
+        """行ごとの企業コード"""
+        return self.companies[self.company_idx]
+
+    @property
+    def period(self) -> List[str]:
+        """行ごとの期間ラベル"""
+        return ordinal_to_period(self.ordinal)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.company_idx, self.ordinal, self.date, *self.values.values()]
+        return sum(a.nbytes for a in arrays) + sum(m.nbytes for m in self.mask.values())
+
+    def locate(self, companies: Sequence[str], periods: Sequence[Union[str, int]]) -> np.ndarray:
+        """
+        (company, period) の組に対応する行番号 (ベクトル化)
+
+        Returns:
+            行番号配列 (存在しない組は -1)
+        """
+        names = np.asarray(companies, dtype=str)
+        ordinals = _period_ordinals(periods)
+        if len(self.companies) == 0:
+            return np.full(len(names), -1, dtype=np.int64)
+
+        company_pos = np.searchsorted(self.companies, names)
+        company_pos = np.minimum(company_pos, len(self.companies) - 1)
+        known = self.companies[company_pos] == names
+        keys = _row_keys(company_pos, ordinals)
+        rows = np.minimum(np.searchsorted(self._keys, keys), max(len(self) - 1, 0))
+        found = known & (len(self) > 0) & (self._keys[rows] == keys)
+        return np.where(found, rows, -1)
+
+    def get(self, company: str, period: Union[str, int], field: str) -> Optional[float]:
+        """1セルの値 (行・値が無ければ None)"""
+        row = int(self.locate([company], [period])[0])
+        if row < 0 or field not in self.values or not self.mask[field][row]:
+            return None
+        return float(self.values[field][row])
+
+    # ------------------------------------------------------------------
+    # Slicing
+    # ------------------------------------------------------------------
+
+    def take(self, rows: np.ndarray, fields: Optional[Sequence[str]] = None) -> "FinancialStore":
+        """行 (インデックスまたはブール配列) と項目を選択した新しいストア"""
+        fields = self.fields if fields is None else list(fields)
+        company_idx = self.company_idx[rows]
+        used, remapped = np.unique(company_idx, return_inverse=True)
+        return FinancialStore(
+            self.companies[used],
+            remapped,
+            self.ordinal[rows],
+            self.date[rows],
+            {f: self.values[f][rows] for f in fields},
+            {f: self.mask[f][rows] for f in fields},
+        )
+
+    def select_companies(self, *companies: str) -> "FinancialStore":
+        """企業で絞り込み"""
+        wanted = np.isin(self.companies, companies)
+        return self.take(wanted[self.company_idx])
+
+    def period_range(
+        self,
+        start: Optional[Union[str, int]] = None,
+        end: Optional[Union[str, int]] = None,
+    ) -> "FinancialStore":
+        """期間 [start, end] で絞り込み (両端を含む)"""
+        keep = np.ones(len(self), dtype=bool)
+        if start is not None:
+            keep &= self.ordinal >= _period_ordinal(start)
+        if end is not None:
+            keep &= self.ordinal <= _period_ordinal(end)
+        return self.take(keep)
+
+    def statement(self, statement: str) -> "FinancialStore":
+        """1諸表 (pl / bs / cf) の項目と、その諸表に値がある行だけを抽出"""
+        fields = [f for f in STATEMENT_FIELDS[statement] if f in self.values]
+        if not fields:
+            return self.take(np.zeros(len(self), dtype=bool), fields)
+        has_value = np.logical_or.reduce([self.mask[f] for f in fields])
+        return self.take(has_value, fields)
+
+    # ------------------------------------------------------------------
+    # Joins
+    # ------------------------------------------------------------------
+
+    def join(self, other: "FinancialStore", how: str = "outer") -> "FinancialStore":
+        """
+        (company, period) での結合 (PL/BS/CF の横結合など)
+
+        同じ項目が両方にある場合は other の値を優先し、other で欠損なら self の値を残す。
+
+        Args:
+            other: 結合するストア
+            how: "outer" (和集合) / "inner" (積集合) / "left" (self の行)
+
+        Returns:
+            結合後のストア
+        """
+        if how not in ("outer", "inner", "left"):
+            raise ValueError(f"Unknown join type: {how}")
+
+        companies = np.union1d(self.companies, other.companies)
+        left_keys = _row_keys(np.searchsorted(companies, self.company), self.ordinal)
+        right_keys = _row_keys(np.searchsorted(companies, other.company), other.ordinal)
+
+        if how == "outer":
+            keys = np.union1d(left_keys, right_keys)
+        elif how == "inner":
+            keys = np.intersect1d(left_keys, right_keys)
+        else:
+            keys = left_keys
+
+        def positions(source: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+            # Source keys are sorted and unique: map each output key to a source row
+            if len(source) == 0:
+                return np.zeros(len(keys), dtype=np.int64), np.zeros(len(keys), dtype=bool)
+            pos = np.minimum(np.searchsorted(source, keys), len(source) - 1)
+            return pos, source[pos] == keys
+
+        left_pos, in_left = positions(left_keys)
+        right_pos, in_right = positions(right_keys)
+
+        values: Dict[str, np.ndarray] = {}
+        mask: Dict[str, np.ndarray] = {}
+        for f in dict.fromkeys(self.fields + other.fields):
+            column = np.full(len(keys), np.nan)
+            present = np.zeros(len(keys), dtype=bool)
+            for store, pos, hit in ((self, left_pos, in_left), (other, right_pos, in_right)):
+                if f not in store.values or len(store) == 0:
+                    continue
+                take = hit & store.mask[f][pos]
+                column[take] = store.values[f][pos[take]]
+                present |= take
+            values[f] = column
+            mask[f] = present
+
+        date = np.full(len(keys), "", dtype=object)
+        for store, pos, hit in ((self, left_pos, in_left), (other, right_pos, in_right)):
+            if len(store):
+                take = hit & (store.date[pos] != "")
+                date[take] = store.date[pos[take]]
+
+        company_idx = (keys >> _KEY_SHIFT).astype(np.int32)
+        used, remapped = np.unique(company_idx, return_inverse=True)
+        return FinancialStore(
+            companies[used],
+            remapped,
+            (keys & 0xFFFFFFFF).astype(np.int32),
+            date.astype(str),
+            values,
+            mask,
+        )
+
+    # ------------------------------------------------------------------
+    # Conversion
+    # ------------------------------------------------------------------
+
+    def to_frame(self) -> pd.DataFrame:
+        """load_panel と同じ列構成の DataFrame"""
+        frame = pd.DataFrame(
+            {
+                "company": self.company,
+                "period": self.period,
+                "date": np.where(self.date == "", np.array(None, dtype=object), self.date),
+                "ordinal": self.ordinal.astype(int),
+            }
+        )
+        for f in NUMERIC_FIELDS:
+            frame[f] = self.values[f] if f in self.values else np.nan
+        for f in self.fields:
+            if f not in NUMERIC_FIELDS:
+                frame[f] = self.values[f]
+        return frame
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """company, period, date と値のある項目だけを持つ辞書のリスト"""
+        periods = self.period
+        company = self.company
+        records: List[Dict[str, Any]] = []
+        for row in range(len(self)):
+            record: Dict[str, Any] = {
+                KEY_FIELDS[0]: str(company[row]),
+                KEY_FIELDS[1]: periods[row],
+                KEY_FIELDS[2]: str(self.date[row]) or None,
+            }
+            for f in self.fields:
+                if self.mask[f][row]:
+                    record[f] = float(self.values[f][row])
+            records.append(record)
+        return records
+
+    def to_grid(
+        self, fields: Sequence[str] = NUMERIC_FIELDS
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """panel.to_grid と同じ (companies, ordinals, grid) 形式に展開"""
+        if len(self) == 0:
+            return (
+                np.array([], dtype=object),
+                np.array([], dtype=int),
+                np.empty((0, 0, len(fields))),
+            )
+        start = int(self.ordinal.min())
+        ordinals = np.arange(start, int(self.ordinal.max()) + 1)
+        grid = np.full((len(self.companies), len(ordinals), len(fields)), np.nan)
+        offset = self.ordinal - start
+        for i, f in enumerate(fields):
+            if f in self.values:
+                grid[self.company_idx, offset, i] = self.values[f]
+        return self.companies, ordinals, grid
+
+
+def concat_stores(stores: Sequence[FinancialStore]) -> FinancialStore:
+    """複数ストア (企業別など) を1つに結合"""
+    result = FinancialStore.empty()
+    for store in stores:
+        result = result.join(store)
+    return result
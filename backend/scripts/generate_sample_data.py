@@ -9,7 +9,7 @@ from datetime import datetime, timedelta
 from pathlib import Path
 
 
-def generate_sample_data():
+def generate_sample_data() -> None:
     """Generate sample quarterly financial data"""
     # Create output directories
     data_dir = Path(__file__).parent.parent / 'data' / 'financials'
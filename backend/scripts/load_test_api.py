@@ -0,0 +1,212 @@
+"""
+ローカル参照APIの負荷試験
+同時接続クライアント数 (既定100) で代表的なクエリを発行し、p50 / p95 / p99 レイテンシを計測する。
+spec の SC-005 (同時100ユーザーで応答500ms以下) を p99 で判定する
+"""
+
+import argparse
+import http.client
+import json
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from panel import DATA_DIR
+from query_api import create_server
+
+# SC-005: response time under 500ms with 100 concurrent users
+TARGET_LATENCY_MS = 500.0
+DEFAULT_CLIENTS = 100
+DEFAULT_REQUESTS_PER_CLIENT = 50
+
+# Representative query mix (path, weight)
+QUERY_MIX: List[Tuple[str, int]] = [
+    ("/v1/financials?fields=revenue&from=2020Q1&to=2024Q4", 4),
+    ("/v1/financials?company=TEPCO&statement=pl&format=columnar", 3),
+    ("/v1/financials?company=CHUBU&from=2018Q1", 2),
+    ("/v1/metrics?fields=revenue_yoy,operating_margin&from=2020Q1", 3),
+    ("/v1/metrics?company=TEPCO&format=columnar", 2),
+    ("/v1/health_scores?from=2022Q1", 2),
+    ("/v1/notes?category=risk", 1),
+]
+
+
+@dataclass
+class ClientResult:
+    """1クライアント分の計測結果"""
+
+    latencies_ms: List[float] = field(default_factory=list)
+    statuses: Dict[int, int] = field(default_factory=dict)
+    errors: List[str] = field(default_factory=list)
+
+
+def _weighted_paths() -> List[str]:
+    return [path for path, weight in QUERY_MIX for _ in range(weight)]
+
+
+def run_client(
+    host: str,
+    port: int,
+    requests: int,
+    offset: int,
+    conditional: bool,
+    start: threading.Barrier,
+    result: ClientResult,
+) -> None:
+    """keep-alive 接続1本で requests 件のリクエストを順に送る"""
+    paths = _weighted_paths()
+    etags: Dict[str, str] = {}
+    connection = http.client.HTTPConnection(host, port, timeout=30)
+    start.wait()
+    for i in range(requests):
+        path = paths[(offset + i) % len(paths)]
+        headers = {"If-None-Match": etags[path]} if conditional and path in etags else {}
+        began = time.perf_counter()
+        try:
+            connection.request("GET", path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException) as e:
+            result.errors.append(f"{path}: {e}")
+            connection.close()
+            connection = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        result.latencies_ms.append((time.perf_counter() - began) * 1000.0)
+        result.statuses[response.status] = result.statuses.get(response.status, 0) + 1
+        etag = response.getheader("ETag")
+        if etag:
+            etags[path] = etag
+    connection.close()
+
+
+def run_load_test(
+    host: str,
+    port: int,
+    clients: int = DEFAULT_CLIENTS,
+    requests_per_client: int = DEFAULT_REQUESTS_PER_CLIENT,
+    conditional: bool = False,
+) -> Dict[str, object]:
+    """
+    負荷試験を実行
+
+    Args:
+        host: 接続先ホスト
+        port: 接続先ポート
+        clients: 同時接続クライアント数
+        requests_per_client: クライアントごとのリクエスト数
+        conditional: 2回目以降の同一クエリで If-None-Match を送る
+
+    Returns:
+        集計結果 (レイテンシ分位点・スループット・ステータス内訳)
+    """
+    results = [ClientResult() for _ in range(clients)]
+    barrier = threading.Barrier(clients + 1)
+    threads = [
+        threading.Thread(
+            target=run_client,
+            args=(host, port, requests_per_client, i, conditional, barrier, results[i]),
+            daemon=True,
+        )
+        for i in range(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    began = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+
+    latencies = np.array([ms for r in results for ms in r.latencies_ms])
+    statuses: Dict[int, int] = {}
+    for r in results:
+        for status, count in r.statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+    errors = [e for r in results for e in r.errors]
+
+    summary: Dict[str, object] = {
+        "clients": clients,
+        "requests": int(latencies.size),
+        "errors": len(errors),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(latencies.size / elapsed, 1) if elapsed else None,
+        "statuses": dict(sorted(statuses.items())),
+        "failed_responses": sum(count for status, count in statuses.items() if status >= 400),
+    }
+    if latencies.size:
+        for name, q in (("p50_ms", 50), ("p95_ms", 95), ("p99_ms", 99)):
+            summary[name] = round(float(np.percentile(latencies, q)), 2)
+        summary["max_ms"] = round(float(latencies.max()), 2)
+    if errors:
+        summary["error_samples"] = errors[:5]
+    return summary
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """コマンドライン引数を解析"""
+    parser = argparse.ArgumentParser(description="Query API load test")
+    parser.add_argument(
+        "--url",
+        default=None,
+        help="計測対象 (例: http://127.0.0.1:8765)。省略時はプロセス内でサーバを起動",
+    )
+    parser.add_argument("--clients", type=int, default=DEFAULT_CLIENTS, help="同時接続数")
+    parser.add_argument(
+        "--requests",
+        type=int,
+        default=DEFAULT_REQUESTS_PER_CLIENT,
+        help="クライアントごとのリクエスト数",
+    )
+    parser.add_argument(
+        "--conditional",
+        action="store_true",
+        help="取得済みの ETag で If-None-Match を送る (304 応答の計測)",
+    )
+    parser.add_argument(
+        "--target-ms", type=float, default=TARGET_LATENCY_MS, help="p99 の目標値 (ms)"
+    )
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR, help="データディレクトリ")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """メイン処理 (p99 が目標値を超えたら 1 を返す)"""
+    args = parse_args(argv)
+
+    server = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname or "127.0.0.1", url.port or 80
+    else:
+        server = create_server("127.0.0.1", 0, args.data_dir)
+        host, port = "127.0.0.1", server.server_address[1]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        summary = run_load_test(host, port, args.clients, args.requests, args.conditional)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    summary["target_p99_ms"] = args.target_ms
+    p99 = summary.get("p99_ms")
+    passed = (
+        isinstance(p99, float)
+        and p99 <= args.target_ms
+        and not summary["errors"]
+        and not summary["failed_responses"]
+    )
+    summary["passed"] = passed
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
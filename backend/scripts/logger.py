@@ -1,16 +1,111 @@
 """
 Logging infrastructure for FinSight backend scripts
 Provides standardized logging configuration with file and console handlers
+
+Handlers can run behind a QueueHandler/QueueListener pair so that formatting and
+file I/O happen on a background thread instead of the caller's hot loop.
 """
 
+import atexit
+import copy
 import logging
+import logging.handlers
+import os
+import queue
 import sys
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional
+
+# Log directory (FINSIGHT_LOG_DIR redirects it, e.g. for tests)
+LOG_DIR = Path(os.getenv("FINSIGHT_LOG_DIR", str(Path(__file__).parent.parent.parent / "logs")))
+LOG_DIR.mkdir(parents=True, exist_ok=True)
+
+# Defaults (overridable via environment)
+LOG_ASYNC = os.getenv("FINSIGHT_LOG_ASYNC", "1") == "1"
+LOG_ROTATION = os.getenv("FINSIGHT_LOG_ROTATION", "size")  # size / time / none
+LOG_MAX_BYTES = int(os.getenv("FINSIGHT_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("FINSIGHT_LOG_BACKUP_COUNT", "5"))
+LOG_ROTATE_WHEN = os.getenv("FINSIGHT_LOG_ROTATE_WHEN", "midnight")
+
+# Active queue listeners keyed by logger name
+_listeners: Dict[str, logging.handlers.QueueListener] = {}
+
+
+def _create_file_handler(
+    log_path: Path,
+    rotation: str,
+    max_bytes: int,
+    backup_count: int,
+    when: str,
+) -> logging.Handler:
+    """
+    Create file handler for the requested rotation policy
+
+    Args:
+        log_path: Log file path
+        rotation: "size", "time" or "none"
+        max_bytes: Max file size before rollover (size rotation)
+        backup_count: Number of rotated files to keep
+        when: Rollover interval (time rotation, e.g. "midnight", "H")
+
+    Returns:
+        File handler instance
+    """
+    if rotation == "size":
+        return logging.handlers.RotatingFileHandler(
+            log_path,
+            maxBytes=max_bytes,
+            backupCount=backup_count,
+            encoding="utf-8",
+        )
+    if rotation == "time":
+        return logging.handlers.TimedRotatingFileHandler(
+            log_path,
+            when=when,
+            backupCount=backup_count,
+            encoding="utf-8",
+        )
+    if rotation == "none":
+        return logging.FileHandler(log_path, encoding="utf-8")
+    raise ValueError(f"Unknown log rotation mode: {rotation} (expected size, time or none)")
+
+
+def _stop_listener(name: str) -> None:
+    """Stop and discard the queue listener attached to a logger"""
+    listener = _listeners.pop(name, None)
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+def shutdown_logging() -> None:
+    """
+    Flush and stop all queue listeners
+
+    Registered with atexit, so queued records are written before the process exits.
+    """
+    for name in list(_listeners):
+        _stop_listener(name)
+
+
+atexit.register(shutdown_logging)
 
-# Log directory
-LOG_DIR = Path(__file__).parent.parent.parent / "logs"
-LOG_DIR.mkdir(exist_ok=True)
+
+class _DeferredFormatQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener's handlers
+
+    The stock prepare() formats the record on the caller's thread. Only the message
+    arguments are merged here (they may be mutated after the call returns); exc_info is
+    kept so the listener's formatter renders the traceback.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
 
 
 def setup_logger(
@@ -18,6 +113,11 @@ def setup_logger(
     level: int = logging.INFO,
     log_file: Optional[str] = None,
     console: bool = True,
+    async_mode: Optional[bool] = None,
+    rotation: Optional[str] = None,
+    max_bytes: Optional[int] = None,
+    backup_count: Optional[int] = None,
+    when: Optional[str] = None,
 ) -> logging.Logger:
     """
     Setup logger with file and console handlers
@@ -27,15 +127,30 @@ def setup_logger(
         level: Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
         log_file: Optional log file name (will be created in logs/ directory)
         console: Enable console output
+        async_mode: Route records through a queue to a background listener
+            (default: FINSIGHT_LOG_ASYNC)
+        rotation: File rotation mode "size", "time" or "none"
+            (default: FINSIGHT_LOG_ROTATION)
+        max_bytes: Max log file size for size rotation (default: FINSIGHT_LOG_MAX_BYTES)
+        backup_count: Rotated files to keep (default: FINSIGHT_LOG_BACKUP_COUNT)
+        when: Rollover interval for time rotation (default: FINSIGHT_LOG_ROTATE_WHEN)
 
     Returns:
         Configured logger instance
     """
+    async_mode = LOG_ASYNC if async_mode is None else async_mode
+    rotation = rotation or LOG_ROTATION
+    max_bytes = LOG_MAX_BYTES if max_bytes is None else max_bytes
+    backup_count = LOG_BACKUP_COUNT if backup_count is None else backup_count
+    when = when or LOG_ROTATE_WHEN
+
     logger = logging.getLogger(name)
     logger.setLevel(level)
 
-    # Remove existing handlers to avoid duplicates
+    # Remove existing handlers (and listener) to avoid duplicates
+    _stop_listener(name)
     logger.handlers = []
+    handlers: List[logging.Handler] = []
 
     # Create formatter
     formatter = logging.Formatter(
@@ -48,15 +163,26 @@ def setup_logger(
         console_handler = logging.StreamHandler(sys.stdout)
         console_handler.setLevel(level)
         console_handler.setFormatter(formatter)
-        logger.addHandler(console_handler)
+        handlers.append(console_handler)
 
     # File handler
     if log_file:
         log_path = LOG_DIR / log_file
-        file_handler = logging.FileHandler(log_path, encoding="utf-8")
+        file_handler = _create_file_handler(log_path, rotation, max_bytes, backup_count, when)
         file_handler.setLevel(level)
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
+
+    if async_mode and handlers:
+        # Caller only enqueues the record; the listener thread formats and writes it
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        logger.addHandler(_DeferredFormatQueueHandler(log_queue))
+        listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        listener.start()
+        _listeners[name] = listener
+    else:
+        for handler in handlers:
+            logger.addHandler(handler)
 
     return logger
 
@@ -105,6 +231,16 @@ def get_data_logger() -> logging.Logger:
     )
 
 
+def get_api_logger() -> logging.Logger:
+    """Get logger for the local query API"""
+    return setup_logger(
+        "finsight.api",
+        level=logging.INFO,
+        log_file="query_api.log",
+        console=True,
+    )
+
+
 # Example usage
 if __name__ == "__main__":
     # Test logging
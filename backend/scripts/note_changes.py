@@ -0,0 +1,493 @@
+"""
+注記段落の期間比較による変更検知 (会計方針の変更検知)
+各段落の MinHash 署名を LSH バンドで (企業, セクション) ごとに索引し、前期の段落と
+近似一致させることで、新規・削除・大幅な書き換えを段落数に対してほぼ線形の時間で検出する。
+検出結果は category=policy_change の注記として xbrl_notes.json に書き戻す
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+import time
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from logger import get_nlp_logger
+from notes_index import NOTES_PATH, normalize_text
+from panel import CACHE_DIR
+from publisher import write_if_changed
+
+# Logger
+logger = get_nlp_logger()
+
+# Signature cache (paragraph digest -> MinHash signature)
+FINGERPRINT_CACHE_PATH = CACHE_DIR / "note_fingerprints.npz"
+
+# MinHash / LSH parameters: 32 bands x 4 rows puts the candidate threshold near Jaccard 0.42
+NUM_PERM = 128
+LSH_BANDS = 32
+LSH_ROWS = NUM_PERM // LSH_BANDS
+SHINGLE_SIZE = 3
+MINHASH_SEED = 20240601
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+# Estimated Jaccard similarity: >= UNCHANGED is the same paragraph with minor edits,
+# >= REWRITTEN is the same paragraph materially rewritten, below it the paragraphs are unrelated
+UNCHANGED_THRESHOLD = 0.85
+REWRITTEN_THRESHOLD = 0.4
+
+# Sections with at most this many paragraph pairs are compared exhaustively (no LSH misses)
+EXHAUSTIVE_PAIRS = 1024
+
+# Paragraphs shorter than this (headings, page furniture) are ignored
+MIN_PARAGRAPH_CHARS = 12
+
+# Marker for notes written by this stage (replaced on every run, never used as input)
+CHANGE_SOURCE = "note_changes"
+CHANGE_TYPES = ("new", "removed", "rewritten")
+CHANGE_SEVERITY = {"new": 0.6, "removed": 0.5}
+MAX_NOTE_TEXT = 10000
+
+# Current-period paragraphs timed in the all-pairs benchmark baseline
+PAIRWISE_SAMPLE = 2000
+
+
+@dataclass
+class Paragraph:
+    """注記の1段落"""
+
+    company: str
+    section: str
+    period: str
+    doc_id: str
+    text: str
+    keywords: List[str]
+    digest: str = ""
+    signature: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.uint64))
+
+
+@dataclass
+class NoteChange:
+    """検出した段落の変更"""
+
+    change_type: str  # new / removed / rewritten
+    company: str
+    section: str
+    period: str
+    previous_period: str
+    current: Optional[Paragraph]
+    previous: Optional[Paragraph]
+    similarity: Optional[float] = None
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """注記本文を段落 (改行区切り) に分割し、短すぎる行を除く"""
+    lines = (line.strip() for line in str(text).splitlines())
+    return [line for line in lines if len(line) >= MIN_PARAGRAPH_CHARS]
+
+
+def paragraph_digest(text: str) -> str:
+    """正規化した段落テキストのハッシュ (完全一致の判定とキャッシュキー)"""
+    normalized = "".join(normalize_text(text).split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+def shingle_hashes(text: str, size: int = SHINGLE_SIZE) -> np.ndarray:
+    """空白を除いて正規化したテキストの文字 n-gram を 32bit ハッシュした配列"""
+    normalized = "".join(normalize_text(text).split())
+    if len(normalized) <= size:
+        grams = {normalized}
+    else:
+        grams = {normalized[i : i + size] for i in range(len(normalized) - size + 1)}
+    return np.fromiter(
+        (zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams)
+    )
+
+
+class MinHasher:
+    """
+    MinHash 署名の計算 (ハッシュ族 (a * x + b) mod p を配列演算で一括適用)
+
+    同じ段落の署名は digest をキーにキャッシュし、前回実行分はファイルから再利用する。
+    """
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = MINHASH_SEED):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        # a, b < 2^29 and x < 2^32 keep a * x + b below 2^64
+        self.a = rng.integers(1, 1 << 29, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 29, size=num_perm, dtype=np.uint64)
+        self.cache: Dict[str, np.ndarray] = {}
+        self.used: Set[str] = set()
+        self.computed = 0
+
+    def signature(self, text: str, digest: Optional[str] = None) -> np.ndarray:
+        """段落の MinHash 署名 (uint64 × num_perm)"""
+        key = digest or paragraph_digest(text)
+        self.used.add(key)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        shingles = shingle_hashes(text)
+        hashed = (np.outer(self.a, shingles) + self.b[:, None]) % np.uint64(MERSENNE_PRIME)
+        signature: np.ndarray = (hashed & np.uint64(MAX_HASH)).min(axis=1)
+        self.cache[key] = signature
+        self.computed += 1
+        return signature
+
+    def load(self, path: Path = FINGERPRINT_CACHE_PATH) -> None:
+        """署名キャッシュを読み込む (パラメータが違う場合は使わない)"""
+        if not path.exists():
+            return
+        with np.load(path, allow_pickle=False) as data:
+            if data["signatures"].shape[1:] != (self.num_perm,) or not np.array_equal(
+                data["a"], self.a
+            ):
+                return
+            self.cache.update(zip(data["digests"].tolist(), data["signatures"]))
+
+    def save(self, path: Path = FINGERPRINT_CACHE_PATH) -> None:
+        """今回使った段落の署名だけをキャッシュに保存"""
+        digests = sorted(self.used & set(self.cache))
+        signatures = (
+            np.stack([self.cache[d] for d in digests])
+            if digests
+            else np.empty((0, self.num_perm), dtype=np.uint64)
+        )
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.stem}.tmp.npz")
+        np.savez_compressed(tmp, digests=np.array(digests), signatures=signatures, a=self.a)
+        tmp.replace(path)
+
+
+def estimate_similarity(left: np.ndarray, right: np.ndarray) -> float:
+    """署名の一致率 (Jaccard 係数の推定値)"""
+    return float(np.mean(left == right))
+
+
+def band_keys(signature: np.ndarray) -> List[bytes]:
+    """LSH バンドごとのバケットキー (バンド番号 + 行の値)"""
+    rows = signature.reshape(LSH_BANDS, LSH_ROWS)
+    return [bytes([band]) + rows[band].tobytes() for band in range(LSH_BANDS)]
+
+
+def match_paragraphs(
+    previous: List[Paragraph], current: List[Paragraph]
+) -> List[Tuple[str, Optional[Paragraph], Optional[Paragraph], Optional[float]]]:
+    """
+    前期と当期の段落を対応付ける
+
+    完全一致 (digest) を先に除き、残りは前期段落の LSH バケットから候補を引いて
+    推定類似度の高い順に1対1で対応付ける。比較は候補ペアに限られるため、
+    段落数に対してほぼ線形で済む。小さいセクションは全ペアを比較する。
+
+    Returns:
+        (変更種別, 当期段落, 前期段落, 類似度) のリスト (変更のないものは含まない)
+    """
+    previous_digests = {p.digest for p in previous}
+    current_digests = {p.digest for p in current}
+    remaining_previous = [p for p in previous if p.digest not in current_digests]
+    remaining_current = [p for p in current if p.digest not in previous_digests]
+
+    exhaustive = len(remaining_previous) * len(remaining_current) <= EXHAUSTIVE_PAIRS
+    buckets: Dict[bytes, List[int]] = {}
+    if not exhaustive:
+        for i, paragraph in enumerate(remaining_previous):
+            for key in band_keys(paragraph.signature):
+                buckets.setdefault(key, []).append(i)
+
+    pairs: List[Tuple[float, int, int]] = []
+    for j, paragraph in enumerate(remaining_current):
+        if exhaustive:
+            candidates: Set[int] = set(range(len(remaining_previous)))
+        else:
+            candidates = {i for key in band_keys(paragraph.signature) for i in buckets.get(key, [])}
+        for i in candidates:
+            similarity = estimate_similarity(remaining_previous[i].signature, paragraph.signature)
+            if similarity >= REWRITTEN_THRESHOLD:
+                pairs.append((similarity, i, j))
+
+    changes: List[Tuple[str, Optional[Paragraph], Optional[Paragraph], Optional[float]]] = []
+    used_previous, used_current = set(), set()
+    for similarity, i, j in sorted(pairs, key=lambda p: (-p[0], p[1], p[2])):
+        if i in used_previous or j in used_current:
+            continue
+        used_previous.add(i)
+        used_current.add(j)
+        if similarity < UNCHANGED_THRESHOLD:
+            changes.append(("rewritten", remaining_current[j], remaining_previous[i], similarity))
+
+    for j, paragraph in enumerate(remaining_current):
+        if j not in used_current:
+            changes.append(("new", paragraph, None, None))
+    for i, paragraph in enumerate(remaining_previous):
+        if i not in used_previous:
+            changes.append(("removed", None, paragraph, None))
+    return changes
+
+
+def note_section(note: Dict[str, Any]) -> str:
+    """注記のセクション (section 項目、無ければカテゴリ)"""
+    return str(note.get("section") or note.get("category") or "")
+
+
+def collect_paragraphs(
+    notes: List[Dict[str, Any]], hasher: MinHasher
+) -> Dict[Tuple[str, str], Dict[str, List[Paragraph]]]:
+    """
+    (企業, セクション) -> 期間 -> 段落 の索引を作成
+
+    このステージ自身が出力した注記は入力にしない。
+    """
+    index: Dict[Tuple[str, str], Dict[str, List[Paragraph]]] = {}
+    for note in notes:
+        if note.get("source") == CHANGE_SOURCE:
+            continue
+        key = (str(note.get("company", "")), note_section(note))
+        period = str(note.get("period", ""))
+        note_keywords = [str(k) for k in note.get("keywords", [])]
+        for text in split_paragraphs(note.get("text", "")):
+            digest = paragraph_digest(text)
+            index.setdefault(key, {}).setdefault(period, []).append(
+                Paragraph(
+                    company=key[0],
+                    section=key[1],
+                    period=period,
+                    doc_id=str(note.get("docID", "")),
+                    text=text,
+                    # Fall back to the note's keywords when none appear in this paragraph
+                    keywords=[k for k in note_keywords if k in text] or note_keywords,
+                    digest=digest,
+                    signature=hasher.signature(text, digest),
+                )
+            )
+    return index
+
+
+def detect_changes(
+    notes: List[Dict[str, Any]], hasher: Optional[MinHasher] = None
+) -> List[NoteChange]:
+    """
+    (企業, セクション) ごとに連続する期間の段落を比較して変更を検出
+
+    Args:
+        notes: xbrl_notes.json の注記一覧
+        hasher: 署名キャッシュを持つ MinHasher (省略時は新規)
+
+    Returns:
+        検出した変更 (企業・セクション・期間順)
+    """
+    hasher = hasher or MinHasher()
+    changes: List[NoteChange] = []
+    for (company, section), periods in sorted(collect_paragraphs(notes, hasher).items()):
+        ordered = sorted(periods)
+        for previous_period, period in zip(ordered, ordered[1:]):
+            for change_type, current, previous, similarity in match_paragraphs(
+                periods[previous_period], periods[period]
+            ):
+                changes.append(
+                    NoteChange(
+                        change_type=change_type,
+                        company=company,
+                        section=section,
+                        period=period,
+                        previous_period=previous_period,
+                        current=current,
+                        previous=previous,
+                        similarity=similarity,
+                    )
+                )
+    return changes
+
+
+def change_to_note(change: NoteChange, detected_at: str) -> Dict[str, Any]:
+    """変更を policy_change 注記に変換"""
+    paragraph = change.current or change.previous
+    assert paragraph is not None
+    if change.change_type == "rewritten":
+        severity = round(min(1.0, 1.0 - (change.similarity or 0.0) + 0.3), 2)
+    else:
+        severity = CHANGE_SEVERITY[change.change_type]
+
+    label = {"new": "新規", "removed": "削除", "rewritten": "変更"}[change.change_type]
+    text = f"[{label}] {paragraph.text}"
+    keywords = list(dict.fromkeys(paragraph.keywords + (change.previous or paragraph).keywords))
+    if not keywords:
+        keywords = [change.section or "会計方針"]
+    return {
+        "company": change.company,
+        "period": change.period,
+        # Removed paragraphs are reported against the current period's filing when known
+        "docID": change.current.doc_id if change.current else paragraph.doc_id,
+        "category": "policy_change",
+        "text": text[:MAX_NOTE_TEXT],
+        "severity": severity,
+        "keywords": keywords,
+        "detected_at": detected_at,
+        "source": CHANGE_SOURCE,
+        "change": {
+            "type": change.change_type,
+            "section": change.section,
+            "previous_period": change.previous_period,
+            "similarity": None if change.similarity is None else round(change.similarity, 3),
+            "previous_text": change.previous.text[:MAX_NOTE_TEXT] if change.previous else None,
+        },
+    }
+
+
+def update_note_changes(
+    notes_path: Path = NOTES_PATH, cache_path: Optional[Path] = FINGERPRINT_CACHE_PATH
+) -> Dict[str, int]:
+    """
+    xbrl_notes.json の policy_change (変更検知) 注記を作り直す
+
+    前回このステージが出力した注記を取り除き、今回の検出結果を追加する。
+    内容が変わらなければファイルは書き換えない。
+
+    Returns:
+        変更種別 -> 件数
+    """
+    if not notes_path.exists():
+        logger.info(f"Notes file not found; skipping change detection: {notes_path}")
+        return {}
+
+    with open(notes_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    notes = [n for n in data.get("notes", []) if n.get("source") != CHANGE_SOURCE]
+    previous_changes = {
+        json.dumps({k: v for k, v in n.items() if k != "detected_at"}, sort_keys=True): n
+        for n in data.get("notes", [])
+        if n.get("source") == CHANGE_SOURCE
+    }
+
+    hasher = MinHasher()
+    if cache_path is not None:
+        hasher.load(cache_path)
+    changes = detect_changes(notes, hasher)
+
+    detected_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    generated = []
+    for change in changes:
+        note = change_to_note(change, detected_at)
+        key = json.dumps({k: v for k, v in note.items() if k != "detected_at"}, sort_keys=True)
+        # Keep the first detection time of changes that were already reported
+        generated.append(previous_changes.get(key, note))
+
+    data["notes"] = notes + generated
+    content = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+    if write_if_changed(notes_path, content):
+        logger.info(f"Wrote {len(generated)} policy_change notes to {notes_path.name}")
+
+    if cache_path is not None:
+        hasher.save(cache_path)
+
+    counts = {change_type: 0 for change_type in CHANGE_TYPES}
+    for change in changes:
+        counts[change.change_type] += 1
+    logger.info(
+        f"Note changes: {counts['new']} new, {counts['removed']} removed, "
+        f"{counts['rewritten']} rewritten ({hasher.computed} signatures computed)"
+    )
+    return counts
+
+
+def run_benchmark(paragraphs: int, seed: int = 0) -> Dict[str, float]:
+    """
+    合成段落で LSH 照合と全ペア比較の時間を比較
+
+    前期 paragraphs 段落に対し、当期は 10% に節を挿入・5% を削除・5% を追加する。
+    全ペア比較は当期 PAIRWISE_SAMPLE 段落分を計測し、全段落分に換算する。
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = [chr(c) for c in range(0x4E00, 0x4E00 + 3000)]
+
+    def sentence() -> str:
+        return "".join(rng.choice(vocabulary, size=int(rng.integers(40, 120))))
+
+    hasher = MinHasher()
+
+    def make(period: str, text: str) -> Paragraph:
+        digest = paragraph_digest(text)
+        return Paragraph(
+            "BENCH", "policy", period, "", text, [], digest, hasher.signature(text, digest)
+        )
+
+    base = [sentence() for _ in range(paragraphs)]
+    current_texts = []
+    for text in base:
+        roll = rng.random()
+        if roll < 0.05:
+            continue  # removed
+        if roll < 0.15:
+            cut = len(text) // 2
+            text = text[:cut] + sentence()[: len(text) // 5] + text[cut:]  # insert a clause
+        current_texts.append(text)
+    current_texts += [sentence() for _ in range(paragraphs // 20)]
+
+    began = time.perf_counter()
+    previous = [make("P0", t) for t in base]
+    current = [make("P1", t) for t in current_texts]
+    signature_s = time.perf_counter() - began
+
+    began = time.perf_counter()
+    changes = match_paragraphs(previous, current)
+    lsh_s = time.perf_counter() - began
+
+    # Quadratic baseline: compare every signature pair (sampled, scaled to all paragraphs)
+    sample = current[:PAIRWISE_SAMPLE]
+    began = time.perf_counter()
+    left = np.stack([p.signature for p in previous])
+    for paragraph in sample:
+        (left == paragraph.signature).mean(axis=1).max()
+    pairwise_s = (time.perf_counter() - began) * len(current) / max(len(sample), 1)
+
+    counts = {t: float(sum(1 for c in changes if c[0] == t)) for t in CHANGE_TYPES}
+    return {
+        "paragraphs": float(paragraphs),
+        "signature_s": signature_s,
+        "lsh_match_s": lsh_s,
+        "pairwise_s": pairwise_s,
+        **counts,
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """コマンドライン引数を解析"""
+    parser = argparse.ArgumentParser(description="Detect note paragraph changes between periods")
+    parser.add_argument("--notes", type=Path, default=NOTES_PATH, help="注記JSON")
+    parser.add_argument(
+        "--benchmark",
+        type=int,
+        metavar="PARAGRAPHS",
+        help="合成段落で LSH 照合と全ペア比較の時間を比較して終了",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """メイン処理"""
+    args = parse_args(argv)
+
+    try:
+        if args.benchmark:
+            results = run_benchmark(args.benchmark)
+            print(json.dumps({k: round(v, 4) for k, v in results.items()}, indent=2))
+            return 0
+
+        update_note_changes(args.notes)
+        return 0
+
+    except Exception as e:
+        logger.error(f"Fatal error: {str(e)}", exc_info=True)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
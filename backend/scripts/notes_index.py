@@ -0,0 +1,512 @@
+"""
+注記 (data/xbrl_notes.json) の全文検索用 文字bigram転置インデックス
+日本語は空白で区切られないため、正規化した本文とキーワードを2文字単位に分解して索引する。
+ポスティングは (企業, 期間) グループごとにまとめて差分符号化し、bigram のハッシュでシャードに分割する。
+クライアントはマニフェストを読み、クエリの bigram を含むシャードだけを取得すればよい
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import sys
+import unicodedata
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from logger import get_nlp_logger
+from panel import DATA_DIR, PROJECT_ROOT
+from publisher import write_if_changed
+
+# Logger
+logger = get_nlp_logger()
+
+# Paths
+NOTES_PATH = DATA_DIR / "xbrl_notes.json"
+NOTES_INDEX_DIR = DATA_DIR / "notes_index"
+FRONTEND_NOTES_INDEX_DIR = PROJECT_ROOT / "frontend" / "public" / "data" / "notes_index"
+MANIFEST_NAME = "manifest.json"
+
+# Copy of the notes next to the frontend index (postings point into it by file order)
+NOTES_COPY_NAME = "notes.json"
+
+# Bump when normalization, tokenization or the file layout changes (forces a full rebuild)
+NOTES_INDEX_FORMAT_VERSION = 1
+
+# Shards per index; the client maps a bigram to a shard with shard_of()
+SHARD_COUNT = 32
+
+# Content hash length in shard file names
+HASH_LENGTH = 12
+
+# Runs of whitespace/punctuation split the text; bigrams never span them
+SEPARATOR_PATTERN = re.compile(r"[\W_]+")
+
+GroupKey = Tuple[str, str]
+# bigram -> group id -> ascending note ordinals within the group
+Postings = Dict[str, Dict[int, List[int]]]
+
+
+def normalize_text(text: str) -> str:
+    """NFKC 正規化 (全角英数・半角カナの統一) と小文字化"""
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def text_bigrams(text: str) -> Set[str]:
+    """正規化したテキストの文字bigram集合 (区切り文字をまたぐ bigram は作らない)"""
+    bigrams: Set[str] = set()
+    for segment in SEPARATOR_PATTERN.split(normalize_text(text)):
+        bigrams.update(segment[i : i + 2] for i in range(len(segment) - 1))
+    return bigrams
+
+
+def query_terms(query: str) -> List[str]:
+    """検索語を正規化して区切り文字で分割 (すべての語を含む注記が一致)"""
+    return [t for t in SEPARATOR_PATTERN.split(normalize_text(query)) if t]
+
+
+def shard_of(bigram: str, shard_count: int = SHARD_COUNT) -> int:
+    """bigram の格納シャード (フロントエンドの notesIndexLoader と同じ式)"""
+    return (ord(bigram[0]) * 31 + ord(bigram[1])) % shard_count
+
+
+def note_text(note: Dict[str, Any]) -> str:
+    """索引・照合の対象テキスト (本文とキーワード、改行で区切る)"""
+    return "\n".join([str(note.get("text", ""))] + [str(k) for k in note.get("keywords", [])])
+
+
+def group_notes(notes: Iterable[Dict[str, Any]]) -> Dict[GroupKey, List[Dict[str, Any]]]:
+    """注記を (企業, 期間) ごとにファイル内の順序のまま分ける"""
+    groups: Dict[GroupKey, List[Dict[str, Any]]] = {}
+    for note in notes:
+        key = (str(note.get("company", "")), str(note.get("period", "")))
+        groups.setdefault(key, []).append(note)
+    return groups
+
+
+def group_hash(notes: Sequence[Dict[str, Any]]) -> str:
+    """グループ内容のハッシュ (順序・本文・キーワード・書類ID・カテゴリ)"""
+    payload = [
+        [note.get("docID"), note.get("category"), note.get("text"), note.get("keywords", [])]
+        for note in notes
+    ]
+    encoded = json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def encode_postings(groups: Dict[int, List[int]]) -> List[List[int]]:
+    """
+    グループ別ポスティングを [グループID, 先頭の注記番号, 差分, 差分, ...] の列に圧縮
+
+    注記番号は (企業, 期間) グループ内の順序なので小さく、差分はさらに小さくなる。
+    """
+    encoded = []
+    for group_id in sorted(groups):
+        ordinals = groups[group_id]
+        encoded.append([group_id, ordinals[0]] + [b - a for a, b in zip(ordinals, ordinals[1:])])
+    return encoded
+
+
+def decode_postings(encoded: List[List[int]]) -> Dict[int, List[int]]:
+    """encode_postings の逆変換"""
+    groups: Dict[int, List[int]] = {}
+    for row in encoded:
+        ordinals = [row[1]]
+        for delta in row[2:]:
+            ordinals.append(ordinals[-1] + delta)
+        groups[row[0]] = ordinals
+    return groups
+
+
+class NotesIndex:
+    """
+    シャード分割した bigram 転置インデックス
+
+    groups は (企業, 期間) グループの一覧で、位置がグループIDになる (削除されたグループは
+    count 0 の欠番として残し、ID を振り直さない)。シャードはディレクトリから必要な分だけ読み込む。
+    """
+
+    def __init__(
+        self,
+        groups: Optional[List[Dict[str, Any]]] = None,
+        shard_count: int = SHARD_COUNT,
+        directory: Optional[Path] = None,
+        shard_meta: Optional[Dict[int, Dict[str, Any]]] = None,
+    ):
+        self.groups: List[Dict[str, Any]] = groups or []
+        self.shard_count = shard_count
+        self.directory = directory
+        self.shard_meta = shard_meta or {}
+        self._shards: Dict[int, Dict[str, List[List[int]]]] = {}
+        self._dirty: Set[int] = set()
+        self.shards_loaded = 0
+
+    @classmethod
+    def open(cls, directory: Path = NOTES_INDEX_DIR) -> Optional["NotesIndex"]:
+        """マニフェストを読み込む (シャードは検索時に読み込む)。無ければ None"""
+        path = directory / MANIFEST_NAME
+        if not path.exists():
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format_version") != NOTES_INDEX_FORMAT_VERSION:
+            return None
+        return cls(
+            groups=manifest["groups"],
+            shard_count=manifest["shard_count"],
+            directory=directory,
+            shard_meta={int(k): v for k, v in manifest["shards"].items()},
+        )
+
+    @classmethod
+    def build(cls, notes: List[Dict[str, Any]], shard_count: int = SHARD_COUNT) -> "NotesIndex":
+        """注記一覧からメモリ上にインデックスを作成"""
+        index = cls(shard_count=shard_count)
+        index.update(notes)
+        return index
+
+    @property
+    def group_ids(self) -> Dict[GroupKey, int]:
+        return {(g["company"], g["period"]): i for i, g in enumerate(self.groups) if g["count"] > 0}
+
+    def shard(self, number: int) -> Dict[str, List[List[int]]]:
+        """シャード (bigram -> 圧縮ポスティング)。未読み込みならファイルから読む"""
+        if number not in self._shards:
+            postings: Dict[str, List[List[int]]] = {}
+            meta = self.shard_meta.get(number)
+            if self.directory is not None and meta:
+                with open(self.directory / meta["file"], "r", encoding="utf-8") as f:
+                    postings = json.load(f)["postings"]
+                self.shards_loaded += 1
+            self._shards[number] = postings
+        return self._shards[number]
+
+    def postings(self, bigram: str) -> Dict[int, List[int]]:
+        """bigram のポスティング (グループID -> 注記番号)"""
+        encoded = self.shard(shard_of(bigram, self.shard_count)).get(bigram)
+        return decode_postings(encoded) if encoded else {}
+
+    def update(self, notes: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        注記一覧に合わせて差分更新
+
+        内容ハッシュが変わった・消えたグループのポスティングを取り除き、
+        変わった・新しいグループだけを分解し直して追加する。
+
+        Returns:
+            {"added", "changed", "removed", "unchanged"} のグループ数
+        """
+        current = group_notes(notes)
+        ids = self.group_ids
+        stats = {"added": 0, "changed": 0, "removed": 0, "unchanged": 0}
+
+        stale: Set[int] = set()
+        reindex: Dict[int, List[Dict[str, Any]]] = {}
+        for key, group_id in ids.items():
+            group = current.get(key)
+            if group is None:
+                stale.add(group_id)
+                self.groups[group_id] = {**self.groups[group_id], "hash": "", "count": 0}
+                stats["removed"] += 1
+            elif group_hash(group) != self.groups[group_id]["hash"]:
+                stale.add(group_id)
+                reindex[group_id] = group
+                stats["changed"] += 1
+            else:
+                stats["unchanged"] += 1
+
+        for key, group in current.items():
+            if key not in ids:
+                self.groups.append({"company": key[0], "period": key[1], "hash": "", "count": 0})
+                reindex[len(self.groups) - 1] = group
+                stats["added"] += 1
+
+        if not stale and not reindex:
+            return stats
+
+        # Every shard may hold postings of a stale group
+        for number in range(self.shard_count if stale else 0):
+            shard = self.shard(number)
+            for bigram in list(shard):
+                kept = [row for row in shard[bigram] if row[0] not in stale]
+                if len(kept) == len(shard[bigram]):
+                    continue
+                if kept:
+                    shard[bigram] = kept
+                else:
+                    del shard[bigram]
+                self._dirty.add(number)
+
+        additions: Postings = {}
+        for group_id, group in reindex.items():
+            for ordinal, note in enumerate(group):
+                for bigram in text_bigrams(note_text(note)):
+                    additions.setdefault(bigram, {}).setdefault(group_id, []).append(ordinal)
+            key = (group[0].get("company", ""), group[0].get("period", ""))
+            self.groups[group_id] = {
+                "company": str(key[0]),
+                "period": str(key[1]),
+                "hash": group_hash(group),
+                "count": len(group),
+            }
+
+        for bigram, groups in additions.items():
+            number = shard_of(bigram, self.shard_count)
+            shard = self.shard(number)
+            existing = shard.get(bigram, [])
+            if existing and existing[-1][0] >= min(groups):
+                merged = decode_postings(existing)
+                merged.update(groups)
+                shard[bigram] = encode_postings(merged)
+            else:
+                # New groups get the highest ids; append without decoding the list
+                shard[bigram] = existing + encode_postings(groups)
+            self._dirty.add(number)
+
+        return stats
+
+    def candidates(
+        self,
+        query: str,
+        companies: Optional[Sequence[str]] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+    ) -> List[Tuple[int, int]]:
+        """
+        クエリの全 bigram を含む (グループID, 注記番号) の一覧
+
+        1文字の語は bigram を持たないため、対象グループの全注記を候補にする (照合で絞り込む)。
+        """
+        allowed = {
+            i
+            for i, g in enumerate(self.groups)
+            if g["count"] > 0
+            and (not companies or g["company"] in companies)
+            and (start is None or g["period"] >= start)
+            and (end is None or g["period"] <= end)
+        }
+        bigrams = sorted({bg for term in query_terms(query) for bg in text_bigrams(term)})
+        if not bigrams:
+            return [(i, o) for i in sorted(allowed) for o in range(self.groups[i]["count"])]
+
+        # Intersect from the shortest posting list
+        postings = sorted(
+            (self.postings(bigram) for bigram in bigrams),
+            key=lambda p: sum(len(ordinals) for ordinals in p.values()),
+        )
+        matched = {g: set(ordinals) for g, ordinals in postings[0].items() if g in allowed}
+        for other in postings[1:]:
+            matched = {
+                g: ordinals.intersection(other[g]) for g, ordinals in matched.items() if g in other
+            }
+            matched = {g: ordinals for g, ordinals in matched.items() if ordinals}
+            if not matched:
+                break
+        return sorted((g, o) for g, ordinals in matched.items() for o in ordinals)
+
+    def search(
+        self,
+        query: str,
+        grouped: Dict[GroupKey, List[Dict[str, Any]]],
+        companies: Optional[Sequence[str]] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        category: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        候補を注記本文と照合し、すべての語を部分文字列として含む注記を返す
+
+        Args:
+            query: 検索語 (空白区切りで AND)
+            grouped: インデックス作成時と同じ注記一覧を group_notes で分けたもの
+            companies: 企業コードで絞り込み
+            start: 期間の下限 (YYYYQn)
+            end: 期間の上限 (YYYYQn)
+            category: カテゴリで絞り込み
+
+        Returns:
+            一致した注記 (期間・企業順)
+        """
+        terms = query_terms(query)
+        if not terms:
+            return []
+        # A two-character term is exactly one bigram, so its postings need no verification
+        verify = [term for term in terms if len(term) != 2]
+        results = []
+        for group_id, ordinal in self.candidates(query, companies, start, end):
+            meta = self.groups[group_id]
+            group = grouped.get((meta["company"], meta["period"]), [])
+            if ordinal >= len(group):
+                continue
+            note = group[ordinal]
+            if category is not None and note.get("category") != category:
+                continue
+            if verify:
+                text = normalize_text(note_text(note))
+                if not all(term in text for term in verify):
+                    continue
+            results.append(note)
+        return sorted(results, key=lambda n: (str(n.get("period")), str(n.get("company"))))
+
+    def save(self, directory: Path = NOTES_INDEX_DIR) -> Dict[str, Any]:
+        """
+        シャードとマニフェストを書き出す
+
+        シャードは内容ハッシュ付きのファイル名で、内容が変わったものだけが新しいファイルになる。
+
+        Returns:
+            マニフェスト
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        unchanged_files = directory == self.directory
+        shards: Dict[str, Dict[str, Any]] = {}
+        for number in range(self.shard_count):
+            if unchanged_files and number not in self._dirty and number in self.shard_meta:
+                shards[f"{number:02d}"] = self.shard_meta[number]
+                continue
+            postings = self.shard(number)
+            payload = json.dumps(
+                {"postings": postings}, ensure_ascii=False, sort_keys=True, separators=(",", ":")
+            ).encode("utf-8")
+            digest = hashlib.sha256(payload).hexdigest()[:HASH_LENGTH]
+            name = f"shard-{number:02d}.{digest}.json"
+            write_if_changed(directory / name, payload)
+            shards[f"{number:02d}"] = {
+                "file": name,
+                "bytes": len(payload),
+                "bigrams": len(postings),
+            }
+
+        self.directory = directory
+        self.shard_meta = {int(k): v for k, v in shards.items()}
+        self._dirty.clear()
+        manifest = {
+            "format_version": NOTES_INDEX_FORMAT_VERSION,
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            "shard_count": self.shard_count,
+            "notes": sum(g["count"] for g in self.groups),
+            "groups": self.groups,
+            "shards": shards,
+        }
+        write_if_changed(
+            directory / MANIFEST_NAME,
+            json.dumps(manifest, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+        )
+
+        keep = {entry["file"] for entry in shards.values()} | {MANIFEST_NAME}
+        for path in directory.glob("*.json"):
+            if path.name not in keep:
+                path.unlink()
+        return manifest
+
+
+def load_notes(path: Path = NOTES_PATH) -> List[Dict[str, Any]]:
+    """注記一覧を読み込む (無ければ空)"""
+    if not path.exists():
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        notes: List[Dict[str, Any]] = json.load(f).get("notes", [])
+        return notes
+
+
+def update_notes_index(
+    full: bool = False,
+    notes_path: Path = NOTES_PATH,
+    directory: Path = NOTES_INDEX_DIR,
+    frontend_dir: Optional[Path] = FRONTEND_NOTES_INDEX_DIR,
+    shard_count: int = SHARD_COUNT,
+) -> Dict[str, int]:
+    """
+    注記インデックスを差分更新して書き出す
+
+    Args:
+        full: True なら既存インデックスを使わずに作り直す (欠番グループも詰める)
+        notes_path: 注記JSON
+        directory: インデックス出力先
+        frontend_dir: インデックスと注記 (notes.json) のコピー先
+            (frontend/public/data/notes_index)、None でコピーしない
+        shard_count: 新規作成時のシャード数
+
+    Returns:
+        グループ数の内訳 (NotesIndex.update の戻り値)
+    """
+    if not notes_path.exists():
+        logger.info(f"Notes file not found; skipping index: {notes_path}")
+        return {}
+
+    notes = load_notes(notes_path)
+    index = None if full else NotesIndex.open(directory)
+    if index is None or index.shard_count != shard_count:
+        index = NotesIndex(shard_count=shard_count)
+
+    stats = index.update(notes)
+    if frontend_dir is not None:
+        # Copied on every run: fields outside the group hash (severity etc.) may change alone
+        frontend_dir.mkdir(parents=True, exist_ok=True)
+        write_if_changed(frontend_dir / NOTES_COPY_NAME, notes_path.read_bytes())
+    if not (stats["added"] or stats["changed"] or stats["removed"]):
+        logger.info("Notes index is up to date")
+        return stats
+
+    manifest = index.save(directory)
+    logger.info(
+        f"Notes index: {manifest['notes']} notes in {len(index.group_ids)} groups "
+        f"(added {stats['added']}, changed {stats['changed']}, removed {stats['removed']}), "
+        f"{sum(s['bytes'] for s in manifest['shards'].values())} bytes"
+    )
+
+    if frontend_dir is not None:
+        keep = {s["file"] for s in manifest["shards"].values()} | {MANIFEST_NAME}
+        for name in keep:
+            write_if_changed(frontend_dir / name, (directory / name).read_bytes())
+        for path in frontend_dir.glob("*.json"):
+            if path.name not in keep | {NOTES_COPY_NAME}:
+                path.unlink()
+    return stats
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """コマンドライン引数を解析"""
+    parser = argparse.ArgumentParser(description="Build the bigram inverted index for notes")
+    parser.add_argument("--full", action="store_true", help="インデックスを作り直す")
+    parser.add_argument("--search", metavar="QUERY", help="作成済みインデックスで検索して表示")
+    parser.add_argument("--company", action="append", help="検索対象の企業 (複数指定可)")
+    parser.add_argument(
+        "--no-frontend",
+        action="store_true",
+        help="frontend/public/data へのコピーを行わない",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """メイン処理"""
+    args = parse_args(argv)
+
+    try:
+        if args.search:
+            index = NotesIndex.open()
+            if index is None:
+                logger.error(f"Notes index not found: {NOTES_INDEX_DIR}")
+                return 1
+            grouped = group_notes(load_notes())
+            results = index.search(args.search, grouped, companies=args.company)
+            for note in results:
+                print(f"{note['period']} {note['company']} [{note['category']}] {note['docID']}")
+                print(f"  {str(note.get('text', ''))[:120]}")
+            print(f"{len(results)} notes ({index.shards_loaded} shards loaded)")
+            return 0
+
+        update_notes_index(
+            full=args.full, frontend_dir=None if args.no_frontend else FRONTEND_NOTES_INDEX_DIR
+        )
+        return 0
+
+    except Exception as e:
+        logger.error(f"Fatal error: {str(e)}", exc_info=True)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,331 @@
+"""
+財務諸表CSVをパネル形式 (企業 × 期間) で扱う共通ユーティリティ
+派生指標・スコアなどの後段ステージが共有する
+"""
+
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Directories
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+DATA_DIR = PROJECT_ROOT / "data"
+FINANCIALS_DIR = DATA_DIR / "financials"
+CACHE_DIR = DATA_DIR / ".cache"
+
+# Statement definitions
+KEY_FIELDS = ["company", "period", "date"]
+STATEMENT_FIELDS: Dict[str, List[str]] = {
+    "pl": ["revenue", "operating_income", "ordinary_income", "net_income"],
+    "bs": ["total_assets", "current_assets", "fixed_assets", "total_liabilities", "net_assets"],
+    "cf": ["operating_cf", "investing_cf", "financing_cf"],
+}
+STATEMENTS = tuple(STATEMENT_FIELDS)
+NUMERIC_FIELDS = [field for fields in STATEMENT_FIELDS.values() for field in fields]
+
+# Flow items (PL/CF) are summed over periods; stock items (BS) are point-in-time
+FLOW_FIELDS = STATEMENT_FIELDS["pl"] + STATEMENT_FIELDS["cf"]
+STOCK_FIELDS = STATEMENT_FIELDS["bs"]
+
+# Column aliases found in published CSVs (frontend sample data uses these names)
+COLUMN_ALIASES = {
+    "period_end": "date",
+    "total_equity": "net_assets",
+}
+
+PERIOD_PATTERN = re.compile(r"^(\d{4})Q([1-4])$")
+STATEMENT_FILE_PATTERN = re.compile(
+    r"^(?P<company>[A-Za-z0-9]+)_(?P<statement>pl|bs|cf)_quarterly\.csv$"
+)
+
+
+def period_to_ordinal(periods: pd.Series) -> np.ndarray:
+    """
+    期間ラベル (YYYYQn) を連続した四半期番号に変換
+
+    Args:
+        periods: 期間ラベル
+
+    Returns:
+        year * 4 + (quarter - 1) の整数配列
+    """
+    parts = periods.astype(str).str.extract(PERIOD_PATTERN.pattern)
+    if parts.isna().any().any():
+        invalid = periods[parts.isna().any(axis=1)].tolist()
+        raise ValueError(f"Invalid period labels: {invalid[:5]}")
+    return (parts[0].astype(int) * 4 + parts[1].astype(int) - 1).to_numpy()
+
+
+def ordinal_to_period(ordinals: np.ndarray) -> List[str]:
+    """四半期番号を期間ラベル (YYYYQn) に戻す"""
+    return [f"{o // 4}Q{o % 4 + 1}" for o in np.asarray(ordinals, dtype=int)]
+
+
+def statement_csv_path(company: str, statement: str, directory: Path = FINANCIALS_DIR) -> Path:
+    """{company}_{statement}_quarterly.csv のパス"""
+    return directory / f"{company}_{statement}_quarterly.csv"
+
+
+def list_companies(directory: Path = FINANCIALS_DIR) -> List[str]:
+    """ディレクトリ内の財務諸表CSVから企業コード一覧を取得"""
+    companies = set()
+    for path in directory.glob("*_quarterly.csv"):
+        match = STATEMENT_FILE_PATTERN.match(path.name)
+        if match:
+            companies.add(match.group("company"))
+    return sorted(companies)
+
+
+def load_statement(
+    company: str, statement: str, directory: Path = FINANCIALS_DIR
+) -> Optional[pd.DataFrame]:
+    """
+    1企業1諸表のCSVを読み込み、列名を正規化
+
+    Returns:
+        DataFrame (ファイルが無ければ None)
+    """
+    path = statement_csv_path(company, statement, directory)
+    if not path.exists():
+        return None
+
+    df = pd.read_csv(path, dtype={"company": str, "period": str})
+    df = df.rename(columns=COLUMN_ALIASES)
+    if "date" not in df.columns:
+        df["date"] = None
+
+    fields = [f for f in STATEMENT_FIELDS[statement] if f in df.columns]
+    df[fields] = df[fields].apply(pd.to_numeric, errors="coerce")
+    return df[KEY_FIELDS + fields]
+
+
+def load_panel(
+    companies: Optional[Sequence[str]] = None,
+    directory: Path = FINANCIALS_DIR,
+) -> pd.DataFrame:
+    """
+    全企業のPL/BS/CFを (company, period) で結合したパネルを作成
+
+    Args:
+        companies: 対象企業 (None で全企業)
+        directory: 財務諸表CSVディレクトリ
+
+    Returns:
+        KEY_FIELDS + ordinal + NUMERIC_FIELDS 列を持つ DataFrame
+        (company, ordinal でソート済み、欠損項目は NaN)
+    """
+    if companies is None:
+        companies = list_companies(directory)
+
+    frames = []
+    for company in companies:
+        merged: Optional[pd.DataFrame] = None
+        for statement in STATEMENTS:
+            df = load_statement(company, statement, directory)
+            if df is None or df.empty:
+                continue
+            # Later duplicates (e.g. amended filings) win
+            df = df.drop_duplicates(subset=["company", "period"], keep="last")
+            if merged is None:
+                merged = df
+            else:
+                merged = merged.merge(
+                    df, on=["company", "period"], how="outer", suffixes=("", "_r")
+                )
+                merged["date"] = merged["date"].fillna(merged.pop("date_r"))
+        if merged is not None:
+            frames.append(merged)
+
+    if not frames:
+        panel = pd.DataFrame(columns=KEY_FIELDS + NUMERIC_FIELDS)
+    else:
+        panel = pd.concat(frames, ignore_index=True)
+
+    for field in NUMERIC_FIELDS:
+        if field not in panel.columns:
+            panel[field] = np.nan
+    panel[NUMERIC_FIELDS] = panel[NUMERIC_FIELDS].astype(float)
+
+    panel["ordinal"] = period_to_ordinal(panel["period"]) if len(panel) else []
+    panel = panel.sort_values(["company", "ordinal"], kind="stable").reset_index(drop=True)
+    return panel[KEY_FIELDS + ["ordinal"] + NUMERIC_FIELDS]
+
+
+def to_grid(
+    panel: pd.DataFrame, fields: Sequence[str]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    パネルを密な3次元配列 (企業 × 連続四半期 × 項目) に展開
+
+    欠落した四半期は NaN で埋めるため、ラグ計算を配列スライスで行える。
+
+    Returns:
+        (companies, ordinals, grid) - grid.shape == (len(companies), len(ordinals), len(fields))
+    """
+    if panel.empty:
+        return np.array([], dtype=object), np.array([], dtype=int), np.empty((0, 0, len(fields)))
+
+    companies, company_idx = np.unique(panel["company"].to_numpy(dtype=str), return_inverse=True)
+    ordinal = panel["ordinal"].to_numpy(dtype=int)
+    start = int(ordinal.min())
+    ordinals = np.arange(start, int(ordinal.max()) + 1)
+
+    grid = np.full((len(companies), len(ordinals), len(fields)), np.nan)
+    grid[company_idx, ordinal - start, :] = panel[list(fields)].to_numpy(dtype=float)
+    return companies, ordinals, grid
+
+
+def from_grid(
+    companies: np.ndarray,
+    ordinals: np.ndarray,
+    columns: Dict[str, np.ndarray],
+) -> pd.DataFrame:
+    """
+    (企業 × 四半期) の2次元配列群を長形式の DataFrame に戻す
+
+    Args:
+        companies: 企業コード配列
+        ordinals: 四半期番号配列
+        columns: 列名 -> shape (len(companies), len(ordinals)) の配列
+
+    Returns:
+        company, period, ordinal と各列を持つ DataFrame
+    """
+    n_companies, n_periods = len(companies), len(ordinals)
+    frame = pd.DataFrame(
+        {
+            "company": np.repeat(companies, n_periods),
+            "ordinal": np.tile(ordinals, n_companies),
+        }
+    )
+    frame.insert(1, "period", ordinal_to_period(frame["ordinal"].to_numpy()))
+    for name, values in columns.items():
+        frame[name] = values.reshape(-1)
+    return frame
+
+
+def row_hashes(panel: pd.DataFrame) -> Dict[str, Dict[str, str]]:
+    """(company, period) ごとの入力値ハッシュ"""
+    hashes = pd.util.hash_pandas_object(panel[["date"] + NUMERIC_FIELDS], index=False)
+    state: Dict[str, Dict[str, str]] = {}
+    for company, period, value in zip(panel["company"], panel["period"], hashes):
+        state.setdefault(company, {})[period] = f"{value:016x}"
+    return state
+
+
+def dirty_ordinals(
+    panel: pd.DataFrame,
+    previous_state: Dict[str, Dict[str, str]],
+    current_state: Dict[str, Dict[str, str]],
+) -> Dict[str, int]:
+    """
+    企業ごとに再計算が必要な最初の四半期番号を求める
+
+    追加・変更・削除された期間のうち最も古いもの以降が再計算対象。
+    """
+    ordinal_by_key = {
+        (company, period): int(ordinal)
+        for company, period, ordinal in zip(panel["company"], panel["period"], panel["ordinal"])
+    }
+
+    dirty: Dict[str, int] = {}
+    for company in set(previous_state) | set(current_state):
+        before = previous_state.get(company, {})
+        after = current_state.get(company, {})
+        changed = [p for p in after if before.get(p) != after[p]]
+        removed = [p for p in before if p not in after]
+
+        if not changed and not removed:
+            continue
+        if removed:
+            # Removed periods invalidate everything after them; recompute the issuer
+            dirty[company] = -1
+            continue
+        dirty[company] = min(ordinal_by_key[(company, p)] for p in changed)
+
+    return dirty
+
+
+def load_incremental_state(path: Path, engine_version: str) -> Dict[str, Dict[str, str]]:
+    """
+    前回実行時の入力ハッシュを読み込む
+
+    エンジンのバージョン (定義・設定のハッシュ) が変わっていれば空を返し、全件再計算させる。
+    """
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    if state.get("engine_version") != engine_version:
+        return {}
+    rows: Dict[str, Dict[str, str]] = state.get("rows", {})
+    return rows
+
+
+def save_incremental_state(
+    path: Path, engine_version: str, rows: Dict[str, Dict[str, str]]
+) -> None:
+    """今回の入力ハッシュを保存"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"engine_version": engine_version, "rows": rows}, f)
+
+
+def dirty_window(panel: pd.DataFrame, dirty: Dict[str, int], lookback: int) -> pd.DataFrame:
+    """再計算対象の企業について、変更期間から lookback 四半期前以降の行を抽出"""
+    start = panel["company"].map(dirty)
+    return panel[start.notna() & (panel["ordinal"] >= start - lookback)]
+
+
+def merge_period_records(
+    existing: Dict[str, Dict[str, Dict[str, Any]]],
+    frame: pd.DataFrame,
+    dirty: Dict[str, int],
+    current_state: Dict[str, Dict[str, str]],
+    digits: int = 2,
+) -> Tuple[Dict[str, Dict[str, Dict[str, Any]]], Dict[str, int]]:
+    """
+    再計算結果を既存の companies[企業][期間] 辞書に反映
+
+    Args:
+        existing: 前回出力の companies 辞書
+        frame: 再計算結果 (company, period, ordinal と値列)
+        dirty: 企業 -> 再計算開始の四半期番号 (-1 は全期間)
+        current_state: 今回の入力ハッシュ (存在する期間の判定に使用)
+        digits: 丸め桁数
+
+    Returns:
+        (companies 辞書, 企業 -> 更新した期間数)
+    """
+    frame = frame[frame["ordinal"] >= frame["company"].map(dirty)]
+    value_columns = [c for c in frame.columns if c not in ("company", "period", "ordinal")]
+    companies = {c: p for c, p in existing.items() if c in current_state}
+    updated: Dict[str, int] = {}
+
+    for company, first_dirty in dirty.items():
+        periods = companies.setdefault(company, {})
+        if first_dirty < 0:
+            periods.clear()
+        else:
+            for period in [p for p in periods if p not in current_state.get(company, {})]:
+                del periods[period]
+
+        rows = frame[frame["company"] == company]
+        values = rows[value_columns].to_numpy(dtype=float).round(digits)
+        for period, row in zip(rows["period"], values):
+            periods[period] = {
+                name: float(value) for name, value in zip(value_columns, row) if not np.isnan(value)
+            }
+        updated[company] = len(rows)
+
+        if not periods:
+            del companies[company]
+
+    sorted_companies = {
+        company: dict(sorted(periods.items())) for company, periods in sorted(companies.items())
+    }
+    return sorted_companies, updated
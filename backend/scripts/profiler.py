@@ -0,0 +1,307 @@
+"""
+パイプライン各ステージのプロファイリング
+cProfile + tracemalloc による詳細モードと、本番でも使える低オーバーヘッドのサンプリングモード
+
+使い方:
+    configure_profiling("full", run_name="extract")
+    with profile_stage("extract.parse_csv"):
+        ...
+    write_profile_reports()
+
+レポートは logs/profiles/{run_name}_{timestamp}/ 以下にステージごとに出力される
+"""
+
+import argparse
+import cProfile
+import io
+import json
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from types import FrameType
+from typing import Dict, Iterator, List, Optional
+
+from logger import LOG_DIR
+
+# Output directory
+PROFILE_DIR = LOG_DIR / "profiles"
+
+# Profiling modes
+PROFILE_MODES = ("full", "sample")
+
+# Report sizes
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+TRACEMALLOC_FRAMES = 10
+SAMPLE_STACK_DEPTH = 30
+
+
+@dataclass
+class StageStats:
+    """ステージ単位の累積統計"""
+
+    name: str
+    calls: int = 0
+    wall_time: float = 0.0
+    peak_memory: int = 0
+    profile: Optional[cProfile.Profile] = None
+    allocations: Dict[str, int] = field(default_factory=dict)
+    alloc_counts: Dict[str, int] = field(default_factory=dict)
+    samples: Counter = field(default_factory=Counter)
+
+
+class _ProfilingSession:
+    """プロファイリングセッション (プロセスに1つ)"""
+
+    def __init__(self, mode: str, run_name: str, sample_interval: float) -> None:
+        self.mode = mode
+        self.run_name = run_name
+        self.sample_interval = sample_interval
+        self.stages: Dict[str, StageStats] = {}
+        self.active_stage: Optional[str] = None
+        self.started_at = datetime.now()
+        self._main_thread_id = threading.get_ident()
+        self._stop_event = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+        if mode == "full":
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        elif mode == "sample":
+            self._sampler = threading.Thread(
+                target=self._sample_loop, name="finsight-profiler", daemon=True
+            )
+            self._sampler.start()
+
+    def stage(self, name: str) -> StageStats:
+        if name not in self.stages:
+            self.stages[name] = StageStats(name=name)
+        return self.stages[name]
+
+    def _sample_loop(self) -> None:
+        """メインスレッドのスタックを一定間隔で採取し、実行中ステージに集計"""
+        while not self._stop_event.wait(self.sample_interval):
+            stage_name = self.active_stage
+            if stage_name is None:
+                continue
+            frame = sys._current_frames().get(self._main_thread_id)
+            if frame is None:
+                continue
+            self.stages[stage_name].samples[_collapse_stack(frame)] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._sampler is not None:
+            self._sampler.join(timeout=1.0)
+        if self.mode == "full" and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+_session: Optional[_ProfilingSession] = None
+
+
+def _collapse_stack(frame: Optional[FrameType]) -> str:
+    """スタックを flamegraph の collapsed 形式 (root;...;leaf) に変換"""
+    names: List[str] = []
+    while frame is not None and len(names) < SAMPLE_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    """エントリポイント共通の --profile 引数を追加"""
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="full",
+        choices=PROFILE_MODES,
+        default=None,
+        help="ステージごとのプロファイルを logs/profiles/ に出力 "
+        "(full: cProfile + tracemalloc, sample: 低オーバーヘッドのサンプリング)",
+    )
+    parser.add_argument(
+        "--profile-interval",
+        type=float,
+        default=0.005,
+        help="サンプリングモードの採取間隔 (秒)",
+    )
+
+
+def configure_profiling(
+    mode: Optional[str],
+    run_name: str,
+    sample_interval: float = 0.005,
+) -> None:
+    """
+    プロファイリングを有効化
+
+    Args:
+        mode: "full" / "sample" / None (無効)
+        run_name: レポートディレクトリ名の接頭辞 (fetch/extract/validate)
+        sample_interval: サンプリング間隔 (秒)
+    """
+    global _session
+
+    if _session is not None:
+        _session.stop()
+        _session = None
+
+    if mode is None:
+        return
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode: {mode} (expected one of {PROFILE_MODES})")
+
+    _session = _ProfilingSession(mode, run_name, sample_interval)
+
+
+def is_profiling() -> bool:
+    """プロファイリングが有効かどうか"""
+    return _session is not None
+
+
+@contextmanager
+def profile_stage(name: str) -> Iterator[None]:
+    """
+    ステージを計測するコンテキストマネージャ
+
+    同名ステージは呼び出しごとに累積される。プロファイラは同時に1つしか
+    有効化できないため、ステージ内で入れ子になったステージは外側に含めて計測する。
+
+    Args:
+        name: ステージ名 (例: "extract.parse_csv")
+    """
+    session = _session
+    if session is None or session.active_stage is not None:
+        yield
+        return
+
+    stats = session.stage(name)
+    session.active_stage = name
+    snapshot_before = None
+    baseline = 0
+
+    if session.mode == "full":
+        if stats.profile is None:
+            stats.profile = cProfile.Profile()
+        tracemalloc.reset_peak()
+        snapshot_before = tracemalloc.take_snapshot()
+        baseline, _ = tracemalloc.get_traced_memory()
+        stats.profile.enable()
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+
+        if session.mode == "full" and stats.profile is not None:
+            stats.profile.disable()
+            _, peak = tracemalloc.get_traced_memory()
+            stats.peak_memory = max(stats.peak_memory, peak - baseline)
+            if snapshot_before is not None:
+                _accumulate_allocations(stats, snapshot_before, tracemalloc.take_snapshot())
+
+        stats.calls += 1
+        stats.wall_time += elapsed
+        session.active_stage = None
+
+
+def _accumulate_allocations(
+    stats: StageStats,
+    before: tracemalloc.Snapshot,
+    after: tracemalloc.Snapshot,
+) -> None:
+    """スナップショット差分を行単位でステージに加算"""
+    filters = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ]
+    diff = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")
+    for stat in diff:
+        if stat.size_diff <= 0:
+            continue
+        frame = stat.traceback[0]
+        key = f"{frame.filename}:{frame.lineno}"
+        stats.allocations[key] = stats.allocations.get(key, 0) + stat.size_diff
+        stats.alloc_counts[key] = stats.alloc_counts.get(key, 0) + stat.count_diff
+
+
+def _safe_filename(stage_name: str) -> str:
+    return "".join(c if c.isalnum() or c in "._-" else "_" for c in stage_name)
+
+
+def _write_stage_report(stats: StageStats, output_dir: Path) -> None:
+    """1ステージ分のレポートを書き出す"""
+    base = output_dir / _safe_filename(stats.name)
+
+    if stats.profile is not None:
+        stats.profile.dump_stats(f"{base}.pstats")
+        buffer = io.StringIO()
+        report = pstats.Stats(stats.profile, stream=buffer)
+        report.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_FUNCTIONS)
+        report.sort_stats(pstats.SortKey.TIME).print_stats(TOP_FUNCTIONS)
+        Path(f"{base}_cpu.txt").write_text(buffer.getvalue(), encoding="utf-8")
+
+    if stats.allocations:
+        top = sorted(stats.allocations.items(), key=lambda item: item[1], reverse=True)
+        lines = [f"Top {TOP_ALLOCATIONS} allocations for {stats.name}", ""]
+        for location, size in top[:TOP_ALLOCATIONS]:
+            count = stats.alloc_counts.get(location, 0)
+            lines.append(f"{size / 1024:>12.1f} KiB  {count:>8} blocks  {location}")
+        Path(f"{base}_alloc.txt").write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    if stats.samples:
+        collapsed = [f"{stack} {count}" for stack, count in stats.samples.most_common()]
+        Path(f"{base}.collapsed").write_text("\n".join(collapsed) + "\n", encoding="utf-8")
+
+
+def write_profile_reports() -> Optional[Path]:
+    """
+    全ステージのレポートを書き出してプロファイリングを終了
+
+    Returns:
+        レポートディレクトリ (プロファイリング無効時は None)
+    """
+    global _session
+
+    session = _session
+    if session is None:
+        return None
+
+    session.stop()
+    _session = None
+
+    timestamp = session.started_at.strftime("%Y%m%d_%H%M%S")
+    output_dir = PROFILE_DIR / f"{session.run_name}_{timestamp}"
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    summary = []
+    for stats in sorted(session.stages.values(), key=lambda s: s.wall_time, reverse=True):
+        _write_stage_report(stats, output_dir)
+        summary.append(
+            {
+                "stage": stats.name,
+                "calls": stats.calls,
+                "wall_time_sec": round(stats.wall_time, 6),
+                "peak_memory_bytes": stats.peak_memory if session.mode == "full" else None,
+                "samples": sum(stats.samples.values()) if session.mode == "sample" else None,
+            }
+        )
+
+    with open(output_dir / "summary.json", "w", encoding="utf-8") as f:
+        json.dump(
+            {"run": session.run_name, "mode": session.mode, "stages": summary},
+            f,
+            ensure_ascii=False,
+            indent=2,
+        )
+
+    return output_dir
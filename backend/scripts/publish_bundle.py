@@ -0,0 +1,364 @@
+"""
+ダッシュボード向けデータバンドルを発行
+企業ごとに PL/BS/CF・派生指標・健全性スコア・同業比較を1ファイルにまとめ、
+gzip / brotli の事前圧縮版とコンテンツハッシュ付きファイル名で出力する
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from chart_series import CHART_FORMAT_VERSION, build_chart_series
+from compute_health_score import HEALTH_SCORES_PATH
+from compute_metrics import METRICS_PATH
+from compute_peer_stats import company_peer_records, load_peer_stats
+from logger import get_data_logger
+from panel import DATA_DIR, FINANCIALS_DIR, PROJECT_ROOT, STATEMENT_FIELDS
+from publisher import atomic_write_bytes, write_if_changed
+from standalone_quarters import load_standalone_panel
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+# Logger
+logger = get_data_logger()
+
+# Output directories
+BUNDLE_DIR = DATA_DIR / "bundle"
+FRONTEND_DATA_DIR = PROJECT_ROOT / "frontend" / "public" / "data"
+MANIFEST_NAME = "manifest.json"
+CHARTS_DIR_NAME = "charts"
+BUNDLE_SCHEMA_VERSION = "1.2.0"
+
+# Flow items (PL / CF) in bundles and chart series are standalone quarters, not the filed
+# fiscal year-to-date values, so statements, metrics and charts agree
+FLOW_BASIS = "standalone"
+
+# Content hash length in file names
+HASH_LENGTH = 12
+
+
+def _column(values: pd.Series) -> List[Optional[float]]:
+    """NaN を null にした数値配列"""
+    array = values.to_numpy(dtype=float).round(2)
+    return [None if np.isnan(v) else float(v) for v in array]
+
+
+def _aligned(
+    records: Dict[str, Dict[str, Any]], periods: List[str]
+) -> Dict[str, List[Optional[float]]]:
+    """companies[企業][期間] 形式の辞書を期間配列に揃えた列形式へ変換"""
+    names = sorted({name for values in records.values() for name in values})
+    return {name: [records.get(p, {}).get(name) for p in periods] for name in names}
+
+
+def _load_companies_json(path: Path) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        companies: Dict[str, Dict[str, Dict[str, Any]]] = json.load(f).get("companies", {})
+        return companies
+
+
+def build_company_bundle(
+    company: str,
+    panel: pd.DataFrame,
+    metrics: Dict[str, Dict[str, Any]],
+    health_scores: Dict[str, Dict[str, Any]],
+    peers: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    """
+    1企業分のバンドル (期間軸に揃えた列形式) を作成
+
+    Args:
+        company: 企業コード
+        panel: load_standalone_panel の結果 (当該企業の行、フロー項目は単独四半期)
+        metrics: 派生指標 (期間 -> 指標)
+        health_scores: 健全性スコア (期間 -> サブスコア)
+        peers: 同業比較 (期間 -> <指標>_pct / _z / _median)
+
+    Returns:
+        バンドル辞書
+    """
+    periods = panel["period"].tolist()
+    statements: Dict[str, Dict[str, List[Optional[float]]]] = {}
+    for statement, fields in STATEMENT_FIELDS.items():
+        columns = {f: _column(panel[f]) for f in fields if panel[f].notna().any()}
+        if columns:
+            statements[statement] = columns
+
+    return {
+        "schema_version": BUNDLE_SCHEMA_VERSION,
+        "company": company,
+        "flow_basis": FLOW_BASIS,
+        "periods": periods,
+        "period_end": panel["date"].where(panel["date"].notna(), None).tolist(),
+        "statements": statements,
+        "metrics": _aligned(metrics, periods),
+        "health_score": _aligned(health_scores, periods),
+        "peers": _aligned(peers or {}, periods),
+    }
+
+
+def _encode(bundle: Dict[str, Any]) -> bytes:
+    """決定的なバイト列に変換 (同じ内容なら同じハッシュ)"""
+    return json.dumps(bundle, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode(
+        "utf-8"
+    )
+
+
+def _is_intact(path: Path, payload: bytes, decompress: Callable[[bytes], bytes]) -> bool:
+    """既存ファイルが payload を完全に含むか (途中で落ちて切れたファイルは False)"""
+    if not path.exists():
+        return False
+    try:
+        return decompress(path.read_bytes()) == payload
+    except Exception:  # truncated or corrupt archive (error types differ per codec)
+        return False
+
+
+def _write_variants(
+    output_dir: Path, name: str, payload: bytes, suffix: str = ".json"
+) -> Dict[str, Any]:
+    """
+    非圧縮・gzip・brotli の各ファイルを書き出す
+
+    同名ファイルがあっても内容を確かめ、欠けていれば書き直す (いずれも一時ファイル経由の置換)。
+    圧縮済みファイルは展開して比較するため、内容が同じなら再圧縮しない。
+    """
+    digest = hashlib.sha256(payload).hexdigest()
+    filename = f"{name}.{digest[:HASH_LENGTH]}{suffix}"
+    entry: Dict[str, Any] = {
+        "file": filename,
+        "sha256": digest,
+        "bytes": len(payload),
+        "encodings": {},
+    }
+
+    write_if_changed(output_dir / filename, payload)
+
+    gz_path = output_dir / f"{filename}.gz"
+    if not _is_intact(gz_path, payload, gzip.decompress):
+        # mtime=0 keeps the compressed bytes reproducible
+        atomic_write_bytes(gz_path, gzip.compress(payload, compresslevel=9, mtime=0))
+    entry["encodings"]["gzip"] = {"file": gz_path.name, "bytes": gz_path.stat().st_size}
+
+    if brotli is not None:
+        br_path = output_dir / f"{filename}.br"
+        if not _is_intact(br_path, payload, brotli.decompress):
+            atomic_write_bytes(br_path, brotli.compress(payload, quality=11))
+        entry["encodings"]["br"] = {"file": br_path.name, "bytes": br_path.stat().st_size}
+
+    return entry
+
+
+def _load_manifest(path: Path) -> Dict[str, Any]:
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        manifest: Dict[str, Any] = json.load(f)
+        return manifest
+
+
+def _remove_stale(output_dir: Path, keep: List[str], pattern: str = "*.json*") -> int:
+    """マニフェストから参照されなくなったハッシュ付きファイルを削除"""
+    removed = 0
+    for path in output_dir.glob(pattern):
+        if path.name == MANIFEST_NAME or path.name in keep:
+            continue
+        path.unlink()
+        removed += 1
+    return removed
+
+
+def sync_directory(source: Path, destination: Path, pattern: str) -> int:
+    """
+    pattern に一致するファイルを destination に同期 (内容が同じファイルはコピーしない)
+
+    Returns:
+        コピーしたファイル数
+    """
+    destination.mkdir(parents=True, exist_ok=True)
+    copied = 0
+    for path in source.glob(pattern):
+        # Atomic replace, so an interrupted copy is repaired by the next sync
+        if write_if_changed(destination / path.name, path.read_bytes()):
+            copied += 1
+    return copied
+
+
+def _variant_files(entries: Dict[str, Any]) -> List[str]:
+    """マニフェストの各エントリが参照するファイル名"""
+    return [
+        name
+        for entry in entries.values()
+        for name in [entry["file"]] + [v["file"] for v in entry["encodings"].values()]
+    ]
+
+
+def publish_chart_series(
+    panel: pd.DataFrame, output_dir: Path, frontend_dir: Optional[Path] = None
+) -> Dict[str, Any]:
+    """
+    企業ごとのグラフ系列 (chart_series) をバイナリで発行
+
+    <企業>.<ハッシュ>.bin に型付き配列を連結し、各系列の位置は charts/manifest.json の
+    index に記録する。フロントエンドはマニフェストを読んで必要な解像度だけを取り出す
+
+    Args:
+        panel: load_standalone_panel の結果 (フロー項目は単独四半期)
+        output_dir: 出力先 (bundle/charts)
+        frontend_dir: コピー先、None でコピーしない
+
+    Returns:
+        グラフ系列のマニフェスト
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    entries: Dict[str, Any] = {}
+    for company, (index, payload) in sorted(build_chart_series(panel).items()):
+        entry = _write_variants(output_dir, company, payload, suffix=".bin")
+        entry["index"] = index
+        entries[company] = entry
+
+    version = hashlib.sha256(
+        "".join(entries[c]["sha256"] for c in sorted(entries)).encode("utf-8")
+    ).hexdigest()[:HASH_LENGTH]
+    manifest = {
+        "format_version": CHART_FORMAT_VERSION,
+        "version": version,
+        "flow_basis": FLOW_BASIS,
+        "companies": entries,
+    }
+    content = json.dumps(manifest, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    write_if_changed(output_dir / MANIFEST_NAME, content)
+
+    keep = _variant_files(entries)
+    removed = _remove_stale(output_dir, keep, "*.bin*")
+    if removed:
+        logger.info(f"Removed {removed} stale chart series files")
+    total = sum(entry["bytes"] for entry in entries.values())
+    logger.info(f"Chart series: {len(entries)} companies ({total} bytes, version {version})")
+
+    if frontend_dir is not None:
+        sync_directory(output_dir, frontend_dir, "*.bin*")
+        sync_directory(output_dir, frontend_dir, MANIFEST_NAME)
+        _remove_stale(frontend_dir, keep, "*.bin*")
+
+    return manifest
+
+
+def publish_bundle(
+    output_dir: Path = BUNDLE_DIR,
+    frontend_dir: Optional[Path] = FRONTEND_DATA_DIR,
+    directory: Path = FINANCIALS_DIR,
+) -> Dict[str, Any]:
+    """
+    全企業のバンドル・グラフ系列とマニフェストを発行
+
+    Args:
+        output_dir: バンドル出力先
+        frontend_dir: コピー先 (frontend/public/data)、None でコピーしない
+        directory: 財務諸表CSVディレクトリ
+
+    Returns:
+        マニフェスト
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if brotli is None:
+        logger.warning("brotli is not installed; skipping .br variants")
+
+    # Statements and chart series share one basis: flow items as standalone quarters
+    panel = load_standalone_panel(directory=directory)
+    metrics = _load_companies_json(METRICS_PATH)
+    health_scores = _load_companies_json(HEALTH_SCORES_PATH)
+    peer_stats = load_peer_stats()
+
+    entries: Dict[str, Any] = {}
+    for key, rows in panel.groupby("company", sort=True):
+        company = str(key)
+        bundle = build_company_bundle(
+            company,
+            rows,
+            metrics.get(company, {}),
+            health_scores.get(company, {}),
+            company_peer_records(peer_stats, company),
+        )
+        entry = _write_variants(output_dir, company, _encode(bundle))
+        entry["periods"] = len(rows)
+        entry["latest_period"] = rows["period"].iloc[-1]
+        entries[company] = entry
+        logger.info(f"Bundle: {entry['file']} ({entry['bytes']} bytes)")
+
+    version = hashlib.sha256(
+        "".join(entries[c]["sha256"] for c in sorted(entries)).encode("utf-8")
+    ).hexdigest()[:HASH_LENGTH]
+    manifest_path = output_dir / MANIFEST_NAME
+    previous = _load_manifest(manifest_path)
+    unchanged = previous.get("version") == version
+    manifest = {
+        "schema_version": BUNDLE_SCHEMA_VERSION,
+        "version": version,
+        "flow_basis": FLOW_BASIS,
+        # Keep the timestamp of unchanged bundles so the manifest bytes stay identical
+        "generated_at": (
+            previous["generated_at"] if unchanged else datetime.now().isoformat(timespec="seconds")
+        ),
+        "companies": entries,
+    }
+    content = json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8")
+    if not write_if_changed(manifest_path, content):
+        logger.info(f"Bundle unchanged (version {version})")
+
+    keep = _variant_files(entries)
+    removed = _remove_stale(output_dir, keep)
+    if removed:
+        logger.info(f"Removed {removed} stale bundle files")
+
+    frontend_bundle = frontend_dir / output_dir.name if frontend_dir is not None else None
+    if frontend_bundle is not None:
+        copied = sync_directory(output_dir, frontend_bundle, "*.json*")
+        _remove_stale(frontend_bundle, keep)
+        logger.info(f"Synced {copied} bundle files to {frontend_bundle}")
+
+    publish_chart_series(
+        panel,
+        output_dir / CHARTS_DIR_NAME,
+        frontend_bundle / CHARTS_DIR_NAME if frontend_bundle is not None else None,
+    )
+
+    return manifest
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="Publish dashboard data bundle")
+    parser.add_argument(
+        "--no-frontend",
+        action="store_true",
+        help="frontend/public/data へのコピーを行わない",
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        manifest = publish_bundle(frontend_dir=None if args.no_frontend else FRONTEND_DATA_DIR)
+        logger.info(f"Published bundle version {manifest['version']}")
+        return 0
+
+    except Exception as e:
+        logger.error(f"Fatal error: {str(e)}", exc_info=True)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""
+差分発行 (delta publishing)
+出力を正規化した内容でハッシュし、内容が変わったファイルだけを書き込み・ステージする
+"""
+
+import csv
+import hashlib
+import io
+import json
+import os
+import subprocess
+import tempfile
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from panel import DATA_DIR, PROJECT_ROOT
+
+# Publish manifest (hashes and row counts of every published output)
+PUBLISH_MANIFEST_PATH = DATA_DIR / "publish_manifest.json"
+PUBLISH_MANIFEST_VERSION = "1.0.0"
+
+# Decimal places kept for numeric values (億円 / %)
+CANONICAL_DIGITS = 2
+
+
+def format_value(value: Any) -> str:
+    """
+    CSV出力用に値を正規化
+
+    浮動小数点の表記揺れ (1234.5 / 1234.50 / -0.0 など) をなくし、同じ値は常に同じ文字列にする。
+    """
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        if value != value:  # NaN
+            return ""
+        rounded = round(value, CANONICAL_DIGITS)
+        if rounded == 0:
+            rounded = 0.0
+        return repr(rounded)
+    return str(value)
+
+
+def render_csv(rows: Iterable[Dict[str, Any]], fields: Sequence[str]) -> str:
+    """
+    行を正規化したCSVテキストに変換
+
+    行は値の並びでソートするため、入力順 (キャッシュファイルの列挙順など) に依存しない。
+    """
+    lines = sorted(tuple(format_value(row.get(f)) for f in fields) for row in rows)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(fields)
+    writer.writerows(lines)
+    return buffer.getvalue()
+
+
+def content_hash(content: bytes) -> str:
+    """内容の SHA-256"""
+    return hashlib.sha256(content).hexdigest()
+
+
+def file_hash(path: Path, chunk_size: int = 1 << 20) -> str:
+    """ファイル内容の SHA-256 (全体をメモリに読み込まない)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_if_changed(path: Path, content: bytes) -> bool:
+    """
+    内容が変わった場合のみアトミックに書き込む
+
+    Returns:
+        書き込んだかどうか
+    """
+    if path.exists() and content_hash(path.read_bytes()) == content_hash(content):
+        return False
+    atomic_write_bytes(path, content)
+    return True
+
+
+def atomic_write_bytes(path: Path, content: bytes) -> None:
+    """一時ファイルに書いてから置換する (途中で落ちても壊れたファイルを残さない)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+@dataclass
+class PublishReport:
+    """発行結果 (変更・未変更の出力)"""
+
+    changed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    paths: List[Path] = field(default_factory=list)
+
+    def summary(self) -> str:
+        if not self.changed:
+            return f"No outputs changed ({len(self.unchanged)} unchanged)"
+        return (
+            f"{len(self.changed)} output(s) changed: {', '.join(sorted(self.changed))} "
+            f"({len(self.unchanged)} unchanged)"
+        )
+
+
+class PublishManifest:
+    """発行マニフェスト (出力キー -> ハッシュ・行数)"""
+
+    def __init__(self, path: Path = PUBLISH_MANIFEST_PATH) -> None:
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.report = PublishReport()
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("outputs", {})
+
+    def publish(self, key: str, path: Path, content: bytes, rows: int) -> bool:
+        """
+        出力を発行 (内容が変わった場合のみ書き込み)
+
+        Args:
+            key: 出力キー (例: "TEPCO/pl")
+            path: 出力ファイルパス
+            content: 正規化済みの内容
+            rows: データ行数
+
+        Returns:
+            変更があったかどうか
+        """
+        digest = content_hash(content)
+        written = write_if_changed(path, content)
+        return self._record(key, path, digest, rows, written)
+
+    def publish_file(self, key: str, path: Path, staged: Path, digest: str, rows: int) -> bool:
+        """
+        書き込み済みの一時ファイルを発行 (内容が変わった場合のみ置き換え、同じなら削除)
+
+        Args:
+            key: 出力キー (例: "TEPCO/pl")
+            path: 出力ファイルパス
+            staged: 正規化済みの内容を書いた一時ファイル (path と同じディレクトリ)
+            digest: 一時ファイルの SHA-256
+            rows: データ行数
+
+        Returns:
+            変更があったかどうか
+        """
+        written = not path.exists() or file_hash(path) != digest
+        if written:
+            os.replace(staged, path)
+        else:
+            staged.unlink()
+        return self._record(key, path, digest, rows, written)
+
+    def _record(self, key: str, path: Path, digest: str, rows: int, written: bool) -> bool:
+        previous = self.entries.get(key, {})
+
+        if written or previous.get("sha256") != digest:
+            self.entries[key] = {
+                "file": _relative(path),
+                "sha256": digest,
+                "rows": rows,
+                "updated_at": datetime.now().isoformat(timespec="seconds"),
+            }
+            self.report.changed.append(key)
+            self.report.paths.append(path)
+            return True
+
+        self.report.unchanged.append(key)
+        return False
+
+    def save(self) -> bool:
+        """
+        マニフェストを保存 (エントリに変更がある場合のみ)
+
+        Returns:
+            書き込んだかどうか
+        """
+        content = json.dumps(
+            {"schema_version": PUBLISH_MANIFEST_VERSION, "outputs": self.entries},
+            ensure_ascii=False,
+            indent=2,
+            sort_keys=True,
+        ).encode("utf-8")
+        written = write_if_changed(self.path, content + b"\n")
+        if written:
+            self.report.paths.append(self.path)
+        return written
+
+
+def _relative(path: Path) -> str:
+    try:
+        return path.resolve().relative_to(PROJECT_ROOT.resolve()).as_posix()
+    except ValueError:
+        return str(path)
+
+
+def stage_paths(paths: Sequence[Path], repo_root: Optional[Path] = None) -> bool:
+    """
+    変更されたファイルのみ git add する
+
+    Returns:
+        ステージしたかどうか (対象なし・git 失敗時は False)
+    """
+    if not paths:
+        return False
+    root = repo_root or PROJECT_ROOT
+    result = subprocess.run(
+        ["git", "add", "--", *[str(p) for p in paths]],
+        cwd=root,
+        capture_output=True,
+        text=True,
+    )
+    return result.returncode == 0
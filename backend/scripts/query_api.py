@@ -0,0 +1,572 @@
+"""
+財務データのローカル参照API (読み取り専用)
+抽出済みの財務諸表・派生指標・健全性スコア・注記を企業・期間・項目で絞り込んで返す。
+応答は LRU キャッシュに保持し、データの発行バージョンを ETag として条件付きGETに対応する
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from financial_store import FinancialStore
+from logger import get_api_logger
+from notes_index import NotesIndex, group_notes
+from panel import DATA_DIR, NUMERIC_FIELDS, PERIOD_PATTERN, STATEMENTS
+
+# Logger
+logger = get_api_logger()
+
+# Server defaults
+API_HOST = os.getenv("FINSIGHT_API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("FINSIGHT_API_PORT", "8765"))
+API_CACHE_SIZE = int(os.getenv("FINSIGHT_API_CACHE_SIZE", "512"))
+
+# Minimum seconds between data version checks (stat calls on every request are avoided)
+RELOAD_INTERVAL = 1.0
+
+# Response formats
+#   json:     list of row objects
+#   columnar: one array per column (smaller, maps directly onto typed arrays)
+RESPONSE_FORMATS = ("json", "columnar")
+
+# Input files (relative to the data directory)
+PUBLISH_MANIFEST_FILE = "publish_manifest.json"
+METRICS_FILE = "metrics.json"
+HEALTH_SCORES_FILE = "health_scores.json"
+NOTES_FILE = "xbrl_notes.json"
+NOTE_CATEGORIES = ("risk", "policy_change", "info")
+
+
+class QueryError(ValueError):
+    """不正なクエリパラメータ (HTTP 400)"""
+
+    pass
+
+
+def data_version(data_dir: Path = DATA_DIR) -> str:
+    """
+    データの発行バージョン
+
+    発行マニフェスト (内容が変わった出力のハッシュを記録) と各入力ファイルのサイズ・更新時刻から算出する。
+
+    Returns:
+        16桁の16進文字列
+    """
+    digest = hashlib.sha256()
+    manifest = data_dir / PUBLISH_MANIFEST_FILE
+    if manifest.exists():
+        digest.update(manifest.read_bytes())
+
+    inputs = sorted((data_dir / "financials").glob("*_quarterly.csv"))
+    inputs += [data_dir / name for name in (METRICS_FILE, HEALTH_SCORES_FILE, NOTES_FILE)]
+    for path in inputs:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()[:16]
+
+
+def _load_json(path: Path) -> Dict[str, Any]:
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        data: Dict[str, Any] = json.load(f)
+    return data
+
+
+@dataclass
+class DataSnapshot:
+    """ある発行バージョンのデータ一式 (読み取り専用)"""
+
+    version: str
+    store: FinancialStore
+    metrics: Dict[str, Dict[str, Dict[str, float]]]
+    health_scores: Dict[str, Dict[str, Dict[str, float]]]
+    notes: List[Dict[str, Any]]
+    metric_names: Tuple[str, ...] = ()
+    score_names: Tuple[str, ...] = ()
+    loaded_at: float = field(default_factory=time.time)
+    _notes_index: Optional[NotesIndex] = field(default=None, repr=False)
+    _notes_grouped: Dict[Tuple[str, str], List[Dict[str, Any]]] = field(
+        default_factory=dict, repr=False
+    )
+    _notes_lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def notes_index(self) -> Tuple[NotesIndex, Dict[Tuple[str, str], List[Dict[str, Any]]]]:
+        """注記の bigram インデックス (最初の全文検索時に作成)"""
+        with self._notes_lock:
+            if self._notes_index is None:
+                self._notes_index = NotesIndex.build(self.notes)
+                self._notes_grouped = group_notes(self.notes)
+            return self._notes_index, self._notes_grouped
+
+
+def _value_names(companies: Dict[str, Dict[str, Dict[str, float]]]) -> Tuple[str, ...]:
+    return tuple(sorted({n for periods in companies.values() for v in periods.values() for n in v}))
+
+
+def load_snapshot(data_dir: Path = DATA_DIR) -> DataSnapshot:
+    """データディレクトリからスナップショットを読み込む"""
+    version = data_version(data_dir)
+    metrics = _load_json(data_dir / METRICS_FILE).get("companies", {})
+    health_scores = _load_json(data_dir / HEALTH_SCORES_FILE).get("companies", {})
+    return DataSnapshot(
+        version=version,
+        store=FinancialStore.load_csv(directory=data_dir / "financials"),
+        metrics=metrics,
+        health_scores=health_scores,
+        notes=_load_json(data_dir / NOTES_FILE).get("notes", []),
+        metric_names=_value_names(metrics),
+        score_names=_value_names(health_scores),
+    )
+
+
+class DataRepository:
+    """
+    現在のスナップショットを保持し、発行バージョンが変わったら読み直す
+
+    バージョン確認は RELOAD_INTERVAL 秒に1回まで。読み込み中も旧スナップショットで応答を続ける。
+    """
+
+    def __init__(self, data_dir: Path = DATA_DIR, reload_interval: float = RELOAD_INTERVAL):
+        self.data_dir = data_dir
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._snapshot = load_snapshot(data_dir)
+        self._checked_at = time.monotonic()
+
+    def current(self) -> DataSnapshot:
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return self._snapshot
+        if not self._lock.acquire(blocking=False):
+            return self._snapshot
+        try:
+            self._checked_at = now
+            if data_version(self.data_dir) != self._snapshot.version:
+                self._snapshot = load_snapshot(self.data_dir)
+                logger.info(f"Reloaded data (version {self._snapshot.version})")
+        finally:
+            self._lock.release()
+        return self._snapshot
+
+
+class LRUCache:
+    """スレッドセーフな LRU キャッシュ (エンコード済み応答を保持)"""
+
+    def __init__(self, capacity: int = API_CACHE_SIZE) -> None:
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[Any, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Optional[bytes]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Any, value: bytes) -> None:
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._items),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+            }
+
+
+@dataclass(frozen=True)
+class Query:
+    """正規化したクエリ (キャッシュキーにも使う)"""
+
+    companies: Tuple[str, ...] = ()
+    start: Optional[str] = None
+    end: Optional[str] = None
+    fields: Tuple[str, ...] = ()
+    statement: Optional[str] = None
+    category: Optional[str] = None
+    text: Optional[str] = None
+    format: str = "json"
+
+
+def _split(values: List[str], sort: bool = True) -> Tuple[str, ...]:
+    items = [item.strip() for value in values for item in value.split(",")]
+    unique = tuple(dict.fromkeys(item for item in items if item))
+    return tuple(sorted(unique)) if sort else unique
+
+
+def parse_query(query_string: str) -> Query:
+    """
+    クエリ文字列を解析
+
+    パラメータ: company (カンマ区切り可), from, to (YYYYQn), fields, statement (pl/bs/cf),
+    category (注記), q (注記の全文検索、空白区切りで AND), format (json/columnar)
+
+    Raises:
+        QueryError: 不正な値
+    """
+    params = parse_qs(query_string, keep_blank_values=False)
+    known = {"company", "from", "to", "fields", "statement", "category", "q", "format"}
+    unknown = sorted(set(params) - known)
+    if unknown:
+        raise QueryError(f"Unknown parameter(s): {', '.join(unknown)}")
+
+    def single(name: str) -> Optional[str]:
+        values = params.get(name)
+        if not values:
+            return None
+        if len(values) > 1:
+            raise QueryError(f"Parameter '{name}' given more than once")
+        return values[0].strip() or None
+
+    start, end = single("from"), single("to")
+    for name, value in (("from", start), ("to", end)):
+        if value is not None and not PERIOD_PATTERN.match(value):
+            raise QueryError(f"Invalid period for '{name}': {value} (expected YYYYQn)")
+    if start and end and start > end:
+        raise QueryError(f"'from' ({start}) is after 'to' ({end})")
+
+    statement = single("statement")
+    if statement is not None and statement not in STATEMENTS:
+        raise QueryError(f"Invalid statement: {statement} (expected one of {STATEMENTS})")
+
+    category = single("category")
+    if category is not None and category not in NOTE_CATEGORIES:
+        raise QueryError(f"Invalid category: {category} (expected one of {NOTE_CATEGORIES})")
+
+    response_format = single("format") or "json"
+    if response_format not in RESPONSE_FORMATS:
+        raise QueryError(f"Invalid format: {response_format} (expected one of {RESPONSE_FORMATS})")
+
+    return Query(
+        companies=_split(params.get("company", [])),
+        start=start,
+        end=end,
+        fields=_split(params.get("fields", []), sort=False),
+        statement=statement,
+        category=category,
+        text=single("q"),
+        format=response_format,
+    )
+
+
+def _in_range(period: str, query: Query) -> bool:
+    return (query.start is None or period >= query.start) and (
+        query.end is None or period <= query.end
+    )
+
+
+def _shape(rows: List[Dict[str, Any]], columns: Sequence[str], query: Query) -> Dict[str, Any]:
+    """行リストを指定の形式に整形"""
+    if query.format == "columnar":
+        return {
+            "columns": {c: [row.get(c) for row in rows] for c in columns},
+            "count": len(rows),
+        }
+    return {"rows": rows, "count": len(rows)}
+
+
+def query_financials(snapshot: DataSnapshot, query: Query) -> Dict[str, Any]:
+    """財務諸表の値"""
+    store = snapshot.store
+    if query.statement:
+        store = store.statement(query.statement)
+    available = store.fields
+
+    fields = [f for f in query.fields or available if f in available]
+
+    if query.companies:
+        store = store.select_companies(*query.companies)
+    store = store.period_range(query.start, query.end)
+
+    if query.format == "columnar":
+        # Build columns straight from the typed arrays
+        columns: Dict[str, List[Any]] = {
+            "company": store.company.tolist(),
+            "period": store.period,
+            "date": [d or None for d in store.date.tolist()],
+        }
+        for f in fields:
+            values = store.values[f].astype(object)
+            values[~store.mask[f]] = None
+            columns[f] = values.tolist()
+        return {"columns": columns, "count": len(store)}
+
+    rows = [
+        {k: v for k, v in record.items() if k in ("company", "period", "date") or k in fields}
+        for record in store.take(np.arange(len(store)), fields).to_records()
+    ]
+    return _shape(rows, ["company", "period", "date", *fields], query)
+
+
+def _query_period_map(
+    companies: Dict[str, Dict[str, Dict[str, float]]], names: Sequence[str], query: Query
+) -> Dict[str, Any]:
+    """companies[企業][期間] = {名前: 値} 形式のデータ (派生指標・スコア)"""
+    fields = list(query.fields) or list(names)
+
+    rows = []
+    for company in sorted(companies):
+        if query.companies and company not in query.companies:
+            continue
+        for period, values in sorted(companies[company].items()):
+            if _in_range(period, query):
+                rows.append(
+                    {"company": company, "period": period, **{f: values.get(f) for f in fields}}
+                )
+    return _shape(rows, ["company", "period", *fields], query)
+
+
+def query_metrics(snapshot: DataSnapshot, query: Query) -> Dict[str, Any]:
+    """派生指標"""
+    return _query_period_map(snapshot.metrics, snapshot.metric_names, query)
+
+
+def query_health_scores(snapshot: DataSnapshot, query: Query) -> Dict[str, Any]:
+    """財務健全性スコア"""
+    return _query_period_map(snapshot.health_scores, snapshot.score_names, query)
+
+
+def query_notes(snapshot: DataSnapshot, query: Query) -> Dict[str, Any]:
+    """注記 (q 指定時は bigram インデックスで全文検索)"""
+    if query.text:
+        index, grouped = snapshot.notes_index()
+        rows = index.search(
+            query.text,
+            grouped,
+            companies=query.companies,
+            start=query.start,
+            end=query.end,
+            category=query.category,
+        )
+    else:
+        rows = [
+            note
+            for note in snapshot.notes
+            if (not query.companies or note.get("company") in query.companies)
+            and _in_range(str(note.get("period", "")), query)
+            and (query.category is None or note.get("category") == query.category)
+        ]
+    columns = list(query.fields) or sorted({k for note in rows for k in note})
+    if query.fields:
+        rows = [{k: note.get(k) for k in columns} for note in rows]
+    return _shape(rows, columns, query)
+
+
+# Endpoint path -> handler
+ROUTES: Dict[str, Callable[[DataSnapshot, Query], Dict[str, Any]]] = {
+    "/v1/financials": query_financials,
+    "/v1/metrics": query_metrics,
+    "/v1/health_scores": query_health_scores,
+    "/v1/notes": query_notes,
+}
+
+
+def validate_fields(snapshot: DataSnapshot, path: str, query: Query) -> None:
+    """
+    fields パラメータを検証 (応答を作らずに判定できるので、304 の判定より前に呼ぶ)
+
+    Raises:
+        QueryError: エンドポイントに存在しない項目名
+    """
+    known: Sequence[str]
+    if path == "/v1/financials":
+        known = NUMERIC_FIELDS
+    elif path == "/v1/metrics":
+        known = snapshot.metric_names
+    elif path == "/v1/health_scores":
+        known = snapshot.score_names
+    else:
+        return
+    invalid = [f for f in query.fields if f not in known]
+    # Empty outputs have no names yet; their queries return no rows rather than an error
+    if invalid and known:
+        raise QueryError(f"Unknown field(s): {', '.join(invalid)}")
+
+
+def _etag(version: str) -> str:
+    return f'"{version}"'
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    """読み取り専用の GET ハンドラ"""
+
+    server: "QueryServer"
+    protocol_version = "HTTP/1.1"
+    server_version = "FinSightQueryAPI/1.0"
+
+    def do_GET(self) -> None:  # noqa: N802 (BaseHTTPRequestHandler API)
+        url = urlsplit(self.path)
+        snapshot = self.server.repository.current()
+
+        if url.path == "/health":
+            self._send_json(
+                200,
+                {
+                    "status": "ok",
+                    "version": snapshot.version,
+                    "companies": snapshot.store.companies.tolist(),
+                    "rows": len(snapshot.store),
+                    "cache": self.server.cache.stats(),
+                },
+                cache_control="no-store",
+            )
+            return
+
+        handler = ROUTES.get(url.path)
+        if handler is None:
+            self._send_json(404, {"error": f"Not found: {url.path}"})
+            return
+
+        try:
+            query = parse_query(url.query)
+            validate_fields(snapshot, url.path, query)
+        except QueryError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        # The ETag depends only on the data version, so a valid query is answered 304
+        # without building (or caching) the response body
+        etag = _etag(snapshot.version)
+        if _etag_matches(self.headers.get("If-None-Match"), etag):
+            self._send(304, b"", etag=etag)
+            return
+
+        key = (snapshot.version, url.path, query)
+        body = self.server.cache.get(key)
+        if body is None:
+            body = json.dumps(
+                {"version": snapshot.version, **handler(snapshot, query)},
+                ensure_ascii=False,
+                separators=(",", ":"),
+            ).encode("utf-8")
+            self.server.cache.put(key, body)
+        self._send(200, body, etag=etag)
+
+    def do_HEAD(self) -> None:  # noqa: N802
+        self.send_error(405, "Method Not Allowed")
+
+    def _send_json(self, status: int, payload: Dict[str, Any], cache_control: str = "") -> None:
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self._send(status, body, cache_control=cache_control or "no-cache")
+
+    def _send(
+        self, status: int, body: bytes, etag: Optional[str] = None, cache_control: str = "no-cache"
+    ) -> None:
+        self.send_response(status)
+        if status != 304:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", cache_control)
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class QueryServer(ThreadingHTTPServer):
+    """リポジトリと応答キャッシュを持つスレッド型HTTPサーバ"""
+
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        repository: DataRepository,
+        cache: LRUCache,
+    ) -> None:
+        super().__init__(address, QueryRequestHandler)
+        self.repository = repository
+        self.cache = cache
+
+
+def create_server(
+    host: str = API_HOST,
+    port: int = API_PORT,
+    data_dir: Path = DATA_DIR,
+    cache_size: int = API_CACHE_SIZE,
+) -> QueryServer:
+    """サーバを作成 (port=0 で空きポートを使用)"""
+    return QueryServer((host, port), DataRepository(data_dir), LRUCache(cache_size))
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """コマンドライン引数を解析"""
+    parser = argparse.ArgumentParser(description="FinSight local query API (read-only)")
+    parser.add_argument("--host", default=API_HOST, help="待ち受けアドレス")
+    parser.add_argument("--port", type=int, default=API_PORT, help="待ち受けポート")
+    parser.add_argument(
+        "--cache-size", type=int, default=API_CACHE_SIZE, help="応答キャッシュの件数上限"
+    )
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR, help="データディレクトリ")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """メイン処理"""
+    args = parse_args(argv)
+    try:
+        server = create_server(args.host, args.port, args.data_dir, args.cache_size)
+    except OSError as e:
+        logger.error(f"Failed to start server: {str(e)}")
+        return 1
+
+    snapshot = server.repository.current()
+    logger.info(
+        f"Serving {len(snapshot.store)} rows (version {snapshot.version}) "
+        f"on http://{args.host}:{server.server_address[1]}"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down")
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
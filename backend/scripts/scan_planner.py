@@ -0,0 +1,234 @@
+"""
+EDINET 書類一覧APIの走査日計画
+決算期末と法定提出期限 (四半期: 期末後45日、有価証券報告書: 期末後3ヶ月) および
+日本の営業日カレンダーから、報告書が提出され得る日だけを走査対象にする
+"""
+
+from dataclasses import dataclass
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import FrozenSet, Iterable, List, Set, Tuple
+
+# Scan modes
+#   full:     every calendar day (default; amendments filed outside the windows are found)
+#   deadline: business days from period end to the statutory deadline (opt-in)
+#   likely:   business days in the last `likely_days` before each deadline (opt-in)
+SCAN_MODES = ("full", "deadline", "likely")
+
+# Statutory filing deadlines
+QUARTERLY_DEADLINE_DAYS = 45
+ANNUAL_DEADLINE_MONTHS = 3
+
+# Default width of the "likely" window before each deadline (calendar days)
+LIKELY_WINDOW_DAYS = 21
+
+# One-off holidays (imperial succession 2019) and moved holidays (Olympics 2020/2021)
+SPECIAL_HOLIDAYS = {
+    date(2019, 4, 30),
+    date(2019, 5, 1),
+    date(2019, 5, 2),
+    date(2019, 10, 22),
+}
+MOVED_HOLIDAYS = {
+    2020: {"marine": date(2020, 7, 23), "sports": date(2020, 7, 24), "mountain": date(2020, 8, 10)},
+    2021: {"marine": date(2021, 7, 22), "sports": date(2021, 7, 23), "mountain": date(2021, 8, 8)},
+}
+
+
+@dataclass
+class ScanPlan:
+    """走査計画"""
+
+    dates: List[date]  # newest first (scan order)
+    total_days: int
+    mode: str
+
+    @property
+    def skipped_days(self) -> int:
+        return self.total_days - len(self.dates)
+
+
+def _nth_monday(year: int, month: int, n: int) -> date:
+    first = date(year, month, 1)
+    offset = (7 - first.weekday()) % 7
+    return first + timedelta(days=offset + 7 * (n - 1))
+
+
+def _vernal_equinox(year: int) -> date:
+    day = int(20.8431 + 0.242194 * (year - 1980)) - (year - 1980) // 4
+    return date(year, 3, day)
+
+
+def _autumnal_equinox(year: int) -> date:
+    day = int(23.2488 + 0.242194 * (year - 1980)) - (year - 1980) // 4
+    return date(year, 9, day)
+
+
+@lru_cache(maxsize=None)
+def japanese_holidays(year: int) -> FrozenSet[date]:
+    """
+    国民の祝日・振替休日・国民の休日 (2000年以降の祝日法に基づく)
+
+    Args:
+        year: 西暦年
+
+    Returns:
+        祝日の集合
+    """
+    moved = MOVED_HOLIDAYS.get(year, {})
+    holidays: Set[date] = {
+        date(year, 1, 1),
+        _nth_monday(year, 1, 2),
+        date(year, 2, 11),
+        _vernal_equinox(year),
+        date(year, 4, 29),
+        date(year, 5, 3),
+        date(year, 5, 4),
+        date(year, 5, 5),
+        _nth_monday(year, 9, 3),
+        _autumnal_equinox(year),
+        date(year, 11, 3),
+        date(year, 11, 23),
+    }
+
+    # Emperor's birthday
+    if year >= 2020:
+        holidays.add(date(year, 2, 23))
+    elif year <= 2018:
+        holidays.add(date(year, 12, 23))
+
+    # Marine day, sports day, mountain day
+    holidays.add(moved.get("marine", _nth_monday(year, 7, 3)))
+    holidays.add(moved.get("sports", _nth_monday(year, 10, 2)))
+    if year >= 2016:
+        holidays.add(moved.get("mountain", date(year, 8, 11)))
+
+    holidays |= {d for d in SPECIAL_HOLIDAYS if d.year == year}
+
+    # Substitute holiday: a holiday on Sunday moves to the next non-holiday
+    for holiday in sorted(holidays):
+        if holiday.weekday() == 6:
+            substitute = holiday + timedelta(days=1)
+            while substitute in holidays:
+                substitute += timedelta(days=1)
+            holidays.add(substitute)
+
+    # Citizens' holiday: a weekday sandwiched between two holidays
+    for holiday in sorted(holidays):
+        between = holiday + timedelta(days=1)
+        if between not in holidays and between + timedelta(days=1) in holidays:
+            if between.weekday() != 6:
+                holidays.add(between)
+
+    return frozenset(holidays)
+
+
+def is_business_day(day: date) -> bool:
+    """
+    EDINET の営業日かどうか (土日・祝日・年末年始 12/29-1/3 を除く)
+    """
+    if day.weekday() >= 5:
+        return False
+    if (day.month == 12 and day.day >= 29) or (day.month == 1 and day.day <= 3):
+        return False
+    return day not in japanese_holidays(day.year)
+
+
+def next_business_day(day: date) -> date:
+    """day 以降で最初の営業日"""
+    while not is_business_day(day):
+        day += timedelta(days=1)
+    return day
+
+
+def _add_months(day: date, months: int) -> date:
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    # Clamp to the last day of the target month
+    last_day = (date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)).day
+    return date(year, month, min(day.day, last_day))
+
+
+def _month_end(year: int, month: int) -> date:
+    return _add_months(date(year, month, 1), 1) - timedelta(days=1)
+
+
+def filing_windows(
+    start: date,
+    end: date,
+    fiscal_year_end_month: int = 3,
+) -> List[Tuple[date, date]]:
+    """
+    期間内に締切を持つ提出期間 (期末翌日 〜 提出期限) の一覧
+
+    期末は決算月とその3・6・9ヶ月後。決算期末の報告書は有価証券報告書 (3ヶ月)、
+    それ以外は四半期報告書 (45日) の期限とする。期限が休業日なら翌営業日まで延長。
+
+    Args:
+        start: 走査開始日
+        end: 走査終了日
+        fiscal_year_end_month: 決算月 (1-12)
+
+    Returns:
+        (期末, 提出期限) のリスト
+    """
+    windows = []
+    # Periods ending up to 3 months before `start` can still have deadlines inside the range
+    for year in range(start.year - 1, end.year + 1):
+        for offset in (0, 3, 6, 9):
+            month = (fiscal_year_end_month - 1 + offset) % 12 + 1
+            period_end = _month_end(year, month)
+            if offset == 0:
+                deadline = _add_months(period_end, ANNUAL_DEADLINE_MONTHS)
+            else:
+                deadline = period_end + timedelta(days=QUARTERLY_DEADLINE_DAYS)
+            deadline = next_business_day(deadline)
+            if deadline >= start and period_end <= end:
+                windows.append((period_end, deadline))
+    return sorted(windows)
+
+
+def plan_scan_dates(
+    start: date,
+    end: date,
+    fiscal_year_end_months: Iterable[int] = (3,),
+    mode: str = "full",
+    likely_days: int = LIKELY_WINDOW_DAYS,
+) -> ScanPlan:
+    """
+    走査対象日を計画
+
+    Args:
+        start: 走査開始日
+        end: 走査終了日
+        fiscal_year_end_months: 対象企業の決算月 (複数企業の場合は和集合)
+        mode: "full" / "deadline" / "likely" (deadline と likely は提出期間外の訂正報告書を走査しない)
+        likely_days: likely モードで期限前に走査する日数
+
+    Returns:
+        走査計画 (新しい日付から順)
+    """
+    if mode not in SCAN_MODES:
+        raise ValueError(f"Unknown scan mode: {mode} (expected one of {SCAN_MODES})")
+
+    total_days = (end - start).days + 1
+    if total_days <= 0:
+        return ScanPlan(dates=[], total_days=0, mode=mode)
+
+    if mode == "full":
+        dates = [end - timedelta(days=i) for i in range(total_days)]
+        return ScanPlan(dates=dates, total_days=total_days, mode=mode)
+
+    selected: Set[date] = set()
+    for month in set(fiscal_year_end_months):
+        for period_end, deadline in filing_windows(start, end, month):
+            first = period_end + timedelta(days=1)
+            if mode == "likely":
+                first = max(first, deadline - timedelta(days=likely_days))
+            day = max(first, start)
+            while day <= min(deadline, end):
+                if is_business_day(day):
+                    selected.add(day)
+                day += timedelta(days=1)
+
+    return ScanPlan(dates=sorted(selected, reverse=True), total_days=total_days, mode=mode)
@@ -0,0 +1,229 @@
+"""
+複数ワーカー (プロセス / ノード) での分散取得
+走査日をシャードに分割し、共有キャッシュ上の docID リース (ロックファイルの flock) で
+同じ書類を二重にダウンロードしないようにする。シャードごとの状態は最後に1つの索引へ統合する
+"""
+
+import fcntl
+import json
+import os
+import socket
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Dict, List, Optional, Sequence, Type
+
+from checkpoint import atomic_write_json
+
+# Shared cache layout
+CACHE_DIR = Path(__file__).parent.parent.parent / "data" / ".cache"
+LOCK_DIR = CACHE_DIR / "locks"
+SHARD_DIR = CACHE_DIR / "shards"
+DOCUMENT_INDEX_PATH = CACHE_DIR / "document_index.json"
+
+
+def select_shard_dates(dates: Sequence[date], shard_index: int, shard_count: int) -> List[date]:
+    """
+    走査日をシャードに割り当てる (日付の通し番号で交互に分配し、負荷を均等にする)
+
+    Args:
+        dates: 走査計画の日付
+        shard_index: 自シャード番号 (0始まり)
+        shard_count: シャード数
+
+    Returns:
+        自シャードが担当する日付 (元の順序を保持)
+    """
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"shard_index must be in [0, {shard_count}): {shard_index}")
+    return [d for d in dates if d.toordinal() % shard_count == shard_index]
+
+
+def worker_id() -> str:
+    """ホスト名とPIDによるワーカー識別子"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class DocumentLease:
+    """
+    docID 単位のリース (共有キャッシュ上のロックファイルへの排他 flock)
+
+    flock はプロセス終了時に OS が解放するため、落ちたワーカーのリースは期限を待たずに
+    他のワーカーが取得できる。解放時はロックを保持したままファイルを削除し、取得側は
+    ロック後にファイルが差し替わっていないこと (inode の一致) を確認してから取得とみなす。
+
+    使い方:
+        with DocumentLease(doc_id) as lease:
+            if lease.acquired:
+                ...
+    """
+
+    def __init__(self, doc_id: str, lock_dir: Path = LOCK_DIR) -> None:
+        self.doc_id = doc_id
+        self.path = lock_dir / f"{doc_id}.lock"
+        self.owner = worker_id()
+        self.acquired = False
+        self._fd: Optional[int] = None
+
+    def acquire(self) -> bool:
+        """リースを取得 (他ワーカーが保持していれば False)"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            fd = os.open(self.path, os.O_CREAT | os.O_RDWR)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return False
+
+            # The previous holder may have unlinked the file between our open and flock
+            try:
+                current = os.stat(self.path)
+            except FileNotFoundError:
+                current = None
+            if current is None or current.st_ino != os.fstat(fd).st_ino:
+                os.close(fd)
+                continue
+
+            os.ftruncate(fd, 0)
+            os.write(fd, json.dumps({"owner": self.owner, "acquired_at": time.time()}).encode())
+            self._fd = fd
+            self.acquired = True
+            return True
+
+    def release(self) -> None:
+        """リースを解放 (ロックを保持したままロックファイルを削除)"""
+        if self.acquired and self._fd is not None:
+            self.path.unlink(missing_ok=True)
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+            self.acquired = False
+
+    def __enter__(self) -> "DocumentLease":
+        self.acquire()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        self.release()
+
+
+@dataclass
+class ShardState:
+    """1シャード分の走査・ダウンロード状態"""
+
+    shard_index: int
+    shard_count: int
+    start_date: str
+    end_date: str
+    scan_mode: str
+    cursor: Optional[str] = None
+    found_docs: List[Dict[str, Any]] = field(default_factory=list)
+    downloaded: List[str] = field(default_factory=list)
+    failed_dates: List[str] = field(default_factory=list)  # retried on resume
+    scan_complete: bool = False
+    worker: Optional[str] = None
+    updated_at: Optional[str] = None
+
+    def add_document(self, doc: Dict[str, Any]) -> bool:
+        """書類を追加 (docID が既出なら追加しない)"""
+        if any(d.get("docID") == doc.get("docID") for d in self.found_docs):
+            return False
+        self.found_docs.append(doc)
+        return True
+
+    def is_scanned(self, date_str: str) -> bool:
+        """カーソルより新しい (走査済みの) 日付かどうか (取得に失敗した日付は含めない)"""
+        return (
+            self.cursor is not None
+            and date_str >= self.cursor
+            and date_str not in self.failed_dates
+        )
+
+    def mark_scanned(self, date_str: str, success: bool) -> None:
+        """日付の走査結果を記録 (ScanCheckpoint.mark_scanned と同じ規則)"""
+        if self.cursor is None or date_str < self.cursor:
+            self.cursor = date_str
+        if success:
+            if date_str in self.failed_dates:
+                self.failed_dates.remove(date_str)
+        elif date_str not in self.failed_dates:
+            self.failed_dates.append(date_str)
+
+
+def shard_state_path(shard_index: int, shard_count: int, directory: Path = SHARD_DIR) -> Path:
+    return directory / f"shard-{shard_index}-of-{shard_count}.json"
+
+
+def load_shard_state(
+    shard_index: int, shard_count: int, directory: Path = SHARD_DIR
+) -> Optional[ShardState]:
+    """シャード状態を読み込む (存在しない・壊れている場合は None)"""
+    path = shard_state_path(shard_index, shard_count, directory)
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return ShardState(**json.load(f))
+    except (json.JSONDecodeError, TypeError):
+        return None
+
+
+def save_shard_state(state: ShardState, directory: Path = SHARD_DIR) -> None:
+    """シャード状態をアトミックに保存"""
+    state.worker = worker_id()
+    state.updated_at = datetime.now().isoformat(timespec="seconds")
+    path = shard_state_path(state.shard_index, state.shard_count, directory)
+    atomic_write_json(path, asdict(state))
+
+
+def merge_shard_states(
+    shard_count: int,
+    directory: Path = SHARD_DIR,
+    index_path: Path = DOCUMENT_INDEX_PATH,
+) -> Dict[str, Any]:
+    """
+    全シャードの状態を1つの書類索引に統合
+
+    Args:
+        shard_count: シャード数
+        directory: シャード状態ディレクトリ
+        index_path: 出力する索引ファイル
+
+    Returns:
+        索引 (documents: docID -> メタデータ, incomplete_shards: 未完了シャード)
+    """
+    documents: Dict[str, Dict[str, Any]] = {}
+    incomplete: List[int] = []
+
+    for shard_index in range(shard_count):
+        state = load_shard_state(shard_index, shard_count, directory)
+        if state is None or not state.scan_complete:
+            incomplete.append(shard_index)
+        if state is None:
+            continue
+        for doc in state.found_docs:
+            doc_id = doc.get("docID")
+            if doc_id:
+                documents[doc_id] = {**doc, "shard": shard_index}
+
+    index = {
+        "shard_count": shard_count,
+        "incomplete_shards": incomplete,
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "documents": dict(
+            sorted(
+                documents.items(),
+                key=lambda item: (item[1].get("submitDateTime") or "", item[0]),
+            )
+        ),
+    }
+    atomic_write_json(index_path, index)
+    return index
@@ -0,0 +1,464 @@
+"""
+累計 (年初来, YTD) のフロー項目を単独四半期・TTM に変換
+四半期報告書の PL/CF は期首からの累計値で開示されるため、企業ごとの決算月から
+会計年度内の位置を求め、全企業をまとめた配列演算で前四半期との差分 (単独四半期) と
+TTM (当期累計 + 前期通期 - 前年同期累計) を計算する。結果は data/standalone.json に出力し、
+新しい書類で変わった会計年度 (と、TTM が参照する翌年度) だけを再計算する
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from logger import get_data_logger
+from panel import (
+    CACHE_DIR,
+    DATA_DIR,
+    FINANCIALS_DIR,
+    FLOW_FIELDS,
+    from_grid,
+    load_incremental_state,
+    load_panel,
+    merge_period_records,
+    row_hashes,
+    save_incremental_state,
+    to_grid,
+)
+
+# Logger
+logger = get_data_logger()
+
+# Output
+STANDALONE_PATH = DATA_DIR / "standalone.json"
+STANDALONE_STATE_PATH = CACHE_DIR / "standalone_state.json"
+STANDALONE_SCHEMA_VERSION = "1.0.0"
+
+# Bump when conversion rules change (invalidates incremental state)
+ENGINE_VERSION = "1"
+
+# Flow value basis: "ytd" (fiscal year-to-date, as filed) or "quarterly" (already standalone)
+FLOW_BASES = ("ytd", "quarterly")
+DEFAULT_FLOW_BASIS = os.getenv("FLOW_BASIS", "ytd")
+
+# Auto detection: YTD revenue at fiscal Q4 is ~4x Q1, standalone revenue is ~1x
+BASIS_DETECTION_FIELD = "revenue"
+YTD_RATIO_THRESHOLD = 2.5
+
+# DataFrame.attrs key set on panels whose flow items are already standalone quarters
+FLOW_BASIS_ATTR = "flow_basis"
+
+# Fiscal year end month when <COMPANY>_FISCAL_YEAR_END_MONTH is not set
+DEFAULT_FISCAL_YEAR_END_MONTH = 3
+
+
+def fiscal_year_end_month(company: str) -> int:
+    """企業の決算月 (環境変数 <COMPANY>_FISCAL_YEAR_END_MONTH、既定は3月)"""
+    return int(os.getenv(f"{company}_FISCAL_YEAR_END_MONTH", str(DEFAULT_FISCAL_YEAR_END_MONTH)))
+
+
+def fiscal_shift(month: int) -> int:
+    """
+    期間ラベル (Q1 = 4〜6月) から会計年度の四半期位置へのずれ
+
+    3月決算は 0 (Q1 が第1四半期)、12月決算は 3 (Q4 = 1〜3月が第1四半期)。
+    四半期末でない決算月はその直前の四半期末に寄せる。
+    """
+    start_month = month % 12 + 1
+    return ((start_month - 4) % 12) // 3
+
+
+def fiscal_positions(ordinals: np.ndarray, shifts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    企業 × 四半期ごとの会計年度番号と年度内位置
+
+    Args:
+        ordinals: 四半期番号 (連続)
+        shifts: 企業ごとの fiscal_shift
+
+    Returns:
+        (会計年度番号, 年度内位置 0〜3) - いずれも shape (企業数, 四半期数)
+    """
+    offset = ordinals[None, :] - shifts[:, None]
+    return offset // 4, offset % 4
+
+
+def fiscal_year_label(fiscal_index: np.ndarray, shifts: np.ndarray) -> np.ndarray:
+    """
+    会計年度番号を、その年度の期末が属する暦年 (2025年3月期なら 2025) に変換
+
+    Args:
+        fiscal_index: (企業 × 四半期) の会計年度番号
+        shifts: 企業ごとの fiscal_shift
+    """
+    end = fiscal_index * 4 + shifts[:, None] + 3
+    label: np.ndarray = end // 4 + (end % 4 == 3)
+    return label
+
+
+def _lag(values: np.ndarray, periods: int) -> np.ndarray:
+    """四半期軸 (axis=1) を periods だけ遅らせる (3次元配列にも対応)"""
+    lagged = np.full_like(values, np.nan)
+    if periods < values.shape[1]:
+        lagged[:, periods:] = values[:, :-periods]
+    return lagged
+
+
+def detect_ytd(values: np.ndarray, position: np.ndarray) -> np.ndarray:
+    """
+    売上高の系列から累計値かどうかを判定
+
+    同じ会計年度の第4四半期と第1四半期の比 (正の値のみ) の中央値が閾値以上なら累計。
+
+    Args:
+        values: (企業 × 四半期) の売上高
+        position: 年度内位置
+
+    Returns:
+        企業ごとの判定 (1.0 = 累計, 0.0 = 単独, NaN = 判定不能)
+    """
+    first = _lag(values, 3)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where((position == 3) & (values > 0) & (first > 0), values / first, np.nan)
+    result = np.full(len(values), np.nan)
+    has_ratio = ~np.isnan(ratio).all(axis=1)
+    if has_ratio.any():
+        median = np.nanmedian(ratio[has_ratio], axis=1)
+        result[has_ratio] = (median >= YTD_RATIO_THRESHOLD).astype(float)
+    return result
+
+
+def resolve_basis(
+    companies: np.ndarray, ordinals: np.ndarray, revenue: np.ndarray, shifts: np.ndarray
+) -> Dict[str, str]:
+    """
+    企業ごとのフロー項目の基準 (ytd / quarterly)
+
+    環境変数 <COMPANY>_FLOW_BASIS > 売上高からの自動判定 > FLOW_BASIS (既定 ytd) の順。
+    """
+    _, position = fiscal_positions(ordinals, shifts)
+    detected = detect_ytd(revenue, position)
+    basis: Dict[str, str] = {}
+    for company, flag in zip(companies, detected):
+        override = os.getenv(f"{company}_FLOW_BASIS")
+        if override in FLOW_BASES:
+            basis[company] = override
+        elif not np.isnan(flag):
+            basis[company] = "ytd" if flag else "quarterly"
+        else:
+            basis[company] = DEFAULT_FLOW_BASIS
+    return basis
+
+
+def standalone_arrays(
+    values: np.ndarray, position: np.ndarray, ytd: np.ndarray
+) -> Dict[str, np.ndarray]:
+    """
+    フロー項目を単独四半期・累計・TTM に変換 (全企業・全項目を一括計算)
+
+    - 単独四半期: 累計企業は年度内の前四半期累計との差分 (第1四半期は累計そのもの、
+      前四半期が欠けていれば NaN)。単独企業はそのまま
+    - 累計: 単独企業は年度内の単独四半期の合計 (途中が欠けていれば NaN)
+    - TTM: 当期累計 + 前年度通期 - 前年同期累計 (第4四半期は通期そのもの)。
+      途中の四半期が欠けていても、この3点があれば求まる
+
+    Args:
+        values: (企業 × 連続四半期 × 項目) の開示値
+        position: (企業 × 四半期) の年度内位置
+        ytd: 企業ごとに開示値が累計かどうか
+
+    Returns:
+        {"standalone", "ytd", "ttm"} -> (企業 × 四半期 × 項目) の配列
+    """
+    pos = position[:, :, None]
+    cumulative = ytd[:, None, None]
+
+    # Standalone issuers: accumulate within the fiscal year
+    running = values.copy()
+    for k in range(1, 4):
+        running = np.where(pos >= k, running + _lag(values, k), running)
+    ytd_values = np.where(cumulative, values, running)
+
+    # YTD issuers: difference against the previous quarter of the same fiscal year
+    differenced = np.where(pos == 0, values, values - _lag(values, 1))
+    standalone = np.where(cumulative, differenced, values)
+
+    # Previous fiscal year total sits at the quarter before this fiscal year's first quarter
+    quarters = np.arange(values.shape[1])[None, :]
+    previous_end = quarters - position - 1
+    gathered = np.take_along_axis(ytd_values, np.maximum(previous_end, 0)[:, :, None], axis=1)
+    previous_total = np.where(previous_end[:, :, None] >= 0, gathered, np.nan)
+    ttm = np.where(pos == 3, ytd_values, ytd_values + previous_total - _lag(ytd_values, 4))
+
+    return {"standalone": standalone, "ytd": ytd_values, "ttm": ttm}
+
+
+def load_flow_basis(path: Path = STANDALONE_PATH) -> Dict[str, str]:
+    """前回の変換で使った企業ごとの基準 (data/standalone.json の basis)"""
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        basis: Dict[str, str] = json.load(f).get("basis", {})
+        return basis
+
+
+def _convert(
+    panel: pd.DataFrame, basis: Optional[Dict[str, str]] = None
+) -> Tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray], np.ndarray, Dict[str, str]]:
+    """パネルの変換 (companies, ordinals, 変換結果, 年度番号, 基準)"""
+    companies, ordinals, grid = to_grid(panel, FLOW_FIELDS)
+    shifts = np.array([fiscal_shift(fiscal_year_end_month(c)) for c in companies], dtype=int)
+    resolved = resolve_basis(
+        companies, ordinals, grid[:, :, FLOW_FIELDS.index(BASIS_DETECTION_FIELD)], shifts
+    )
+    # Recorded basis wins over re-detection on a partial panel (env overrides still apply)
+    for company in companies:
+        if basis and company in basis and not os.getenv(f"{company}_FLOW_BASIS"):
+            resolved[company] = basis[company]
+    fiscal_index, position = fiscal_positions(ordinals, shifts)
+    ytd = np.array([resolved[c] == "ytd" for c in companies], dtype=bool)
+    converted = standalone_arrays(grid, position, ytd)
+    return companies, ordinals, converted, fiscal_year_label(fiscal_index, shifts), resolved
+
+
+def standalone_panel(panel: pd.DataFrame, basis: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """
+    パネルのフロー項目を単独四半期に変換
+
+    変換済みのパネル (attrs[FLOW_BASIS_ATTR] == "standalone") はそのまま返すため、
+    派生指標などの各ステージは入口で呼ぶだけで累計値のまま計算することがなくなる。
+    年度の途中から差分を取らないよう、未変換のパネルは企業ごとに全期間を渡すこと。
+
+    Args:
+        panel: load_panel の結果
+        basis: 企業 -> 基準 (省略時は data/standalone.json の記録、無ければ自動判定)
+
+    Returns:
+        load_panel と同じ列の DataFrame (フロー項目のみ置き換え)
+    """
+    if panel.attrs.get(FLOW_BASIS_ATTR) == "standalone":
+        return panel
+    panel = panel.copy()
+    panel.attrs[FLOW_BASIS_ATTR] = "standalone"
+    if panel.empty:
+        return panel
+    names, ordinals, converted, _, _ = _convert(
+        panel, load_flow_basis() if basis is None else basis
+    )
+    company_idx = np.searchsorted(names, panel["company"].to_numpy(dtype=str))
+    offset = panel["ordinal"].to_numpy(dtype=int) - int(ordinals[0])
+    panel[FLOW_FIELDS] = converted["standalone"][company_idx, offset, :]
+    return panel
+
+
+def load_standalone_panel(
+    companies: Optional[Sequence[str]] = None, directory: Path = FINANCIALS_DIR
+) -> pd.DataFrame:
+    """
+    フロー項目を単独四半期に変換した load_panel
+
+    派生指標 (QoQ / TTM / 利益率)・健全性スコア・同業比較・グラフはこのパネルを使う。
+    基準は data/standalone.json に記録されたもの (無ければ自動判定) を使う。
+
+    Returns:
+        load_panel と同じ列の DataFrame (フロー項目のみ置き換え)
+    """
+    return standalone_panel(load_panel(companies, directory))
+
+
+def compute_standalone_frame(
+    panel: pd.DataFrame, basis: Optional[Dict[str, str]] = None
+) -> Tuple[pd.DataFrame, Dict[str, str]]:
+    """
+    パネルの単独四半期・累計・TTM を計算
+
+    Args:
+        panel: load_panel の結果 (部分集合でも可)
+        basis: 企業 -> 基準 (省略時は自動判定)
+
+    Returns:
+        (company, period, ordinal, fiscal_year と <項目> / <項目>_ytd / <項目>_ttm 列を持つ
+         DataFrame (元データが存在する行のみ), 企業 -> 基準)
+    """
+    if panel.empty:
+        return pd.DataFrame(columns=["company", "period", "ordinal"]), {}
+    companies, ordinals, converted, fiscal_year, resolved = _convert(panel, basis)
+
+    columns: Dict[str, np.ndarray] = {"fiscal_year": fiscal_year.astype(float)}
+    for i, field in enumerate(FLOW_FIELDS):
+        columns[field] = converted["standalone"][:, :, i]
+        columns[f"{field}_ytd"] = converted["ytd"][:, :, i]
+        columns[f"{field}_ttm"] = converted["ttm"][:, :, i]
+    frame = from_grid(companies, ordinals, columns)
+
+    # Drop gap-filling rows that have no source data
+    frame = frame.merge(panel[["company", "ordinal"]], on=["company", "ordinal"], how="inner")
+    return frame, resolved
+
+
+def _fiscal_index(companies: pd.Series, ordinals: pd.Series) -> pd.Series:
+    """行ごとの会計年度番号 (企業ごとの決算月を反映)"""
+    shifts = {c: fiscal_shift(fiscal_year_end_month(c)) for c in companies.unique()}
+    return (ordinals - companies.map(shifts)) // 4
+
+
+def panel_basis(panel: pd.DataFrame) -> Dict[str, str]:
+    """パネル全体から企業ごとの基準を判定"""
+    if panel.empty:
+        return {}
+    companies, ordinals, grid = to_grid(panel, [BASIS_DETECTION_FIELD])
+    shifts = np.array([fiscal_shift(fiscal_year_end_month(c)) for c in companies], dtype=int)
+    return resolve_basis(companies, ordinals, grid[:, :, 0], shifts)
+
+
+def touched_fiscal_years(
+    panel: pd.DataFrame,
+    previous_state: Dict[str, Dict[str, str]],
+    current_state: Dict[str, Dict[str, str]],
+) -> Dict[str, Optional[Set[int]]]:
+    """
+    企業ごとに再計算が必要な会計年度番号
+
+    変更された期間の年度と、その通期値を TTM で参照する翌年度。期間が削除された企業は
+    None (全期間を再計算)。
+    """
+    year_by_key = dict(
+        zip(
+            zip(panel["company"], panel["period"]),
+            _fiscal_index(panel["company"], panel["ordinal"]),
+        )
+    )
+    touched: Dict[str, Optional[Set[int]]] = {}
+    for company in set(previous_state) | set(current_state):
+        before = previous_state.get(company, {})
+        after = current_state.get(company, {})
+        changed = [p for p in after if before.get(p) != after[p]]
+        if any(p not in after for p in before):
+            touched[company] = None
+        elif changed:
+            years = {int(year_by_key[(company, p)]) for p in changed}
+            touched[company] = years | {year + 1 for year in years}
+    return touched
+
+
+def _in_touched(
+    frame: pd.DataFrame, touched: Dict[str, Optional[Set[int]]], lookback_years: int = 0
+) -> np.ndarray:
+    """行が再計算対象の会計年度 (lookback_years 年前まで含む) に属するかどうか"""
+    year = _fiscal_index(frame["company"], frame["ordinal"])
+    everything = frame["company"].map(lambda c: c in touched and touched[c] is None)
+    keys = pd.MultiIndex.from_tuples(
+        [
+            (c, y - back)
+            for c, years in touched.items()
+            if years
+            for y in years
+            for back in range(lookback_years + 1)
+        ],
+        names=["company", "year"],
+    )
+    rows = pd.MultiIndex.from_arrays([frame["company"], year], names=["company", "year"])
+    return (everything.to_numpy(dtype=bool)) | rows.isin(keys)
+
+
+def _load_existing() -> Dict[str, Dict[str, Dict[str, Any]]]:
+    if not STANDALONE_PATH.exists():
+        return {}
+    with open(STANDALONE_PATH, "r", encoding="utf-8") as f:
+        companies: Dict[str, Dict[str, Dict[str, Any]]] = json.load(f).get("companies", {})
+        return companies
+
+
+def _config_version(basis: Dict[str, str]) -> str:
+    """エンジン版・決算月・基準のハッシュ (変われば全件再計算)"""
+    config = {c: [fiscal_year_end_month(c), b] for c, b in sorted(basis.items())}
+    digest = hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+    return f"{ENGINE_VERSION}:{digest[:12]}"
+
+
+def update_standalone(full: bool = False, directory: Path = FINANCIALS_DIR) -> Dict[str, int]:
+    """
+    単独四半期ファイルを更新
+
+    前回実行時の入力ハッシュと比較し、変更された期間を含む会計年度と翌年度のみ再計算する。
+    決算月・基準が変わった場合は全件を再計算する。
+
+    Args:
+        full: True なら全企業・全期間を再計算
+        directory: 財務諸表CSVディレクトリ
+
+    Returns:
+        企業 -> 再計算した期間数
+    """
+    panel = load_panel(directory=directory)
+    current_state = row_hashes(panel)
+    basis = panel_basis(panel)
+    engine_version = _config_version(basis)
+
+    previous_state = {} if full else load_incremental_state(STANDALONE_STATE_PATH, engine_version)
+    existing = _load_existing() if previous_state else {}
+    if previous_state:
+        touched = touched_fiscal_years(panel, previous_state, current_state)
+    else:
+        touched = {company: None for company in current_state}
+
+    if not touched:
+        logger.info("Standalone quarters are up to date (no changed fiscal years)")
+        return {}
+
+    # Touched fiscal years plus the year before (TTM needs its total and same-quarter YTD)
+    frame, _ = compute_standalone_frame(panel[_in_touched(panel, touched, 1)], basis)
+    frame = frame[_in_touched(frame, touched)]
+
+    shifts = {c: fiscal_shift(fiscal_year_end_month(c)) for c in touched}
+    dirty = {
+        company: -1 if years is None else min(years) * 4 + shifts[company]
+        for company, years in touched.items()
+    }
+    companies, updated = merge_period_records(existing, frame, dirty, current_state)
+    for periods in companies.values():
+        for values in periods.values():
+            values["fiscal_year"] = int(values["fiscal_year"])
+
+    output = {
+        "schema_version": STANDALONE_SCHEMA_VERSION,
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "basis": dict(sorted(basis.items())),
+        "fiscal_year_end_month": {c: fiscal_year_end_month(c) for c in sorted(basis)},
+        "companies": companies,
+    }
+    with open(STANDALONE_PATH, "w", encoding="utf-8") as f:
+        json.dump(output, f, ensure_ascii=False, separators=(",", ":"))
+
+    save_incremental_state(STANDALONE_STATE_PATH, engine_version, current_state)
+
+    for company, count in updated.items():
+        logger.info(f"Standalone quarters updated: {company} ({count} periods)")
+    return updated
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="Convert YTD flow items to standalone quarters")
+    parser.add_argument("--full", action="store_true", help="全企業・全期間を再計算")
+    args = parser.parse_args(argv)
+
+    try:
+        updated = update_standalone(full=args.full)
+        logger.info(f"Standalone quarters: {sum(updated.values())} periods recomputed")
+        return 0
+
+    except Exception as e:
+        logger.error(f"Fatal error: {str(e)}", exc_info=True)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,422 @@
+"""
+財務諸表CSVのストリーミング出力 (メモリ使用量を履歴の長さに依存させない)
+抽出した行を一定件数ごとに (company, period) でソートしてディスクへ書き出し (ラン)、
+全ランを k-way マージしながら同じ期間の行を統合して、PL/BS/CF の3ファイルを1パスで書き込む
+"""
+
+import argparse
+import csv
+import hashlib
+import heapq
+import json
+import marshal
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from financial_store import FinancialStore
+from logger import get_data_logger
+from panel import (
+    CACHE_DIR,
+    FINANCIALS_DIR,
+    KEY_FIELDS,
+    NUMERIC_FIELDS,
+    PERIOD_PATTERN,
+    STATEMENT_FIELDS,
+    statement_csv_path,
+)
+from publisher import PublishManifest, format_value, render_csv
+
+# Logger
+logger = get_data_logger()
+
+# Rows buffered in memory before a sorted run is spilled to disk
+RUN_ROWS = int(os.getenv("EXTRACT_RUN_ROWS", "50000"))
+
+# Maximum runs merged at once (more runs are merged in several passes)
+MERGE_FAN_IN = 64
+
+# Temporary run files
+RUN_DIR = CACHE_DIR / "runs"
+
+# Run row: (company, ordinal, sequence, date, {field: value})
+RunRow = Tuple[str, int, int, str, Dict[str, float]]
+
+
+def _write_block(f: IO[bytes], block: List[RunRow]) -> None:
+    data = marshal.dumps(block)
+    f.write(len(data).to_bytes(8, "little"))
+    f.write(data)
+
+
+def _write_run(rows: Iterable[RunRow], path: Path, block_rows: int) -> Path:
+    # Runs are private to this process: marshal is several times faster than JSON lines.
+    # Rows are written in length-prefixed blocks so reading back holds one block per run
+    with open(path, "wb") as f:
+        block: List[RunRow] = []
+        for row in rows:
+            block.append(row)
+            if len(block) >= block_rows:
+                _write_block(f, block)
+                block = []
+        if block:
+            _write_block(f, block)
+    return path
+
+
+def _read_run(path: Path) -> Iterator[RunRow]:
+    with open(path, "rb") as f:
+        while header := f.read(8):
+            block: List[RunRow] = marshal.loads(f.read(int.from_bytes(header, "little")))
+            yield from block
+
+
+def _run_key(row: RunRow) -> Tuple[str, int, int]:
+    return row[0], row[1], row[2]
+
+
+def _period_ordinal(period: str) -> int:
+    match = PERIOD_PATTERN.match(period)
+    if not match:
+        raise ValueError(f"Invalid period label: {period}")
+    return int(match.group(1)) * 4 + int(match.group(2)) - 1
+
+
+class SortedRunWriter:
+    """
+    抽出行をソート済みランとしてディスクに書き出し、(company, period) 順に統合して返す
+
+    行は追加順の連番を持ち、同じ (company, period) の行は項目ごとに後の行の値を優先する
+    (FinancialStore.from_records と同じ規則)。メモリに保持するのは run_rows 行と、
+    マージ中の各ランの読み込みブロック (合計で run_rows 行程度) だけ。
+    """
+
+    def __init__(
+        self,
+        run_rows: int = RUN_ROWS,
+        directory: Path = RUN_DIR,
+        fields: Sequence[str] = NUMERIC_FIELDS,
+    ) -> None:
+        self.run_rows = max(run_rows, 1)
+        # A merge reads one block from each of up to MERGE_FAN_IN runs at a time, so the
+        # read buffers together stay within one run's worth of rows
+        self.block_rows = max(self.run_rows // MERGE_FAN_IN, 1)
+        self.fields = list(fields)
+        directory.mkdir(parents=True, exist_ok=True)
+        self.directory = Path(tempfile.mkdtemp(dir=directory, prefix="run-"))
+        self.runs: List[Path] = []
+        self.buffer: List[RunRow] = []
+        self.rows = 0
+
+    def __enter__(self) -> "SortedRunWriter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def add(self, record: Dict[str, Any]) -> None:
+        """抽出行 (company, period, date と項目値を持つ辞書) を追加"""
+        values = {f: float(record[f]) for f in self.fields if record.get(f) is not None}
+        ordinal = _period_ordinal(str(record["period"]))
+        self.buffer.append(
+            (str(record["company"]), ordinal, self.rows, record.get("date") or "", values)
+        )
+        self.rows += 1
+        if len(self.buffer) >= self.run_rows:
+            self._spill()
+
+    def extend(self, records: Iterable[Dict[str, Any]]) -> None:
+        for record in records:
+            self.add(record)
+
+    def _spill(self) -> None:
+        if not self.buffer:
+            return
+        self.buffer.sort(key=_run_key)
+        path = self.directory / f"{len(self.runs):06d}.run"
+        self.runs.append(_write_run(self.buffer, path, self.block_rows))
+        self.buffer = []
+
+    def _merged_runs(self) -> Iterator[RunRow]:
+        """全ランを (company, ordinal, 連番) 順に返す (ランが多い場合は段階的にマージ)"""
+        self._spill()
+        runs = self.runs
+        generation = 0
+        while len(runs) > MERGE_FAN_IN:
+            generation += 1
+            merged: List[Path] = []
+            for start in range(0, len(runs), MERGE_FAN_IN):
+                group = runs[start : start + MERGE_FAN_IN]
+                path = self.directory / f"g{generation}-{start // MERGE_FAN_IN:06d}.run"
+                rows = heapq.merge(*(_read_run(p) for p in group), key=_run_key)
+                merged.append(_write_run(rows, path, self.block_rows))
+                for p in group:
+                    p.unlink()
+            runs = merged
+        self.runs = runs
+        return heapq.merge(*(_read_run(p) for p in runs), key=_run_key)
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """
+        統合済みの行を (company, period) 順に返す
+
+        Yields:
+            company, period, date と値のある項目だけを持つ辞書 (FinancialStore.to_records 形式)
+        """
+        current: Optional[Tuple[str, int]] = None
+        date = ""
+        values: Dict[str, float] = {}
+        for company, ordinal, _, row_date, row_values in self._merged_runs():
+            if (company, ordinal) != current:
+                if current is not None:
+                    yield _merged_record(current, date, values, self.fields)
+                current, date, values = (company, ordinal), "", {}
+            # Later rows win per field; missing values keep the earlier ones
+            values.update(row_values)
+            date = row_date or date
+        if current is not None:
+            yield _merged_record(current, date, values, self.fields)
+
+    def close(self) -> None:
+        """一時ランを削除"""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def _merged_record(
+    key: Tuple[str, int], date: str, values: Dict[str, float], fields: Sequence[str]
+) -> Dict[str, Any]:
+    record: Dict[str, Any] = {
+        KEY_FIELDS[0]: key[0],
+        KEY_FIELDS[1]: f"{key[1] // 4}Q{key[1] % 4 + 1}",
+        KEY_FIELDS[2]: date or None,
+    }
+    record.update((f, values[f]) for f in fields if f in values)
+    return record
+
+
+@dataclass
+class _StagedStatement:
+    """書き込み中の諸表ファイル (一時ファイル・ハッシュ・行数)"""
+
+    path: Path
+    fields: List[str]
+    staged: Path
+    handle: IO[str]
+    writer: Any
+    digest: Any = field(default_factory=hashlib.sha256)
+    rows: int = 0
+
+    @classmethod
+    def open(cls, path: Path, fields: List[str]) -> "_StagedStatement":
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+        handle = os.fdopen(fd, "w", encoding="utf-8", newline="")
+        staged = cls(path, fields, Path(tmp_name), handle, None)
+        staged.writer = csv.writer(_HashingWriter(handle, staged.digest), lineterminator="\n")
+        staged.writer.writerow(fields)
+        return staged
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self.writer.writerow([format_value(record.get(f)) for f in self.fields])
+        self.rows += 1
+
+    def close(self) -> None:
+        self.handle.close()
+
+
+class _HashingWriter:
+    """書き込んだテキストを UTF-8 でハッシュに加えながらファイルへ書く"""
+
+    def __init__(self, handle: IO[str], digest: Any) -> None:
+        self.handle = handle
+        self.digest = digest
+
+    def write(self, text: str) -> int:
+        self.digest.update(text.encode("utf-8"))
+        return self.handle.write(text)
+
+
+def stream_statement_csvs(
+    records: Iterable[Dict[str, Any]],
+    manifest: Optional[PublishManifest] = None,
+    directory: Path = FINANCIALS_DIR,
+) -> Dict[str, List[str]]:
+    """
+    (company, period) 順の統合済み行から PL/BS/CF の CSV を1パスで書き込む
+
+    各諸表は一時ファイルに書きながらハッシュを計算し、内容が変わった場合のみ置き換える。
+    出力は render_csv と同じバイト列になる (既存の発行ハッシュは変わらない)。
+    行は書き込んだら保持しないため、メモリ使用量は行数に依存しない。
+
+    Args:
+        records: SortedRunWriter.records の出力
+        manifest: 発行マニフェスト (省略時は新規作成して保存)
+        directory: 財務諸表CSVディレクトリ
+
+    Returns:
+        企業 -> 内容が変わった諸表のリスト
+    """
+    own_manifest = manifest is None
+    if manifest is None:
+        manifest = PublishManifest()
+
+    changed: Dict[str, List[str]] = {}
+    company: Optional[str] = None
+    staged: Dict[str, _StagedStatement] = {}
+
+    def finish() -> None:
+        for statement, output in staged.items():
+            output.close()
+            if output.rows == 0:
+                logger.warning(f"No data for {company} {statement.upper()}")
+                output.staged.unlink()
+                continue
+            key = f"{company}/{statement}"
+            digest = output.digest.hexdigest()
+            if manifest.publish_file(key, output.path, output.staged, digest, output.rows):
+                changed.setdefault(str(company), []).append(statement)
+                logger.info(f"Updated: {output.path.name} ({output.rows} rows)")
+            else:
+                logger.info(f"Unchanged: {output.path.name} ({output.rows} rows)")
+        staged.clear()
+
+    try:
+        for record in records:
+            if record["company"] != company:
+                finish()
+                company = record["company"]
+                staged.update(
+                    (
+                        statement,
+                        _StagedStatement.open(
+                            statement_csv_path(str(company), statement, directory),
+                            KEY_FIELDS + fields,
+                        ),
+                    )
+                    for statement, fields in STATEMENT_FIELDS.items()
+                )
+            for statement, fields in STATEMENT_FIELDS.items():
+                if any(record.get(f) is not None for f in fields):
+                    staged[statement].write(record)
+        finish()
+    finally:
+        for output in staged.values():
+            output.close()
+            output.staged.unlink(missing_ok=True)
+
+    if own_manifest:
+        manifest.save()
+    return changed
+
+
+def _synthetic_records(quarters: int, duplicates: int, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    """ZIP 内の複数CSV・訂正報告を模した、期間ごとに duplicates 行ある抽出行"""
+    rng = np.random.default_rng(seed)
+    for ordinal in range(1980 * 4, 1980 * 4 + quarters):
+        period = f"{ordinal // 4}Q{ordinal % 4 + 1}"
+        for copy in range(duplicates):
+            fields = NUMERIC_FIELDS[copy::duplicates] or NUMERIC_FIELDS
+            record: Dict[str, Any] = {"company": "BENCH", "period": period, "date": "2000-01-01"}
+            record.update((f, round(float(rng.normal(1000.0, 100.0)), 2)) for f in fields)
+            yield record
+
+
+def _batch_csvs(count: int, duplicates: int) -> Dict[str, bytes]:
+    """一括方式: 全行をストアに読み込んでから render_csv で出力"""
+    store = FinancialStore.from_records(list(_synthetic_records(count, duplicates)))
+    return {
+        statement: render_csv(store.statement(statement).to_records(), KEY_FIELDS + fields).encode(
+            "utf-8"
+        )
+        for statement, fields in STATEMENT_FIELDS.items()
+    }
+
+
+def _stream_csvs(count: int, duplicates: int, run_rows: int, directory: Path) -> None:
+    """ストリーミング方式: ソート済みランを経由して directory に出力"""
+    manifest = PublishManifest(directory / "manifest.json")
+    with SortedRunWriter(run_rows, directory / "runs") as writer:
+        writer.extend(_synthetic_records(count, duplicates))
+        stream_statement_csvs(writer.records(), manifest, directory)
+
+
+def _measure(task: Any) -> Tuple[float, int]:
+    """task の秒数 (tracemalloc なし) とピークメモリ (tracemalloc あり) を別々に計測"""
+    began = time.perf_counter()
+    task()
+    seconds = time.perf_counter() - began
+    tracemalloc.start()
+    task()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def run_benchmark(quarters: Sequence[int], duplicates: int, run_rows: int) -> List[Dict[str, Any]]:
+    """
+    履歴の長さごとに、一括方式 (全行をメモリに保持) とストリーミング方式のピークメモリ・秒数を比較
+
+    Returns:
+        履歴の長さごとの計測値 (行数・各方式のピークKiB・秒数・出力一致)
+    """
+    results: List[Dict[str, Any]] = []
+    for count in quarters:
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp)
+            batch_s, batch_peak = _measure(lambda: _batch_csvs(count, duplicates))
+            stream_s, stream_peak = _measure(
+                lambda: _stream_csvs(count, duplicates, run_rows, directory)
+            )
+
+            identical = all(
+                statement_csv_path("BENCH", statement, directory).read_bytes() == content
+                for statement, content in _batch_csvs(count, duplicates).items()
+            )
+            results.append(
+                {
+                    "quarters": count,
+                    "rows": count * duplicates,
+                    "batch_peak_kib": round(batch_peak / 1024, 1),
+                    "stream_peak_kib": round(stream_peak / 1024, 1),
+                    "batch_s": round(batch_s, 3),
+                    "stream_s": round(stream_s, 3),
+                    "identical": identical,
+                }
+            )
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="Streaming statement writer benchmark")
+    parser.add_argument(
+        "--quarters",
+        type=int,
+        nargs="+",
+        default=[1000, 4000, 16000],
+        help="合成データの四半期数 (複数指定可)",
+    )
+    parser.add_argument("--duplicates", type=int, default=8, help="1期間あたりの抽出行数")
+    parser.add_argument("--run-rows", type=int, default=RUN_ROWS, help="1ランの行数")
+    args = parser.parse_args(argv)
+
+    try:
+        for result in run_benchmark(args.quarters, args.duplicates, args.run_rows):
+            print(json.dumps(result))
+        return 0
+
+    except Exception as e:
+        logger.error(f"Fatal error: {str(e)}", exc_info=True)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+"""
+訂正報告書を考慮した書類の置き換え (supersession) 索引
+(企業, 期末, 報告書区分) ごとに最新の正本だけを選び、それ以外の書類をスキップ理由付きで記録する
+"""
+
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from checkpoint import atomic_write_json
+
+# Supersession index (docID -> metadata, status and skip reason)
+CACHE_DIR = Path(__file__).parent.parent.parent / "data" / ".cache"
+SUPERSESSION_INDEX_PATH = CACHE_DIR / "supersession.json"
+SUPERSESSION_INDEX_VERSION = "1"
+
+# EDINET docTypeCode -> (statement scope, amendment)
+DOC_TYPE_SCOPES: Dict[str, Tuple[str, bool]] = {
+    "120": ("annual", False),  # 有価証券報告書
+    "130": ("annual", True),  # 訂正有価証券報告書
+    "140": ("quarterly", False),  # 四半期報告書
+    "150": ("quarterly", True),  # 訂正四半期報告書
+    "160": ("semiannual", False),  # 半期報告書
+    "170": ("semiannual", True),  # 訂正半期報告書
+}
+
+# Skip reasons
+SKIP_WITHDRAWN = "withdrawn"
+SKIP_NO_CSV = "no_csv"
+SKIP_UNKNOWN_PERIOD = "unknown_period"
+SKIP_SUPERSEDED_BY_AMENDMENT = "superseded_by_amendment"
+SKIP_SUPERSEDED_BY_LATER_FILING = "superseded_by_later_filing"
+
+
+def document_scope(doc: Dict[str, Any]) -> Tuple[str, bool]:
+    """
+    書類の報告書区分と訂正報告書かどうか
+
+    docTypeCode を優先し、無い場合は docDescription から判定する。
+    """
+    code = str(doc.get("docTypeCode") or "")
+    if code in DOC_TYPE_SCOPES:
+        return DOC_TYPE_SCOPES[code]
+
+    description = doc.get("docDescription") or ""
+    amendment = "訂正" in description or bool(doc.get("parentDocID"))
+    if "四半期" in description:
+        return "quarterly", amendment
+    if "半期" in description:
+        return "semiannual", amendment
+    return "annual", amendment
+
+
+@dataclass
+class Resolution:
+    """置き換え判定の結果"""
+
+    selected: List[Dict[str, Any]] = field(default_factory=list)
+    skipped: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+    @property
+    def selected_ids(self) -> List[str]:
+        return [doc["docID"] for doc in self.selected]
+
+    def summary(self) -> str:
+        reasons: Dict[str, int] = {}
+        for entry in self.skipped.values():
+            reasons[entry["reason"]] = reasons.get(entry["reason"], 0) + 1
+        detail = ", ".join(f"{reason}: {count}" for reason, count in sorted(reasons.items()))
+        return f"{len(self.selected)} selected, {len(self.skipped)} skipped" + (
+            f" ({detail})" if detail else ""
+        )
+
+
+def _root_id(doc_id: str, documents: Dict[str, Dict[str, Any]]) -> str:
+    """訂正の連鎖 (parentDocID) をたどって原本の docID を返す"""
+    seen = {doc_id}
+    current = doc_id
+    while True:
+        parent = documents.get(current, {}).get("parentDocID")
+        if not parent or parent not in documents or parent in seen:
+            return current
+        seen.add(parent)
+        current = parent
+
+
+def resolve_documents(documents: Dict[str, Dict[str, Any]]) -> Resolution:
+    """
+    書類群から (企業, 期末, 報告書区分) ごとの正本を選ぶ
+
+    - 取下げ済み・CSVなし・期末不明の書類は対象外
+    - 同じキーの書類のうち提出日時が最も新しいものを正本とする (同時刻なら訂正を優先、次に docID)
+    - 訂正報告書の期末が空の場合は原本の期末を引き継ぐ
+
+    Args:
+        documents: docID -> 書類一覧APIのメタデータ
+
+    Returns:
+        判定結果 (selected は提出日時順)。selected の各書類は periodEnd を判定に使った期末で
+        置き換えた複製 (キャッシュファイル名はこの期末から作る)
+    """
+    resolution = Resolution()
+    groups: Dict[Tuple[str, str, str], List[Dict[str, Any]]] = {}
+
+    for doc_id, doc in documents.items():
+        if str(doc.get("withdrawalStatus") or "0") != "0":
+            resolution.skipped[doc_id] = {"reason": SKIP_WITHDRAWN}
+            continue
+        if str(doc.get("csvFlag") or "1") == "0":
+            resolution.skipped[doc_id] = {"reason": SKIP_NO_CSV}
+            continue
+
+        root = _root_id(doc_id, documents)
+        period_end = doc.get("periodEnd") or documents[root].get("periodEnd")
+        if not period_end:
+            resolution.skipped[doc_id] = {"reason": SKIP_UNKNOWN_PERIOD}
+            continue
+
+        scope, _ = document_scope(doc)
+        key = (doc.get("edinetCode") or "", period_end, scope)
+        groups.setdefault(key, []).append(doc)
+
+    for key, docs in groups.items():
+        ranked = sorted(
+            docs,
+            key=lambda d: (d.get("submitDateTime") or "", document_scope(d)[1], d["docID"]),
+        )
+        winner = ranked[-1]
+        winner_root = _root_id(winner["docID"], documents)
+        # Amendments filed with an empty periodEnd carry the period inherited from the root
+        resolution.selected.append({**winner, "periodEnd": key[1]})
+
+        for doc in ranked[:-1]:
+            same_chain = _root_id(doc["docID"], documents) == winner_root
+            amended = document_scope(winner)[1]
+            reason = (
+                SKIP_SUPERSEDED_BY_AMENDMENT
+                if same_chain or amended
+                else SKIP_SUPERSEDED_BY_LATER_FILING
+            )
+            resolution.skipped[doc["docID"]] = {
+                "reason": reason,
+                "superseded_by": winner["docID"],
+            }
+
+    resolution.selected.sort(key=lambda d: (d.get("submitDateTime") or "", d["docID"]))
+    return resolution
+
+
+class SupersessionIndex:
+    """
+    置き換え索引 (永続化)
+
+    これまでに見つかった書類メタデータを蓄積し、追加のたびに全体を再判定する。
+    別の実行で見つかった訂正報告書も、原本の置き換えとして反映される。
+    """
+
+    def __init__(self, path: Path = SUPERSESSION_INDEX_PATH) -> None:
+        self.path = path
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.resolution = Resolution()
+        if path.exists():
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("schema_version") == SUPERSESSION_INDEX_VERSION:
+                    self.documents = {
+                        doc_id: entry["metadata"]
+                        for doc_id, entry in data.get("documents", {}).items()
+                    }
+            except (json.JSONDecodeError, KeyError, TypeError):
+                self.documents = {}
+        self.resolution = resolve_documents(self.documents)
+
+    def update(self, docs: List[Dict[str, Any]]) -> Resolution:
+        """
+        書類を追加して再判定
+
+        Args:
+            docs: 書類一覧APIのメタデータ
+
+        Returns:
+            判定結果 (索引全体)
+        """
+        for doc in docs:
+            doc_id = doc.get("docID")
+            if doc_id:
+                self.documents[doc_id] = doc
+        self.resolution = resolve_documents(self.documents)
+        return self.resolution
+
+    def select(self, docs: List[Dict[str, Any]]) -> Resolution:
+        """
+        与えた書類のうち正本と判定されたもの (判定は索引全体で行う)
+
+        Args:
+            docs: 書類一覧APIのメタデータ
+
+        Returns:
+            docs に含まれる書類だけに絞った判定結果
+        """
+        resolution = self.update(docs)
+        requested = {doc.get("docID") for doc in docs}
+        return Resolution(
+            selected=[doc for doc in resolution.selected if doc["docID"] in requested],
+            skipped={
+                doc_id: entry for doc_id, entry in resolution.skipped.items() if doc_id in requested
+            },
+        )
+
+    def skip_reason(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """スキップ理由 (正本または未登録の場合は None)"""
+        return self.resolution.skipped.get(doc_id)
+
+    def save(self) -> None:
+        """索引をアトミックに保存"""
+        selected = set(self.resolution.selected_ids)
+        documents = {}
+        for doc_id in sorted(self.documents):
+            skipped = self.resolution.skipped.get(doc_id)
+            documents[doc_id] = {
+                "status": "selected" if doc_id in selected else "skipped",
+                **(skipped or {}),
+                "metadata": self.documents[doc_id],
+            }
+        atomic_write_json(
+            self.path,
+            {
+                "schema_version": SUPERSESSION_INDEX_VERSION,
+                "updated_at": datetime.now().isoformat(timespec="seconds"),
+                "summary": self.resolution.summary(),
+                "documents": documents,
+            },
+        )
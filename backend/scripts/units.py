@@ -0,0 +1,61 @@
+"""
+金額の単位換算
+XBRL の単位 (unit の measure) と EDINET CSV の単位列を、発行値の億円に換算する
+"""
+
+from typing import Dict, Optional
+
+# Published values are 億円 (2 decimals)
+YEN_PER_OKU = 100_000_000
+
+# Yen per reported unit: XBRL measures (JPY) and EDINET CSV 単位 labels
+YEN_PER_UNIT: Dict[str, int] = {
+    "JPY": 1,
+    "円": 1,
+    "千円": 1_000,
+    "百万円": 1_000_000,
+    "億円": YEN_PER_OKU,
+}
+
+# XBRL facts without unitRef are reported in yen
+DEFAULT_XBRL_UNIT = "JPY"
+
+# CSV archives without a unit column state amounts in 千円
+DEFAULT_CSV_UNIT = "千円"
+
+
+def to_yen(value: float, unit: str) -> Optional[float]:
+    """
+    金額を円に換算
+
+    Args:
+        value: 報告された値
+        unit: 報告単位 (XBRL の measure または CSV の単位)
+
+    Returns:
+        円建ての値 (株数・比率など金額でない単位は None)
+    """
+    scale = YEN_PER_UNIT.get(unit.strip())
+    return None if scale is None else value * scale
+
+
+def yen_to_oku(value: float) -> float:
+    """円 → 億円 (小数2桁)"""
+    return round(value / YEN_PER_OKU, 2)
+
+
+def to_oku(value: float, unit: str) -> Optional[float]:
+    """
+    金額を億円 (小数2桁) に換算
+
+    1回の割り算で換算するため、千円の値は従来の value / 100000 と同じ結果になる。
+
+    Args:
+        value: 報告された値
+        unit: 報告単位 (CSV の単位)
+
+    Returns:
+        億円建ての値 (株数・比率など金額でない単位は None)
+    """
+    scale = YEN_PER_UNIT.get(unit.strip())
+    return None if scale is None else round(value / (YEN_PER_OKU // scale), 2)
@@ -3,19 +3,33 @@ Schema validation script for FinSight data files
 Validates CSV and JSON files against the schema defined in data/schema/README.md
 """
 
+import argparse
 import csv
+import hashlib
 import json
 import re
 import sys
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from checkpoint import atomic_write_json
+from profiler import (
+    add_profile_arguments,
+    configure_profiling,
+    profile_stage,
+    write_profile_reports,
+)
 
 # Schema version
 SCHEMA_VERSION = "1.0.0"
 
+# Validator version (bump when validation rules change so cached results are discarded)
+VALIDATOR_VERSION = "1"
+
 # Data directory paths
 DATA_DIR = Path(__file__).parent.parent.parent / "data"
 FINANCIALS_DIR = DATA_DIR / "financials"
+VALIDATION_CACHE_PATH = DATA_DIR / ".cache" / "validation.json"
 
 
 class ValidationError(Exception):
@@ -226,10 +240,100 @@ def validate_note_item(note: Dict[str, Any], index: int) -> List[str]:
     return errors
 
 
-def validate_all_files() -> int:
+class ValidationCache:
+    """
+    Persistent validation results keyed by (content hash, schema version, validator version)
+
+    Only results looked up during the current run are saved, so entries for deleted or
+    modified files are dropped instead of accumulating.
+    """
+
+    def __init__(self, path: Optional[Path] = VALIDATION_CACHE_PATH):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.used: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        if path is not None and path.exists():
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f).get("entries", {})
+            except (OSError, ValueError):
+                self.entries = {}
+
+    @staticmethod
+    def key(digest: str) -> str:
+        """Cache key for a file content hash"""
+        return f"{digest}:{SCHEMA_VERSION}:{VALIDATOR_VERSION}"
+
+    def validate(
+        self, filepath: Path, validator: Callable[[Path], Tuple[bool, List[str]]]
+    ) -> Tuple[bool, List[str], bool]:
+        """
+        Validate a file, reusing the cached result when its content is unchanged
+
+        Args:
+            filepath: Path to the file
+            validator: Validation function (validate_csv_schema / validate_notes_json)
+
+        Returns:
+            Tuple of (is_valid, errors, cache_hit)
+        """
+        try:
+            with open(filepath, "rb") as f:
+                key = self.key(hashlib.file_digest(f, "sha256").hexdigest())
+        except OSError:
+            # Unreadable files are reported by the validator and never cached
+            is_valid, errors = validator(filepath)
+            self.misses += 1
+            return is_valid, errors, False
+
+        entry = self.entries.get(key)
+        hit = entry is not None
+        if entry is None:
+            is_valid, errors = validator(filepath)
+            entry = {"valid": is_valid, "errors": errors}
+            self.misses += 1
+        else:
+            self.hits += 1
+        self.used[key] = entry
+        return entry["valid"], list(entry["errors"]), hit
+
+    def save(self) -> None:
+        """Persist results used in this run"""
+        if self.path is None or self.used == self.entries:
+            return
+        atomic_write_json(
+            self.path,
+            {
+                "schema_version": SCHEMA_VERSION,
+                "validator_version": VALIDATOR_VERSION,
+                "entries": self.used,
+            },
+        )
+
+
+def _report(name: str, is_valid: bool, errors: List[str], hit: bool) -> int:
+    """Print a file result and return its error count"""
+    suffix = " (cached)" if hit else ""
+    if is_valid:
+        print(f"✓ {name}: PASS{suffix}")
+        return 0
+    print(f"✗ {name}: FAIL{suffix}")
+    for error in errors:
+        print(f"  - {error}")
+    return len(errors)
+
+
+def validate_all_files(use_cache: bool = True) -> int:
     """
     Validate all data files
 
+    Files whose content hash is unchanged since the last run reuse the cached result.
+
+    Args:
+        use_cache: Reuse and update the validation cache (False revalidates every file)
+
     Returns:
         Exit code (0 for success, 1 for failure)
     """
@@ -240,23 +344,19 @@ def validate_all_files() -> int:
     print()
 
     total_errors = 0
+    cache = ValidationCache(VALIDATION_CACHE_PATH if use_cache else None)
 
     # Validate CSV files
     print("Validating CSV files...")
-    csv_files = list(FINANCIALS_DIR.glob("*.csv"))
+    csv_files = sorted(FINANCIALS_DIR.glob("*.csv"))
 
     if not csv_files:
         print(f"⚠️  No CSV files found in {FINANCIALS_DIR}")
     else:
         for csv_file in csv_files:
-            is_valid, errors = validate_csv_schema(csv_file)
-            if is_valid:
-                print(f"✓ {csv_file.name}: PASS")
-            else:
-                print(f"✗ {csv_file.name}: FAIL")
-                for error in errors:
-                    print(f"  - {error}")
-                total_errors += len(errors)
+            with profile_stage("validate.csv"):
+                is_valid, errors, hit = cache.validate(csv_file, validate_csv_schema)
+            total_errors += _report(csv_file.name, is_valid, errors, hit)
 
     print()
 
@@ -267,14 +367,14 @@ def validate_all_files() -> int:
     if not notes_file.exists():
         print(f"⚠️  Notes file not found: {notes_file}")
     else:
-        is_valid, errors = validate_notes_json(notes_file)
-        if is_valid:
-            print(f"✓ {notes_file.name}: PASS")
-        else:
-            print(f"✗ {notes_file.name}: FAIL")
-            for error in errors:
-                print(f"  - {error}")
-            total_errors += len(errors)
+        with profile_stage("validate.notes"):
+            is_valid, errors, hit = cache.validate(notes_file, validate_notes_json)
+        total_errors += _report(notes_file.name, is_valid, errors, hit)
+
+    if use_cache:
+        cache.save()
+        print()
+        print(f"Cache: {cache.hits} hit(s), {cache.misses} file(s) validated")
 
     print()
     print("=" * 80)
@@ -287,5 +387,25 @@ def validate_all_files() -> int:
         return 1
 
 
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="FinSight Data Schema Validation")
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Revalidate every file without reading or updating the validation cache",
+    )
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    configure_profiling(args.profile, "validate", args.profile_interval)
+    try:
+        return validate_all_files(use_cache=not args.no_cache)
+    finally:
+        report_dir = write_profile_reports()
+        if report_dir:
+            print(f"Profile reports written to: {report_dir}")
+
+
 if __name__ == "__main__":
-    sys.exit(validate_all_files())
+    sys.exit(main())
@@ -0,0 +1,253 @@
+"""
+XBRL インスタンス (EDINET 書類取得API type=1) のストリーミング解析
+lxml の iterparse で要素を順に読み、taxonomy_map.json に対応する事実 (fact) だけを残す。
+処理済みの要素は逐次解放するため、大きな有価証券報告書でもメモリ使用量は一定に保たれる
+"""
+
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Any, Dict, List, Optional, Tuple, Union
+
+from lxml import etree
+
+from logger import get_data_logger
+from units import DEFAULT_XBRL_UNIT, to_yen, yen_to_oku
+
+# Logger
+logger = get_data_logger()
+
+# Namespaces
+XBRLI_NS = "http://www.xbrl.org/2003/instance"
+XBRLDI_NS = "http://xbrl.org/2006/xbrldi"
+XSI_NIL = "{http://www.w3.org/2001/XMLSchema-instance}nil"
+
+# Cache file suffix for XBRL instance archives (CSV archives are plain .zip)
+XBRL_ARCHIVE_SUFFIX = ".xbrl.zip"
+
+
+@dataclass(frozen=True)
+class Context:
+    """XBRL コンテキスト (期間と次元の有無)"""
+
+    start: Optional[str]  # duration start (None for instants)
+    end: str  # duration end date or instant
+    dimensional: bool  # has explicit/typed members (segment, non-consolidated, ...)
+
+
+def build_concept_index(taxonomy_map: Dict[str, List[str]]) -> Dict[str, str]:
+    """
+    要素のローカル名 -> フィールド名 の完全一致索引
+
+    部分一致は "Assets" が "CurrentAssets" に当たるなど曖昧になるため、XBRL では完全一致のみ使う。
+    同じ名前が複数フィールドにある場合は taxonomy_map の先頭側を優先する。
+    """
+    index: Dict[str, str] = {}
+    for field_name, aliases in taxonomy_map.items():
+        for alias in aliases:
+            index.setdefault(alias, field_name)
+    return index
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _parse_context(elem: etree._Element) -> Tuple[str, Context]:
+    period = elem.find(f"{{{XBRLI_NS}}}period")
+    instant = period.findtext(f"{{{XBRLI_NS}}}instant") if period is not None else None
+    start = period.findtext(f"{{{XBRLI_NS}}}startDate") if period is not None else None
+    end = period.findtext(f"{{{XBRLI_NS}}}endDate") if period is not None else None
+    dimensional = (
+        elem.find(f".//{{{XBRLDI_NS}}}explicitMember") is not None
+        or elem.find(f".//{{{XBRLDI_NS}}}typedMember") is not None
+    )
+    context_end = (instant or end or "").strip()
+    return elem.get("id", ""), Context(
+        start=None if instant else (start or "").strip() or None,
+        end=context_end,
+        dimensional=dimensional,
+    )
+
+
+def _parse_unit(elem: etree._Element) -> Tuple[str, str]:
+    measure = elem.findtext(f".//{{{XBRLI_NS}}}measure") or ""
+    return elem.get("id", ""), _local_name(measure.split(":")[-1])
+
+
+@dataclass
+class ParseStats:
+    """解析統計 (ベンチマーク・ログ用)"""
+
+    elements: int = 0
+    facts: int = 0
+    mapped_facts: int = 0
+
+
+def iter_mapped_facts(
+    source: Union[str, Path, IO[bytes]],
+    concept_index: Dict[str, str],
+    stats: Optional[ParseStats] = None,
+) -> List[Tuple[str, Context, float]]:
+    """
+    インスタンス文書をストリーミング解析し、対応付けられた連結 (次元なし) の数値事実を返す
+
+    Args:
+        source: インスタンス文書のパスまたはバイナリファイルオブジェクト
+        concept_index: build_concept_index の結果
+        stats: 解析統計 (任意)
+
+    Returns:
+        (フィールド名, コンテキスト, 値 (円)) のリスト。金額でない単位の事実は除く
+    """
+    stats = stats if stats is not None else ParseStats()
+    contexts: Dict[str, Context] = {}
+    units: Dict[str, str] = {}
+    facts: List[Tuple[str, Context, float]] = []
+    pending: List[Tuple[str, str, Optional[str], str]] = []  # facts seen before their context
+
+    context_tag = f"{{{XBRLI_NS}}}context"
+    unit_tag = f"{{{XBRLI_NS}}}unit"
+    depth = 0
+
+    for event, elem in etree.iterparse(source, events=("start", "end"), huge_tree=True):
+        if event == "start":
+            depth += 1
+            continue
+        depth -= 1
+        if depth != 1:
+            # Only children of <xbrli:xbrl> are facts/contexts/units; nested nodes are read
+            # through their parent and released with it
+            continue
+
+        stats.elements += 1
+        tag = elem.tag
+        if tag == context_tag:
+            context_id, parsed = _parse_context(elem)
+            contexts[context_id] = parsed
+        elif tag == unit_tag:
+            unit_id, measure = _parse_unit(elem)
+            units[unit_id] = measure
+        elif isinstance(tag, str) and elem.get("contextRef") is not None:
+            stats.facts += 1
+            field_name = concept_index.get(_local_name(tag))
+            if field_name and elem.get(XSI_NIL) != "true" and elem.text:
+                pending.append(
+                    (field_name, elem.get("contextRef", ""), elem.get("unitRef"), elem.text)
+                )
+
+        # Release the processed element and any siblings already handled
+        elem.clear()
+        parent = elem.getparent()
+        if parent is not None:
+            while elem.getprevious() is not None:
+                del parent[0]
+
+    for field_name, context_ref, unit_ref, text in pending:
+        context = contexts.get(context_ref)
+        if context is None or context.dimensional:
+            continue
+        unit = units.get(unit_ref, DEFAULT_XBRL_UNIT) if unit_ref is not None else DEFAULT_XBRL_UNIT
+        try:
+            value = to_yen(float(text.strip()), unit)
+        except ValueError:
+            logger.warning("Invalid value for %s: %s", field_name, text)
+            continue
+        if value is None:
+            continue
+        facts.append((field_name, context, value))
+        stats.mapped_facts += 1
+
+    return facts
+
+
+def select_period_values(
+    facts: List[Tuple[str, Context, float]], period_end: Optional[str] = None
+) -> Dict[str, float]:
+    """
+    期末日の値をフィールドごとに1つ選ぶ
+
+    期末日 (省略時は事実の最終日付) に終わるコンテキストのうち、期首が最も早いもの
+    (四半期報告書では累計期間) を採用する。
+
+    Returns:
+        フィールド名 -> 値 (億円, 小数2桁)
+    """
+    if not facts:
+        return {}
+    target_end = period_end or max(context.end for _, context, _ in facts)
+
+    best: Dict[str, Tuple[str, float]] = {}
+    for field_name, context, value in facts:
+        if context.end != target_end:
+            continue
+        start = context.start or ""
+        current = best.get(field_name)
+        if current is None or start < current[0]:
+            best[field_name] = (start, value)
+
+    return {name: yen_to_oku(value) for name, (_, value) in best.items()}
+
+
+def parse_xbrl_instance(
+    source: Union[str, Path, IO[bytes]],
+    company: str,
+    period: str,
+    date: str,
+    concept_index: Dict[str, str],
+    stats: Optional[ParseStats] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    XBRL インスタンスを parse_financial_csv と同じ形式の1行に変換
+
+    Args:
+        source: インスタンス文書
+        company: 企業コード (TEPCO/CHUBU)
+        period: 期間 (YYYYQQ)
+        date: 決算日 (YYYY-MM-DD、不明な場合は "unknown")
+        concept_index: build_concept_index の結果
+        stats: 解析統計 (任意)
+
+    Returns:
+        財務データ辞書 または None (対応する事実が無い場合)
+    """
+    facts = iter_mapped_facts(source, concept_index, stats)
+    values = select_period_values(facts, date if date != "unknown" else None)
+    if not values:
+        return None
+    return {"company": company, "period": period, "date": date, **values}
+
+
+def parse_xbrl_zip(
+    zip_path: Path,
+    company: str,
+    period: str,
+    date: str,
+    concept_index: Dict[str, str],
+    stats: Optional[ParseStats] = None,
+) -> List[Dict[str, Any]]:
+    """
+    type=1 の ZIP 内の XBRL インスタンス (XBRL/PublicDoc/*.xbrl) を展開せずに解析
+
+    Returns:
+        財務データ辞書のリスト (インスタンス文書ごとに最大1行)
+    """
+    rows: List[Dict[str, Any]] = []
+    try:
+        with zipfile.ZipFile(zip_path, "r") as zf:
+            names = [
+                n
+                for n in zf.namelist()
+                if n.endswith(".xbrl") and ("PublicDoc/" in n or "/" not in n)
+            ]
+            for name in names:
+                with zf.open(name) as instance:
+                    row = parse_xbrl_instance(instance, company, period, date, concept_index, stats)
+                if row:
+                    rows.append(row)
+                    logger.debug("Parsed XBRL instance: %s with %d fields", name, len(row))
+    except zipfile.BadZipFile:
+        logger.error(f"Bad ZIP file: {zip_path}")
+    except etree.XMLSyntaxError as e:
+        logger.error(f"Invalid XBRL in {zip_path.name}: {str(e)}")
+    return rows
@@ -0,0 +1,69 @@
+"""
+Shared fixtures for the backend tests
+scripts/ is a flat directory of modules that import each other directly, so it is put on sys.path
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+import pytest
+
+# Logs of the code under test go to a throwaway directory, not the repository's logs/
+_LOG_DIR = tempfile.TemporaryDirectory(prefix="finsight-test-logs-")
+os.environ["FINSIGHT_LOG_DIR"] = _LOG_DIR.name
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from helpers import make_standalone_panel, to_ytd  # noqa: E402
+
+
+def pytest_unconfigure(config: pytest.Config) -> None:
+    from logger import shutdown_logging
+
+    shutdown_logging()
+    _LOG_DIR.cleanup()
+
+
+@pytest.fixture
+def standalone_panel_truth() -> pd.DataFrame:
+    return make_standalone_panel()
+
+
+@pytest.fixture
+def ytd_panel(standalone_panel_truth: pd.DataFrame) -> pd.DataFrame:
+    return to_ytd(standalone_panel_truth)
+
+
+@pytest.fixture
+def isolated_data(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[Path]:
+    """
+    Redirect every derived output and incremental state file into tmp_path
+
+    Yields:
+        The financials directory (empty) to write statements into
+    """
+    import compute_anomalies
+    import compute_health_score
+    import compute_metrics
+    import compute_peer_stats
+    import standalone_quarters
+
+    outputs = {
+        compute_metrics: ("METRICS_PATH", "METRICS_STATE_PATH"),
+        compute_peer_stats: ("PEER_STATS_PATH", "PEER_STATS_STATE_PATH"),
+        compute_anomalies: ("ANOMALIES_PATH", "ANOMALIES_STATE_PATH"),
+        compute_health_score: ("HEALTH_SCORES_PATH", "HEALTH_SCORE_STATE_PATH"),
+        standalone_quarters: ("STANDALONE_PATH", "STANDALONE_STATE_PATH"),
+    }
+    for module, names in outputs.items():
+        for name in names:
+            monkeypatch.setattr(module, name, tmp_path / "out" / Path(getattr(module, name)).name)
+    (tmp_path / "out").mkdir()
+
+    # Flow basis is detected from the synthetic data, never read from data/standalone.json
+    monkeypatch.setattr(standalone_quarters, "load_flow_basis", lambda *args, **kwargs: {})
+    yield tmp_path / "financials"
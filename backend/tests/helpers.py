@@ -0,0 +1,104 @@
+"""
+Synthetic panels and comparison helpers shared by the backend tests
+Imported directly by test modules (pytest puts this directory on sys.path)
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from panel import (
+    FLOW_FIELDS,
+    KEY_FIELDS,
+    STATEMENT_FIELDS,
+    STOCK_FIELDS,
+    ordinal_to_period,
+    statement_csv_path,
+)
+
+# Synthetic issuers (March fiscal year end) and history length
+COMPANIES = ["AAA", "BBB", "CCC", "DDD", "EEE"]
+FIRST_ORDINAL = 2015 * 4
+QUARTERS = 24
+
+
+def _period_end(ordinal: int) -> str:
+    """Label quarter end date (Q1 = April to June)"""
+    year, quarter = divmod(ordinal, 4)
+    month = (quarter + 1) * 3 + 3
+    if month > 12:
+        return f"{year + 1}-03-31"
+    day = 30 if month in (6, 9) else 31
+    return f"{year}-{month:02d}-{day}"
+
+
+def make_standalone_panel(seed: int = 0) -> pd.DataFrame:
+    """
+    Panel whose flow items are standalone quarters (the ground truth for conversions)
+
+    Returns:
+        load_panel columns, sorted by (company, ordinal)
+    """
+    rng = np.random.default_rng(seed)
+    ordinals = np.arange(FIRST_ORDINAL, FIRST_ORDINAL + QUARTERS)
+    rows = len(COMPANIES) * QUARTERS
+    panel = pd.DataFrame(
+        {
+            "company": np.repeat(COMPANIES, QUARTERS),
+            "period": np.tile(ordinal_to_period(ordinals), len(COMPANIES)),
+            "date": np.tile([_period_end(int(o)) for o in ordinals], len(COMPANIES)),
+            "ordinal": np.tile(ordinals, len(COMPANIES)),
+        }
+    )
+    for field in FLOW_FIELDS:
+        scale = rng.uniform(100.0, 1000.0)
+        values = scale * rng.uniform(0.5, 1.5, rows)
+        panel[field] = np.round(-values if field == "investing_cf" else values, 2)
+    for field in STOCK_FIELDS:
+        panel[field] = np.round(10000.0 + np.cumsum(rng.normal(0.0, 100.0, rows)), 2)
+    return panel
+
+
+def to_ytd(panel: pd.DataFrame) -> pd.DataFrame:
+    """Accumulate standalone flow items within each fiscal year, as filed"""
+    ytd = panel.copy()
+    fiscal_year = ytd["ordinal"] // 4
+    ytd[FLOW_FIELDS] = ytd.groupby([ytd["company"], fiscal_year])[FLOW_FIELDS].cumsum().round(2)
+    return ytd
+
+
+def write_statements(panel: pd.DataFrame, directory: Path) -> None:
+    """Write the panel as {company}_{statement}_quarterly.csv files"""
+    directory.mkdir(parents=True, exist_ok=True)
+    for company, rows in panel.groupby("company"):
+        for statement, fields in STATEMENT_FIELDS.items():
+            path = statement_csv_path(str(company), statement, directory)
+            rows[KEY_FIELDS + fields].to_csv(path, index=False)
+
+
+def assert_records_close(actual: Any, expected: Any, path: str = "$") -> None:
+    """Nested JSON-like values are equal, floats within a rounding tolerance"""
+    if isinstance(expected, dict):
+        assert isinstance(actual, dict), path
+        assert sorted(actual) == sorted(expected), path
+        for key in expected:
+            assert_records_close(actual[key], expected[key], f"{path}.{key}")
+    elif isinstance(expected, list):
+        assert isinstance(actual, list) and len(actual) == len(expected), path
+        for i, (a, e) in enumerate(zip(actual, expected)):
+            assert_records_close(a, e, f"{path}[{i}]")
+    elif isinstance(expected, float):
+        assert actual == pytest.approx(expected, rel=1e-6, abs=1e-3), path
+    else:
+        assert actual == expected, path
+
+
+def read_json(path: Path) -> Dict[str, Any]:
+    """Read a JSON output written by the code under test"""
+    with open(path, "r", encoding="utf-8") as f:
+        data: Dict[str, Any] = json.load(f)
+    return data
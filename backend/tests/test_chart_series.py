@@ -0,0 +1,105 @@
+"""Tests for chart series: vectorized LTTB against a scalar reference, annual rollups"""
+
+import math
+from typing import List
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from chart_series import annual_rollup, build_chart_series, decode_series, downsample
+import standalone_quarters
+from standalone_quarters import FLOW_BASIS_ATTR
+
+
+def lttb_reference(x: List[float], y: List[float], threshold: int) -> List[int]:
+    """Straightforward per-point LTTB (Steinarsson 2013) returning kept positions"""
+    n = len(x)
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    kept = [0]
+    for i in range(threshold - 2):
+        next_start = int(math.floor((i + 1) * every)) + 1
+        next_end = min(int(math.floor((i + 2) * every)) + 1, n)
+        avg_x = sum(x[next_start:next_end]) / (next_end - next_start)
+        avg_y = sum(y[next_start:next_end]) / (next_end - next_start)
+
+        best, best_area = -1, -1.0
+        for j in range(int(math.floor(i * every)) + 1, int(math.floor((i + 1) * every)) + 1):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        kept.append(best)
+        a = best
+    kept.append(n - 1)
+    return kept
+
+
+@pytest.mark.parametrize("threshold", [3, 10, 50])
+def test_downsample_matches_scalar_lttb(threshold: int) -> None:
+    rng = np.random.default_rng(threshold)
+    lengths = [threshold + 1, 2 * threshold + 7, 160, threshold]
+    values = np.full((len(lengths), 200), np.nan)
+    for row, length in enumerate(lengths):
+        values[row, :length] = np.cumsum(rng.normal(0.0, 1.0, length))
+    # Missing quarters are skipped, not treated as zero
+    values[2, [5, 6, 40, 99]] = np.nan
+
+    result = downsample(values, threshold)
+
+    for row, kept in enumerate(result):
+        present = np.flatnonzero(~np.isnan(values[row]))
+        if len(present) <= threshold:
+            assert kept is None
+            continue
+        assert kept is not None
+        x = present.astype(float).tolist()
+        y = values[row, present].tolist()
+        expected = [int(present[i]) for i in lttb_reference(x, y, threshold)]
+        assert kept.tolist() == expected
+
+
+def test_ytd_panel_is_converted_before_charting(
+    ytd_panel: pd.DataFrame, standalone_panel_truth: pd.DataFrame, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(standalone_quarters, "load_flow_basis", lambda *args, **kwargs: {})
+    expected = standalone_panel_truth.copy()
+    expected.attrs[FLOW_BASIS_ATTR] = "standalone"
+
+    charts = build_chart_series(ytd_panel)["BBB"]
+    reference = build_chart_series(expected)["BBB"]
+
+    for resolution in ("quarterly", "ttm"):
+        _, values = decode_series(*charts, "revenue", resolution)
+        _, truth = decode_series(*reference, "revenue", resolution)
+        np.testing.assert_allclose(values, truth, rtol=1e-5)
+
+
+def test_annual_rollup_follows_each_fiscal_year_end() -> None:
+    # 2020Q2 .. 2023Q2; row 0 has a March year end (shift 0), row 1 December (shift 3)
+    ordinals = np.arange(2020 * 4 + 1, 2020 * 4 + 14)
+    values = np.tile(ordinals.astype(float), (2, 1))
+    first, flows = annual_rollup(values, ordinals, np.array([0, 3]), flow=True)
+    _, stocks = annual_rollup(values, ordinals, np.array([0, 3]), flow=False)
+
+    # Fiscal year numbering starts at the December issuer's earlier fiscal year
+    assert first == 2019
+    march = ordinals.reshape(1, -1)
+    assert flows[0, 2] == march[0, 3:7].sum()  # April 2021 .. March 2022
+    assert flows[1, 1] == march[0, 2:6].sum()  # January .. December 2021
+    assert stocks[0, 2] == 2021 * 4 + 3
+    assert stocks[1, 1] == 2021 * 4 + 2
+    assert np.isnan(flows[0, 1])  # April 2020 quarter is missing
+
+
+def test_annual_labels_match_standalone_fiscal_year(standalone_panel_truth: pd.DataFrame) -> None:
+    panel = standalone_panel_truth.copy()
+    panel.attrs[FLOW_BASIS_ATTR] = "standalone"
+
+    index, payload = build_chart_series(panel)["AAA"]
+    labels, values = decode_series(index, payload, "revenue", "annual")
+
+    # History starts in April 2015, the first quarter of the year ending March 2016
+    assert labels[0] == "FY2016"
+    expected = panel[panel["company"] == "AAA"]["revenue"].to_numpy()[:4].sum()
+    assert values[0] == pytest.approx(expected, rel=1e-6)
@@ -0,0 +1,149 @@
+"""Tests for the scan checkpoint: cursor, failed dates and resuming an interrupted scan"""
+
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+import fetch_edinet
+from checkpoint import ScanCheckpoint, load_checkpoint, save_checkpoint
+from fetch_edinet import EDINETAPIError, find_company_documents
+
+EDINET_CODE = "E04498"
+
+
+def _checkpoint() -> ScanCheckpoint:
+    return ScanCheckpoint(EDINET_CODE, "2024-01-01", "2024-01-05", "full", 40)
+
+
+def test_cursor_moves_to_the_oldest_scanned_date() -> None:
+    state = _checkpoint()
+    state.mark_scanned("2024-01-05", True)
+    state.mark_scanned("2024-01-03", True)
+    # A late retry of a newer date does not move the cursor forward
+    state.mark_scanned("2024-01-04", True)
+
+    assert state.cursor == "2024-01-03"
+    assert state.is_scanned("2024-01-05")
+    assert not state.is_scanned("2024-01-02")
+
+
+def test_failed_dates_stay_pending_until_they_succeed() -> None:
+    state = _checkpoint()
+    state.mark_scanned("2024-01-05", True)
+    state.mark_scanned("2024-01-04", False)
+    state.mark_scanned("2024-01-04", False)
+
+    assert state.failed_dates == ["2024-01-04"]
+    assert not state.is_scanned("2024-01-04")
+
+    state.mark_scanned("2024-01-04", True)
+    assert state.failed_dates == []
+    assert state.is_scanned("2024-01-04")
+
+
+def test_documents_are_added_once() -> None:
+    state = _checkpoint()
+
+    assert state.add_document({"docID": "S100A001"})
+    assert not state.add_document({"docID": "S100A001"})
+    assert state.found_ids == ["S100A001"]
+
+
+def test_round_trip_and_corrupt_file(tmp_path: Path) -> None:
+    state = _checkpoint()
+    state.mark_scanned("2024-01-04", False)
+    save_checkpoint(state, tmp_path)
+
+    loaded = load_checkpoint(EDINET_CODE, tmp_path)
+    assert loaded == state
+    assert loaded is not None and loaded.updated_at is not None
+    # No temporary files are left next to the checkpoint
+    assert [p.name for p in tmp_path.iterdir()] == [f"{EDINET_CODE}.json"]
+
+    (tmp_path / f"{EDINET_CODE}.json").write_text("{", encoding="utf-8")
+    assert load_checkpoint(EDINET_CODE, tmp_path) is None
+    assert load_checkpoint("E99999", tmp_path) is None
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.fixture
+def scripted_api(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Dict[str, Any]:
+    """documents.json answers per date; queried dates are recorded"""
+    api: Dict[str, Any] = {"queried": [], "fail": set(), "interrupt": set(), "docs": {}}
+
+    def get_documents_list(date: str) -> List[Dict[str, Any]]:
+        api["queried"].append(date)
+        if date in api["interrupt"]:
+            raise Interrupted(date)
+        if date in api["fail"]:
+            raise EDINETAPIError(f"HTTP 500 for {date}")
+        return list(api["docs"].get(date, []))
+
+    monkeypatch.setattr(fetch_edinet, "get_documents_list", get_documents_list)
+    monkeypatch.setattr(fetch_edinet.time, "sleep", lambda _: None)
+    monkeypatch.setattr(fetch_edinet, "CHECKPOINT_INTERVAL", 1)
+    monkeypatch.setattr(
+        fetch_edinet, "save_checkpoint", lambda state: save_checkpoint(state, tmp_path)
+    )
+    return api
+
+
+def _doc(doc_id: str) -> Dict[str, Any]:
+    return {"docID": doc_id, "edinetCode": EDINET_CODE, "docDescription": "四半期報告書"}
+
+
+def _scan(state: ScanCheckpoint) -> List[Dict[str, Any]]:
+    return find_company_documents(
+        EDINET_CODE, state.start_date, state.end_date, state.limit, "full", state
+    )
+
+
+def test_resume_requeries_only_failed_and_unscanned_dates(
+    tmp_path: Path, scripted_api: Dict[str, Any]
+) -> None:
+    scripted_api["docs"] = {"2024-01-05": [_doc("S100A005")], "2024-01-01": [_doc("S100A001")]}
+    scripted_api["fail"] = {"2024-01-04"}
+    scripted_api["interrupt"] = {"2024-01-02"}
+
+    with pytest.raises(Interrupted):
+        _scan(_checkpoint())
+
+    saved = load_checkpoint(EDINET_CODE, tmp_path)
+    assert saved is not None
+    assert (saved.cursor, saved.failed_dates, saved.found_ids) == (
+        "2024-01-03",
+        ["2024-01-04"],
+        ["S100A005"],
+    )
+
+    scripted_api["queried"].clear()
+    scripted_api["fail"].clear()
+    scripted_api["interrupt"].clear()
+    docs = _scan(saved)
+
+    assert scripted_api["queried"] == ["2024-01-04", "2024-01-02", "2024-01-01"]
+    assert [doc["docID"] for doc in docs] == ["S100A005", "S100A001"]
+    resumed = load_checkpoint(EDINET_CODE, tmp_path)
+    assert resumed is not None and resumed.scan_complete and resumed.failed_dates == []
+
+    # A completed scan is not queried again
+    scripted_api["queried"].clear()
+    assert [doc["docID"] for doc in _scan(resumed)] == ["S100A005", "S100A001"]
+    assert scripted_api["queried"] == []
+
+
+def test_scan_with_failed_dates_is_not_complete(
+    tmp_path: Path, scripted_api: Dict[str, Any]
+) -> None:
+    scripted_api["fail"] = {"2024-01-02"}
+
+    _scan(_checkpoint())
+
+    saved = load_checkpoint(EDINET_CODE, tmp_path)
+    assert saved is not None
+    assert not saved.scan_complete
+    assert (saved.cursor, saved.failed_dates) == ("2024-01-01", ["2024-01-02"])
@@ -0,0 +1,21 @@
+"""Tests for anomaly detection"""
+
+from pathlib import Path
+
+import pandas as pd
+
+import compute_anomalies
+from compute_anomalies import update_anomalies
+from helpers import read_json, write_statements
+
+
+def test_unit_error_is_flagged(isolated_data: Path, ytd_panel: pd.DataFrame) -> None:
+    changed = ytd_panel.copy()
+    row = (changed["company"] == "BBB") & (changed["period"] == "2020Q2")
+    changed.loc[row, "total_assets"] *= 100.0
+    write_statements(changed, isolated_data)
+
+    update_anomalies(full=True, directory=isolated_data)
+
+    companies = read_json(compute_anomalies.ANOMALIES_PATH)["companies"]
+    assert "total_assets" in companies["BBB"]["2020Q2"]
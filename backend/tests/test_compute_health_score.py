@@ -0,0 +1,94 @@
+"""Tests for the financial health score engine"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict
+
+import numpy as np
+import pytest
+
+from compute_health_score import (
+    CATEGORIES,
+    HEALTH_SCORE_CONFIG_PATH,
+    load_score_config,
+    run_benchmark,
+    score_arrays,
+)
+
+
+def _config(**indicators: Any) -> Dict[str, Any]:
+    return {"weights": {c: 25 for c in CATEGORIES}, "indicators": indicators}
+
+
+def test_indicators_are_interpolated_clipped_and_averaged() -> None:
+    config = _config(
+        liquidity=[{"metric": "a", "low": 0.0, "high": 10.0}],
+        stability=[
+            {"metric": "b", "low": 0.0, "high": 10.0},
+            # Lower is better when low > high
+            {"metric": "c", "low": 4.0, "high": 2.0},
+        ],
+    )
+    metrics = {
+        "a": np.array([[5.0, 20.0, np.nan]]),
+        "b": np.array([[10.0, -1.0, np.nan]]),
+        "c": np.array([[2.0, 3.0, np.nan]]),
+    }
+
+    scores = score_arrays(metrics, config)
+
+    np.testing.assert_allclose(scores["liquidity"], [[12.5, 25.0, np.nan]])
+    np.testing.assert_allclose(scores["stability"], [[25.0, 6.25, np.nan]])
+    assert np.isnan(scores["profitability"]).all()
+    # Missing categories are left out and the remaining weights scaled to 100 points
+    np.testing.assert_allclose(scores["total"], [[75.0, 62.5, np.nan]])
+
+
+def test_missing_metric_value_leaves_the_category_average_of_the_rest() -> None:
+    config = _config(
+        cash_flow=[
+            {"metric": "a", "low": 0.0, "high": 1.0},
+            {"metric": "b", "low": 0.0, "high": 1.0},
+        ]
+    )
+    scores = score_arrays({"a": np.array([[1.0]]), "b": np.array([[np.nan]])}, config)
+
+    assert scores["cash_flow"][0, 0] == 25.0
+    assert scores["total"][0, 0] == 100.0
+
+
+def _write_config(tmp_path: Path, config: Dict[str, Any]) -> Path:
+    path = tmp_path / "health_score_config.json"
+    path.write_text(json.dumps(config), encoding="utf-8")
+    return path
+
+
+def test_shipped_config_is_valid() -> None:
+    config = load_score_config(HEALTH_SCORE_CONFIG_PATH)
+    assert set(config["indicators"]) == set(CATEGORIES)
+
+
+@pytest.mark.parametrize(
+    "category, indicator, message",
+    [
+        ("liquidity", {"metric": "curent_assets_ratio", "low": 5, "high": 30}, "Unknown metric"),
+        ("stability", {"metric": "equity_ratio", "low": 10, "high": 10}, "low == high"),
+        ("liquidity", {"metric": "equity_ratio", "low": 10}, "needs metric, low and high"),
+        ("solvency", {"metric": "equity_ratio", "low": 10, "high": 40}, "Unknown categories"),
+    ],
+)
+def test_invalid_config_is_rejected(
+    tmp_path: Path, category: str, indicator: Dict[str, Any], message: str
+) -> None:
+    config = load_score_config(HEALTH_SCORE_CONFIG_PATH)
+    config["indicators"].setdefault(category, []).append(indicator)
+
+    with pytest.raises(ValueError, match=message):
+        load_score_config(_write_config(tmp_path, config))
+
+
+def test_hundreds_of_issuers_score_well_under_a_second() -> None:
+    timings = run_benchmark(500, 40, load_score_config(HEALTH_SCORE_CONFIG_PATH))
+
+    assert timings["rows"] == 500 * 40
+    assert timings["full_s"] < 1.0
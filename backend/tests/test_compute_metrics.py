@@ -0,0 +1,15 @@
+"""Tests for derived metrics: standalone input"""
+
+import pandas as pd
+
+from compute_metrics import compute_metrics_frame
+
+
+def test_ytd_and_standalone_input_give_the_same_metrics(
+    ytd_panel: pd.DataFrame, standalone_panel_truth: pd.DataFrame
+) -> None:
+    from_ytd = compute_metrics_frame(ytd_panel)
+    from_standalone = compute_metrics_frame(standalone_panel_truth)
+
+    pd.testing.assert_frame_equal(from_ytd, from_standalone, atol=0.05, check_exact=False)
+    assert from_ytd["revenue_ttm"].notna().any()
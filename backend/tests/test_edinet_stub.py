@@ -0,0 +1,180 @@
+"""Tests for the stub EDINET server: fault injection, recording and replaying cassettes"""
+
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import pytest
+import requests
+
+import fetch_edinet
+from edinet_stub import (
+    INJECTED_ERROR_STATUSES,
+    CassetteStore,
+    StubFaults,
+    StubServer,
+    StubState,
+    TokenBucket,
+    cassette_key,
+    create_stub_server,
+)
+
+DATE = "2024-08-09"
+DOC = {"docID": "S100TEST", "edinetCode": "E04498", "docDescription": "四半期報告書"}
+ARCHIVE = b"PK\x03\x04" + bytes(range(256)) * 64
+HEADERS = {"Subscription-Key": "key"}
+
+
+def _state() -> StubState:
+    state = StubState()
+    state.add_filing(DATE, DOC, ARCHIVE)
+    return state
+
+
+@contextmanager
+def _serving(server: StubServer) -> Iterator[StubServer]:
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def _stub(
+    state: Optional[StubState] = None,
+    cassette: Optional[CassetteStore] = None,
+    faults: Optional[StubFaults] = None,
+    upstream: Optional[str] = None,
+) -> StubServer:
+    return create_stub_server(state, "127.0.0.1", 0, cassette, faults, upstream)
+
+
+def _list(server: StubServer, **headers: str) -> requests.Response:
+    return requests.get(
+        f"{server.api_base}/documents.json",
+        params={"date": DATE, "type": "2"},
+        headers={**HEADERS, **headers},
+        timeout=10,
+    )
+
+
+def test_cassette_key_ignores_prefix_order_and_api_key() -> None:
+    key = cassette_key(
+        "/api/v2/documents.json", {"type": "2", "Subscription-Key": "secret", "date": DATE}
+    )
+
+    assert key == f"GET /documents.json?date={DATE}&type=2"
+    assert cassette_key("/api/v2/documents/S100TEST", {}) == "GET /documents/S100TEST"
+
+
+def test_faults_are_reproducible_from_the_seed() -> None:
+    def statuses(faults: StubFaults) -> List[Optional[int]]:
+        return [faults.draw()[1] for _ in range(200)]
+
+    drawn = statuses(StubFaults(error_rate=0.2, throttle_rate=0.1, seed=7))
+
+    assert drawn == statuses(StubFaults(error_rate=0.2, throttle_rate=0.1, seed=7))
+    assert drawn != statuses(StubFaults(error_rate=0.2, throttle_rate=0.1, seed=8))
+    assert set(drawn) == {None, 429, *INJECTED_ERROR_STATUSES}
+    assert 20 <= drawn.count(429) + sum(drawn.count(s) for s in INJECTED_ERROR_STATUSES) <= 100
+    delay, _ = StubFaults(latency=0.5, jitter=0.1).draw()
+    assert 0.5 <= delay < 0.6
+
+
+def test_token_bucket_allows_a_burst_then_waits() -> None:
+    bucket = TokenBucket(rate=1.0, burst=2)
+
+    assert [bucket.acquire(), bucket.acquire()] == [0.0, 0.0]
+    assert 0.0 < bucket.acquire() <= 1.0
+
+
+def test_fixtures_are_served_with_conditional_lists() -> None:
+    with _serving(_stub(_state())) as server:
+        assert requests.get(f"{server.api_base}/documents.json", timeout=10).status_code == 401
+
+        listed = _list(server)
+        assert listed.json()["results"] == [DOC]
+        not_modified = _list(server, **{"If-None-Match": listed.headers["ETag"]})
+        assert (not_modified.status_code, not_modified.content) == (304, b"")
+
+        document = requests.get(f"{server.api_base}/documents/S100TEST", headers=HEADERS)
+        missing = requests.get(f"{server.api_base}/documents/S100NONE", headers=HEADERS)
+        assert (document.content, missing.status_code) == (ARCHIVE, 404)
+
+
+def test_injected_errors_and_rate_limit() -> None:
+    with _serving(_stub(_state(), faults=StubFaults(throttle_rate=1.0, retry_after=3))) as server:
+        throttled = _list(server)
+        assert (throttled.status_code, throttled.headers["Retry-After"]) == (429, "3")
+
+    with _serving(_stub(_state(), faults=StubFaults(error_rate=1.0))) as server:
+        assert _list(server).status_code in INJECTED_ERROR_STATUSES
+
+    with _serving(_stub(_state(), faults=StubFaults(rate_limit=0.5, burst=2))) as server:
+        assert [_list(server).status_code for _ in range(3)] == [200, 200, 429]
+        assert _list(server).headers["Retry-After"] == "2"
+        assert server.state.requests["rate_limited"] == 2
+
+
+@pytest.fixture
+def fetch_from(monkeypatch: pytest.MonkeyPatch) -> Iterator[None]:
+    """Point fetch_edinet at a stub and skip its retry sleeps"""
+    monkeypatch.setattr(fetch_edinet, "EDINET_API_KEY", "key")
+    monkeypatch.setattr(fetch_edinet.time, "sleep", lambda _: None)
+    yield
+
+
+def test_client_retries_through_injected_errors(
+    monkeypatch: pytest.MonkeyPatch, fetch_from: None
+) -> None:
+    faults = StubFaults(error_rate=0.5, seed=3)
+    with _serving(_stub(_state(), faults=faults)) as server:
+        monkeypatch.setattr(fetch_edinet, "EDINET_API_BASE", server.api_base)
+
+        assert fetch_edinet.get_documents_list(DATE, max_retries=20, retry_delay=0) == [DOC]
+        assert server.state.requests["injected_5xx"] >= 1
+        assert server.state.requests["documents_list"] == 1
+
+
+def test_record_then_replay(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, fetch_from: None
+) -> None:
+    cassette_dir = tmp_path / "cassette"
+
+    def fetch(server: StubServer) -> List[object]:
+        monkeypatch.setattr(fetch_edinet, "EDINET_API_BASE", server.api_base)
+        output = tmp_path / f"{server.server_address[1]}.zip"
+        downloaded = fetch_edinet.download_document("S100TEST", output, retry_delay=0)
+        return [fetch_edinet.get_documents_list(DATE), downloaded, output.read_bytes()]
+
+    with _serving(_stub(_state())) as upstream:
+        # Transient upstream failures are passed through but never recorded
+        failing = StubFaults(error_rate=1.0)
+        with _serving(_stub(faults=failing)) as failing_upstream:
+            with _serving(
+                _stub(cassette=CassetteStore(cassette_dir), upstream=failing_upstream.api_base)
+            ) as recorder:
+                assert _list(recorder).status_code in INJECTED_ERROR_STATUSES
+                assert recorder.cassette is not None and len(recorder.cassette) == 0
+
+        with _serving(
+            _stub(cassette=CassetteStore(cassette_dir), upstream=upstream.api_base)
+        ) as recorder:
+            recorded = fetch(recorder)
+            assert recorder.state.requests["recorded"] == 2
+        assert upstream.state.requests == {"documents_list": 1, "document": 1}
+
+    # The upstream is gone; an empty stub answers from the cassette alone
+    cassette = CassetteStore(cassette_dir)
+    assert len(cassette) == 2
+    assert len(list((cassette_dir / "bodies").iterdir())) == 2
+    with _serving(_stub(cassette=cassette)) as replayer:
+        assert fetch(replayer) == recorded == [[DOC], True, ARCHIVE]
+        assert replayer.state.requests == {"replayed": 2}
+        # Recorded ETags still answer conditional requests
+        etag = _list(replayer).headers["ETag"]
+        assert _list(replayer, **{"If-None-Match": etag}).status_code == 304
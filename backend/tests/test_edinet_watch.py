@@ -0,0 +1,234 @@
+"""Tests for the filing watcher: conditional polling, ingestion and rollback"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, cast
+
+import pytest
+from requests import Session
+
+import edinet_watch
+import panel
+from edinet_watch import (
+    DocumentsPoller,
+    FilingWatcher,
+    WatchMetrics,
+    WatchValidationError,
+    ingest_company,
+)
+from publisher import PublishManifest
+from supersession import SupersessionIndex
+
+DATE = "2025-11-14"
+COMPANIES = {"E04498": "TEPCO"}
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, body: Optional[Dict[str, Any]] = None, etag: str = ""):
+        self.status_code = status_code
+        self.body = body or {}
+        self.headers = {"ETag": etag} if etag else {}
+
+    def json(self) -> Dict[str, Any]:
+        return self.body
+
+
+class FakeSession:
+    """Answers documents.json requests from a script and records them"""
+
+    def __init__(self, responses: List[FakeResponse]) -> None:
+        self.responses = list(responses)
+        self.requests: List[Tuple[str, Optional[str]]] = []
+
+    def get(self, url: str, params: Dict[str, str], headers: Dict[str, str], timeout: float) -> Any:
+        self.requests.append((params["type"], headers.get("If-None-Match")))
+        return self.responses.pop(0)
+
+
+def _metadata(count: int, etag: str) -> FakeResponse:
+    return FakeResponse(200, {"metadata": {"status": "200", "resultset": {"count": count}}}, etag)
+
+
+def _documents(*docs: Dict[str, Any]) -> FakeResponse:
+    return FakeResponse(200, {"results": list(docs)})
+
+
+def _filing(doc_id: str, period_end: str = "2025-09-30", **extra: Any) -> Dict[str, Any]:
+    return {
+        "docID": doc_id,
+        "edinetCode": "E04498",
+        "docDescription": "四半期報告書－第102期第2四半期",
+        "docTypeCode": "140",
+        "periodEnd": period_end,
+        "submitDateTime": f"{DATE} 15:00",
+        **extra,
+    }
+
+
+def _poller(responses: List[FakeResponse]) -> Tuple[DocumentsPoller, FakeSession]:
+    session = FakeSession(responses)
+    poller = DocumentsPoller(WatchMetrics(), api_key="key", session=cast(Session, session))
+    return poller, session
+
+
+def test_not_modified_skips_the_list() -> None:
+    poller, session = _poller([_metadata(3, '"v1"'), _documents(), FakeResponse(304)])
+
+    assert poller.poll(DATE) == []
+    assert poller.poll(DATE) is None
+    # The second metadata request is conditional and the list is not fetched again
+    assert session.requests == [("1", None), ("2", None), ("1", '"v1"')]
+    assert poller.metrics.not_modified == 1
+
+
+def test_unchanged_count_skips_the_list() -> None:
+    poller, session = _poller([_metadata(3, '"v1"'), _documents(), _metadata(3, '"v2"')])
+
+    poller.poll(DATE)
+    assert poller.poll(DATE) is None
+    assert [doc_type for doc_type, _ in session.requests] == ["1", "2", "1"]
+    assert poller.etag == '"v2"'
+    assert poller.metrics.unchanged == 1
+
+
+def test_new_day_refetches_the_list() -> None:
+    poller, session = _poller(
+        [_metadata(3, '"v1"'), _documents(), _metadata(3, '"v1"'), _documents()]
+    )
+
+    poller.poll(DATE)
+    assert poller.poll("2025-11-17") == []
+    assert session.requests[2] == ("1", None)
+
+
+@pytest.fixture
+def watch_env(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Dict[str, Any]:
+    """ingest_company with its files under tmp_path and a scripted extraction"""
+    financials = tmp_path / "financials"
+    financials.mkdir()
+    env: Dict[str, Any] = {
+        "index_path": tmp_path / "supersession.json",
+        "financials": financials,
+        "rows": ["TEPCO,2025Q2,2025-09-30,100.0"],
+        "derived": [],
+    }
+
+    def download(doc: Dict[str, Any], company: str, downloaded: List[str], fmt: str) -> bool:
+        (tmp_path / f"{doc['docID']}.zip").write_bytes(b"zip")
+        downloaded.append(doc["docID"])
+        return True
+
+    def extract(company: str, manifest: PublishManifest) -> List[str]:
+        path = panel.statement_csv_path(company, "pl", financials)
+        content = "\n".join(["company,period,date,revenue", *env["rows"]]) + "\n"
+        changed = manifest.publish(f"{company}/pl", path, content.encode("utf-8"), 1)
+        return ["pl"] if changed else []
+
+    monkeypatch.setattr(
+        edinet_watch, "SupersessionIndex", lambda: SupersessionIndex(env["index_path"])
+    )
+    monkeypatch.setattr(
+        edinet_watch,
+        "statement_csv_path",
+        lambda company, statement: panel.statement_csv_path(company, statement, financials),
+    )
+    monkeypatch.setattr(
+        edinet_watch, "PublishManifest", lambda: PublishManifest(tmp_path / "manifest.json")
+    )
+    monkeypatch.setattr(edinet_watch, "download_cached_document", download)
+    monkeypatch.setattr(
+        edinet_watch, "cached_document_path", lambda doc, *_: tmp_path / f"{doc['docID']}.zip"
+    )
+    monkeypatch.setattr(edinet_watch, "process_company_cache", extract)
+    monkeypatch.setattr(
+        edinet_watch, "update_derived_outputs", lambda frontend: env["derived"].append(frontend)
+    )
+    return env
+
+
+def _indexed(path: Path) -> List[str]:
+    return sorted(json.loads(path.read_text(encoding="utf-8"))["documents"])
+
+
+def test_new_filing_is_ingested(tmp_path: Path, watch_env: Dict[str, Any]) -> None:
+    poller, _ = _poller([_metadata(1, '"v1"'), _documents(_filing("S100A001"))])
+    watcher = FilingWatcher(COMPANIES, poller=poller, state_path=tmp_path / "watch.json")
+
+    assert watcher.run_once(DATE) == 1
+    assert watch_env["derived"] == [False]
+    assert _indexed(watch_env["index_path"]) == ["S100A001"]
+    assert json.loads((tmp_path / "watch.json").read_text()) == {
+        "date": DATE,
+        "seen": ["S100A001"],
+    }
+    status, body = watcher.health()
+    assert (status, body["status"], body["seen"]) == (200, "ok", 1)
+
+
+def test_seen_filing_is_not_ingested_again(tmp_path: Path, watch_env: Dict[str, Any]) -> None:
+    (tmp_path / "watch.json").write_text(json.dumps({"date": DATE, "seen": ["S100A001"]}))
+    poller, _ = _poller([_metadata(1, '"v1"'), _documents(_filing("S100A001"))])
+    watcher = FilingWatcher(COMPANIES, poller=poller, state_path=tmp_path / "watch.json")
+
+    assert watcher.run_once(DATE) == 0
+    assert watch_env["derived"] == []
+
+
+def test_validation_failure_restores_statements_and_index(
+    tmp_path: Path, watch_env: Dict[str, Any]
+) -> None:
+    ingest_company("TEPCO", [_filing("S100A001")])
+    statement = panel.statement_csv_path("TEPCO", "pl", watch_env["financials"])
+    published = statement.read_bytes()
+    index = watch_env["index_path"].read_bytes()
+
+    # An amendment whose extraction produces an invalid period
+    watch_env["rows"] = ["TEPCO,2025Q9,2025-09-30,120.0"]
+    poller, _ = _poller(
+        [_metadata(2, '"v2"'), _documents(_filing("S100A002", parentDocID="S100A001"))]
+    )
+    watcher = FilingWatcher(COMPANIES, poller=poller, state_path=tmp_path / "watch.json")
+
+    assert watcher.run_once(DATE) == 0
+    assert statement.read_bytes() == published
+    assert watch_env["index_path"].read_bytes() == index
+    assert watch_env["derived"] == [False]
+    # Left unseen and the list is refetched on the next poll
+    assert watcher.state is not None and watcher.state.seen == []
+    assert poller.etag is None
+    assert watcher.metrics.validation_failures == 1
+
+
+def test_missing_download_restores_the_index(
+    tmp_path: Path, watch_env: Dict[str, Any], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(edinet_watch, "download_cached_document", lambda *_: False)
+
+    with pytest.raises(edinet_watch.EDINETAPIError):
+        ingest_company("TEPCO", [_filing("S100A001")])
+    assert not watch_env["index_path"].exists()
+
+
+def test_validation_error_is_raised_by_ingest(watch_env: Dict[str, Any]) -> None:
+    watch_env["rows"] = ["TEPCO,2025Q9,2025-09-30,120.0"]
+
+    with pytest.raises(WatchValidationError):
+        ingest_company("TEPCO", [_filing("S100A001")])
+    assert not panel.statement_csv_path("TEPCO", "pl", watch_env["financials"]).exists()
+
+
+def test_health_reports_failing_and_stale(tmp_path: Path) -> None:
+    poller, _ = _poller([FakeResponse(500)])
+    watcher = FilingWatcher(
+        COMPANIES, interval=10, poller=poller, state_path=tmp_path / "watch.json"
+    )
+    assert watcher.health()[1]["status"] == "starting"
+
+    with pytest.raises(edinet_watch.EDINETAPIError):
+        watcher.run_once(DATE)
+    status, body = watcher.health()
+    assert (status, body["status"]) == (503, "failing")
+
+    watcher.metrics.last_success_at = 0.0
+    assert watcher.health()[0] == 503
+    assert watcher.health()[1]["status"] == "stale"
@@ -0,0 +1,108 @@
+"""Tests for EDINET CSV parsing and statement CSV creation"""
+
+import csv
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+import extract_financials
+from extract_financials import create_statement_csvs, load_taxonomy_mapping, parse_financial_csv
+from financial_store import FinancialStore
+from publisher import PublishManifest
+from units import DEFAULT_CSV_UNIT, to_oku
+
+ROWS: List[Dict[str, Any]] = [
+    {"company": "AAA", "period": "2020Q2", "date": "2020-09-30", "revenue": 200.0},
+    {"company": "AAA", "period": "2020Q1", "date": "2020-06-30", "revenue": 100.0},
+    # A second CSV in the same archive: same period, partly different values
+    {"company": "AAA", "period": "2020Q1", "date": "2020-06-30", "revenue": 110.0},
+    {"company": "AAA", "period": "2020Q1", "date": "2020-06-30", "total_assets": 5000.0},
+]
+
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def test_csv_archive_matches_baseline() -> None:
+    # Expected row produced by the original parser (amounts in 千円, substring label matching)
+    expected = json.loads((FIXTURES / "edinet_statement.expected.json").read_text(encoding="utf-8"))
+    row = parse_financial_csv(
+        FIXTURES / "edinet_statement.csv", "TEPCO", "2025Q2", "2025-09-30", load_taxonomy_mapping()
+    )
+
+    assert row == expected
+
+
+def test_csv_unit_column_is_applied_per_row(tmp_path: Path) -> None:
+    path = tmp_path / "statement.csv"
+    path.write_text(
+        "要素名,コンテキストID,金額,単位\n"
+        "売上高,CurrentYTDDuration,681000,百万円\n"
+        "経常利益,CurrentYTDDuration,3987000000,円\n"
+        "当期純利益,CurrentYTDDuration,267800,\n"
+        "負債合計,CurrentQuarterInstant,1012,億円\n"
+        "営業利益,CurrentYTDDuration,1000,株\n",
+        encoding="cp932",
+    )
+    row = parse_financial_csv(path, "TEPCO", "2025Q2", "2025-09-30", load_taxonomy_mapping())
+
+    assert row == {
+        "company": "TEPCO",
+        "period": "2025Q2",
+        "date": "2025-09-30",
+        "revenue": 6810.0,
+        "ordinary_income": 39.87,
+        # An empty unit falls back to 千円
+        "net_income": 2.68,
+        "total_liabilities": 1012.0,
+        # A non-monetary unit is not read as an amount
+    }
+
+
+@pytest.mark.parametrize("value", [1.0, 5.0, 12345.0, 99995.0, 123456789.0, -655005.0, 0.5])
+def test_thousand_yen_conversion_matches_original(value: float) -> None:
+    assert to_oku(value, DEFAULT_CSV_UNIT) == round(value / 100000, 2)
+
+
+def _read(path: Path) -> List[Dict[str, str]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+@pytest.fixture
+def financials_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.setattr(extract_financials, "FINANCIALS_DIR", tmp_path)
+    return tmp_path
+
+
+def test_record_rows_are_not_merged(financials_dir: Path) -> None:
+    manifest = PublishManifest(financials_dir / "manifest.json")
+    changed = create_statement_csvs("AAA", ROWS, manifest)
+
+    assert changed == ["pl", "bs"]
+    pl = _read(financials_dir / "AAA_pl_quarterly.csv")
+    # Rows are written in canonical (sorted) order, duplicates kept
+    assert [(r["period"], r["revenue"]) for r in pl] == [
+        ("2020Q1", "100.0"),
+        ("2020Q1", "110.0"),
+        ("2020Q2", "200.0"),
+    ]
+    assert len(_read(financials_dir / "AAA_bs_quarterly.csv")) == 1
+
+
+def test_store_rows_are_one_per_period(financials_dir: Path) -> None:
+    manifest = PublishManifest(financials_dir / "manifest.json")
+    create_statement_csvs("AAA", FinancialStore.from_records(ROWS), manifest)
+
+    pl = _read(financials_dir / "AAA_pl_quarterly.csv")
+    # Later rows win per field
+    assert [(r["period"], r["revenue"]) for r in pl] == [("2020Q1", "110.0"), ("2020Q2", "200.0")]
+
+
+def test_unchanged_content_is_not_rewritten(financials_dir: Path) -> None:
+    manifest = PublishManifest(financials_dir / "manifest.json")
+    create_statement_csvs("AAA", ROWS, manifest)
+
+    assert create_statement_csvs("AAA", ROWS, manifest) == []
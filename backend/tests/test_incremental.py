@@ -0,0 +1,105 @@
+"""Tests for the derived stages: incremental updates against a full rebuild"""
+
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+import pandas as pd
+import pytest
+
+import compute_anomalies
+import compute_health_score
+import compute_metrics
+import compute_peer_stats
+from helpers import assert_records_close, read_json, write_statements
+
+# Stage -> (update function, output file attribute, compared sections of the output)
+STAGES: Dict[str, Any] = {
+    "metrics": (compute_metrics.update_metrics, (compute_metrics, "METRICS_PATH"), ["companies"]),
+    "peer_stats": (
+        compute_peer_stats.update_peer_stats,
+        (compute_peer_stats, "PEER_STATS_PATH"),
+        ["periods"],
+    ),
+    "anomalies": (
+        compute_anomalies.update_anomalies,
+        (compute_anomalies, "ANOMALIES_PATH"),
+        ["flags", "companies"],
+    ),
+    "health_scores": (
+        compute_health_score.update_health_scores,
+        (compute_health_score, "HEALTH_SCORES_PATH"),
+        ["companies"],
+    ),
+}
+
+# (company, period, field, transformation) applied to one filed value
+CHANGES = [
+    ("BBB", "2019Q2", "revenue", lambda v: v * 1.5),
+    ("AAA", "2015Q1", "operating_income", lambda v: v * 0.2),
+    ("DDD", "2016Q3", "net_income", lambda v: -v + 1.0),
+    ("EEE", "2020Q4", "total_assets", lambda v: v * 100.0),
+]
+
+
+def _output(stage: str) -> Dict[str, Any]:
+    _, (module, name), sections = STAGES[stage]
+    data = read_json(getattr(module, name))
+    return {section: data[section] for section in sections}
+
+
+@pytest.mark.parametrize("stage", sorted(STAGES))
+@pytest.mark.parametrize("company, period, field, change", CHANGES)
+def test_incremental_update_matches_full(
+    isolated_data: Path,
+    ytd_panel: pd.DataFrame,
+    stage: str,
+    company: str,
+    period: str,
+    field: str,
+    change: Callable[[pd.Series], pd.Series],
+) -> None:
+    update = STAGES[stage][0]
+    write_statements(ytd_panel, isolated_data)
+    total = update(full=True, directory=isolated_data)
+
+    changed = ytd_panel.copy()
+    row = (changed["company"] == company) & (changed["period"] == period)
+    changed.loc[row, field] = change(changed.loc[row, field])
+    write_statements(changed, isolated_data)
+
+    updated = update(directory=isolated_data)
+    incremental = _output(stage)
+    update(full=True, directory=isolated_data)
+
+    if isinstance(updated, dict):
+        # Per-issuer stages only touch the changed issuer
+        assert list(updated) == [company]
+    else:
+        # Cross-sectional stages only recompute the periods that look back at the change
+        assert 0 < updated < total
+    assert_records_close(incremental, _output(stage))
+
+
+@pytest.mark.parametrize("stage", sorted(STAGES))
+def test_new_issuer_matches_full(isolated_data: Path, ytd_panel: pd.DataFrame, stage: str) -> None:
+    update = STAGES[stage][0]
+    write_statements(ytd_panel[ytd_panel["company"] != "DDD"], isolated_data)
+    update(full=True, directory=isolated_data)
+
+    write_statements(ytd_panel, isolated_data)
+    update(directory=isolated_data)
+    incremental = _output(stage)
+    update(full=True, directory=isolated_data)
+
+    assert_records_close(incremental, _output(stage))
+
+
+@pytest.mark.parametrize("stage", sorted(STAGES))
+def test_unchanged_input_is_not_recomputed(
+    isolated_data: Path, ytd_panel: pd.DataFrame, stage: str
+) -> None:
+    update = STAGES[stage][0]
+    write_statements(ytd_panel, isolated_data)
+    update(full=True, directory=isolated_data)
+
+    assert not update(directory=isolated_data)
@@ -0,0 +1,171 @@
+"""Tests for note change detection: MinHash signatures and LSH paragraph matching"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pytest
+
+import note_changes
+from note_changes import (
+    CHANGE_SOURCE,
+    MinHasher,
+    Paragraph,
+    detect_changes,
+    estimate_similarity,
+    match_paragraphs,
+    paragraph_digest,
+    shingle_hashes,
+    update_note_changes,
+)
+
+VOCABULARY = [chr(c) for c in range(0x4E00, 0x4E00 + 3000)]
+
+
+def _sentences(count: int, seed: int) -> List[str]:
+    rng = np.random.default_rng(seed)
+    return ["".join(rng.choice(VOCABULARY, size=int(rng.integers(40, 80)))) for _ in range(count)]
+
+
+def _paragraphs(texts: List[str], period: str, hasher: MinHasher) -> List[Paragraph]:
+    paragraphs = []
+    for text in texts:
+        digest = paragraph_digest(text)
+        signature = hasher.signature(text, digest)
+        paragraphs.append(Paragraph("TEPCO", "policy", period, "", text, [], digest, signature))
+    return paragraphs
+
+
+def _summary(changes: List[Any]) -> List[Tuple[str, Optional[str], Optional[str]]]:
+    return [
+        (change_type, current and current.digest, previous and previous.digest)
+        for change_type, current, previous, _ in changes
+    ]
+
+
+def test_signature_estimates_jaccard_similarity() -> None:
+    hasher = MinHasher()
+    left, right = _sentences(2, seed=0)
+    edited = left[:40] + right[:20]
+
+    a, b = set(shingle_hashes(left).tolist()), set(shingle_hashes(edited).tolist())
+    jaccard = len(a & b) / len(a | b)
+    estimate = estimate_similarity(hasher.signature(left), hasher.signature(edited))
+
+    assert abs(estimate - jaccard) < 0.15
+    assert estimate_similarity(hasher.signature(left), hasher.signature(right)) < 0.1
+    # Whitespace and full-width forms do not change the paragraph
+    assert paragraph_digest("会計方針の変更 ＡＢＣ") == paragraph_digest("会計方針の 変更abc")
+
+
+def test_lsh_matching_agrees_with_exhaustive_matching(monkeypatch: pytest.MonkeyPatch) -> None:
+    hasher = MinHasher()
+    base = _sentences(120, seed=1)
+    clauses = _sentences(120, seed=2)
+    current = []
+    for i, text in enumerate(base):
+        half = len(text) // 2
+        if i % 4 == 0:
+            continue  # removed
+        if i % 4 == 1:
+            text = text[:half] + clauses[i][:10] + text[half:]  # clause inserted
+        elif i % 4 == 2:
+            text = text[:half] + clauses[i][:half]  # second half replaced
+        current.append(text)
+    current += _sentences(10, seed=3)
+    previous_paragraphs = _paragraphs(base, "2024Q1", hasher)
+    current_paragraphs = _paragraphs(current, "2024Q2", hasher)
+    # Paragraphs left after exact matches are too many to compare exhaustively
+    pairs = (len(base) - 30) * (len(current) - 30)
+    assert pairs > note_changes.EXHAUSTIVE_PAIRS
+
+    lsh = match_paragraphs(previous_paragraphs, current_paragraphs)
+    monkeypatch.setattr(note_changes, "EXHAUSTIVE_PAIRS", pairs)
+    exhaustive = match_paragraphs(previous_paragraphs, current_paragraphs)
+
+    assert _summary(lsh) == _summary(exhaustive)
+    kinds = [change[0] for change in lsh]
+    assert kinds.count("rewritten") >= 20
+    # Unmatched replacements show up as both new and removed
+    assert kinds.count("new") - 10 == kinds.count("removed") - 30
+    assert all(
+        note_changes.REWRITTEN_THRESHOLD <= (similarity or 0) < note_changes.UNCHANGED_THRESHOLD
+        for change_type, _, _, similarity in lsh
+        if change_type == "rewritten"
+    )
+
+
+def test_paragraphs_are_matched_one_to_one() -> None:
+    hasher = MinHasher()
+    (text,) = _sentences(1, seed=4)
+    previous = _paragraphs([text[:-4] + "あいうえ"], "2024Q1", hasher)
+    # Two near copies of one previous paragraph: only the closer one is matched
+    current = _paragraphs(
+        [text[:-4] + "かきくけ", text[:-8] + "さしすせそたちつ"], "2024Q2", hasher
+    )
+
+    changes = match_paragraphs(previous, current)
+
+    assert [(change[0], change[1]) for change in changes] == [
+        ("rewritten", current[0]),
+        ("new", current[1]),
+    ]
+
+
+def _note(period: str, text: str, **extra: Any) -> Dict[str, Any]:
+    return {
+        "company": "TEPCO",
+        "period": period,
+        "docID": f"S100{period}",
+        "category": "policy_change",
+        "section": "会計方針",
+        "text": text,
+        "keywords": [],
+        **extra,
+    }
+
+
+def _notes() -> List[Dict[str, Any]]:
+    kept, rewritten, removed, added = _sentences(4, seed=5)
+    edited = rewritten[:30] + "この方針は当期より変更しています" + rewritten[30:]
+    return [
+        _note("2024Q1", "\n".join([kept, rewritten, removed, "短い見出し"])),
+        _note("2024Q2", "\n".join([kept, edited, added])),
+        # Output of a previous run is not an input
+        _note("2024Q2", added[::-1], source=CHANGE_SOURCE),
+    ]
+
+
+def test_detect_changes_between_consecutive_periods() -> None:
+    notes = _notes()
+    changes = detect_changes(notes)
+
+    assert sorted(change.change_type for change in changes) == ["new", "removed", "rewritten"]
+    assert {(change.period, change.previous_period) for change in changes} == {("2024Q2", "2024Q1")}
+    rewritten = next(change for change in changes if change.change_type == "rewritten")
+    assert rewritten.current is not None and "当期より変更" in rewritten.current.text
+
+
+def test_update_keeps_detection_time_and_reuses_signatures(tmp_path: Path) -> None:
+    notes_path, cache_path = tmp_path / "xbrl_notes.json", tmp_path / "fingerprints.npz"
+    notes_path.write_text(json.dumps({"notes": _notes()}, ensure_ascii=False), encoding="utf-8")
+
+    assert update_note_changes(notes_path, cache_path) == {"new": 1, "removed": 1, "rewritten": 1}
+    first = notes_path.read_bytes()
+    generated = [n for n in json.loads(first)["notes"] if n.get("source") == CHANGE_SOURCE]
+    assert len(generated) == 3
+    assert all(n["category"] == "policy_change" for n in generated)
+
+    # The rerun finds the same changes and leaves the file untouched
+    update_note_changes(notes_path, cache_path)
+    assert notes_path.read_bytes() == first
+
+    hasher = MinHasher()
+    hasher.load(cache_path)
+    detect_changes(json.loads(first)["notes"], hasher)
+    assert hasher.computed == 0
+    # A cache made with other hash parameters is ignored
+    other = MinHasher(seed=1)
+    other.load(cache_path)
+    assert other.cache == {}
@@ -0,0 +1,190 @@
+"""Tests for the sharded notes index: search, incremental updates and tombstoned groups"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+from notes_index import (
+    MANIFEST_NAME,
+    NOTES_COPY_NAME,
+    NotesIndex,
+    decode_postings,
+    encode_postings,
+    group_notes,
+    normalize_text,
+    note_text,
+    query_terms,
+    text_bigrams,
+    update_notes_index,
+)
+
+SHARDS = 4
+
+
+def _note(company: str, period: str, text: str, **extra: Any) -> Dict[str, Any]:
+    return {"company": company, "period": period, "text": text, "category": "info", **extra}
+
+
+NOTES = [
+    _note("TEPCO", "2024Q1", "減損損失を計上しました", category="risk"),
+    _note("TEPCO", "2024Q1", "会計方針の変更", category="policy_change"),
+    _note("TEPCO", "2024Q2", "継続企業の前提に関する注記", keywords=["ゴーイングコンサーン"]),
+    _note("KEPCO", "2024Q1", "固定資産の減損"),
+    _note("KEPCO", "2024Q2", "Impairment loss on ＦＩＸＥＤ assets"),
+]
+
+QUERIES = [
+    "減損",
+    "減損 損失",
+    "会計",
+    "ゴーイング",
+    "fixed assets",
+    "損",
+    "存在しない",
+    "前提 注記",
+]
+
+
+def _scan(notes: List[Dict[str, Any]], query: str) -> List[Dict[str, Any]]:
+    """Reference search: substring match of every term against every note"""
+    terms = query_terms(query)
+    matched = [n for n in notes if terms and all(t in normalize_text(note_text(n)) for t in terms)]
+    return sorted(matched, key=lambda n: (n["period"], n["company"]))
+
+
+def _search(index: NotesIndex, notes: List[Dict[str, Any]], query: str, **filters: Any) -> Any:
+    return index.search(query, group_notes(notes), **filters)
+
+
+def test_bigrams_do_not_span_separators() -> None:
+    assert text_bigrams("Ａｂ・cd e") == {"ab", "cd"}
+    assert query_terms("  減損　ＦＩＸＥＤ ") == ["減損", "fixed"]
+
+
+def test_postings_round_trip() -> None:
+    groups = {3: [0, 4, 5], 0: [2], 7: [1, 9]}
+
+    assert encode_postings(groups) == [[0, 2], [3, 0, 4, 1], [7, 1, 8]]
+    assert decode_postings(encode_postings(groups)) == groups
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_search_matches_a_full_scan(query: str) -> None:
+    index = NotesIndex.build(NOTES, shard_count=SHARDS)
+
+    assert _search(index, NOTES, query) == _scan(NOTES, query)
+
+
+def test_search_filters() -> None:
+    index = NotesIndex.build(NOTES, shard_count=SHARDS)
+
+    assert [n["company"] for n in _search(index, NOTES, "減損", companies=["KEPCO"])] == ["KEPCO"]
+    assert _search(index, NOTES, "減損", start="2024Q2") == []
+    assert [n["text"] for n in _search(index, NOTES, "減損", category="risk")] == [
+        "減損損失を計上しました"
+    ]
+
+
+def _updated_notes() -> List[Dict[str, Any]]:
+    """TEPCO 2024Q1 changed, KEPCO 2024Q1 removed, KEPCO 2024Q3 added"""
+    notes = [n for n in NOTES if (n["company"], n["period"]) != ("KEPCO", "2024Q1")]
+    notes[1] = _note("TEPCO", "2024Q1", "会計上の見積りの変更に関する注記")
+    notes.append(_note("KEPCO", "2024Q3", "減損の兆候はありません"))
+    return notes
+
+
+def test_update_matches_a_rebuild() -> None:
+    index = NotesIndex.build(NOTES, shard_count=SHARDS)
+    notes = _updated_notes()
+
+    assert index.update(notes) == {"added": 1, "changed": 1, "removed": 1, "unchanged": 2}
+    for query in QUERIES + ["見積り", "兆候"]:
+        assert _search(index, notes, query) == _scan(notes, query)
+    # Rows stay in group id order (appending new groups relies on it)
+    for number in range(SHARDS):
+        for rows in index.shard(number).values():
+            assert [row[0] for row in rows] == sorted({row[0] for row in rows})
+    # A second update with the same notes changes nothing
+    assert index.update(notes) == {"added": 0, "changed": 0, "removed": 0, "unchanged": 4}
+
+
+def test_removed_group_is_a_tombstone() -> None:
+    index = NotesIndex.build(NOTES, shard_count=SHARDS)
+    before = index.group_ids
+
+    index.update(_updated_notes())
+
+    # The removed group keeps its id with count 0; other ids are not renumbered
+    removed = before[("KEPCO", "2024Q1")]
+    assert index.groups[removed]["count"] == 0
+    assert ("KEPCO", "2024Q1") not in index.group_ids
+    assert all(index.group_ids[key] == i for key, i in before.items() if key in index.group_ids)
+    assert index.group_ids[("KEPCO", "2024Q3")] == len(before)
+    # Its postings are gone from every shard
+    for number in range(SHARDS):
+        assert all(row[0] != removed for rows in index.shard(number).values() for row in rows)
+
+    # A group that comes back gets a new id
+    index.update(NOTES)
+    assert index.group_ids[("KEPCO", "2024Q1")] == len(before) + 1
+    assert _search(index, NOTES, "減損") == _scan(NOTES, "減損")
+
+
+def test_saved_index_loads_shards_on_demand(tmp_path: Path) -> None:
+    NotesIndex.build(NOTES, shard_count=SHARDS).save(tmp_path)
+
+    index = NotesIndex.open(tmp_path)
+    assert index is not None and index.shards_loaded == 0
+    assert _search(index, NOTES, "減損") == _scan(NOTES, "減損")
+    assert 0 < index.shards_loaded < SHARDS
+
+
+def test_save_rewrites_only_changed_shards(tmp_path: Path) -> None:
+    first = NotesIndex.build(NOTES, shard_count=SHARDS).save(tmp_path)
+
+    index = NotesIndex.open(tmp_path)
+    assert index is not None
+    notes = NOTES + [_note("TEPCO", "2024Q3", "xy")]
+    index.update(notes)
+    second = index.save(tmp_path)
+
+    changed = [n for n in first["shards"] if first["shards"][n] != second["shards"][n]]
+    assert len(changed) == 1
+    # Replaced shard files are removed
+    files = {entry["file"] for entry in second["shards"].values()} | {MANIFEST_NAME}
+    assert {p.name for p in tmp_path.iterdir()} == files
+    reopened = NotesIndex.open(tmp_path)
+    assert reopened is not None
+    assert _search(reopened, notes, "xy") == [notes[-1]]
+
+
+def test_update_notes_index_copies_and_full_rebuild_drops_tombstones(tmp_path: Path) -> None:
+    notes_path = tmp_path / "xbrl_notes.json"
+    directory, frontend = tmp_path / "index", tmp_path / "frontend"
+
+    def update(notes: List[Dict[str, Any]], full: bool = False) -> Dict[str, int]:
+        notes_path.write_text(json.dumps({"notes": notes}, ensure_ascii=False), encoding="utf-8")
+        return update_notes_index(full, notes_path, directory, frontend, SHARDS)
+
+    update(NOTES)
+    assert update(NOTES)["unchanged"] == 4
+    update(_updated_notes())
+
+    manifest = json.loads((directory / MANIFEST_NAME).read_text(encoding="utf-8"))
+    assert len(manifest["groups"]) == 5
+    copied = {p.name for p in frontend.iterdir()}
+    assert copied == {p.name for p in directory.iterdir()} | {NOTES_COPY_NAME}
+    assert (frontend / NOTES_COPY_NAME).read_bytes() == notes_path.read_bytes()
+
+    # The notes copy follows fields the index ignores
+    notes = _updated_notes()
+    notes[0] = {**notes[0], "severity": 0.9}
+    assert update(notes)["unchanged"] == 4
+    assert (frontend / NOTES_COPY_NAME).read_bytes() == notes_path.read_bytes()
+
+    assert update(_updated_notes(), full=True)["added"] == 4
+    manifest = json.loads((directory / MANIFEST_NAME).read_text(encoding="utf-8"))
+    assert [g["count"] for g in manifest["groups"]] == [2, 1, 1, 1]
+    assert update_notes_index(notes_path=tmp_path / "missing.json", directory=directory) == {}
@@ -0,0 +1,56 @@
+"""Tests for the dashboard bundle: crash-safe variants and the statement basis"""
+
+import gzip
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import publish_bundle
+from helpers import write_statements
+from publish_bundle import FLOW_BASIS, MANIFEST_NAME, _write_variants, publish_bundle as publish
+
+PAYLOAD = json.dumps({"periods": [f"2020Q{q}" for q in range(1, 5)] * 50}).encode("utf-8")
+
+
+@pytest.mark.parametrize("variant", ["", ".gz", ".br"])
+def test_truncated_variant_is_rewritten(tmp_path: Path, variant: str) -> None:
+    if variant == ".br" and publish_bundle.brotli is None:
+        pytest.skip("brotli is not installed")
+    entry = _write_variants(tmp_path, "AAA", PAYLOAD)
+    path = tmp_path / f"{entry['file']}{variant}"
+    intact = path.read_bytes()
+
+    # A crash in the middle of a write left half of the file under its final name
+    path.write_bytes(intact[: len(intact) // 2])
+    _write_variants(tmp_path, "AAA", PAYLOAD)
+
+    assert path.read_bytes() == intact
+    assert gzip.decompress((tmp_path / f"{entry['file']}.gz").read_bytes()) == PAYLOAD
+    assert not list(tmp_path.glob(".*.tmp"))
+
+
+def test_statements_and_charts_share_the_standalone_basis(
+    isolated_data: Path,
+    ytd_panel: pd.DataFrame,
+    standalone_panel_truth: pd.DataFrame,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(publish_bundle, "METRICS_PATH", tmp_path / "missing.json")
+    monkeypatch.setattr(publish_bundle, "HEALTH_SCORES_PATH", tmp_path / "missing.json")
+    monkeypatch.setattr(publish_bundle, "load_peer_stats", lambda: {})
+    write_statements(ytd_panel, isolated_data)
+
+    output = tmp_path / "bundle"
+    manifest = publish(output_dir=output, frontend_dir=None, directory=isolated_data)
+    bundle = json.loads((output / manifest["companies"]["CCC"]["file"]).read_bytes())
+    charts = json.loads((output / "charts" / MANIFEST_NAME).read_bytes())
+
+    assert manifest["flow_basis"] == bundle["flow_basis"] == charts["flow_basis"] == FLOW_BASIS
+    truth = standalone_panel_truth[standalone_panel_truth["company"] == "CCC"]
+    np.testing.assert_allclose(bundle["statements"]["pl"]["revenue"], truth["revenue"], atol=0.02)
+    # Stock items are not affected by the flow basis
+    np.testing.assert_allclose(bundle["statements"]["bs"]["total_assets"], truth["total_assets"])
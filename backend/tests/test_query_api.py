@@ -0,0 +1,145 @@
+"""Tests for the query API: parameter parsing, the response cache and conditional GETs"""
+
+import http.client
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import pytest
+
+from helpers import make_standalone_panel, write_statements
+from query_api import LRUCache, Query, QueryError, QueryServer, create_server, parse_query
+
+
+def test_parse_query_normalises() -> None:
+    query = parse_query("company=BBB,AAA&company=AAA&fields=revenue,net_income&from=2020Q1")
+
+    # Companies are a set (sorted for the cache key); fields keep the requested order
+    assert query == Query(
+        companies=("AAA", "BBB"), start="2020Q1", fields=("revenue", "net_income")
+    )
+    assert parse_query("") == Query()
+    assert parse_query("q=%E6%B8%9B%E6%90%8D&format=columnar").text == "減損"
+
+
+@pytest.mark.parametrize(
+    "query_string",
+    [
+        "companies=AAA",
+        "from=2020Q1&from=2021Q1",
+        "from=2020-03",
+        "to=2020Q5",
+        "from=2021Q1&to=2020Q4",
+        "statement=pnl",
+        "category=other",
+        "format=csv",
+    ],
+)
+def test_parse_query_rejects(query_string: str) -> None:
+    with pytest.raises(QueryError):
+        parse_query(query_string)
+
+
+def test_lru_cache_evicts_least_recently_used() -> None:
+    cache = LRUCache(2)
+    cache.put("a", b"1")
+    cache.put("b", b"2")
+    assert cache.get("a") == b"1"
+    # "b" is now the least recently used entry
+    cache.put("c", b"3")
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (b"1", b"3")
+    assert cache.stats() == {
+        "size": 2,
+        "capacity": 2,
+        "hits": 3,
+        "misses": 1,
+        "hit_rate": 0.75,
+    }
+
+
+def test_lru_cache_with_no_capacity_stores_nothing() -> None:
+    cache = LRUCache(0)
+    cache.put("a", b"1")
+
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+
+
+@pytest.fixture
+def server(tmp_path: Path) -> Iterator[QueryServer]:
+    """Server on a free port over a synthetic data directory"""
+    write_statements(make_standalone_panel(), tmp_path / "financials")
+    metrics = {"companies": {"AAA": {"2020Q1": {"roe": 8.5, "roa": 3.1}}}}
+    (tmp_path / "metrics.json").write_text(json.dumps(metrics), encoding="utf-8")
+
+    server = create_server("127.0.0.1", 0, tmp_path, cache_size=8)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def _get(
+    server: QueryServer, path: str, etag: Optional[str] = None
+) -> Tuple[int, Dict[str, str], bytes]:
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=10)
+    try:
+        conn.request("GET", path, headers={"If-None-Match": etag} if etag else {})
+        response = conn.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        conn.close()
+
+
+def test_get_returns_rows_with_an_etag(server: QueryServer) -> None:
+    status, headers, body = _get(server, "/v1/financials?company=AAA&from=2020Q1&fields=revenue")
+    payload: Dict[str, Any] = json.loads(body)
+
+    assert status == 200
+    assert headers["ETag"] == f'"{payload["version"]}"'
+    assert payload["count"] == len(payload["rows"]) > 0
+    assert {row["company"] for row in payload["rows"]} == {"AAA"}
+    assert all(row["period"] >= "2020Q1" for row in payload["rows"])
+    assert set(payload["rows"][0]) == {"company", "period", "date", "revenue"}
+
+
+def test_matching_etag_is_not_modified(server: QueryServer) -> None:
+    path = "/v1/metrics?company=AAA"
+    _, headers, _ = _get(server, path)
+    cached = server.cache.stats()
+
+    status, not_modified, body = _get(server, path, etag=headers["ETag"])
+
+    assert (status, body) == (304, b"")
+    assert not_modified["ETag"] == headers["ETag"]
+    # The 304 is answered before the cache is consulted
+    assert server.cache.stats() == cached
+
+    # Weak and listed validators match too; a stale one gets the full response
+    assert _get(server, path, etag=f'"0", W/{headers["ETag"]}')[0] == 304
+    assert _get(server, path, etag='"stale"')[0] == 200
+
+
+def test_invalid_query_is_rejected_before_the_etag(server: QueryServer) -> None:
+    _, headers, _ = _get(server, "/v1/metrics")
+
+    status, _, body = _get(server, "/v1/metrics?fields=roe,unknown", etag=headers["ETag"])
+    assert status == 400
+    assert "unknown" in json.loads(body)["error"]
+    assert _get(server, "/v1/financials?period=2020Q1", etag=headers["ETag"])[0] == 400
+    assert _get(server, "/v1/unknown")[0] == 404
+
+
+def test_repeated_query_is_served_from_the_cache(server: QueryServer) -> None:
+    first = _get(server, "/v1/metrics?company=AAA&fields=roe")
+    # The same query spelled differently has the same cache key
+    second = _get(server, "/v1/metrics?fields=roe&company=AAA,AAA")
+
+    assert first[2] == second[2]
+    assert (server.cache.stats()["hits"], server.cache.stats()["misses"]) == (1, 1)
+    assert json.loads(first[2])["rows"] == [{"company": "AAA", "period": "2020Q1", "roe": 8.5}]
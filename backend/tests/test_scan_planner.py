@@ -0,0 +1,106 @@
+"""Tests for the filing-calendar scan planner and its holiday calendar"""
+
+from datetime import date
+
+import pytest
+
+from scan_planner import (
+    filing_windows,
+    is_business_day,
+    japanese_holidays,
+    next_business_day,
+    plan_scan_dates,
+)
+
+
+@pytest.mark.parametrize(
+    "day",
+    [
+        date(2015, 5, 6),  # 5/3 on Sunday, 5/4 and 5/5 taken: moves to Wednesday
+        date(2019, 5, 6),  # Children's Day on Sunday
+        date(2020, 2, 24),  # Emperor's Birthday on Sunday
+        date(2023, 1, 2),  # New Year's Day on Sunday
+        date(2024, 9, 23),  # Autumnal equinox on Sunday
+        date(2025, 11, 24),  # Labour Thanksgiving Day on Sunday
+    ],
+)
+def test_substitute_holiday(day: date) -> None:
+    assert day in japanese_holidays(day.year)
+
+
+@pytest.mark.parametrize(
+    "day",
+    [
+        date(2009, 9, 22),  # Respect for the Aged Day (21st) and equinox (23rd)
+        date(2015, 9, 22),
+        date(2026, 9, 22),
+    ],
+)
+def test_citizens_holiday_between_two_holidays(day: date) -> None:
+    assert day in japanese_holidays(day.year)
+    assert not is_business_day(day)
+
+
+@pytest.mark.parametrize(
+    "day, holiday",
+    [
+        (date(2012, 3, 20), True),
+        (date(2023, 3, 21), True),
+        (date(2023, 3, 20), False),
+        (date(2024, 3, 20), True),
+        (date(2027, 3, 21), True),
+        (date(2012, 9, 22), True),
+        (date(2023, 9, 23), True),
+        (date(2024, 9, 22), True),
+        (date(2025, 9, 23), True),
+        (date(2025, 9, 22), False),
+    ],
+)
+def test_equinox_days(day: date, holiday: bool) -> None:
+    assert (day in japanese_holidays(day.year)) is holiday
+
+
+@pytest.mark.parametrize(
+    "day, expected",
+    [
+        (date(2019, 4, 27), date(2019, 5, 7)),  # Golden Week of the 2019 succession
+        (date(2024, 12, 28), date(2025, 1, 6)),  # Year-end closure, then a weekend
+        (date(2024, 7, 15), date(2024, 7, 16)),  # Marine Day
+        (date(2024, 7, 16), date(2024, 7, 16)),
+    ],
+)
+def test_next_business_day(day: date, expected: date) -> None:
+    assert next_business_day(day) == expected
+
+
+def test_deadline_on_a_holiday_moves_to_the_next_business_day() -> None:
+    # February year end: the May quarter's 45-day deadline is Marine Day 2024-07-15
+    windows = filing_windows(date(2024, 6, 1), date(2024, 7, 31), fiscal_year_end_month=2)
+    assert (date(2024, 5, 31), date(2024, 7, 16)) in windows
+
+    plan = plan_scan_dates(date(2024, 6, 1), date(2024, 7, 31), [2], mode="deadline")
+    assert plan.dates[0] == date(2024, 7, 16)
+    assert date(2024, 7, 15) not in plan.dates
+
+
+def test_annual_deadline_skips_golden_week() -> None:
+    # January year end: the annual report is due 2019-04-30, a one-off holiday
+    windows = filing_windows(date(2019, 4, 1), date(2019, 5, 31), fiscal_year_end_month=1)
+    assert (date(2019, 1, 31), date(2019, 5, 7)) in windows
+
+
+def test_full_scan_is_the_default() -> None:
+    plan = plan_scan_dates(date(2024, 1, 1), date(2024, 1, 31))
+
+    assert plan.mode == "full"
+    assert len(plan.dates) == plan.total_days == 31
+    assert plan.dates[0] == date(2024, 1, 31)
+
+
+def test_likely_window_is_a_subset_of_deadline() -> None:
+    start, end = date(2023, 4, 1), date(2024, 3, 31)
+    deadline = plan_scan_dates(start, end, [3, 12], mode="deadline")
+    likely = plan_scan_dates(start, end, [3, 12], mode="likely")
+
+    assert set(likely.dates) < set(deadline.dates)
+    assert all(is_business_day(d) for d in deadline.dates)
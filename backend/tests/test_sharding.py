@@ -0,0 +1,115 @@
+"""Tests for sharded fetching: date assignment, docID leases and merging shard states"""
+
+import json
+import os
+from datetime import date, timedelta
+from pathlib import Path
+
+import pytest
+
+from sharding import (
+    DocumentLease,
+    ShardState,
+    load_shard_state,
+    merge_shard_states,
+    save_shard_state,
+    select_shard_dates,
+)
+
+DATES = [date(2024, 3, 31) - timedelta(days=i) for i in range(100)]
+
+
+@pytest.mark.parametrize("shard_count", [1, 2, 3, 7])
+def test_shards_partition_the_scan_plan(shard_count: int) -> None:
+    shards = [select_shard_dates(DATES, i, shard_count) for i in range(shard_count)]
+
+    assert sorted(d for shard in shards for d in shard) == sorted(DATES)
+    assert sum(len(shard) for shard in shards) == len(DATES)
+    # Consecutive dates alternate between shards, so sizes differ by at most one
+    assert max(map(len, shards)) - min(map(len, shards)) <= 1
+    # Each shard keeps the plan order (newest first)
+    assert all(shard == sorted(shard, reverse=True) for shard in shards)
+
+
+def test_assignment_does_not_depend_on_the_plan() -> None:
+    # The same date lands on the same shard whatever range each worker planned
+    early = select_shard_dates(DATES[:40], 1, 3)
+    late = select_shard_dates(DATES[20:], 1, 3)
+
+    assert [d for d in early if d in DATES[20:]] == [d for d in late if d in DATES[:40]]
+
+
+@pytest.mark.parametrize("shard_index", [-1, 3])
+def test_invalid_shard_index(shard_index: int) -> None:
+    with pytest.raises(ValueError):
+        select_shard_dates(DATES, shard_index, 3)
+
+
+def test_lease_is_exclusive_until_released(tmp_path: Path) -> None:
+    first = DocumentLease("S100A001", tmp_path)
+    second = DocumentLease("S100A001", tmp_path)
+
+    assert first.acquire()
+    assert not second.acquire()
+    # Other documents are not blocked
+    with DocumentLease("S100A002", tmp_path) as other:
+        assert other.acquired
+    owner = json.loads(first.path.read_text())["owner"]
+    assert owner == first.owner
+
+    first.release()
+    assert not first.path.exists()
+    assert second.acquire()
+    second.release()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_lease_of_a_dead_worker_is_taken_over(tmp_path: Path) -> None:
+    crashed = DocumentLease("S100A001", tmp_path)
+    assert crashed.acquire()
+    # The process dies: the OS drops the flock but the lock file stays behind
+    assert crashed._fd is not None
+    os.close(crashed._fd)
+
+    with DocumentLease("S100A001", tmp_path) as lease:
+        assert lease.acquired
+
+
+def test_lease_context_releases_on_error(tmp_path: Path) -> None:
+    with pytest.raises(RuntimeError):
+        with DocumentLease("S100A001", tmp_path) as lease:
+            assert lease.acquired
+            raise RuntimeError("download failed")
+
+    assert DocumentLease("S100A001", tmp_path).acquire()
+
+
+def _state(shard_index: int, complete: bool, *docs: str) -> ShardState:
+    state = ShardState(shard_index, 3, "2024-01-01", "2024-03-31", "full")
+    for doc_id in docs:
+        state.add_document({"docID": doc_id, "submitDateTime": f"2024-02-{doc_id[-2:]} 09:00"})
+    state.scan_complete = complete
+    return state
+
+
+def test_merge_shard_states(tmp_path: Path) -> None:
+    shards = tmp_path / "shards"
+    save_shard_state(_state(0, True, "S100A003", "S100A001"), shards)
+    # A document found by two shards (e.g. after an overlapping rerun) is kept once
+    save_shard_state(_state(1, False, "S100A002", "S100A001"), shards)
+
+    index = merge_shard_states(3, shards, tmp_path / "index.json")
+
+    assert index["incomplete_shards"] == [1, 2]
+    assert list(index["documents"]) == ["S100A001", "S100A002", "S100A003"]
+    assert index["documents"]["S100A001"]["shard"] == 1
+    assert json.loads((tmp_path / "index.json").read_text()) == index
+
+
+def test_shard_state_round_trip(tmp_path: Path) -> None:
+    state = _state(2, False, "S100A001")
+    state.mark_scanned("2024-03-30", False)
+    save_shard_state(state, tmp_path)
+
+    assert load_shard_state(2, 3, tmp_path) == state
+    assert load_shard_state(0, 3, tmp_path) is None
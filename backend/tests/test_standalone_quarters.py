@@ -0,0 +1,78 @@
+"""Tests for fiscal year-to-date to standalone quarter conversion and TTM"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from panel import FLOW_FIELDS
+from standalone_quarters import (
+    FLOW_BASIS_ATTR,
+    compute_standalone_frame,
+    fiscal_positions,
+    fiscal_shift,
+    fiscal_year_label,
+    standalone_panel,
+)
+
+
+def _by_key(frame: pd.DataFrame) -> pd.DataFrame:
+    return frame.sort_values(["company", "ordinal"]).reset_index(drop=True)
+
+
+def test_ytd_is_decumulated(ytd_panel: pd.DataFrame, standalone_panel_truth: pd.DataFrame) -> None:
+    frame, basis = compute_standalone_frame(ytd_panel)
+
+    assert set(basis.values()) == {"ytd"}
+    frame, truth = _by_key(frame), _by_key(standalone_panel_truth)
+    for field in FLOW_FIELDS:
+        np.testing.assert_allclose(frame[field], truth[field], atol=0.011)
+        np.testing.assert_allclose(frame[f"{field}_ytd"], ytd_panel[field], atol=0.011)
+
+
+def test_ttm_is_trailing_four_standalone_quarters(
+    ytd_panel: pd.DataFrame, standalone_panel_truth: pd.DataFrame
+) -> None:
+    frame = _by_key(compute_standalone_frame(ytd_panel)[0])
+    truth = _by_key(standalone_panel_truth)
+
+    for field in FLOW_FIELDS:
+        expected = truth.groupby("company")[field].transform(lambda s: s.rolling(4).sum())
+        np.testing.assert_allclose(frame[f"{field}_ttm"], expected, atol=0.05)
+
+
+def test_ttm_survives_a_missing_middle_quarter(ytd_panel: pd.DataFrame) -> None:
+    # Without Q2 the standalone Q3 is unknown, but Q3 TTM only needs YTD and the prior year
+    gap = ytd_panel[ytd_panel["period"] != "2018Q2"]
+    frame = _by_key(compute_standalone_frame(gap)[0]).set_index(["company", "period"])
+    full = _by_key(compute_standalone_frame(ytd_panel)[0]).set_index(["company", "period"])
+
+    assert np.isnan(float(frame.loc[("AAA", "2018Q3"), "revenue"]))
+    assert frame.loc[("AAA", "2018Q3"), "revenue_ttm"] == pytest.approx(
+        full.loc[("AAA", "2018Q3"), "revenue_ttm"]
+    )
+
+
+def test_quarterly_basis_is_unchanged(standalone_panel_truth: pd.DataFrame) -> None:
+    frame, basis = compute_standalone_frame(standalone_panel_truth)
+
+    assert set(basis.values()) == {"quarterly"}
+    frame = _by_key(frame)
+    for field in FLOW_FIELDS:
+        np.testing.assert_allclose(frame[field], standalone_panel_truth[field])
+
+
+def test_fiscal_year_is_the_year_end_calendar_year() -> None:
+    # 2024Q3 (October to December 2024) ends FY2024 for December year ends, FY2025 for March
+    shifts = np.array([fiscal_shift(3), fiscal_shift(12)])
+    fiscal_index, position = fiscal_positions(np.array([2024 * 4 + 2]), shifts)
+
+    assert fiscal_year_label(fiscal_index, shifts).ravel().tolist() == [2025, 2024]
+    assert position.ravel().tolist() == [2, 3]
+
+
+def test_standalone_panel_converts_once(ytd_panel: pd.DataFrame) -> None:
+    converted = standalone_panel(ytd_panel, {"AAA": "ytd"})
+
+    assert converted.attrs[FLOW_BASIS_ATTR] == "standalone"
+    assert standalone_panel(converted) is converted
+    assert FLOW_BASIS_ATTR not in ytd_panel.attrs
@@ -0,0 +1,90 @@
+"""Tests for the streaming statement writer against the in-memory batch output"""
+
+import random
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+import statement_writer
+from financial_store import FinancialStore
+from panel import KEY_FIELDS, NUMERIC_FIELDS, STATEMENT_FIELDS, statement_csv_path
+from publisher import PublishManifest, render_csv
+from statement_writer import SortedRunWriter, stream_statement_csvs
+
+
+def _shuffled_records(seed: int = 0) -> List[Dict[str, Any]]:
+    """Several issuers, several partial rows per period (later rows win), in random order"""
+    rng = random.Random(seed)
+    records: List[Dict[str, Any]] = []
+    for company in ("E00001", "E00002", "E00003"):
+        for ordinal in range(2018 * 4, 2018 * 4 + 10):
+            period = f"{ordinal // 4}Q{ordinal % 4 + 1}"
+            for copy in range(3):
+                record: Dict[str, Any] = {
+                    "company": company,
+                    "period": period,
+                    "date": f"2024-01-0{copy + 1}" if copy != 1 else None,
+                }
+                record.update(
+                    (f, round(rng.uniform(-1e6, 1e6), 2))
+                    for f in NUMERIC_FIELDS[copy::2]
+                    if rng.random() < 0.8
+                )
+                records.append(record)
+    # Both writers see the same order, so "later rows win" picks the same values
+    rng.shuffle(records)
+    return records
+
+
+@pytest.mark.parametrize("run_rows", [1, 7, 1000])
+def test_streamed_csvs_match_render_csv(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, run_rows: int
+) -> None:
+    # A small fan-in forces the multi-pass merge
+    monkeypatch.setattr(statement_writer, "MERGE_FAN_IN", 2)
+    records = _shuffled_records()
+    store = FinancialStore.from_records(records)
+
+    manifest = PublishManifest(tmp_path / "manifest.json")
+    with SortedRunWriter(run_rows, tmp_path / "runs") as writer:
+        writer.extend(records)
+        changed = stream_statement_csvs(writer.records(), manifest, tmp_path)
+
+    assert sorted(changed) == ["E00001", "E00002", "E00003"]
+    for company in changed:
+        for statement, fields in STATEMENT_FIELDS.items():
+            expected = render_csv(
+                store.select_companies(company).statement(statement).to_records(),
+                KEY_FIELDS + fields,
+            )
+            path = statement_csv_path(company, statement, tmp_path)
+            assert path.read_bytes() == expected.encode("utf-8")
+    # Temporary runs are removed with the writer
+    assert not list((tmp_path / "runs").iterdir())
+
+
+def _stream_peak(tmp_path: Path, quarters: int) -> int:
+    directory = tmp_path / str(quarters)
+    tracemalloc.start()
+    try:
+        with SortedRunWriter(256, directory / "runs") as writer:
+            writer.extend(statement_writer._synthetic_records(quarters, duplicates=4))
+            stream_statement_csvs(
+                writer.records(), PublishManifest(directory / "manifest.json"), directory
+            )
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_peak_memory_does_not_grow_with_history(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # A small fan-in reaches the multi-pass merge early, where memory must stop growing
+    monkeypatch.setattr(statement_writer, "MERGE_FAN_IN", 4)
+    peaks = [_stream_peak(tmp_path, quarters) for quarters in (250, 1000, 4000)]
+
+    # 16 times the rows, about the same peak
+    assert peaks[-1] < peaks[0] * 1.5, peaks
@@ -0,0 +1,157 @@
+"""Tests for resolving amended and duplicate filings to one document per period"""
+
+from pathlib import Path
+from typing import Any, Dict
+
+import pytest
+
+from supersession import (
+    SKIP_NO_CSV,
+    SKIP_SUPERSEDED_BY_AMENDMENT,
+    SKIP_SUPERSEDED_BY_LATER_FILING,
+    SKIP_UNKNOWN_PERIOD,
+    SKIP_WITHDRAWN,
+    SupersessionIndex,
+    document_scope,
+    resolve_documents,
+)
+
+
+def _doc(doc_id: str, submitted: str, **fields: Any) -> Dict[str, Any]:
+    doc: Dict[str, Any] = {
+        "docID": doc_id,
+        "edinetCode": "E04498",
+        "docTypeCode": "140",
+        "periodEnd": "2024-06-30",
+        "submitDateTime": f"2024-{submitted}",
+        "withdrawalStatus": "0",
+        "csvFlag": "1",
+    }
+    doc.update(fields)
+    return doc
+
+
+def _resolve(*docs: Dict[str, Any]) -> Any:
+    return resolve_documents({doc["docID"]: doc for doc in docs})
+
+
+@pytest.mark.parametrize(
+    "doc, expected",
+    [
+        ({"docTypeCode": "120"}, ("annual", False)),
+        ({"docTypeCode": "150"}, ("quarterly", True)),
+        ({"docTypeCode": "170"}, ("semiannual", True)),
+        ({"docDescription": "訂正四半期報告書－第100期第1四半期"}, ("quarterly", True)),
+        ({"docDescription": "半期報告書－第100期"}, ("semiannual", False)),
+        ({"docDescription": "有価証券報告書", "parentDocID": "S100A001"}, ("annual", True)),
+    ],
+)
+def test_document_scope(doc: Dict[str, Any], expected: Any) -> None:
+    assert document_scope(doc) == expected
+
+
+def test_amendment_supersedes_its_original() -> None:
+    resolution = _resolve(
+        _doc("S100A001", "08-09 15:00"),
+        _doc("S100A002", "09-20 10:00", docTypeCode="150", parentDocID="S100A001", periodEnd=""),
+    )
+
+    assert resolution.selected_ids == ["S100A002"]
+    # The amendment's empty periodEnd is taken from the original
+    assert resolution.selected[0]["periodEnd"] == "2024-06-30"
+    assert resolution.skipped == {
+        "S100A001": {"reason": SKIP_SUPERSEDED_BY_AMENDMENT, "superseded_by": "S100A002"}
+    }
+
+
+def test_chain_of_amendments_keeps_the_latest() -> None:
+    resolution = _resolve(
+        _doc("S100A001", "08-09 15:00"),
+        _doc("S100A002", "09-20 10:00", docTypeCode="150", parentDocID="S100A001"),
+        _doc("S100A003", "10-01 10:00", docTypeCode="150", parentDocID="S100A002"),
+    )
+
+    assert resolution.selected_ids == ["S100A003"]
+    assert {doc_id: entry["reason"] for doc_id, entry in resolution.skipped.items()} == {
+        "S100A001": SKIP_SUPERSEDED_BY_AMENDMENT,
+        "S100A002": SKIP_SUPERSEDED_BY_AMENDMENT,
+    }
+
+
+def test_later_unrelated_filing_supersedes() -> None:
+    resolution = _resolve(_doc("S100A001", "08-09 15:00"), _doc("S100A009", "08-10 09:00"))
+
+    assert resolution.selected_ids == ["S100A009"]
+    assert resolution.skipped["S100A001"]["reason"] == SKIP_SUPERSEDED_BY_LATER_FILING
+
+
+def test_amendment_wins_a_tie() -> None:
+    resolution = _resolve(
+        _doc("S100A009", "08-09 15:00", docTypeCode="150"),
+        _doc("S100A001", "08-09 15:00"),
+    )
+
+    assert resolution.selected_ids == ["S100A009"]
+
+
+def test_groups_by_company_period_and_scope() -> None:
+    resolution = _resolve(
+        _doc("S100A001", "08-09 15:00"),
+        _doc("S100A002", "08-09 15:00", edinetCode="E04503"),
+        _doc("S100A003", "08-10 15:00", periodEnd="2024-03-31"),
+        _doc("S100A004", "08-11 15:00", docTypeCode="120"),
+    )
+
+    # Nothing supersedes anything; selected documents are in filing order
+    assert resolution.selected_ids == ["S100A001", "S100A002", "S100A003", "S100A004"]
+    assert resolution.skipped == {}
+
+
+def test_skip_reasons() -> None:
+    resolution = _resolve(
+        _doc("S100A001", "08-09 15:00", withdrawalStatus="1"),
+        _doc("S100A002", "08-09 15:00", csvFlag="0"),
+        _doc("S100A003", "08-09 15:00", periodEnd=None),
+        # An amendment of an unknown original has no period to inherit
+        _doc("S100A004", "09-01 15:00", periodEnd="", parentDocID="S100ZZZZ"),
+    )
+
+    assert resolution.selected == []
+    assert {doc_id: entry["reason"] for doc_id, entry in resolution.skipped.items()} == {
+        "S100A001": SKIP_WITHDRAWN,
+        "S100A002": SKIP_NO_CSV,
+        "S100A003": SKIP_UNKNOWN_PERIOD,
+        "S100A004": SKIP_UNKNOWN_PERIOD,
+    }
+    assert resolution.summary() == (
+        "0 selected, 4 skipped (no_csv: 1, unknown_period: 2, withdrawn: 1)"
+    )
+
+
+def test_parent_cycle_terminates() -> None:
+    resolution = _resolve(
+        _doc("S100A001", "08-09 15:00", parentDocID="S100A002"),
+        _doc("S100A002", "08-10 15:00", parentDocID="S100A001"),
+    )
+
+    assert resolution.selected_ids == ["S100A002"]
+
+
+def test_index_resolves_across_runs(tmp_path: Path) -> None:
+    path = tmp_path / "supersession.json"
+    first = SupersessionIndex(path)
+    assert first.select([_doc("S100A001", "08-09 15:00")]).selected_ids == ["S100A001"]
+    first.save()
+
+    # An amendment found in a later run supersedes the original recorded earlier
+    second = SupersessionIndex(path)
+    selection = second.select(
+        [_doc("S100A002", "09-20 10:00", docTypeCode="150", parentDocID="S100A001")]
+    )
+    assert selection.selected_ids == ["S100A002"]
+    assert second.skip_reason("S100A001") == {
+        "reason": SKIP_SUPERSEDED_BY_AMENDMENT,
+        "superseded_by": "S100A002",
+    }
+    # Only the requested documents are reported by select
+    assert selection.skipped == {}
@@ -0,0 +1,153 @@
+"""Tests for the validation cache: hits on unchanged content, invalidation and pruning"""
+
+import json
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import pytest
+
+import validate_schema
+from validate_schema import ValidationCache, validate_all_files, validate_csv_schema
+
+VALID_CSV = "company,period,date,revenue\nTEPCO,2024Q1,2024-06-30,1000.5\n"
+INVALID_CSV = "company,period,date,revenue\nTEPCO,2024Q5,2024-06-30,abc\n"
+
+
+class CountingValidator:
+    """validate_csv_schema that records the files it was called with"""
+
+    def __init__(self) -> None:
+        self.calls: List[str] = []
+
+    def __call__(self, filepath: Path) -> Tuple[bool, List[str]]:
+        self.calls.append(filepath.name)
+        return validate_csv_schema(filepath)
+
+
+def _write(directory: Path, files: Dict[str, str]) -> List[Path]:
+    paths = []
+    for name, content in files.items():
+        path = directory / name
+        path.write_text(content, encoding="utf-8")
+        paths.append(path)
+    return paths
+
+
+def _run(cache_path: Path, paths: List[Path]) -> Tuple[ValidationCache, CountingValidator]:
+    cache, validator = ValidationCache(cache_path), CountingValidator()
+    for path in paths:
+        cache.validate(path, validator)
+    cache.save()
+    return cache, validator
+
+
+def test_unchanged_files_are_served_from_the_cache(tmp_path: Path) -> None:
+    cache_path = tmp_path / "cache" / "validation.json"
+    paths = _write(tmp_path, {"a.csv": VALID_CSV, "b.csv": INVALID_CSV})
+
+    first, validator = _run(cache_path, paths)
+    assert (first.hits, first.misses, validator.calls) == (0, 2, ["a.csv", "b.csv"])
+
+    second = ValidationCache(cache_path)
+    results = [second.validate(path, validator) for path in paths]
+    assert (second.hits, second.misses) == (2, 0)
+    assert validator.calls == ["a.csv", "b.csv"]
+    # Cached failures keep their messages
+    assert results[0] == (True, [], True)
+    assert results[1][0] is False and len(results[1][1]) == 2
+    assert results[1][1] == validate_csv_schema(paths[1])[1]
+
+
+def test_same_content_shares_one_entry(tmp_path: Path) -> None:
+    paths = _write(tmp_path, {"a.csv": VALID_CSV, "copy.csv": VALID_CSV})
+
+    _run(tmp_path / "validation.json", paths)
+    cache, _ = _run(tmp_path / "validation.json", paths)
+
+    assert len(cache.used) == 1
+    # Both copies hit the one stored result
+    assert (cache.hits, cache.misses) == (2, 0)
+
+
+def test_changed_and_deleted_files_are_pruned(tmp_path: Path) -> None:
+    cache_path = tmp_path / "validation.json"
+    a, b = _write(tmp_path, {"a.csv": VALID_CSV, "b.csv": INVALID_CSV})
+    _run(cache_path, [a, b])
+
+    a.write_text(VALID_CSV + "CHUBU,2024Q1,2024-06-30,2000\n", encoding="utf-8")
+    b.unlink()
+    cache, validator = _run(cache_path, [a])
+
+    assert (cache.hits, cache.misses, validator.calls) == (0, 1, ["a.csv"])
+    entries = json.loads(cache_path.read_text(encoding="utf-8"))["entries"]
+    assert list(entries) == list(cache.used)
+    assert len(entries) == 1
+
+
+def test_save_skips_an_unchanged_cache(tmp_path: Path) -> None:
+    cache_path = tmp_path / "validation.json"
+    paths = _write(tmp_path, {"a.csv": VALID_CSV})
+    _run(cache_path, paths)
+    cache_path.write_text(cache_path.read_text(encoding="utf-8") + "\n", encoding="utf-8")
+    written = cache_path.read_bytes()
+
+    _run(cache_path, paths)
+
+    assert cache_path.read_bytes() == written
+
+
+def test_version_bump_discards_results(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    cache_path = tmp_path / "validation.json"
+    paths = _write(tmp_path, {"a.csv": VALID_CSV})
+    _run(cache_path, paths)
+
+    monkeypatch.setattr(validate_schema, "VALIDATOR_VERSION", "next")
+    cache, validator = _run(cache_path, paths)
+
+    assert (cache.hits, validator.calls) == (0, ["a.csv"])
+    assert all(key.endswith(":next") for key in cache.used)
+
+
+def test_unreadable_and_corrupt_inputs(tmp_path: Path) -> None:
+    cache_path = tmp_path / "validation.json"
+    cache_path.write_text("{", encoding="utf-8")
+    cache = ValidationCache(cache_path)
+    assert cache.entries == {}
+
+    is_valid, errors, hit = cache.validate(tmp_path / "missing.csv", validate_csv_schema)
+    assert (is_valid, hit, cache.misses) == (False, False, 1)
+    assert errors[0].startswith("File not found")
+    # Nothing was cached, so the corrupt file is left as is
+    cache.save()
+    assert cache_path.read_text(encoding="utf-8") == "{"
+
+    # Without a path nothing is read or written
+    memory_only = ValidationCache(None)
+    memory_only.validate(_write(tmp_path, {"a.csv": VALID_CSV})[0], validate_csv_schema)
+    memory_only.save()
+
+
+def test_validate_all_files_reports_cached_results(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]
+) -> None:
+    financials = tmp_path / "financials"
+    financials.mkdir()
+    _write(financials, {"TEPCO_pl_quarterly.csv": VALID_CSV})
+    cache_path = tmp_path / ".cache" / "validation.json"
+    monkeypatch.setattr(validate_schema, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(validate_schema, "FINANCIALS_DIR", financials)
+    monkeypatch.setattr(validate_schema, "VALIDATION_CACHE_PATH", cache_path)
+
+    assert validate_all_files() == 0
+    assert "Cache: 0 hit(s), 1 file(s) validated" in capsys.readouterr().out
+
+    assert validate_all_files() == 0
+    out = capsys.readouterr().out
+    assert "✓ TEPCO_pl_quarterly.csv: PASS (cached)" in out
+    assert "Cache: 1 hit(s), 0 file(s) validated" in out
+
+    # --no-cache revalidates and leaves the cache file alone
+    written = cache_path.read_bytes()
+    assert validate_all_files(use_cache=False) == 0
+    assert "(cached)" not in capsys.readouterr().out
+    assert cache_path.read_bytes() == written
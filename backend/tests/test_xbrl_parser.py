@@ -0,0 +1,185 @@
+"""Tests for the streaming XBRL instance parser"""
+
+import io
+import zipfile
+from pathlib import Path
+from typing import Dict
+
+import pytest
+
+from xbrl_parser import (
+    Context,
+    ParseStats,
+    build_concept_index,
+    iter_mapped_facts,
+    parse_xbrl_instance,
+    parse_xbrl_zip,
+    select_period_values,
+)
+
+TAXONOMY: Dict[str, list] = {
+    "revenue": ["売上高", "NetSales"],
+    "total_assets": ["資産合計", "Assets"],
+    "current_assets": ["CurrentAssets"],
+    "net_income": ["ProfitLoss"],
+}
+
+CONTEXTS = """
+<xbrli:context id="CurrentYTDDuration">
+  <xbrli:entity><xbrli:identifier scheme="x">E00001</xbrli:identifier></xbrli:entity>
+  <xbrli:period><xbrli:startDate>2024-04-01</xbrli:startDate>
+  <xbrli:endDate>2024-09-30</xbrli:endDate></xbrli:period>
+</xbrli:context>
+<xbrli:context id="CurrentQuarterDuration">
+  <xbrli:entity><xbrli:identifier scheme="x">E00001</xbrli:identifier></xbrli:entity>
+  <xbrli:period><xbrli:startDate>2024-07-01</xbrli:startDate>
+  <xbrli:endDate>2024-09-30</xbrli:endDate></xbrli:period>
+</xbrli:context>
+<xbrli:context id="Prior1YTDDuration">
+  <xbrli:entity><xbrli:identifier scheme="x">E00001</xbrli:identifier></xbrli:entity>
+  <xbrli:period><xbrli:startDate>2023-04-01</xbrli:startDate>
+  <xbrli:endDate>2023-09-30</xbrli:endDate></xbrli:period>
+</xbrli:context>
+<xbrli:context id="CurrentQuarterInstant">
+  <xbrli:entity><xbrli:identifier scheme="x">E00001</xbrli:identifier></xbrli:entity>
+  <xbrli:period><xbrli:instant>2024-09-30</xbrli:instant></xbrli:period>
+</xbrli:context>
+<xbrli:context id="CurrentYTDDuration_Segment">
+  <xbrli:entity><xbrli:identifier scheme="x">E00001</xbrli:identifier>
+  <xbrli:segment><xbrldi:explicitMember dimension="jpcrp_cor:OperatingSegmentsAxis">Seg1
+  </xbrldi:explicitMember></xbrli:segment></xbrli:entity>
+  <xbrli:period><xbrli:startDate>2024-04-01</xbrli:startDate>
+  <xbrli:endDate>2024-09-30</xbrli:endDate></xbrli:period>
+</xbrli:context>
+<xbrli:unit id="JPY"><xbrli:measure>iso4217:JPY</xbrli:measure></xbrli:unit>
+<xbrli:unit id="shares"><xbrli:measure>xbrli:shares</xbrli:measure></xbrli:unit>
+"""
+
+
+def _instance(facts: str, contexts: str = CONTEXTS, contexts_first: bool = True) -> bytes:
+    body = contexts + facts if contexts_first else facts + contexts
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<xbrli:xbrl xmlns:xbrli="http://www.xbrl.org/2003/instance" '
+        'xmlns:xbrldi="http://xbrl.org/2006/xbrldi" '
+        'xmlns:jppfs_cor="http://example.com/jppfs_cor" '
+        'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+        f"{body}</xbrli:xbrl>"
+    ).encode("utf-8")
+
+
+def _fact(name: str, context: str, value: str, unit: str = "JPY") -> str:
+    return f'<jppfs_cor:{name} contextRef="{context}" unitRef="{unit}">{value}</jppfs_cor:{name}>'
+
+
+FACTS = "".join(
+    [
+        _fact("NetSales", "CurrentYTDDuration", "681000000000"),
+        _fact("NetSales", "CurrentQuarterDuration", "350000000000"),
+        _fact("NetSales", "Prior1YTDDuration", "600000000000"),
+        _fact("NetSales", "CurrentYTDDuration_Segment", "1"),
+        _fact("Assets", "CurrentQuarterInstant", "13540000000000"),
+        _fact("CurrentAssets", "CurrentQuarterInstant", "5", unit="shares"),
+        '<jppfs_cor:ProfitLoss contextRef="CurrentYTDDuration" unitRef="JPY" xsi:nil="true"/>',
+        _fact("DetailItem", "CurrentYTDDuration", "123"),
+    ]
+)
+
+
+@pytest.fixture
+def concept_index() -> Dict[str, str]:
+    return build_concept_index(TAXONOMY)
+
+
+def test_concept_index_is_exact_and_first_wins() -> None:
+    index = build_concept_index({"a": ["Assets", "Shared"], "b": ["CurrentAssets", "Shared"]})
+
+    assert index == {"Assets": "a", "Shared": "a", "CurrentAssets": "b"}
+
+
+@pytest.mark.parametrize("contexts_first", [True, False])
+def test_iter_mapped_facts(concept_index: Dict[str, str], contexts_first: bool) -> None:
+    stats = ParseStats()
+    facts = iter_mapped_facts(
+        io.BytesIO(_instance(FACTS, contexts_first=contexts_first)), concept_index, stats
+    )
+
+    # Segment members, nil facts, unmapped concepts and non-monetary units are dropped
+    assert sorted((name, context.start, context.end, value) for name, context, value in facts) == [
+        ("revenue", "2023-04-01", "2023-09-30", 600000000000.0),
+        ("revenue", "2024-04-01", "2024-09-30", 681000000000.0),
+        ("revenue", "2024-07-01", "2024-09-30", 350000000000.0),
+        ("total_assets", None, "2024-09-30", 13540000000000.0),
+    ]
+    assert stats.facts == 8
+    assert stats.mapped_facts == 4
+
+
+def test_fact_without_unit_ref_is_yen(concept_index: Dict[str, str]) -> None:
+    facts = iter_mapped_facts(
+        io.BytesIO(
+            _instance(
+                '<jppfs_cor:Assets contextRef="CurrentQuarterInstant">2500000000</jppfs_cor:Assets>'
+            )
+        ),
+        concept_index,
+    )
+
+    assert [value for _, _, value in facts] == [2500000000.0]
+
+
+def test_earliest_start_ending_at_period_end_is_selected() -> None:
+    ytd = Context("2024-04-01", "2024-09-30", False)
+    quarter = Context("2024-07-01", "2024-09-30", False)
+    prior = Context("2023-04-01", "2023-09-30", False)
+    facts = [
+        ("revenue", quarter, 350_000_000_000.0),
+        ("revenue", ytd, 681_000_000_000.0),
+        ("revenue", prior, 600_000_000_000.0),
+        ("total_assets", Context(None, "2024-09-30", False), 13_540_000_000_000.0),
+    ]
+
+    # Cumulative (year-to-date) duration wins regardless of document order
+    assert select_period_values(facts, "2024-09-30") == {
+        "revenue": 6810.0,
+        "total_assets": 135400.0,
+    }
+    # Without a period end the latest context end is used
+    assert select_period_values(facts) == select_period_values(facts, "2024-09-30")
+    assert select_period_values(facts, "2023-09-30") == {"revenue": 6000.0}
+    assert select_period_values([]) == {}
+
+
+def test_parse_instance_row(concept_index: Dict[str, str]) -> None:
+    row = parse_xbrl_instance(
+        io.BytesIO(_instance(FACTS)), "TEPCO", "2025Q2", "2024-09-30", concept_index
+    )
+
+    assert row == {
+        "company": "TEPCO",
+        "period": "2025Q2",
+        "date": "2024-09-30",
+        "revenue": 6810.0,
+        "total_assets": 135400.0,
+    }
+
+
+def test_parse_zip_reads_public_instances_only(
+    tmp_path: Path, concept_index: Dict[str, str]
+) -> None:
+    path = tmp_path / "TEPCO_S100TEST_2024-09-30.xbrl.zip"
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("XBRL/PublicDoc/jpcrp040300-q2r-001.xbrl", _instance(FACTS))
+        zf.writestr("XBRL/AuditDoc/jpaud-qrr-001.xbrl", _instance(FACTS))
+
+    rows = parse_xbrl_zip(path, "TEPCO", "2025Q2", "2024-09-30", concept_index)
+
+    assert [row["revenue"] for row in rows] == [6810.0]
+
+
+def test_invalid_instance_yields_no_rows(tmp_path: Path, concept_index: Dict[str, str]) -> None:
+    path = tmp_path / "TEPCO_S100BROKEN_2024-09-30.xbrl.zip"
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("XBRL/PublicDoc/broken.xbrl", b"<xbrli:xbrl")
+
+    assert parse_xbrl_zip(path, "TEPCO", "2025Q2", "2024-09-30", concept_index) == []
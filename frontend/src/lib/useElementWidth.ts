@@ -0,0 +1,25 @@
+// Element width tracking for responsive charts
+
+import { useCallback, useRef, useState } from 'react';
+
+/**
+ * Track the content width of an element with a ResizeObserver
+ * (a callback ref, so elements mounted after a loading state are observed too)
+ * @returns Ref to attach to the element, and its width in pixels (0 until measured)
+ */
+export const useElementWidth = <T extends HTMLElement>(): [(element: T | null) => void, number] => {
+  const [width, setWidth] = useState(0);
+  const observerRef = useRef<ResizeObserver | null>(null);
+
+  const ref = useCallback((element: T | null) => {
+    observerRef.current?.disconnect();
+    observerRef.current = null;
+    if (!element) return;
+
+    const observer = new ResizeObserver(([entry]) => setWidth(Math.floor(entry.contentRect.width)));
+    observer.observe(element);
+    observerRef.current = observer;
+  }, []);
+
+  return [ref, width];
+};
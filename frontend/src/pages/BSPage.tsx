@@ -1,9 +1,15 @@
 import React, { useState, useEffect } from 'react';
 import { BSChart } from '@/components/BSChart';
 import { YoYBadge } from '@/components/YoYBadge';
+import { useElementWidth } from '@/lib/useElementWidth';
+import { loadCompanyBundle } from '@/services/bundleLoader';
+import type { CompanyBundle } from '@/services/bundleLoader';
+import { loadChartRows, maxChartPoints } from '@/services/chartSeriesLoader';
 import { loadFinancialData } from '@/services/dataLoader';
-import { calculateYoY, findPreviousYearData } from '@/services/yoyCalculator';
-import type { FinancialData, YoYComparison } from '@/types/financial';
+import { calculateBundleYoY } from '@/services/yoyCalculator';
+import type { CompanyCode, FinancialData, YoYComparison } from '@/types/financial';
+
+const CHART_METRICS = ['total_assets', 'total_liabilities', 'net_assets'];
 
 /**
  * B/S (Balance Sheet) Page
@@ -11,11 +17,15 @@ import type { FinancialData, YoYComparison } from '@/types/financial';
  */
 const BSPage: React.FC = () => {
   const [data, setData] = useState<FinancialData[]>([]);
+  const [bundles, setBundles] = useState<Partial<Record<CompanyCode, CompanyBundle | null>>>({});
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [selectedCompany, setSelectedCompany] = useState<'TEPCO' | 'CHUBU'>('TEPCO');
   const [comparisonMode, setComparisonMode] = useState(false);
   const [chartType, setChartType] = useState<'line' | 'bar'>('line');
+  const [chartRows, setChartRows] = useState<FinancialData[] | null>(null);
+  const [chartRef, chartWidth] = useElementWidth<HTMLDivElement>();
+  const maxPoints = maxChartPoints(chartWidth);
 
   useEffect(() => {
     const loadData = async () => {
@@ -24,6 +34,12 @@ const BSPage: React.FC = () => {
         const tepcoData = await loadFinancialData('TEPCO', 'bs');
         const chubuData = await loadFinancialData('CHUBU', 'bs');
         setData([...tepcoData, ...chubuData]);
+        // Already fetched by loadFinancialData; provides the precomputed YoY metrics
+        const [tepcoBundle, chubuBundle] = await Promise.all([
+          loadCompanyBundle('TEPCO'),
+          loadCompanyBundle('CHUBU'),
+        ]);
+        setBundles({ TEPCO: tepcoBundle, CHUBU: chubuBundle });
         setError(null);
       } catch (err) {
         setError(err instanceof Error ? err.message : 'データ読み込みエラー');
@@ -34,29 +50,32 @@ const BSPage: React.FC = () => {
     loadData();
   }, []);
 
+  // Chart series sized to the chart width (CSV / bundle rows when not published)
+  useEffect(() => {
+    let cancelled = false;
+    const companies: CompanyCode[] = comparisonMode ? ['TEPCO', 'CHUBU'] : [selectedCompany];
+    loadChartRows(companies, CHART_METRICS, maxPoints)
+      .catch(() => null)
+      .then((rows) => {
+        if (!cancelled) setChartRows(rows);
+      });
+    return () => {
+      cancelled = true;
+    };
+  }, [comparisonMode, selectedCompany, maxPoints]);
+
   const displayData = comparisonMode ? data : data.filter((d) => d.company === selectedCompany);
 
   const latestData = data
     .filter((d) => d.company === selectedCompany)
     .sort((a, b) => b.period.localeCompare(a.period))[0];
 
+  const bundle = bundles[selectedCompany] ?? null;
   const yoyComparisons: YoYComparison[] = latestData
     ? [
-        calculateYoY(
-          latestData.total_assets || 0,
-          findPreviousYearData(data, latestData.period, selectedCompany)?.total_assets || 0,
-          '総資産'
-        ),
-        calculateYoY(
-          latestData.total_liabilities || 0,
-          findPreviousYearData(data, latestData.period, selectedCompany)?.total_liabilities || 0,
-          '負債合計'
-        ),
-        calculateYoY(
-          latestData.total_equity || 0,
-          findPreviousYearData(data, latestData.period, selectedCompany)?.total_equity || 0,
-          '純資産'
-        ),
+        calculateBundleYoY(bundle, latestData, 'total_assets', '総資産', data),
+        calculateBundleYoY(bundle, latestData, 'total_liabilities', '負債合計', data),
+        calculateBundleYoY(bundle, latestData, 'total_equity', '純資産', data),
       ]
     : [];
 
@@ -190,9 +209,13 @@ const BSPage: React.FC = () => {
         )}
 
         {/* Chart */}
-        <div className="glass-card p-6 fade-in">
+        <div ref={chartRef} className="glass-card p-6 fade-in">
           <h2 className="text-2xl font-bold text-text-primary mb-4">推移グラフ</h2>
-          <BSChart data={displayData} chartType={chartType} comparisonMode={comparisonMode} />
+          <BSChart
+            data={chartRows ?? displayData}
+            chartType={chartType}
+            comparisonMode={comparisonMode}
+          />
         </div>
 
         {/* Period info */}
@@ -2,8 +2,10 @@ import React, { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
 import { loadFinancialData } from '@/services/dataLoader';
 import { YoYBadge } from '@/components/YoYBadge';
-import { calculateYoY, findPreviousYearData } from '@/services/yoyCalculator';
-import type { FinancialData } from '@/types/financial';
+import { loadCompanyBundle } from '@/services/bundleLoader';
+import type { CompanyBundle } from '@/services/bundleLoader';
+import { calculateBundleYoY } from '@/services/yoyCalculator';
+import type { CompanyCode, FinancialData } from '@/types/financial';
 
 /**
  * Dashboard Page
@@ -13,6 +15,7 @@ const Dashboard: React.FC = () => {
   const [plData, setPlData] = useState<FinancialData[]>([]);
   const [bsData, setBsData] = useState<FinancialData[]>([]);
   const [cfData, setCfData] = useState<FinancialData[]>([]);
+  const [bundles, setBundles] = useState<Partial<Record<CompanyCode, CompanyBundle | null>>>({});
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [selectedCompany, setSelectedCompany] = useState<'TEPCO' | 'CHUBU'>('TEPCO');
@@ -33,6 +36,12 @@ const Dashboard: React.FC = () => {
         setPlData([...plTepco, ...plChubu]);
         setBsData([...bsTepco, ...bsChubu]);
         setCfData([...cfTepco, ...cfChubu]);
+        // Already fetched by loadFinancialData; provides the precomputed YoY metrics
+        const [tepcoBundle, chubuBundle] = await Promise.all([
+          loadCompanyBundle('TEPCO'),
+          loadCompanyBundle('CHUBU'),
+        ]);
+        setBundles({ TEPCO: tepcoBundle, CHUBU: chubuBundle });
         setError(null);
       } catch (err) {
         setError(err instanceof Error ? err.message : 'データ読み込みエラー');
@@ -57,36 +66,21 @@ const Dashboard: React.FC = () => {
     .sort((a, b) => b.period.localeCompare(a.period))[0];
 
   // Calculate key YoY metrics
+  const bundle = bundles[selectedCompany] ?? null;
   const revenueYoY = latestPL
-    ? calculateYoY(
-        latestPL.revenue || 0,
-        findPreviousYearData(plData, latestPL.period, selectedCompany)?.revenue || 0,
-        '売上高'
-      )
+    ? calculateBundleYoY(bundle, latestPL, 'revenue', '売上高', plData)
     : null;
 
   const netIncomeYoY = latestPL
-    ? calculateYoY(
-        latestPL.net_income || 0,
-        findPreviousYearData(plData, latestPL.period, selectedCompany)?.net_income || 0,
-        '当期純利益'
-      )
+    ? calculateBundleYoY(bundle, latestPL, 'net_income', '当期純利益', plData)
     : null;
 
   const totalAssetsYoY = latestBS
-    ? calculateYoY(
-        latestBS.total_assets || 0,
-        findPreviousYearData(bsData, latestBS.period, selectedCompany)?.total_assets || 0,
-        '総資産'
-      )
+    ? calculateBundleYoY(bundle, latestBS, 'total_assets', '総資産', bsData)
     : null;
 
   const operatingCFYoY = latestCF
-    ? calculateYoY(
-        latestCF.operating_cf || 0,
-        findPreviousYearData(cfData, latestCF.period, selectedCompany)?.operating_cf || 0,
-        '営業CF'
-      )
+    ? calculateBundleYoY(bundle, latestCF, 'operating_cf', '営業CF', cfData)
     : null;
 
   // Calculate financial ratios
@@ -1,11 +1,35 @@
-import React from 'react';
+import React, { useState } from 'react';
+import { loadIndexedNotes, searchNotes } from '@/services/notesIndexLoader';
+import type { NoteData } from '@/types/notes';
 
 /**
- * Notes Page (Placeholder)
- * Will display XBRL notes analysis with NLP-extracted risk keywords
+ * Notes Page
+ * Keyword search over XBRL notes (sharded bigram index); NLP risk analysis is pending
  * Implementation pending: Phase 7 (US4 - T050-T062)
  */
 const NotesPage: React.FC = () => {
+  const [query, setQuery] = useState('');
+  const [results, setResults] = useState<NoteData[] | null>(null);
+  const [searching, setSearching] = useState(false);
+  const [error, setError] = useState<string | null>(null);
+
+  const handleSearch = async (event: React.FormEvent) => {
+    event.preventDefault();
+    try {
+      setSearching(true);
+      // Only the shards holding the query's bigrams are fetched
+      const notes = await loadIndexedNotes();
+      const found = notes ? await searchNotes(query, notes) : null;
+      setError(found === null ? '注記の検索インデックスが公開されていません' : null);
+      setResults(found);
+    } catch (err) {
+      setError(err instanceof Error ? err.message : '検索エラー');
+      setResults(null);
+    } finally {
+      setSearching(false);
+    }
+  };
+
   return (
     <div className="min-h-screen bg-bg-dark p-8">
       <div className="max-w-7xl mx-auto">
@@ -15,6 +39,45 @@ const NotesPage: React.FC = () => {
           <p className="text-text-secondary">XBRL Notes Analysis (Coming Soon)</p>
         </div>
 
+        {/* Keyword Search */}
+        <div className="glass-card p-6 mb-8">
+          <form onSubmit={handleSearch} className="flex gap-4">
+            <input
+              type="search"
+              value={query}
+              onChange={(e) => setQuery(e.target.value)}
+              placeholder="キーワードで注記を検索 (例: 減損 固定資産)"
+              className="flex-1 bg-bg-dark text-text-primary rounded-lg px-4 py-2 border border-primary-cyan border-opacity-30"
+            />
+            <button
+              type="submit"
+              disabled={searching || query.trim() === ''}
+              className="neuro-btn hover-glow"
+            >
+              {searching ? '検索中...' : '検索'}
+            </button>
+          </form>
+
+          {error && <p className="mt-4 text-accent-red text-sm">{error}</p>}
+
+          {results && (
+            <div className="mt-6 space-y-4">
+              <p className="text-text-secondary text-sm">{results.length} 件</p>
+              {results.map((note, index) => (
+                <div
+                  key={`${note.docID}-${index}`}
+                  className="bg-bg-dark rounded-lg p-4 border border-primary-cyan border-opacity-20"
+                >
+                  <p className="text-text-secondary text-xs mb-2">
+                    {note.company} / {note.period} / {note.category}
+                  </p>
+                  <p className="text-text-primary text-sm whitespace-pre-wrap">{note.text}</p>
+                </div>
+              ))}
+            </div>
+          )}
+        </div>
+
         {/* Coming Soon Notice */}
         <div className="bg-bg-card rounded-lg shadow-neuro-lg p-12 border-2 border-primary-cyan border-opacity-30 text-center">
           <div className="text-6xl mb-6">🔬</div>
@@ -1,9 +1,15 @@
 import React, { useState, useEffect } from 'react';
 import { PLChart } from '@/components/PLChart';
 import { YoYBadge } from '@/components/YoYBadge';
+import { useElementWidth } from '@/lib/useElementWidth';
+import { loadCompanyBundle } from '@/services/bundleLoader';
+import type { CompanyBundle } from '@/services/bundleLoader';
+import { loadChartRows, maxChartPoints } from '@/services/chartSeriesLoader';
 import { loadFinancialData } from '@/services/dataLoader';
-import { calculateYoY, findPreviousYearData } from '@/services/yoyCalculator';
-import type { FinancialData, YoYComparison } from '@/types/financial';
+import { calculateBundleYoY } from '@/services/yoyCalculator';
+import type { CompanyCode, FinancialData, YoYComparison } from '@/types/financial';
+
+const CHART_METRICS = ['revenue', 'operating_income', 'net_income'];
 
 /**
  * P/L (Profit & Loss) Page
@@ -11,11 +17,15 @@ import type { FinancialData, YoYComparison } from '@/types/financial';
  */
 const PLPage: React.FC = () => {
   const [data, setData] = useState<FinancialData[]>([]);
+  const [bundles, setBundles] = useState<Partial<Record<CompanyCode, CompanyBundle | null>>>({});
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [selectedCompany, setSelectedCompany] = useState<'TEPCO' | 'CHUBU'>('TEPCO');
   const [comparisonMode, setComparisonMode] = useState(false);
   const [chartType, setChartType] = useState<'line' | 'bar'>('line');
+  const [chartRows, setChartRows] = useState<FinancialData[] | null>(null);
+  const [chartRef, chartWidth] = useElementWidth<HTMLDivElement>();
+  const maxPoints = maxChartPoints(chartWidth);
 
   useEffect(() => {
     const loadData = async () => {
@@ -24,6 +34,12 @@ const PLPage: React.FC = () => {
         const tepcoData = await loadFinancialData('TEPCO', 'pl');
         const chubuData = await loadFinancialData('CHUBU', 'pl');
         setData([...tepcoData, ...chubuData]);
+        // Already fetched by loadFinancialData; provides the precomputed YoY metrics
+        const [tepcoBundle, chubuBundle] = await Promise.all([
+          loadCompanyBundle('TEPCO'),
+          loadCompanyBundle('CHUBU'),
+        ]);
+        setBundles({ TEPCO: tepcoBundle, CHUBU: chubuBundle });
         setError(null);
       } catch (err) {
         setError(err instanceof Error ? err.message : 'データ読み込みエラー');
@@ -34,6 +50,20 @@ const PLPage: React.FC = () => {
     loadData();
   }, []);
 
+  // Chart series sized to the chart width (CSV / bundle rows when not published)
+  useEffect(() => {
+    let cancelled = false;
+    const companies: CompanyCode[] = comparisonMode ? ['TEPCO', 'CHUBU'] : [selectedCompany];
+    loadChartRows(companies, CHART_METRICS, maxPoints)
+      .catch(() => null)
+      .then((rows) => {
+        if (!cancelled) setChartRows(rows);
+      });
+    return () => {
+      cancelled = true;
+    };
+  }, [comparisonMode, selectedCompany, maxPoints]);
+
   // Get filtered data
   const displayData = comparisonMode ? data : data.filter((d) => d.company === selectedCompany);
 
@@ -43,23 +73,12 @@ const PLPage: React.FC = () => {
     .sort((a, b) => b.period.localeCompare(a.period))[0];
 
   // Calculate YoY comparisons
+  const bundle = bundles[selectedCompany] ?? null;
   const yoyComparisons: YoYComparison[] = latestData
     ? [
-        calculateYoY(
-          latestData.revenue || 0,
-          findPreviousYearData(data, latestData.period, selectedCompany)?.revenue || 0,
-          '売上高'
-        ),
-        calculateYoY(
-          latestData.operating_income || 0,
-          findPreviousYearData(data, latestData.period, selectedCompany)?.operating_income || 0,
-          '営業利益'
-        ),
-        calculateYoY(
-          latestData.net_income || 0,
-          findPreviousYearData(data, latestData.period, selectedCompany)?.net_income || 0,
-          '当期純利益'
-        ),
+        calculateBundleYoY(bundle, latestData, 'revenue', '売上高', data),
+        calculateBundleYoY(bundle, latestData, 'operating_income', '営業利益', data),
+        calculateBundleYoY(bundle, latestData, 'net_income', '当期純利益', data),
       ]
     : [];
 
@@ -182,9 +201,13 @@ const PLPage: React.FC = () => {
         )}
 
         {/* Chart */}
-        <div className="glass-card p-6 fade-in">
+        <div ref={chartRef} className="glass-card p-6 fade-in">
           <h2 className="text-2xl font-bold text-text-primary mb-4">推移グラフ</h2>
-          <PLChart data={displayData} chartType={chartType} comparisonMode={comparisonMode} />
+          <PLChart
+            data={chartRows ?? displayData}
+            chartType={chartType}
+            comparisonMode={comparisonMode}
+          />
         </div>
 
         {/* Period info */}
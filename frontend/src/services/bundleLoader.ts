@@ -0,0 +1,152 @@
+// Pre-built data bundle loader (manifest + content-hashed per-company bundles)
+
+import type { CompanyCode, FinancialData, StatementType } from '@/types/financial';
+import { DataLoadError } from '@/lib/errorHandler';
+
+const BUNDLE_BASE_PATH = '/FinSight/data/bundle/';
+
+export interface BundleManifestEntry {
+  file: string;
+  sha256: string;
+  bytes: number;
+  encodings: Record<string, { file: string; bytes: number }>;
+  periods: number;
+  latest_period: string;
+}
+
+/** Basis of PL / CF values: standalone quarters (filed values are fiscal year-to-date) */
+export type FlowBasis = 'standalone';
+
+export interface BundleManifest {
+  schema_version: string;
+  version: string;
+  /** bundle >= 1.2.0 */
+  flow_basis?: FlowBasis;
+  generated_at: string;
+  companies: Record<string, BundleManifestEntry>;
+}
+
+type Column = (number | null)[];
+
+export interface CompanyBundle {
+  schema_version: string;
+  company: CompanyCode;
+  /** bundle >= 1.2.0 */
+  flow_basis?: FlowBasis;
+  periods: string[];
+  period_end: (string | null)[];
+  statements: Partial<Record<StatementType, Record<string, Column>>>;
+  metrics: Record<string, Column>;
+  health_score: Record<string, Column>;
+  /** Peer comparison per metric: `<metric>_pct`, `<metric>_z`, `<metric>_median` (bundle >= 1.1.0) */
+  peers?: Record<string, Column>;
+}
+
+let manifestPromise: Promise<BundleManifest | null> | null = null;
+const bundleCache: Map<string, Promise<CompanyBundle>> = new Map();
+const periodIndexCache: WeakMap<CompanyBundle, Map<string, number>> = new WeakMap();
+
+/**
+ * Load bundle manifest (fetched once per session)
+ * @returns Manifest, or null when no bundle has been published
+ */
+export const loadBundleManifest = (): Promise<BundleManifest | null> => {
+  if (!manifestPromise) {
+    manifestPromise = fetch(`${BUNDLE_BASE_PATH}manifest.json`, { cache: 'no-cache' })
+      .then((response) => (response.ok ? (response.json() as Promise<BundleManifest>) : null))
+      .catch(() => null);
+  }
+  return manifestPromise;
+};
+
+/**
+ * Load a company bundle. File names are content-hashed, so responses can be cached immutably.
+ * @param company Company code
+ * @returns Company bundle, or null when the manifest has no entry for the company
+ */
+export const loadCompanyBundle = async (company: CompanyCode): Promise<CompanyBundle | null> => {
+  const manifest = await loadBundleManifest();
+  const entry = manifest?.companies[company];
+  if (!entry) return null;
+
+  if (!bundleCache.has(entry.file)) {
+    const url = `${BUNDLE_BASE_PATH}${entry.file}`;
+    bundleCache.set(
+      entry.file,
+      fetch(url).then((response) => {
+        if (!response.ok) {
+          throw new DataLoadError(`Failed to load ${entry.file}: ${response.statusText}`, {
+            status: response.status,
+            url,
+          });
+        }
+        return response.json() as Promise<CompanyBundle>;
+      })
+    );
+  }
+
+  try {
+    return await bundleCache.get(entry.file)!;
+  } catch (error) {
+    bundleCache.delete(entry.file);
+    throw error;
+  }
+};
+
+/**
+ * Convert a bundle's columnar statement into FinancialData rows
+ * @param bundle Company bundle
+ * @param statement Statement type (pl, bs, or cf)
+ * @returns Rows that have at least one value for the statement
+ */
+export const bundleToFinancialData = (
+  bundle: CompanyBundle,
+  statement: StatementType
+): FinancialData[] => {
+  const columns = bundle.statements[statement] ?? {};
+  const fields = Object.keys(columns);
+  const rows: FinancialData[] = [];
+
+  bundle.periods.forEach((period, index) => {
+    const row: Record<string, unknown> = {
+      company: bundle.company,
+      period,
+      period_end: bundle.period_end[index] ?? '',
+    };
+    let hasValue = false;
+    fields.forEach((field) => {
+      const value = columns[field][index];
+      if (value !== null && value !== undefined) {
+        row[field] = value;
+        hasValue = true;
+      }
+      // Pages read equity as total_equity (alias for net_assets)
+      if (field === 'net_assets' && value !== null && value !== undefined) {
+        row.total_equity = value;
+      }
+    });
+    if (hasValue) rows.push(row as unknown as FinancialData);
+  });
+
+  return rows;
+};
+
+/**
+ * Look up a precomputed metric (e.g. "revenue_yoy") for a period without scanning rows
+ * @returns Metric value, or undefined when not available
+ */
+export const getBundleMetric = (
+  bundle: CompanyBundle,
+  period: string,
+  metric: string
+): number | undefined => {
+  let periodIndex = periodIndexCache.get(bundle);
+  if (!periodIndex) {
+    periodIndex = new Map(bundle.periods.map((p, i) => [p, i]));
+    periodIndexCache.set(bundle, periodIndex);
+  }
+
+  const index = periodIndex.get(period);
+  const value = index !== undefined ? bundle.metrics[metric]?.[index] : undefined;
+  return value ?? undefined;
+};
@@ -0,0 +1,248 @@
+// Precomputed chart series loader (quarterly / TTM / annual and LTTB-downsampled typed arrays)
+
+import type { CompanyCode, FinancialData } from '@/types/financial';
+import { DataLoadError } from '@/lib/errorHandler';
+
+const CHARTS_BASE_PATH = '/FinSight/data/bundle/charts/';
+
+/** Horizontal pixels per chart point; narrower charts get a downsampled variant */
+const PIXELS_PER_POINT = 8;
+
+/** Base resolutions; LTTB variants are published as `<base>@<points>` (e.g. "quarterly@100") */
+export type ChartResolution = 'quarterly' | 'ttm' | 'annual';
+
+/** [offset, length] in elements of the Float32 values / Uint16 index sections */
+type Span = [number, number];
+
+interface ChartSeriesEntry {
+  values: Span;
+  /** Quarter positions relative to `start` (downsampled variants only) */
+  index?: Span;
+}
+
+export interface ChartSeriesIndex {
+  format_version: number;
+  /** Quarter ordinal of the first quarter (year * 4 + quarter - 1) */
+  start: number;
+  quarters: number;
+  first_fiscal_year: number;
+  years: number;
+  /** Number of Float32 values; the Uint16 section starts at value_count * 4 bytes */
+  value_count: number;
+  series: Record<string, Record<string, ChartSeriesEntry>>;
+}
+
+export interface ChartSeriesManifestEntry {
+  file: string;
+  sha256: string;
+  bytes: number;
+  encodings: Record<string, { file: string; bytes: number }>;
+  index: ChartSeriesIndex;
+}
+
+export interface ChartSeriesManifest {
+  format_version: number;
+  version: string;
+  companies: Record<string, ChartSeriesManifestEntry>;
+}
+
+export interface CompanyChartSeries {
+  index: ChartSeriesIndex;
+  buffer: ArrayBuffer;
+}
+
+export interface ChartSeries {
+  /** Period labels ("2024Q1", or "FY2024" for annual series) */
+  periods: string[];
+  /** Values (NaN where the source is missing) */
+  values: Float32Array;
+  /** Resolution key actually used (e.g. "quarterly@100") */
+  resolution: string;
+}
+
+let manifestPromise: Promise<ChartSeriesManifest | null> | null = null;
+const bufferCache: Map<string, Promise<ArrayBuffer>> = new Map();
+
+/**
+ * Load chart series manifest (fetched once per session)
+ * @returns Manifest, or null when no chart series have been published
+ */
+export const loadChartSeriesManifest = (): Promise<ChartSeriesManifest | null> => {
+  if (!manifestPromise) {
+    manifestPromise = fetch(`${CHARTS_BASE_PATH}manifest.json`, { cache: 'no-cache' })
+      .then((response) =>
+        response.ok ? (response.json() as Promise<ChartSeriesManifest>) : null
+      )
+      .catch(() => null);
+  }
+  return manifestPromise;
+};
+
+/**
+ * Load a company's chart series buffer (content-hashed, cacheable immutably)
+ * @param company Company code
+ * @returns Index and buffer, or null when the manifest has no entry for the company
+ */
+export const loadCompanyChartSeries = async (
+  company: CompanyCode
+): Promise<CompanyChartSeries | null> => {
+  const manifest = await loadChartSeriesManifest();
+  const entry = manifest?.companies[company];
+  if (!entry) return null;
+
+  if (!bufferCache.has(entry.file)) {
+    const url = `${CHARTS_BASE_PATH}${entry.file}`;
+    bufferCache.set(
+      entry.file,
+      fetch(url).then((response) => {
+        if (!response.ok) {
+          throw new DataLoadError(`Failed to load ${entry.file}: ${response.statusText}`, {
+            status: response.status,
+            url,
+          });
+        }
+        return response.arrayBuffer();
+      })
+    );
+  }
+
+  try {
+    return { index: entry.index, buffer: await bufferCache.get(entry.file)! };
+  } catch (error) {
+    bufferCache.delete(entry.file);
+    throw error;
+  }
+};
+
+const quarterLabel = (ordinal: number): string =>
+  `${Math.floor(ordinal / 4)}Q${(ordinal % 4) + 1}`;
+
+const quarterOrdinal = (period: string): number => {
+  const [year, quarter] = period.split('Q').map(Number);
+  return year * 4 + quarter - 1;
+};
+
+/**
+ * Pick the smallest resolution that still has at least `maxPoints` points
+ * (falls back to full resolution when no downsampled variant is large enough)
+ */
+const pickResolution = (
+  variants: Record<string, ChartSeriesEntry>,
+  base: ChartResolution,
+  maxPoints?: number
+): string => {
+  if (base === 'annual' || maxPoints === undefined) return base;
+  const full = variants[base].values[1];
+  if (full <= maxPoints) return base;
+
+  let best = base;
+  let bestPoints = full;
+  Object.entries(variants).forEach(([key, entry]) => {
+    const points = entry.values[1];
+    if (key.startsWith(`${base}@`) && points >= maxPoints && points < bestPoints) {
+      best = key;
+      bestPoints = points;
+    }
+  });
+  return best;
+};
+
+/**
+ * Read one series from a company's chart buffer
+ * @param charts Company chart series
+ * @param metric Metric name (e.g. "revenue", "free_cf")
+ * @param base Base resolution
+ * @param maxPoints Points the chart can display; a downsampled variant is used when available
+ * @returns Series, or null when the metric / resolution is not published
+ */
+export const selectChartSeries = (
+  charts: CompanyChartSeries,
+  metric: string,
+  base: ChartResolution = 'quarterly',
+  maxPoints?: number
+): ChartSeries | null => {
+  const variants = charts.index.series[metric];
+  if (!variants?.[base]) return null;
+
+  const resolution = pickResolution(variants, base, maxPoints);
+  const entry = variants[resolution];
+  const [offset, length] = entry.values;
+  const values = new Float32Array(charts.buffer, offset * 4, length);
+
+  let periods: string[];
+  if (base === 'annual') {
+    periods = Array.from({ length }, (_, i) => `FY${charts.index.first_fiscal_year + i}`);
+  } else if (entry.index) {
+    const [indexOffset, indexLength] = entry.index;
+    const positions = new Uint16Array(
+      charts.buffer,
+      charts.index.value_count * 4 + indexOffset * 2,
+      indexLength
+    );
+    periods = Array.from(positions, (position) => quarterLabel(charts.index.start + position));
+  } else {
+    periods = Array.from({ length }, (_, i) => quarterLabel(charts.index.start + i));
+  }
+
+  return { periods, values, resolution };
+};
+
+/**
+ * Points a chart of the given width can display
+ * @param width Chart width in pixels (0 until measured)
+ * @returns Point budget, or undefined for full resolution
+ */
+export const maxChartPoints = (width: number): number | undefined =>
+  width > 0 ? Math.max(3, Math.floor(width / PIXELS_PER_POINT)) : undefined;
+
+/**
+ * Load statement chart rows from the precomputed quarterly series.
+ * The first metric of the first company picks the quarters (an LTTB variant for `maxPoints`);
+ * every other series is read from its full quarterly series at the same quarters, so rows
+ * of all metrics and companies stay aligned.
+ * @param companies Companies to load (the first one picks the quarters)
+ * @param metrics Metric names (e.g. ["revenue", "operating_income"])
+ * @param maxPoints Points the chart can display
+ * @returns Rows in FinancialData shape, or null when chart series are not published
+ */
+export const loadChartRows = async (
+  companies: CompanyCode[],
+  metrics: string[],
+  maxPoints?: number
+): Promise<FinancialData[] | null> => {
+  const charts = await Promise.all(companies.map(loadCompanyChartSeries));
+  if (charts.length === 0 || charts.some((entry) => entry === null)) return null;
+
+  const lead = selectChartSeries(charts[0]!, metrics[0], 'quarterly', maxPoints);
+  if (!lead) return null;
+  const ordinals = lead.periods.map(quarterOrdinal);
+
+  const rows: FinancialData[] = [];
+  companies.forEach((company, i) => {
+    const { index } = charts[i]!;
+    const series = metrics.map((metric) => selectChartSeries(charts[i]!, metric));
+
+    ordinals.forEach((ordinal, j) => {
+      const row: Record<string, unknown> = {
+        company,
+        period: lead.periods[j],
+        period_end: '',
+      };
+      let hasValue = false;
+      metrics.forEach((metric, k) => {
+        const values = series[k]?.values;
+        const position = ordinal - index.start;
+        if (!values || position < 0 || position >= values.length) return;
+        const value = values[position];
+        if (Number.isNaN(value)) return;
+        row[metric] = value;
+        // Pages read equity as total_equity (alias for net_assets)
+        if (metric === 'net_assets') row.total_equity = value;
+        hasValue = true;
+      });
+      if (hasValue) rows.push(row as unknown as FinancialData);
+    });
+  });
+
+  return rows;
+};
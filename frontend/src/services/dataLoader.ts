@@ -3,6 +3,7 @@
 import Papa from 'papaparse';
 import type { FinancialData } from '@/types/financial';
 import { DataLoadError, ParseError } from '@/lib/errorHandler';
+import { bundleToFinancialData, loadCompanyBundle } from '@/services/bundleLoader';
 
 export interface LoadDataOptions {
   cache?: boolean;
@@ -13,7 +14,7 @@ export interface LoadDataOptions {
 const dataCache: Map<string, FinancialData[]> = new Map();
 
 /**
- * Load financial data from CSV file
+ * Load financial data, preferring the published bundle and falling back to the CSV file
  * @param company Company code (TEPCO or CHUBU)
  * @param statement Statement type (pl, bs, or cf)
  * @param options Loading options
@@ -33,6 +34,24 @@ export const loadFinancialData = async (
   }
 
   try {
+    const bundle = await loadCompanyBundle(company);
+    if (bundle) {
+      const data = bundleToFinancialData(bundle, statement);
+      if (validateSchema) {
+        const validationErrors = validateFinancialData(data);
+        if (validationErrors.length > 0) {
+          throw new ParseError('Data validation failed', {
+            errors: validationErrors,
+            filename: `bundle/${company}`,
+          });
+        }
+      }
+      if (cache) {
+        dataCache.set(cacheKey, data);
+      }
+      return data;
+    }
+
     const filename = `${company}_${statement}_quarterly.csv`;
     const basePath = '/FinSight/';
     const url = `${basePath}data/${filename}`;
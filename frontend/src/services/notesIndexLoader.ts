@@ -0,0 +1,192 @@
+// Sharded character-bigram index over XBRL notes (built by backend/scripts/notes_index.py)
+
+import type { NoteData, NotesResponse } from '@/types/notes';
+import { DataLoadError } from '@/lib/errorHandler';
+
+const NOTES_INDEX_BASE_PATH = '/FinSight/data/notes_index/';
+/** Copy of xbrl_notes.json published next to the index (notes_index.NOTES_COPY_NAME) */
+const NOTES_FILE = 'notes.json';
+const SEPARATOR_PATTERN = /[^\p{L}\p{N}]+/u;
+
+export interface NotesIndexGroup {
+  company: string;
+  period: string;
+  hash: string;
+  count: number; // 0 for removed groups (ids are never reused)
+}
+
+export interface NotesIndexManifest {
+  format_version: number;
+  generated_at: string;
+  shard_count: number;
+  notes: number;
+  groups: NotesIndexGroup[];
+  shards: Record<string, { file: string; bytes: number; bigrams: number }>;
+}
+
+// [group id, first note ordinal, delta, delta, ...]
+type EncodedPosting = number[];
+
+let manifestPromise: Promise<NotesIndexManifest | null> | null = null;
+let notesPromise: Promise<NoteData[] | null> | null = null;
+const shardCache: Map<string, Promise<Record<string, EncodedPosting[]>>> = new Map();
+
+/** Same normalization as notes_index.normalize_text (NFKC + lower case) */
+export const normalizeText = (text: string): string => text.normalize('NFKC').toLowerCase();
+
+const queryTerms = (query: string): string[] =>
+  normalizeText(query)
+    .split(SEPARATOR_PATTERN)
+    .filter((term) => term.length > 0);
+
+const termBigrams = (term: string): string[] => {
+  const bigrams: string[] = [];
+  const chars = Array.from(term);
+  for (let i = 0; i < chars.length - 1; i += 1) bigrams.push(chars[i] + chars[i + 1]);
+  return bigrams;
+};
+
+/** Same formula as notes_index.shard_of */
+const shardOf = (bigram: string, shardCount: number): number => {
+  const [a, b] = Array.from(bigram);
+  return (a.codePointAt(0)! * 31 + b.codePointAt(0)!) % shardCount;
+};
+
+/**
+ * Load the index manifest (fetched once per session)
+ * @returns Manifest, or null when no index has been published
+ */
+export const loadNotesIndexManifest = (): Promise<NotesIndexManifest | null> => {
+  if (!manifestPromise) {
+    manifestPromise = fetch(`${NOTES_INDEX_BASE_PATH}manifest.json`, { cache: 'no-cache' })
+      .then((response) => (response.ok ? (response.json() as Promise<NotesIndexManifest>) : null))
+      .catch(() => null);
+  }
+  return manifestPromise;
+};
+
+/**
+ * Load the notes the index was built from (fetched once per session)
+ * @returns Notes in file order, or null when they have not been published
+ */
+export const loadIndexedNotes = (): Promise<NoteData[] | null> => {
+  if (!notesPromise) {
+    notesPromise = fetch(`${NOTES_INDEX_BASE_PATH}${NOTES_FILE}`, { cache: 'no-cache' })
+      .then((response) => (response.ok ? (response.json() as Promise<NotesResponse>) : null))
+      .then((data) => data?.notes ?? null)
+      .catch(() => null);
+  }
+  return notesPromise;
+};
+
+const loadShard = async (file: string): Promise<Record<string, EncodedPosting[]>> => {
+  if (!shardCache.has(file)) {
+    const url = `${NOTES_INDEX_BASE_PATH}${file}`;
+    shardCache.set(
+      file,
+      fetch(url).then(async (response) => {
+        if (!response.ok) {
+          throw new DataLoadError(`Failed to load ${file}: ${response.statusText}`, {
+            status: response.status,
+            url,
+          });
+        }
+        return ((await response.json()) as { postings: Record<string, EncodedPosting[]> })
+          .postings;
+      })
+    );
+  }
+  try {
+    return await shardCache.get(file)!;
+  } catch (error) {
+    shardCache.delete(file);
+    throw error;
+  }
+};
+
+const decodePostings = (encoded: EncodedPosting[]): Map<number, number[]> => {
+  const groups = new Map<number, number[]>();
+  encoded.forEach(([groupId, first, ...deltas]) => {
+    const ordinals = [first];
+    deltas.forEach((delta) => ordinals.push(ordinals[ordinals.length - 1] + delta));
+    groups.set(groupId, ordinals);
+  });
+  return groups;
+};
+
+/**
+ * Search notes by keyword, fetching only the shards that hold the query's bigrams.
+ * Terms separated by whitespace or punctuation must all appear in a note (AND).
+ * @param query Search text
+ * @param notes Notes from xbrl_notes.json in file order (postings index notes per company/period)
+ * @returns Matching notes, or null when no index has been published
+ */
+export const searchNotes = async (
+  query: string,
+  notes: NoteData[]
+): Promise<NoteData[] | null> => {
+  const manifest = await loadNotesIndexManifest();
+  if (!manifest) return null;
+
+  const terms = queryTerms(query);
+  if (terms.length === 0) return [];
+
+  const grouped = new Map<string, NoteData[]>();
+  notes.forEach((note) => {
+    const key = `${note.company}|${note.period}`;
+    if (!grouped.has(key)) grouped.set(key, []);
+    grouped.get(key)!.push(note);
+  });
+
+  const bigrams = Array.from(new Set(terms.flatMap(termBigrams)));
+  let matched: Map<number, Set<number>> | null = null;
+  if (bigrams.length === 0) {
+    matched = new Map(
+      manifest.groups.map((group, id) => [
+        id,
+        new Set(Array.from({ length: group.count }, (_, i) => i)),
+      ])
+    );
+  }
+
+  // Fetch the needed shards in parallel; the rest of the index is never downloaded
+  const shardFile = (bigram: string): string | undefined =>
+    manifest.shards[String(shardOf(bigram, manifest.shard_count)).padStart(2, '0')]?.file;
+  const files = Array.from(new Set(bigrams.map(shardFile).filter((f): f is string => !!f)));
+  const shards = new Map(
+    await Promise.all(files.map(async (file) => [file, await loadShard(file)] as const))
+  );
+
+  for (const bigram of bigrams) {
+    const file = shardFile(bigram);
+    const postings = decodePostings((file && shards.get(file)?.[bigram]) || []);
+    const next = new Map<number, Set<number>>();
+    if (matched === null) {
+      postings.forEach((ordinals, groupId) => next.set(groupId, new Set(ordinals)));
+    } else {
+      matched.forEach((ordinals, groupId) => {
+        const other = new Set(postings.get(groupId) ?? []);
+        const kept = new Set(Array.from(ordinals).filter((o) => other.has(o)));
+        if (kept.size > 0) next.set(groupId, kept);
+      });
+    }
+    matched = next;
+    if (matched.size === 0) return [];
+  }
+
+  const results: NoteData[] = [];
+  matched!.forEach((ordinals, groupId) => {
+    const group = manifest.groups[groupId];
+    const groupNotes = grouped.get(`${group.company}|${group.period}`) ?? [];
+    ordinals.forEach((ordinal) => {
+      const note = groupNotes[ordinal];
+      if (!note) return;
+      // Bigram matches are candidates; confirm each term as a substring
+      const text = normalizeText([note.text, ...note.keywords].join('\n'));
+      if (terms.every((term) => text.includes(term))) results.push(note);
+    });
+  });
+  return results.sort((a, b) =>
+    a.period === b.period ? a.company.localeCompare(b.company) : a.period.localeCompare(b.period)
+  );
+};
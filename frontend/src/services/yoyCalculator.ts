@@ -1,6 +1,11 @@
 // YoY (Year-over-Year) comparison calculator
 
 import type { FinancialData, YoYComparison } from '@/types/financial';
+import type { CompanyBundle } from '@/services/bundleLoader';
+import { getBundleMetric } from '@/services/bundleLoader';
+
+/** Numeric statement fields of FinancialData */
+export type StatementField = Exclude<keyof FinancialData, 'company' | 'period' | 'period_end'>;
 
 /**
  * Calculate Year-over-Year comparison
@@ -52,6 +57,39 @@ export const findPreviousYearData = (
   return data.find((d) => d.company === company && d.period === previousPeriod);
 };
 
+/**
+ * YoY comparison for a statement field, read from the bundle's precomputed `<field>_yoy` metric
+ * (scans `data` with findPreviousYearData only when no bundle is published)
+ * @param bundle Company bundle, or null when loading from CSV
+ * @param latest Current period data
+ * @param field Statement field (e.g., "revenue")
+ * @param label Metric label
+ * @param data All financial data (CSV fallback)
+ * @returns YoY comparison data
+ */
+export const calculateBundleYoY = (
+  bundle: CompanyBundle | null,
+  latest: FinancialData,
+  field: StatementField,
+  label: string,
+  data: FinancialData[]
+): YoYComparison => {
+  const current = latest[field] || 0;
+  if (!bundle) {
+    const previous = findPreviousYearData(data, latest.period, latest.company)?.[field] || 0;
+    return calculateYoY(current, previous, label);
+  }
+
+  // Bundle metrics use the backend field name for equity
+  const metric = `${field === 'total_equity' ? 'net_assets' : field}_yoy`;
+  const changePercent = getBundleMetric(bundle, latest.period, metric);
+  if (changePercent === undefined) return calculateYoY(current, 0, label);
+
+  const ratio = 1 + changePercent / 100;
+  const previous = ratio !== 0 ? current / ratio : NaN;
+  return { current, previous, change: current - previous, changePercent, label };
+};
+
 /**
  * Get YoY color based on change percent
  * @param changePercent Change percentage